@@ -10,4 +10,6 @@ class AuditLogConfig(AppConfig):
     verbose_name = 'نظام تسجيل التدقيق'
     
     def ready(self):
-        import audit_log.signals
\ No newline at end of file
+        import audit_log.signals
+        from audit_log.tracker import install_tracking
+        install_tracking()
\ No newline at end of file
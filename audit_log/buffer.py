@@ -0,0 +1,199 @@
+# ====================================
+# 7. audit_log/buffer.py
+# ====================================
+
+"""
+مخزن مؤقت لسجلات التدقيق
+
+بدلاً من INSERT منفصل (و on_commit منفصل) لكل حفظ:
+- داخل معاملة: تُجمع السجلات وتُكتب بـ bulk_create واحد عند نجاح المعاملة
+  (وتُحذف تلقائياً إذا فشلت المعاملة أو الـ savepoint)
+- خارج المعاملات أثناء طلب HTTP: تُجمع وتُكتب في نهاية الطلب (AuditLogMiddleware)
+- خارج الطلبات والمعاملات: تُكتب فوراً
+
+AUDIT_LOG_ASYNC = True: الكتابة تتم في خيط خلفي يستهلك طابوراً (queue).
+"""
+
+import atexit
+import logging
+import queue
+import threading
+
+from django.conf import settings
+from django.db import connection, transaction
+
+logger = logging.getLogger(__name__)
+
+_state = threading.local()
+
+
+def _is_pending_on_commit(callback):
+    """هل ما زال الـ callback مسجلاً في on_commit (لم يُلغَ بسبب rollback)؟"""
+    return any(item[1] is callback for item in connection.run_on_commit)
+
+
+class _TransactionBatch:
+    """سجلات معاملة (أو savepoint) واحدة - تُكتب عند نجاحها"""
+
+    def __init__(self, buffer):
+        self.buffer = buffer
+        self.entries = []
+
+    def __call__(self):
+        entries, self.entries = self.entries, []
+        self.buffer.write(entries)
+
+
+class AuditBuffer:
+    """تجميع سجلات التدقيق وكتابتها دفعة واحدة"""
+
+    def __init__(self):
+        self._queue = None
+        self._worker = None
+        self._worker_lock = threading.Lock()
+
+    # ========================================
+    # Settings
+    # ========================================
+    @property
+    def async_mode(self):
+        return getattr(settings, 'AUDIT_LOG_ASYNC', False)
+
+    @property
+    def batch_size(self):
+        return getattr(settings, 'AUDIT_LOG_BATCH_SIZE', 500)
+
+    # ========================================
+    # Collecting
+    # ========================================
+    def add(self, entry):
+        """
+        إضافة سجل (قاموس بحقول AuditLog)
+
+        content_type يمكن تمريره كـ (app_label, model_name) ويُحل عند الكتابة.
+        """
+        if connection.in_atomic_block:
+            self._get_transaction_batch().entries.append(entry)
+        elif getattr(_state, 'request_entries', None) is not None:
+            _state.request_entries.append(entry)
+        else:
+            self.write([entry])
+
+    def _get_transaction_batch(self):
+        """
+        دفعة الـ savepoint الحالي - واحدة لكل مستوى savepoint حتى يتم
+        تجاهل سجلات الـ savepoint الذي تم التراجع عنه فقط
+        """
+        batches = getattr(_state, 'batches', None)
+        if batches is None:
+            batches = _state.batches = {}
+
+        key = (connection.alias, tuple(connection.savepoint_ids))
+        batch = batches.get(key)
+        if batch is None or not _is_pending_on_commit(batch):
+            # إزالة دفعات المعاملات المنتهية أو الملغاة
+            for stale_key in [k for k, b in batches.items() if not _is_pending_on_commit(b)]:
+                del batches[stale_key]
+
+            batch = batches[key] = _TransactionBatch(self)
+            transaction.on_commit(batch)
+        return batch
+
+    # ========================================
+    # Request Scope
+    # ========================================
+    def begin_request(self):
+        """بداية طلب HTTP: تجميع السجلات المكتوبة خارج المعاملات حتى نهاية الطلب"""
+        _state.request_entries = []
+
+    def end_request(self):
+        """نهاية طلب HTTP: كتابة كل السجلات المجمعة"""
+        entries = getattr(_state, 'request_entries', None)
+        _state.request_entries = None
+        if entries:
+            self.write(entries)
+
+    # ========================================
+    # Writing
+    # ========================================
+    def write(self, entries):
+        """كتابة السجلات (مباشرة أو عبر الخيط الخلفي)"""
+        if not entries:
+            return
+        if self.async_mode:
+            self._ensure_worker()
+            self._queue.put(entries)
+        else:
+            self._bulk_create(entries)
+
+    def _bulk_create(self, entries):
+        from .models import AuditLog
+        from .signals import get_content_type_cached
+
+        try:
+            logs = []
+            for entry in entries:
+                entry = dict(entry)
+                content_type = entry.get('content_type')
+                if isinstance(content_type, tuple):
+                    entry['content_type'] = get_content_type_cached(*content_type)
+                logs.append(AuditLog(**entry))
+            AuditLog.objects.bulk_create(logs, batch_size=self.batch_size)
+        except Exception as e:
+            # لا تؤثر أخطاء التدقيق على العملية الأساسية
+            logger.error(f'Error writing {len(entries)} audit logs: {e}', exc_info=True)
+
+    # ========================================
+    # Async Mode
+    # ========================================
+    def _ensure_worker(self):
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._worker_lock:
+            if self._worker is not None and self._worker.is_alive():
+                return
+            self._queue = queue.Queue()
+            self._worker = threading.Thread(
+                target=self._drain, name='audit-log-writer', daemon=True
+            )
+            self._worker.start()
+            atexit.register(self.shutdown)
+
+    def _drain(self):
+        """الخيط الخلفي: تجميع ما في الطابور وكتابته بـ bulk_create"""
+        from django.db import connection as worker_connection
+
+        while True:
+            entries = self._queue.get()
+            if entries is None:
+                break
+            entries = list(entries)
+
+            # دمج كل الدفعات المنتظرة في كتابة واحدة
+            stop = False
+            while len(entries) < self.batch_size:
+                try:
+                    more = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if more is None:
+                    stop = True
+                    break
+                entries.extend(more)
+
+            self._bulk_create(entries)
+            if stop:
+                break
+
+        worker_connection.close()
+
+    def shutdown(self, timeout=5):
+        """إيقاف الخيط الخلفي بعد كتابة ما تبقى في الطابور"""
+        worker = self._worker
+        if worker is None or not worker.is_alive():
+            return
+        self._queue.put(None)
+        worker.join(timeout)
+
+
+audit_buffer = AuditBuffer()
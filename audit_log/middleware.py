@@ -5,6 +5,8 @@
 import time
 import logging
 from .signals import _thread_locals
+from .buffer import audit_buffer
+from .tracker import snapshot_store
 
 logger = logging.getLogger('request_timing')
 
@@ -15,10 +17,15 @@ class AuditLogMiddleware:
 
     def __call__(self, request):
         _thread_locals.request = request
+        audit_buffer.begin_request()
 
         try:
             response = self.get_response(request)
         finally:
+            # كتابة سجلات التدقيق المجمعة خلال الطلب دفعة واحدة
+            audit_buffer.end_request()
+            # نسخ ما قبل الحفظ المتبقية (حفظ فشل بعد pre_save) لا تنتقل للطلب التالي
+            snapshot_store.clear()
             if hasattr(_thread_locals, 'request'):
                 delattr(_thread_locals, 'request')
 
@@ -6,12 +6,20 @@ from django.db.models.signals import post_save, post_delete, pre_save
 from django.dispatch import receiver
 from django.contrib.auth.signals import user_logged_in, user_logged_out, user_login_failed
 from django.contrib.contenttypes.models import ContentType
-from django.db import transaction
 from functools import lru_cache
 import threading
 from decimal import Decimal
 from datetime import datetime, date
 
+from .buffer import audit_buffer
+from .tracker import (
+    get_changed_fields,
+    get_original_values,
+    is_audit_suspended,
+    refresh_original_values,
+    snapshot_store,
+)
+
 _thread_locals = threading.local()
 
 # Cache for ContentType lookups to avoid repeated DB queries
@@ -42,14 +50,37 @@ def get_client_ip(request):
         ip = request.META.get('REMOTE_ADDR')
     return ip
 
+def get_request_info(request):
+    """معلومات الطلب المحفوظة مع كل سجل تدقيق"""
+    return {
+        'request_path': request.path if request else None,
+        'request_method': request.method if request else None,
+        'ip_address': get_client_ip(request) if request else None,
+        'user_agent': request.META.get('HTTP_USER_AGENT', '')[:500] if request else None,
+    }
+
 def should_audit_model(model):
+    if is_audit_suspended():
+        return False
+
     excluded_models = ['AuditLog', 'Session', 'ContentType', 'Permission', 'LogEntry', 'Migration']
     excluded_apps = ['contenttypes', 'auth', 'sessions', 'admin']
+    # سجلات النسخ الاحتياطي نفسها: تدقيقها يغيّر كل نسخة كاملة (audit_log
+    # يُنسخ) فلا تتطابق نسختان متتاليتان ولا يعمل التخزين حسب المحتوى
+    # واللقطات المالية المشتقة تُعاد كتابتها يومياً من بيانات مدققة أصلاً
+    excluded_labels = [
+        'rent.backup', 'rent.backupschedule', 'rent.backuptombstone',
+        'rent.contractfinancialsnapshot',
+    ]
 
     model_name = model.__name__
     app_label = model._meta.app_label
 
-    return model_name not in excluded_models and app_label not in excluded_apps
+    return (
+        model_name not in excluded_models
+        and app_label not in excluded_apps
+        and model._meta.label_lower not in excluded_labels
+    )
 
 def serialize_value(value):
     if value is None:
@@ -91,19 +122,39 @@ def calculate_changes(old_data, new_data):
     
     return changes if changes else None
 
-_pre_save_instances = {}
+def get_original_fields_dict(instance, new_data):
+    """
+    القيم القديمة من القيم الأصلية المتتبعة (بدون استعلام)
+    الحقول غير المتغيرة تأخذ نفس القيمة المسلسلة الجديدة
+    """
+    changed = get_changed_fields(instance)
+    if changed is None:
+        return None
+
+    old_data = dict(new_data)
+    for field, old_value in changed.items():
+        if field.name not in old_data:
+            continue
+        if field.is_relation:
+            old_data[field.name] = {'id': old_value} if old_value is not None else None
+        else:
+            old_data[field.name] = serialize_value(old_value)
+    return old_data
 
 @receiver(pre_save)
 def store_pre_save_instance(sender, instance, **kwargs):
     if not should_audit_model(sender):
         return
 
+    # القيم الأصلية متتبعة منذ التحميل - لا حاجة لاستعلام
+    if get_original_values(instance) is not None:
+        return
+
     if instance.pk:
         try:
             # Use only() to fetch minimal fields needed for audit
             old_instance = sender.objects.only(*[f.name for f in sender._meta.fields]).get(pk=instance.pk)
-            key = f"{sender.__name__}_{instance.pk}_{id(instance)}"
-            _pre_save_instances[key] = get_model_fields_dict(old_instance)
+            snapshot_store.put(instance, get_model_fields_dict(old_instance))
         except sender.DoesNotExist:
             pass
         except Exception:
@@ -124,58 +175,34 @@ def log_post_save(sender, instance, created, **kwargs):
     changes = None
 
     if not created:
-        key = f"{sender.__name__}_{instance.pk}_{id(instance)}"
-        old_data = _pre_save_instances.pop(key, None)
+        old_data = snapshot_store.pop(instance)
+        if old_data is None:
+            old_data = get_original_fields_dict(instance, new_data)
+
+    # القيم الحالية أصبحت هي الأصلية للحفظ القادم
+    refresh_original_values(instance, kwargs.get('update_fields'))
+
+    if not created:
         if old_data:
             changes = calculate_changes(old_data, new_data)
             # Skip if no actual changes
             if not changes:
                 return
 
-    # Capture values before on_commit (they may change)
-    audit_data = {
+    # Capture values now (they may change before the buffer is flushed)
+    audit_buffer.add({
         'user': user,
         'user_name': user.username if user else 'نظام',
         'action': action,
-        'app_label': sender._meta.app_label,
-        'model_name_lower': sender.__name__.lower(),
-        'model_name': sender.__name__,
+        'content_type': (sender._meta.app_label, sender.__name__.lower()),
         'object_id': instance.pk,
+        'model_name': sender.__name__,
         'object_repr': str(instance)[:500],
         'old_values': old_data if not created else None,
         'new_values': new_data,
         'changes': changes,
-        'request_path': request.path if request else None,
-        'request_method': request.method if request else None,
-        'ip_address': get_client_ip(request) if request else None,
-        'user_agent': request.META.get('HTTP_USER_AGENT', '')[:500] if request else None,
-    }
-
-    def create_audit_log():
-        from .models import AuditLog
-        try:
-            content_type = get_content_type_cached(audit_data['app_label'], audit_data['model_name_lower'])
-            AuditLog.objects.create(
-                user=audit_data['user'],
-                user_name=audit_data['user_name'],
-                action=audit_data['action'],
-                content_type=content_type,
-                object_id=audit_data['object_id'],
-                model_name=audit_data['model_name'],
-                object_repr=audit_data['object_repr'],
-                old_values=audit_data['old_values'],
-                new_values=audit_data['new_values'],
-                changes=audit_data['changes'],
-                request_path=audit_data['request_path'],
-                request_method=audit_data['request_method'],
-                ip_address=audit_data['ip_address'],
-                user_agent=audit_data['user_agent'],
-            )
-        except Exception:
-            pass  # Silent fail - don't affect main operation
-
-    # Defer audit log creation until after transaction commits
-    transaction.on_commit(create_audit_log)
+        **get_request_info(request),
+    })
 
 @receiver(post_delete)
 def log_post_delete(sender, instance, **kwargs):
@@ -186,125 +213,47 @@ def log_post_delete(sender, instance, **kwargs):
     user = get_current_user()
     old_data = get_model_fields_dict(instance)
 
-    audit_data = {
+    audit_buffer.add({
         'user': user,
         'user_name': user.username if user else 'نظام',
+        'action': 'delete',
         'model_name': sender.__name__,
         'object_repr': str(instance)[:500],
         'old_values': old_data,
-        'request_path': request.path if request else None,
-        'request_method': request.method if request else None,
-        'ip_address': get_client_ip(request) if request else None,
-        'user_agent': request.META.get('HTTP_USER_AGENT', '')[:500] if request else None,
-    }
-
-    def create_audit_log():
-        from .models import AuditLog
-        try:
-            AuditLog.objects.create(
-                user=audit_data['user'],
-                user_name=audit_data['user_name'],
-                action='delete',
-                model_name=audit_data['model_name'],
-                object_repr=audit_data['object_repr'],
-                old_values=audit_data['old_values'],
-                request_path=audit_data['request_path'],
-                request_method=audit_data['request_method'],
-                ip_address=audit_data['ip_address'],
-                user_agent=audit_data['user_agent'],
-            )
-        except Exception:
-            pass
-
-    transaction.on_commit(create_audit_log)
+        **get_request_info(request),
+    })
 
 @receiver(user_logged_in)
 def log_user_login(sender, request, user, **kwargs):
-    audit_data = {
+    audit_buffer.add({
         'user': user,
         'user_name': user.username,
-        'request_path': request.path if request else None,
-        'request_method': request.method if request else None,
-        'ip_address': get_client_ip(request),
-        'user_agent': request.META.get('HTTP_USER_AGENT', '')[:500] if request else None,
-    }
-
-    def create_audit_log():
-        from .models import AuditLog
-        try:
-            AuditLog.objects.create(
-                user=audit_data['user'],
-                user_name=audit_data['user_name'],
-                action='login',
-                model_name='User',
-                object_repr=f"تسجيل دخول: {audit_data['user_name']}",
-                request_path=audit_data['request_path'],
-                request_method=audit_data['request_method'],
-                ip_address=audit_data['ip_address'],
-                user_agent=audit_data['user_agent'],
-            )
-        except Exception:
-            pass
-
-    transaction.on_commit(create_audit_log)
+        'action': 'login',
+        'model_name': 'User',
+        'object_repr': f"تسجيل دخول: {user.username}",
+        **get_request_info(request),
+    })
 
 @receiver(user_logged_out)
 def log_user_logout(sender, request, user, **kwargs):
     user_name = user.username if user and user.is_authenticated else 'مجهول'
-    audit_data = {
+    audit_buffer.add({
         'user': user if user and user.is_authenticated else None,
         'user_name': user_name,
-        'request_path': request.path if request else None,
-        'request_method': request.method if request else None,
-        'ip_address': get_client_ip(request) if request else None,
-        'user_agent': request.META.get('HTTP_USER_AGENT', '')[:500] if request else None,
-    }
-
-    def create_audit_log():
-        from .models import AuditLog
-        try:
-            AuditLog.objects.create(
-                user=audit_data['user'],
-                user_name=audit_data['user_name'],
-                action='logout',
-                model_name='User',
-                object_repr=f"تسجيل خروج: {audit_data['user_name']}",
-                request_path=audit_data['request_path'],
-                request_method=audit_data['request_method'],
-                ip_address=audit_data['ip_address'],
-                user_agent=audit_data['user_agent'],
-            )
-        except Exception:
-            pass
-
-    transaction.on_commit(create_audit_log)
+        'action': 'logout',
+        'model_name': 'User',
+        'object_repr': f"تسجيل خروج: {user_name}",
+        **get_request_info(request),
+    })
 
 @receiver(user_login_failed)
 def log_login_failed(sender, credentials, request, **kwargs):
     username = credentials.get('username', 'مجهول')
-    audit_data = {
+    audit_buffer.add({
+        'user': None,
         'user_name': username,
-        'request_path': request.path if request else None,
-        'request_method': request.method if request else None,
-        'ip_address': get_client_ip(request) if request else None,
-        'user_agent': request.META.get('HTTP_USER_AGENT', '')[:500] if request else None,
-    }
-
-    def create_audit_log():
-        from .models import AuditLog
-        try:
-            AuditLog.objects.create(
-                user=None,
-                user_name=audit_data['user_name'],
-                action='login_failed',
-                model_name='User',
-                object_repr=f"محاولة دخول فاشلة: {audit_data['user_name']}",
-                request_path=audit_data['request_path'],
-                request_method=audit_data['request_method'],
-                ip_address=audit_data['ip_address'],
-                user_agent=audit_data['user_agent'],
-            )
-        except Exception:
-            pass
-
-    transaction.on_commit(create_audit_log)
+        'action': 'login_failed',
+        'model_name': 'User',
+        'object_repr': f"محاولة دخول فاشلة: {username}",
+        **get_request_info(request),
+    })
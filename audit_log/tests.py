@@ -1,3 +1,136 @@
 from django.test import TestCase
 
 # Create your tests here.
+
+
+class AuditBufferTest(TestCase):
+    """اختبار تجميع سجلات التدقيق وكتابتها دفعة واحدة"""
+
+    def test_entries_written_with_single_insert_on_commit(self):
+        from django.db import connection, transaction
+        from django.test.utils import CaptureQueriesContext
+        from audit_log.models import AuditLog
+        from rent.models import Tenant
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            for i in range(5):
+                Tenant.objects.create(
+                    name=f'مستأجر {i}', phone=f'05000000{i:02d}', id_number=f'10000000{i:02d}'
+                )
+
+            # سجلات savepoint تم التراجع عنه لا تُكتب
+            try:
+                with transaction.atomic():
+                    Tenant.objects.create(name='ملغى', phone='0500000099', id_number='1000000099')
+                    raise ValueError
+            except ValueError:
+                pass
+
+        self.assertEqual(AuditLog.objects.count(), 0)
+
+        with CaptureQueriesContext(connection) as ctx:
+            for callback in callbacks:
+                callback()
+
+        inserts = [q for q in ctx.captured_queries if q['sql'].startswith('INSERT INTO "audit_logs"')]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(AuditLog.objects.filter(model_name='Tenant', action='create').count(), 5)
+
+
+class OriginalValuesTrackerTest(TestCase):
+    """اختبار تتبع القيم الأصلية بدون استعلام قبل الحفظ"""
+
+    def test_update_audited_without_pre_save_select(self):
+        from django.db import connection, transaction
+        from django.test.utils import CaptureQueriesContext
+        from audit_log.models import AuditLog
+        from rent.models import Tenant
+
+        Tenant.objects.create(name='قديم', phone='0500000001', id_number='1000000001')
+        tenant = Tenant.objects.get(name='قديم')
+
+        # savepoint منفصل لكل خطوة حتى تُسجل دفعة التدقيق داخل captureOnCommitCallbacks
+        with self.captureOnCommitCallbacks(execute=True), transaction.atomic():
+            tenant.name = 'جديد'
+            with CaptureQueriesContext(connection) as ctx:
+                tenant.save()
+
+        selects = [
+            q for q in ctx.captured_queries
+            if q['sql'].startswith('SELECT') and '"tenants"' in q['sql'].split('WHERE')[0]
+        ]
+        self.assertEqual(selects, [])
+
+        log = AuditLog.objects.get(model_name='Tenant', action='update')
+        self.assertEqual(log.changes['name'], {'old': 'قديم', 'new': 'جديد'})
+
+        # refresh_from_db يحدّث القيم الأصلية: الهاتف لا يظهر كتغيير
+        with self.captureOnCommitCallbacks(execute=True), transaction.atomic():
+            Tenant.objects.filter(pk=tenant.pk).update(phone='0500000002')
+            tenant.refresh_from_db()
+            tenant.name = 'أحدث'
+            tenant.save()
+        log = AuditLog.objects.filter(action='update').order_by('-id').first()
+        self.assertEqual(log.changes['name'], {'old': 'جديد', 'new': 'أحدث'})
+        self.assertNotIn('phone', log.changes)
+
+    def test_hand_built_instance_with_pk_is_not_tracked(self):
+        from django.db import transaction
+        from audit_log.models import AuditLog
+        from audit_log.tracker import get_original_values
+        from rent.models import Tenant
+
+        tenant = Tenant.objects.create(name='قديم', phone='0500000001', id_number='1000000001')
+        self.assertIsNotNone(get_original_values(Tenant.objects.get(pk=tenant.pk)))
+
+        changed = Tenant(
+            pk=tenant.pk, created_at=tenant.created_at,
+            name='معدل', phone=tenant.phone, id_number=tenant.id_number,
+        )
+        self.assertIsNone(get_original_values(changed))
+
+        # القيم القديمة تُقرأ من قاعدة البيانات فيُسجل التعديل
+        with self.captureOnCommitCallbacks(execute=True), transaction.atomic():
+            changed.save()
+        log = AuditLog.objects.get(model_name='Tenant', action='update')
+        self.assertEqual(log.changes['name'], {'old': 'قديم', 'new': 'معدل'})
+
+
+class SnapshotStoreTest(TestCase):
+    """اختبار بقاء مخزن نسخ ما قبل الحفظ محدوداً"""
+
+    def test_store_stays_bounded_for_failed_and_noop_saves(self):
+        from django.db import IntegrityError, transaction
+        from django.test import override_settings
+        from audit_log.tracker import ORIGINAL_VALUES_ATTR, snapshot_store
+        from rent.models import Tenant
+
+        Tenant.objects.create(name='أ', phone='0500000001', id_number='1000000001')
+        Tenant.objects.create(name='ب', phone='0500000002', id_number='1000000002')
+        snapshot_store.clear()
+
+        with override_settings(AUDIT_LOG_SNAPSHOT_MAX_SIZE=100):
+            for i in range(2000):
+                # كائنات غير متتبعة حتى تمر بمسار pre_save
+                tenant = Tenant.objects.get(id_number='1000000001')
+                del tenant.__dict__[ORIGINAL_VALUES_ATTR]
+
+                if i % 2:
+                    # حفظ بدون تغيير
+                    tenant.save()
+                else:
+                    # حفظ يفشل بعد pre_save (تكرار رقم الهوية)
+                    tenant.id_number = '1000000002'
+                    with self.assertRaises(IntegrityError), transaction.atomic():
+                        tenant.save()
+
+                self.assertLessEqual(len(snapshot_store), 100)
+
+            metrics = snapshot_store.metrics()
+            self.assertLessEqual(metrics['size'], 100)
+            self.assertEqual(metrics['max_size'], 100)
+            self.assertGreater(metrics['evictions'], 0)
+
+        # نهاية الطلب تفرّغ المخزن
+        snapshot_store.clear()
+        self.assertEqual(len(snapshot_store), 0)
@@ -0,0 +1,234 @@
+# ====================================
+# 8. audit_log/tracker.py
+# ====================================
+
+"""
+تتبع القيم الأصلية للكائنات المحمّلة من قاعدة البيانات
+
+عند تحميل الكائن (Model.from_db) تُحفظ قيم حقوله في instance._original_values
+وتُحدّث بعد كل حفظ. بذلك يمكن معرفة ما تغيّر (سجل التدقيق، تغيّر حالة
+العقد أو السند) دون استعلام SELECT إضافي قبل كل حفظ.
+
+الكائنات المُنشأة يدوياً (حتى مع pk) غير متتبعة حتى أول حفظ، فتُقرأ قيمها
+القديمة من قاعدة البيانات.
+"""
+
+import threading
+import weakref
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db.models import Model
+
+ORIGINAL_VALUES_ATTR = '_original_values'
+
+_suspended = threading.local()
+
+
+@contextmanager
+def audit_suspended():
+    """
+    إيقاف التدقيق وتتبع القيم الأصلية مؤقتاً في الخيط الحالي
+    (مثلاً أثناء استعادة نسخة احتياطية كبيرة)
+    """
+    previous = getattr(_suspended, 'value', False)
+    _suspended.value = True
+    try:
+        yield
+    finally:
+        _suspended.value = previous
+
+
+def is_audit_suspended():
+    return getattr(_suspended, 'value', False)
+
+
+def snapshot_values(instance, fields=None):
+    """
+    قيم الحقول المحمّلة حالياً {attname: value}
+    الحقول المؤجلة (defer/only) لا تُضمّن لتجنب تحميلها
+    """
+    values = {}
+    for field in instance._meta.concrete_fields:
+        if fields is not None and field.name not in fields and field.attname not in fields:
+            continue
+        if field.attname in instance.__dict__:
+            values[field.attname] = instance.__dict__[field.attname]
+    return values
+
+
+def get_original_values(instance, *field_names):
+    """
+    القيم الأصلية للكائن كما حُمّلت أو حُفظت آخر مرة
+
+    Returns:
+        dict {attname: value} أو None إذا لم تكن متتبعة
+        (أو إذا كان أحد الحقول المطلوبة غير متتبع)
+    """
+    original = instance.__dict__.get(ORIGINAL_VALUES_ATTR)
+    if original is None:
+        return None
+    if any(name not in original for name in field_names):
+        return None
+    return original
+
+
+def refresh_original_values(instance, fields=None):
+    """تحديث القيم الأصلية بعد الحفظ (أو refresh_from_db) - fields لتحديث حقول محددة"""
+    original = instance.__dict__.get(ORIGINAL_VALUES_ATTR)
+    if original is None or fields is None:
+        instance.__dict__[ORIGINAL_VALUES_ATTR] = snapshot_values(instance)
+    else:
+        original.update(snapshot_values(instance, fields))
+
+
+def values_equal(field, old, new):
+    """مقارنة قيمتين بعد تحويلهما لنوع الحقل (مثلاً '100.00' و Decimal('100'))"""
+    if old == new:
+        return True
+    try:
+        return field.to_python(old) == field.to_python(new)
+    except Exception:
+        return False
+
+
+def get_changed_fields(instance, original=None):
+    """
+    الحقول التي تغيّرت منذ التحميل
+
+    Returns:
+        dict {field: old_value} أو None إذا لم تكن القيم متتبعة
+    """
+    if original is None:
+        original = get_original_values(instance)
+    if original is None:
+        return None
+
+    changed = {}
+    for field in instance._meta.concrete_fields:
+        if field.attname not in original or field.attname not in instance.__dict__:
+            continue
+        old = original[field.attname]
+        if not values_equal(field, old, instance.__dict__[field.attname]):
+            changed[field] = old
+    return changed
+
+
+def track_original_values(sender, instance):
+    if instance.pk is None or is_audit_suspended():
+        return
+
+    from .signals import should_audit_model
+    if not should_audit_model(sender):
+        return
+
+    instance.__dict__[ORIGINAL_VALUES_ATTR] = snapshot_values(instance)
+
+
+_model_from_db = Model.from_db.__func__
+
+
+def _tracked_from_db(cls, db, field_names, values):
+    instance = _model_from_db(cls, db, field_names, values)
+    track_original_values(cls, instance)
+    return instance
+
+
+def install_tracking():
+    """
+    تتبع القيم الأصلية لكل كائن يُحمّل من قاعدة البيانات (AuditLogConfig.ready)
+
+    from_db وليس post_init: post_init يُرسل أيضاً للكائنات المُنشأة يدوياً
+    فيُعامل Tenant(pk=..., name=...) كأنه محمّل ولا يظهر تغيير عند حفظه.
+    """
+    if Model.__dict__['from_db'].__func__ is not _tracked_from_db:
+        Model.from_db = classmethod(_tracked_from_db)
+
+
+# ========================================
+# Pre-save Snapshot Store
+# ========================================
+
+class SnapshotStore:
+    """
+    مخزن محدود لنسخ ما قبل الحفظ (للكائنات غير المتتبعة فقط)
+
+    - لكل خيط (طلب) مخزنه الخاص ويُفرّغ في نهاية الطلب (AuditLogMiddleware)
+    - حد أقصى للحجم (AUDIT_LOG_SNAPSHOT_MAX_SIZE) مع إخراج الأقدم (LRU)
+    - المفتاح مرتبط بالكائن نفسه (weakref) فلا يُطابق كائناً آخر أُعيد استخدام عنوانه
+
+    بذلك لا تتراكم النسخ عند فشل الحفظ بعد pre_save.
+    """
+
+    def __init__(self, max_size=None):
+        self._max_size = max_size
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._stats = {'stored': 0, 'hits': 0, 'misses': 0, 'evictions': 0, 'cleared': 0}
+
+    @property
+    def max_size(self):
+        if self._max_size is not None:
+            return self._max_size
+        return getattr(settings, 'AUDIT_LOG_SNAPSHOT_MAX_SIZE', 1000)
+
+    def _entries(self):
+        entries = getattr(self._local, 'entries', None)
+        if entries is None:
+            entries = self._local.entries = OrderedDict()
+        return entries
+
+    def _count(self, name, value=1):
+        with self._lock:
+            self._stats[name] += value
+
+    @staticmethod
+    def _key(instance):
+        return (instance._meta.label, instance.pk, id(instance))
+
+    def put(self, instance, data):
+        entries = self._entries()
+        key = self._key(instance)
+        entries[key] = (weakref.ref(instance), data)
+        entries.move_to_end(key)
+        self._count('stored')
+
+        evicted = 0
+        while len(entries) > self.max_size:
+            entries.popitem(last=False)
+            evicted += 1
+        if evicted:
+            self._count('evictions', evicted)
+
+    def pop(self, instance):
+        entries = self._entries()
+        if not entries:
+            return None
+        entry = entries.pop(self._key(instance), None)
+        if entry is None or entry[0]() is not instance:
+            self._count('misses')
+            return None
+        self._count('hits')
+        return entry[1]
+
+    def clear(self):
+        """تفريغ مخزن الخيط الحالي (نهاية الطلب)"""
+        entries = self._entries()
+        if entries:
+            self._count('cleared', len(entries))
+            entries.clear()
+
+    def __len__(self):
+        return len(self._entries())
+
+    def metrics(self):
+        """إحصائيات المخزن: الحجم الحالي للخيط + العدادات التراكمية"""
+        with self._lock:
+            stats = dict(self._stats)
+        stats['size'] = len(self)
+        stats['max_size'] = self.max_size
+        return stats
+
+
+snapshot_store = SnapshotStore()
@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class RentConfig(AppConfig):
     name = 'rent'
+
+    def ready(self):
+        from rent.services.dashboard_service import connect_signals
+        connect_signals()
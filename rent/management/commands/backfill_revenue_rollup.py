@@ -0,0 +1,70 @@
+from datetime import datetime
+
+from dateutil.relativedelta import relativedelta
+from django.core.management.base import BaseCommand, CommandError
+
+from rent.models import RevenueMonthlyRollup
+
+
+class Command(BaseCommand):
+    help = 'إعادة بناء إجماليات الإيرادات الشهرية من السندات - Backfill monthly revenue rollup from receipts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='start', metavar='YYYY-MM',
+                            help='أول شهر (افتراضي: كل السندات)')
+        parser.add_argument('--to', dest='end', metavar='YYYY-MM',
+                            help='آخر شهر (شاملاً)')
+        parser.add_argument('--verify', action='store_true',
+                            help='مقارنة الإجماليات بالسندات دون تعديل')
+
+    def handle(self, *args, **options):
+        start = self._parse_month(options['start'])
+        end = self._parse_month(options['end'])
+        end_exclusive = end + relativedelta(months=1) if end else None
+        if start and end and start > end:
+            raise CommandError('شهر البداية بعد شهر النهاية')
+
+        if options['verify']:
+            mismatches = self._verify(start, end_exclusive)
+            if mismatches:
+                for line in mismatches:
+                    self.stdout.write(self.style.WARNING(f'  {line}'))
+                raise CommandError(f'{len(mismatches)} صف غير مطابق - شغّل الأمر بدون --verify')
+            self.stdout.write(self.style.SUCCESS('الإجماليات مطابقة للسندات.'))
+            return
+
+        rows = RevenueMonthlyRollup.rebuild(start, end_exclusive)
+        self.stdout.write(self.style.SUCCESS(f'تم بناء {rows} صف من إجماليات الإيرادات بنجاح.'))
+
+    def _parse_month(self, value):
+        if not value:
+            return None
+        try:
+            return datetime.strptime(value, '%Y-%m').date()
+        except ValueError:
+            raise CommandError(f'صيغة الشهر غير صحيحة: {value} (المطلوب YYYY-MM)')
+
+    def _verify(self, start, end):
+        expected = {
+            (row['month'], row['building_id'], row['payment_method'] or '', row['status'] or ''):
+                (row['total'], row['count'])
+            for row in RevenueMonthlyRollup.aggregate_receipts(start, end)
+        }
+
+        stored = RevenueMonthlyRollup.objects.all()
+        if start:
+            stored = stored.filter(month__gte=start)
+        if end:
+            stored = stored.filter(month__lt=end)
+        actual = {
+            (row.month, row.building_id, row.payment_method, row.status): (row.amount, row.receipts_count)
+            for row in stored
+            # صفوف صفرية تبقى بعد حذف أو نقل كل سنداتها
+            if row.amount or row.receipts_count
+        }
+
+        mismatches = []
+        for key in sorted(set(expected) | set(actual), key=str):
+            if expected.get(key) != actual.get(key):
+                mismatches.append(f'{key}: السندات={expected.get(key)} الإجماليات={actual.get(key)}')
+        return mismatches
@@ -0,0 +1,104 @@
+import random
+import time
+from datetime import date
+from decimal import Decimal
+
+from dateutil.relativedelta import relativedelta
+from django.core.management.base import BaseCommand, CommandError
+
+from rent.models import Contract, ContractModification
+from rent.services.contract_financial_service import ContractFinancialData, PeriodCalculator
+from rent.services.schedule_builder import HAS_NUMPY, build_schedules
+
+
+class Command(BaseCommand):
+    help = 'قياس أداء بناء جداول الأقساط المجمّع مقابل الحساب لكل عقد - Benchmark bulk schedule builder'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--contracts', type=int, default=5000,
+                            help='عدد العقود الافتراضية (افتراضي: 5000)')
+        parser.add_argument('--repeat', type=int, default=3,
+                            help='عدد مرات التكرار - يُعرض أفضل زمن (افتراضي: 3)')
+        parser.add_argument('--seed', type=int, default=1)
+
+    def _make_contracts(self, count, seed):
+        """عقود وتعديلات إيجار في الذاكرة فقط (بدون قاعدة البيانات)"""
+        rng = random.Random(seed)
+        frequencies = ['monthly', 'quarterly', 'semi_annual', 'annual']
+        contracts = []
+        modifications = {}
+
+        for contract_id in range(1, count + 1):
+            start = date(rng.randint(2018, 2025), rng.randint(1, 12), rng.randint(1, 28))
+            contract = Contract(
+                id=contract_id,
+                start_date=start,
+                end_date=start + relativedelta(months=rng.choice([12, 24, 36, 60])) - relativedelta(days=1),
+                annual_rent=Decimal(rng.randint(10, 500) * 1000),
+                payment_frequency=rng.choice(frequencies),
+                status='active',
+            )
+            mods = []
+            rent = contract.annual_rent
+            for index in range(rng.randint(0, 3)):
+                new_rent = rent + Decimal(rng.randint(1, 20) * 1000)
+                mods.append(ContractModification(
+                    id=contract_id * 10 + index,
+                    contract_id=contract_id,
+                    modification_type='rent_increase',
+                    effective_date=start + relativedelta(months=12 * (index + 1)),
+                    old_rent_amount=rent,
+                    new_rent_amount=new_rent,
+                    is_applied=True,
+                ))
+                rent = new_rent
+            contracts.append(contract)
+            modifications[contract_id] = mods
+
+        return contracts, modifications
+
+    def _best_of(self, repeat, func):
+        best = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = func()
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return best, result
+
+    def handle(self, *args, **options):
+        if not HAS_NUMPY:
+            raise CommandError('NumPy غير مثبت - pip install numpy')
+
+        count = max(options['contracts'], 1)
+        repeat = max(options['repeat'], 1)
+        contracts, modifications = self._make_contracts(count, options['seed'])
+
+        def per_contract():
+            periods = 0
+            for contract in contracts:
+                # كائن جديد في كل مرة حتى لا تُستخدم تواريخ محفوظة على العقد
+                fresh = Contract(**{f.attname: getattr(contract, f.attname) for f in Contract._meta.concrete_fields})
+                data = ContractFinancialData(applied_modifications=modifications[contract.id])
+                periods += len(PeriodCalculator(fresh, data=data).calculate_periods_with_modifications(
+                    include_future=True
+                ))
+            return periods
+
+        def vectorized():
+            # يشمل تحويل الجدول لصفوف كل عقد كما تستهلكها الخدمة المالية
+            table = build_schedules(contracts, modifications)
+            return sum(len(table.periods_for(contract.id)) for contract in contracts)
+
+        baseline, baseline_periods = self._best_of(repeat, per_contract)
+        bulk, bulk_periods = self._best_of(repeat, vectorized)
+
+        if baseline_periods != bulk_periods:
+            raise CommandError(
+                f'عدد الأقساط غير متطابق: {baseline_periods} (لكل عقد) مقابل {bulk_periods} (مجمّع)'
+            )
+
+        self.stdout.write(f'العقود: {count} - الأقساط: {bulk_periods}')
+        self.stdout.write(f'  لكل عقد (relativedelta + مسح خطي): {baseline * 1000:.1f} ms')
+        self.stdout.write(f'  مجمّع (NumPy + searchsorted):       {bulk * 1000:.1f} ms')
+        self.stdout.write(self.style.SUCCESS(f'التسريع: {baseline / bulk:.1f}x'))
@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from rent.models.backup_models import BackupStatus
+from rent.services.backup_service import (
+    ITERATOR_CHUNK_SIZE,
+    IncrementalJsonBackupWriter,
+    JsonBackupWriter,
+    PgDirectoryBackup,
+    pg_tools_available,
+)
+
+
+class Command(BaseCommand):
+    help = 'إنشاء نسخة احتياطية (JSON مضغوط أو pg_dump متوازي) - Create a backup'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=['json', 'directory'], default='json',
+                            help='json: نسخة JSON متدفقة، directory: pg_dump --format directory')
+        parser.add_argument('--incremental', action='store_true',
+                            help='نسخة JSON تزايدية منذ آخر نسخة مكتملة')
+        parser.add_argument('--no-compress', action='store_true',
+                            help='كتابة JSON بدون ضغط gzip')
+        parser.add_argument('--chunk-size', type=int, default=ITERATOR_CHUNK_SIZE,
+                            help=f'عدد السجلات المقروءة في كل دفعة (افتراضي: {ITERATOR_CHUNK_SIZE})')
+        parser.add_argument('--jobs', type=int, default=None,
+                            help='عدد عمليات pg_dump المتوازية (افتراضي: BACKUP_PG_JOBS أو عدد الأنوية)')
+        parser.add_argument('--directory', default=None,
+                            help='مجلد حفظ النسخة (افتراضي: backups/)')
+
+    def handle(self, *args, **options):
+        if options['format'] == 'directory':
+            if not pg_tools_available():
+                raise CommandError('أدوات pg_dump/pg_restore غير متوفرة على السيرفر.')
+            backup = PgDirectoryBackup.create_backup_record(directory=options['directory'])
+            PgDirectoryBackup(backup, jobs=options['jobs']).run()
+        else:
+            writer_class = IncrementalJsonBackupWriter if options['incremental'] else JsonBackupWriter
+            compress = not options['no_compress']
+            try:
+                backup = writer_class.create_backup_record(
+                    compress=compress, directory=options['directory']
+                )
+            except ValueError as e:
+                raise CommandError(str(e))
+            writer_class(
+                backup, compress=compress, chunk_size=options['chunk_size']
+            ).run()
+
+        if backup.status != BackupStatus.COMPLETED:
+            raise CommandError(f'فشل إنشاء النسخة الاحتياطية: {backup.error_message}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'تم إنشاء النسخة {backup.file_path} '
+            f'({backup.get_file_size_display()}, {backup.records_count} سجل، '
+            f'{backup.tables_count} جدول).'
+        ))
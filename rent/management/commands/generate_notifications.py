@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from rent.models import Notification
+
+
+class Command(BaseCommand):
+    help = 'إنشاء الإشعارات التلقائية (مستحقات، تأخير، انتهاء عقود) - Generate automatic notifications'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days-before', type=int, default=30,
+                            help='عدد الأيام قبل انتهاء العقد للتنبيه (افتراضي: 30)')
+
+    def handle(self, *args, **options):
+        stats = Notification.generate_all_notifications(days_before=options['days_before'])
+
+        for notification_type, result in stats.items():
+            self.stdout.write(
+                f'  {notification_type}: {result["created"]} إشعار ({result["duration"]} ثانية)'
+            )
+
+        total = sum(result['created'] for result in stats.values())
+        self.stdout.write(self.style.SUCCESS(f'تم إنشاء {total} إشعار بنجاح.'))
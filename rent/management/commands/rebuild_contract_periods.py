@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+
+from rent.models import Contract, ContractPeriod
+
+
+class Command(BaseCommand):
+    help = 'إعادة توليد جداول أقساط العقود ودفتر توزيع السندات - Rebuild contract period schedules and receipt allocations'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--contract', type=int, action='append', dest='contract_ids',
+                            help='رقم تعريف العقد (يمكن تكراره)')
+        parser.add_argument('--missing-only', action='store_true',
+                            help='توليد جداول العقود التي ليس لها أقساط محفوظة فقط')
+        parser.add_argument('--chunk-size', type=int, default=500,
+                            help='عدد العقود في كل دفعة (افتراضي: 500)')
+
+    def handle(self, *args, **options):
+        chunk_size = max(options['chunk_size'], 1)
+
+        contracts = Contract.objects.filter(is_deleted=False)
+
+        if options['contract_ids']:
+            contracts = contracts.filter(pk__in=options['contract_ids'])
+
+        if options['missing_only']:
+            contracts = contracts.exclude(
+                pk__in=ContractPeriod.objects.values('contract_id')
+            )
+
+        contract_ids = list(contracts.order_by('pk').values_list('pk', flat=True))
+
+        if not contract_ids:
+            self.stdout.write(self.style.WARNING('لا توجد عقود تحتاج لإعادة توليد.'))
+            return
+
+        periods = 0
+        for start in range(0, len(contract_ids), chunk_size):
+            chunk = contracts.filter(pk__in=contract_ids[start:start + chunk_size])
+            periods += ContractPeriod.regenerate_for_contracts(chunk)
+            self.stdout.write(f'  {min(start + chunk_size, len(contract_ids))}/{len(contract_ids)}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'تم توليد {periods} قسط لـ {len(contract_ids)} عقد بنجاح.'
+        ))
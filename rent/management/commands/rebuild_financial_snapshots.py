@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from rent.models import ContractFinancialSnapshot
+
+
+class Command(BaseCommand):
+    help = 'إعادة بناء اللقطات المالية للعقود - Rebuild contract financial snapshots'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--contract', type=int, action='append', dest='contract_ids',
+                            help='رقم تعريف العقد (يمكن تكراره)')
+        parser.add_argument('--stale-only', action='store_true',
+                            help='إعادة بناء اللقطات القديمة أو المفقودة فقط')
+        parser.add_argument('--chunk-size', type=int, default=500,
+                            help='عدد العقود في كل دفعة (افتراضي: 500)')
+
+    def handle(self, *args, **options):
+        rebuilt = ContractFinancialSnapshot.rebuild_all(
+            contract_ids=options['contract_ids'],
+            stale_only=options['stale_only'],
+            chunk_size=options['chunk_size'],
+        )
+
+        if not rebuilt:
+            self.stdout.write(self.style.WARNING('لا توجد عقود تحتاج لإعادة بناء.'))
+            return
+
+        self.stdout.write(self.style.SUCCESS(f'تم إعادة بناء {rebuilt} لقطة مالية بنجاح.'))
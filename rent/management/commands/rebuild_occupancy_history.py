@@ -0,0 +1,39 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from rent.models import Unit, UnitOccupancyMonth
+
+
+class Command(BaseCommand):
+    help = 'إعادة حساب سجل الإشغال الشهري للوحدات من العقود - Rebuild monthly unit occupancy history from contracts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--unit', type=int, action='append', dest='unit_ids',
+                            help='رقم تعريف الوحدة (يمكن تكراره)')
+        parser.add_argument('--building', type=int, action='append', dest='building_ids',
+                            help='رقم تعريف المبنى (يمكن تكراره)')
+        parser.add_argument('--from', dest='start', metavar='YYYY-MM',
+                            help='أول شهر يُعاد حسابه (افتراضي: من إضافة كل وحدة)')
+
+    def handle(self, *args, **options):
+        start_month = None
+        if options['start']:
+            try:
+                start_month = datetime.strptime(options['start'], '%Y-%m').date()
+            except ValueError:
+                raise CommandError(f"صيغة الشهر غير صحيحة: {options['start']} (المطلوب YYYY-MM)")
+
+        unit_ids = None
+        if options['unit_ids'] or options['building_ids']:
+            units = Unit.objects.all()
+            if options['unit_ids']:
+                units = units.filter(pk__in=options['unit_ids'])
+            if options['building_ids']:
+                units = units.filter(building_id__in=options['building_ids'])
+            unit_ids = list(units.values_list('pk', flat=True))
+            if not unit_ids:
+                raise CommandError('لا توجد وحدات مطابقة.')
+
+        rows = UnitOccupancyMonth.rebuild_for_units(unit_ids, start_month=start_month)
+        self.stdout.write(self.style.SUCCESS(f'تم حساب {rows} صف من سجل الإشغال بنجاح.'))
@@ -0,0 +1,42 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from rent.models import Backup
+from rent.services.backup_restore_service import (
+    RESTORE_BATCH_SIZE,
+    JsonRestoreEngine,
+    restore_backup_chain,
+)
+
+
+class Command(BaseCommand):
+    help = 'استعادة نسخة JSON (أو json.gz) بسرعة عبر bulk_create - Fast JSON backup restore'
+
+    def add_arguments(self, parser):
+        parser.add_argument('file_path', nargs='?', help='مسار ملف النسخة (.json أو .json.gz)')
+        parser.add_argument('--backup', type=int, default=None,
+                            help='رقم سجل النسخة (النسخ التزايدية تُستعاد مع سلسلتها)')
+        parser.add_argument('--batch-size', type=int, default=RESTORE_BATCH_SIZE,
+                            help=f'عدد السجلات في كل إدراج (افتراضي: {RESTORE_BATCH_SIZE})')
+
+    def handle(self, *args, **options):
+        if options['backup']:
+            try:
+                backup = Backup.objects.get(pk=options['backup'])
+                stats = restore_backup_chain(backup, batch_size=options['batch_size'])
+            except Backup.DoesNotExist:
+                raise CommandError(f'النسخة غير موجودة: {options["backup"]}')
+            except (ValueError, FileNotFoundError) as e:
+                raise CommandError(str(e))
+        else:
+            file_path = options['file_path']
+            if not file_path or not os.path.exists(file_path):
+                raise CommandError(f'الملف غير موجود: {file_path}')
+            stats = JsonRestoreEngine(batch_size=options['batch_size']).restore(file_path)
+
+        for label, count in stats.items():
+            self.stdout.write(f'  {label}: {count}')
+        self.stdout.write(self.style.SUCCESS(
+            f'تم استعادة {sum(stats.values())} سجل في {len(stats)} جدول.'
+        ))
@@ -0,0 +1,39 @@
+import signal
+
+from django.core.management.base import BaseCommand
+
+from rent.services.backup_schedule_service import BackupScheduleRunner
+
+
+class Command(BaseCommand):
+    help = 'تنفيذ جداول النسخ الاحتياطي المستحقة - Run due backup schedules (long-running worker)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=int, default=60,
+                            help='الفترة بين كل بحث عن جداول مستحقة بالثواني (افتراضي: 60)')
+        parser.add_argument('--once', action='store_true',
+                            help='تنفيذ الجداول المستحقة حالياً ثم الخروج (مناسب لـ cron)')
+
+    def handle(self, *args, **options):
+        runner = BackupScheduleRunner(poll_interval=options['interval'])
+
+        if options['once']:
+            backups = runner.run_pending()
+            failed = sum(1 for b in backups if not b.is_successful)
+            self.stdout.write(self.style.SUCCESS(
+                f'تم تنفيذ {len(backups)} نسخة مجدولة ({failed} فشلت).'
+            ))
+            return
+
+        def shutdown(signum, frame):
+            self.stdout.write(self.style.WARNING('جاري الإيقاف بعد انتهاء النسخة الجارية...'))
+            runner.stop()
+
+        signal.signal(signal.SIGTERM, shutdown)
+        signal.signal(signal.SIGINT, shutdown)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'بدأ تشغيل منفذ جداول النسخ (كل {options["interval"]} ثانية).'
+        ))
+        runner.run_forever()
+        self.stdout.write(self.style.SUCCESS('تم إيقاف منفذ جداول النسخ.'))
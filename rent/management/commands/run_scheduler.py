@@ -0,0 +1,44 @@
+import signal
+
+from django.core.management.base import BaseCommand
+
+from rent.services.scheduler_service import TaskScheduler
+
+
+class Command(BaseCommand):
+    help = 'تشغيل المهام المجدولة المستحقة - Run due scheduled tasks (long-running worker)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4,
+                            help='الحد الأقصى للمهام المنفذة في نفس الوقت (افتراضي: 4)')
+        parser.add_argument('--interval', type=int, default=30,
+                            help='الفترة بين كل بحث عن مهام مستحقة بالثواني (افتراضي: 30)')
+        parser.add_argument('--once', action='store_true',
+                            help='تنفيذ المهام المستحقة حالياً ثم الخروج (مناسب لـ cron)')
+
+    def handle(self, *args, **options):
+        scheduler = TaskScheduler(
+            max_workers=options['workers'],
+            poll_interval=options['interval'],
+        )
+
+        if options['once']:
+            executions = scheduler.run_pending()
+            failed = sum(1 for e in executions if e.status == 'failed')
+            self.stdout.write(self.style.SUCCESS(
+                f'تم تنفيذ {len(executions)} مهمة ({failed} فشلت).'
+            ))
+            return
+
+        def shutdown(signum, frame):
+            self.stdout.write(self.style.WARNING('جاري الإيقاف بعد انتهاء المهام الجارية...'))
+            scheduler.stop()
+
+        signal.signal(signal.SIGTERM, shutdown)
+        signal.signal(signal.SIGINT, shutdown)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'بدأ تشغيل المجدول ({options["workers"]} عامل، كل {options["interval"]} ثانية).'
+        ))
+        scheduler.run_forever()
+        self.stdout.write(self.style.SUCCESS('تم إيقاف المجدول.'))
@@ -0,0 +1,39 @@
+# Generated by Django 4.2.11 on 2026-10-17 04:09
+
+from decimal import Decimal
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rent', '0011_add_vat_input_type'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContractFinancialSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('as_of_date', models.DateField(db_index=True, help_text='التاريخ الذي حُسبت عليه اللقطة', verbose_name='محسوب حتى تاريخ')),
+                ('periods_count', models.PositiveIntegerField(default=0, verbose_name='عدد الفترات المستحقة')),
+                ('total_due', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14, verbose_name='إجمالي المستحق')),
+                ('total_paid', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14, verbose_name='إجمالي المدفوع')),
+                ('outstanding_amount', models.DecimalField(db_index=True, decimal_places=2, default=Decimal('0.00'), max_digits=14, verbose_name='المبلغ المستحق')),
+                ('overdue_amount', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14, verbose_name='المبلغ المتأخر')),
+                ('overdue_periods_count', models.PositiveIntegerField(default=0, verbose_name='عدد الفترات المتأخرة')),
+                ('next_due_date', models.DateField(blank=True, db_index=True, null=True, verbose_name='تاريخ الاستحقاق القادم')),
+                ('next_due_amount', models.DecimalField(blank=True, decimal_places=2, max_digits=14, null=True, verbose_name='مبلغ الاستحقاق القادم')),
+                ('computed_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='تاريخ الحساب')),
+                ('contract', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='financial_snapshot', to='rent.contract', verbose_name='العقد')),
+            ],
+            options={
+                'verbose_name': 'لقطة مالية للعقد',
+                'verbose_name_plural': 'اللقطات المالية للعقود',
+                'db_table': 'contract_financial_snapshots',
+                'indexes': [models.Index(fields=['outstanding_amount', 'as_of_date'], name='contract_fi_outstan_6c9f23_idx'), models.Index(fields=['overdue_periods_count'], name='contract_fi_overdue_d6d26f_idx')],
+            },
+        ),
+    ]
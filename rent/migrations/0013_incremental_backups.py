@@ -0,0 +1,40 @@
+# Generated by Django 4.2.11 on 2026-10-17 04:27
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rent', '0012_contract_financial_snapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BackupTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model_label', models.CharField(help_text='app_label.model_name', max_length=100, verbose_name='النموذج')),
+                ('object_pk', models.CharField(max_length=64, verbose_name='المعرّف')),
+                ('deleted_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now, verbose_name='تاريخ الحذف')),
+            ],
+            options={
+                'verbose_name': 'سجل حذف',
+                'verbose_name_plural': 'سجلات الحذف',
+                'db_table': 'backup_tombstones',
+                'ordering': ['deleted_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='backup',
+            name='base_backup',
+            field=models.ForeignKey(blank=True, help_text='النسخة السابقة في السلسلة (للنسخ التزايدي)', null=True, on_delete=django.db.models.deletion.PROTECT, related_name='incremental_backups', to='rent.backup', verbose_name='النسخة الأساسية'),
+        ),
+        migrations.AddField(
+            model_name='backup',
+            name='watermarks',
+            field=models.JSONField(blank=True, help_text='أحدث قيمة updated_at لكل نموذج في هذه النسخة {model: iso}', null=True, verbose_name='علامات آخر تحديث'),
+        ),
+    ]
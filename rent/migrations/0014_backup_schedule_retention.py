@@ -0,0 +1,39 @@
+# Generated by Django 4.2.11 on 2026-10-17 04:30
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rent', '0013_incremental_backups'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='backup',
+            name='schedule',
+            field=models.ForeignKey(blank=True, help_text='جدول النسخ الذي أنشأ هذه النسخة', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='backups', to='rent.backupschedule', verbose_name='الجدول'),
+        ),
+        migrations.AddField(
+            model_name='backupschedule',
+            name='keep_daily',
+            field=models.PositiveIntegerField(default=7, help_text='عدد الأيام الأخيرة التي يُحتفظ بآخر نسخة من كل منها', verbose_name='نسخ يومية'),
+        ),
+        migrations.AddField(
+            model_name='backupschedule',
+            name='keep_monthly',
+            field=models.PositiveIntegerField(default=12, help_text='عدد الأشهر الأخيرة التي يُحتفظ بآخر نسخة من كل منها', verbose_name='نسخ شهرية'),
+        ),
+        migrations.AddField(
+            model_name='backupschedule',
+            name='keep_weekly',
+            field=models.PositiveIntegerField(default=4, help_text='عدد الأسابيع الأخيرة التي يُحتفظ بآخر نسخة من كل منها', verbose_name='نسخ أسبوعية'),
+        ),
+        migrations.AddField(
+            model_name='backupschedule',
+            name='retention_policy',
+            field=models.CharField(choices=[('keep_last', 'آخر عدد من النسخ'), ('calendar', 'يومي/أسبوعي/شهري')], default='keep_last', help_text='آخر عدد من النسخ (مع مدة الاحتفاظ) أو نسخة لكل يوم/أسبوع/شهر', max_length=20, verbose_name='سياسة الاحتفاظ'),
+        ),
+    ]
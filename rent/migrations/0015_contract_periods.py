@@ -0,0 +1,48 @@
+# Generated by Django 4.2.11 on 2026-10-17 04:35
+
+from decimal import Decimal
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rent', '0014_backup_schedule_retention'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContractPeriod',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period_number', models.PositiveIntegerField(verbose_name='رقم القسط')),
+                ('start_date', models.DateField(verbose_name='تاريخ الاستحقاق')),
+                ('end_date', models.DateField(verbose_name='نهاية الفترة')),
+                ('annual_rent', models.DecimalField(decimal_places=2, max_digits=14, verbose_name='الإيجار السنوي')),
+                ('base_rent', models.DecimalField(decimal_places=2, max_digits=14, verbose_name='إيجار الفترة')),
+                ('vat_amount', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14, verbose_name='ضريبة القيمة المضافة')),
+                ('discount_amount', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14, verbose_name='الخصم')),
+                ('adjustment_amount', models.DecimalField(decimal_places=2, default=Decimal('0.00'), help_text='الضريبة ناقص الخصم', max_digits=14, verbose_name='صافي التعديلات')),
+                ('due_amount', models.DecimalField(decimal_places=2, max_digits=14, verbose_name='المبلغ المستحق')),
+                ('rent_source', models.CharField(default='base', help_text='base أو mod_<id> لتعديل الإيجار المطبق', max_length=30, verbose_name='مصدر الإيجار')),
+                ('paid_amount', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14, verbose_name='المبلغ المسدد')),
+                ('remaining_amount', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14, verbose_name='المبلغ المتبقي')),
+                ('status', models.CharField(choices=[('pending', 'غير مسدد'), ('partial', 'مسدد جزئياً'), ('paid', 'مسدد')], default='pending', max_length=10, verbose_name='حالة السداد')),
+                ('generated_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='تاريخ التوليد')),
+                ('contract', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='schedule_periods', to='rent.contract', verbose_name='العقد')),
+            ],
+            options={
+                'verbose_name': 'قسط العقد',
+                'verbose_name_plural': 'أقساط العقود',
+                'db_table': 'contract_periods',
+                'ordering': ['contract', 'period_number'],
+                'indexes': [models.Index(fields=['contract', 'start_date'], name='contract_pe_contrac_437e6f_idx'), models.Index(fields=['start_date', 'status'], name='contract_pe_start_d_a3b9d7_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='contractperiod',
+            constraint=models.UniqueConstraint(fields=('contract', 'period_number'), name='unique_contract_period_number'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 4.2.11 on 2026-10-17 04:38
+
+from decimal import Decimal
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rent', '0015_contract_periods'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReceiptAllocation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period_number', models.PositiveIntegerField(verbose_name='رقم القسط')),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=14, verbose_name='المبلغ المخصص')),
+                ('paid_before', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14, verbose_name='المسدد من القسط قبل السند')),
+                ('remaining_after', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14, verbose_name='المتبقي من القسط بعد السند')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='تاريخ التوزيع')),
+                ('contract', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='receipt_allocations', to='rent.contract', verbose_name='العقد')),
+                ('period', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='allocations', to='rent.contractperiod', verbose_name='القسط')),
+                ('receipt', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='allocations', to='rent.receipt', verbose_name='السند')),
+            ],
+            options={
+                'verbose_name': 'توزيع سند',
+                'verbose_name_plural': 'توزيعات السندات',
+                'db_table': 'receipt_allocations',
+                'ordering': ['receipt', 'period_number'],
+                'indexes': [models.Index(fields=['contract', 'period_number'], name='receipt_all_contrac_c8c200_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='receiptallocation',
+            constraint=models.UniqueConstraint(fields=('receipt', 'period_number'), name='unique_receipt_allocation_period'),
+        ),
+    ]
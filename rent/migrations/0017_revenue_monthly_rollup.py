@@ -0,0 +1,78 @@
+# Generated by Django 4.2.11 on 2026-10-17 04:58
+
+from decimal import Decimal
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_revenue_rollup(apps, schema_editor):
+    """تعبئة الإجماليات من السندات الحالية (نفس RevenueMonthlyRollup.rebuild)"""
+    from django.db.models import Count, OuterRef, Subquery, Sum
+    from django.db.models.functions import TruncMonth
+
+    Receipt = apps.get_model('rent', 'Receipt')
+    Unit = apps.get_model('rent', 'Unit')
+    RevenueMonthlyRollup = apps.get_model('rent', 'RevenueMonthlyRollup')
+
+    building = Unit.objects.filter(
+        contracts=OuterRef('contract_id')
+    ).order_by('building', 'floor', 'unit_number').values('building_id')[:1]
+
+    rows = Receipt.objects.filter(is_deleted=False).annotate(
+        month=TruncMonth('receipt_date'),
+        building_id=Subquery(building),
+    ).values('month', 'building_id', 'payment_method', 'status').annotate(
+        total=Sum('amount'),
+        count=Count('id'),
+    ).order_by('month')
+
+    RevenueMonthlyRollup.objects.bulk_create([
+        RevenueMonthlyRollup(
+            month=row['month'],
+            building_id=row['building_id'],
+            payment_method=row['payment_method'] or '',
+            status=row['status'] or '',
+            amount=row['total'] or Decimal('0'),
+            receipts_count=row['count'],
+        )
+        for row in rows
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rent', '0016_receipt_allocations'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RevenueMonthlyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(help_text='أول يوم في الشهر', verbose_name='الشهر')),
+                ('payment_method', models.CharField(max_length=20, verbose_name='طريقة الدفع')),
+                ('status', models.CharField(max_length=20, verbose_name='الحالة')),
+                ('amount', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=16, verbose_name='المبلغ')),
+                ('receipts_count', models.IntegerField(default=0, verbose_name='عدد السندات')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='آخر تحديث')),
+                ('building', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='revenue_rollups', to='rent.building', verbose_name='المبنى')),
+            ],
+            options={
+                'verbose_name': 'إجمالي إيرادات شهري',
+                'verbose_name_plural': 'إجماليات الإيرادات الشهرية',
+                'db_table': 'revenue_monthly_rollups',
+                'ordering': ['month'],
+                'indexes': [models.Index(fields=['status', 'month'], name='revenue_mon_status_d743c6_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='revenuemonthlyrollup',
+            constraint=models.UniqueConstraint(condition=models.Q(('building__isnull', False)), fields=('month', 'building', 'payment_method', 'status'), name='unique_revenue_rollup_bucket'),
+        ),
+        migrations.AddConstraint(
+            model_name='revenuemonthlyrollup',
+            constraint=models.UniqueConstraint(condition=models.Q(('building__isnull', True)), fields=('month', 'payment_method', 'status'), name='unique_revenue_rollup_bucket_no_building'),
+        ),
+        migrations.RunPython(backfill_revenue_rollup, migrations.RunPython.noop),
+    ]
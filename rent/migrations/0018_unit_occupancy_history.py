@@ -0,0 +1,40 @@
+# Generated by Django 4.2.11 on 2026-10-17 05:03
+
+from decimal import Decimal
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rent', '0017_revenue_monthly_rollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UnitOccupancyMonth',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(help_text='أول يوم في الشهر', verbose_name='الشهر')),
+                ('days', models.PositiveSmallIntegerField(help_text='أيام الشهر بعد إضافة الوحدة', verbose_name='أيام الإتاحة')),
+                ('occupied_days', models.PositiveSmallIntegerField(verbose_name='أيام الإشغال')),
+                ('vacant_days', models.PositiveSmallIntegerField(verbose_name='أيام الشغور')),
+                ('lost_rent', models.DecimalField(decimal_places=2, default=Decimal('0.00'), help_text='أيام الشغور × الإيجار الشهري للوحدة', max_digits=12, verbose_name='الإيجار الفائت')),
+                ('building', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='occupancy_months', to='rent.building', verbose_name='المبنى')),
+                ('land', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='occupancy_months', to='rent.land', verbose_name='الأرض')),
+                ('unit', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='occupancy_months', to='rent.unit', verbose_name='الوحدة')),
+            ],
+            options={
+                'verbose_name': 'إشغال وحدة شهري',
+                'verbose_name_plural': 'سجل الإشغال الشهري',
+                'db_table': 'unit_occupancy_months',
+                'ordering': ['unit', 'month'],
+                'indexes': [models.Index(fields=['month'], name='unit_occupa_month_bc3caf_idx'), models.Index(fields=['building', 'month'], name='unit_occupa_buildin_0f2149_idx'), models.Index(fields=['land', 'month'], name='unit_occupa_land_id_9fd0f9_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='unitoccupancymonth',
+            constraint=models.UniqueConstraint(fields=('unit', 'month'), name='unique_unit_occupancy_month'),
+        ),
+    ]
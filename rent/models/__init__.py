@@ -114,6 +114,11 @@ from .contractmodify_models import ContractModification
 # Depend on Contract
 # ----------------------------------------
 from .receipt_models import Receipt
+from .financial_snapshot_models import ContractFinancialSnapshot
+from .contract_period_models import ContractPeriod
+from .receipt_allocation_models import ReceiptAllocation
+from .revenue_rollup_models import RevenueMonthlyRollup
+from .occupancy_models import UnitOccupancyMonth
 
 # ----------------------------------------
 # System Models
@@ -137,6 +142,7 @@ from .scheduledtask_models import (
 from .backup_models import (
     Backup,
     BackupSchedule,
+    BackupTombstone,
    # BackupLog
 )
 
@@ -174,6 +180,11 @@ __all__ = [
     # Financial Models
     # ============================================
     'Receipt',
+    'ContractFinancialSnapshot',
+    'ContractPeriod',
+    'ReceiptAllocation',
+    'RevenueMonthlyRollup',
+    'UnitOccupancyMonth',
     
     # ============================================
     # System Models
@@ -194,6 +205,7 @@ __all__ = [
     # ============================================
     'Backup',
     'BackupSchedule',
+    'BackupTombstone',
     #'BackupLog',
     
     # ============================================
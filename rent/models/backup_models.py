@@ -19,6 +19,11 @@ class BackupType(models.TextChoices):
     PARTIAL = 'partial', _('جزئي')
     DIFFERENTIAL = 'differential', _('تفاضلي')
 
+    @classmethod
+    def chained(cls):
+        """الأنواع التي تعتمد على نسخة أساسية (base_backup) عند الاستعادة"""
+        return (cls.INCREMENTAL, cls.DIFFERENTIAL)
+
 
 class BackupStatus(models.TextChoices):
     """حالة النسخة الاحتياطية"""
@@ -38,6 +43,12 @@ class BackupFrequency(models.TextChoices):
     MANUAL = 'manual', _('يدوي')
 
 
+class RetentionPolicy(models.TextChoices):
+    """سياسة الاحتفاظ بالنسخ"""
+    KEEP_LAST = 'keep_last', _('آخر عدد من النسخ')
+    CALENDAR = 'calendar', _('يومي/أسبوعي/شهري')
+
+
 # ========================================
 # Backup Model
 # ========================================
@@ -205,6 +216,36 @@ class Backup(TimeStampedModel, UserTrackingModel):
         help_text=_('بيانات إضافية بصيغة JSON')
     )
     
+    # ========================================
+    # Incremental Backups
+    # ========================================
+    base_backup = models.ForeignKey(
+        'self',
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name='incremental_backups',
+        verbose_name=_('النسخة الأساسية'),
+        help_text=_('النسخة السابقة في السلسلة (للنسخ التزايدي)')
+    )
+    
+    schedule = models.ForeignKey(
+        'BackupSchedule',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='backups',
+        verbose_name=_('الجدول'),
+        help_text=_('جدول النسخ الذي أنشأ هذه النسخة')
+    )
+    
+    watermarks = models.JSONField(
+        _('علامات آخر تحديث'),
+        null=True,
+        blank=True,
+        help_text=_('أحدث قيمة updated_at لكل نموذج في هذه النسخة {model: iso}')
+    )
+    
     # ========================================
     # Metadata
     # ========================================
@@ -270,6 +311,21 @@ class Backup(TimeStampedModel, UserTrackingModel):
         self.is_successful = True
         self.save()
     
+    def get_restore_chain(self):
+        """
+        سلسلة النسخ اللازمة للاستعادة: النسخة الكاملة ثم النسخ التزايدية بالترتيب
+        تحديد السلسلة من هذه النسخة رجوعاً إلى أقرب نسخة كاملة
+        """
+        chain = [self]
+        backup = self
+        while backup.backup_type in BackupType.chained():
+            backup = backup.base_backup
+            if backup is None:
+                raise ValueError('سلسلة النسخ التزايدية غير مكتملة (النسخة الأساسية مفقودة)')
+            chain.append(backup)
+        chain.reverse()
+        return chain
+    
     def mark_as_failed(self, error_message=''):
         """
         Mark backup as failed
@@ -282,6 +338,74 @@ class Backup(TimeStampedModel, UserTrackingModel):
         self.save()
 
 
+# ========================================
+# BackupTombstone Model
+# ========================================
+
+class BackupTombstone(models.Model):
+    """
+    Backup Tombstone Model
+    سجل الحذف النهائي (للنسخ التزايدية)
+    
+    النسخة التزايدية تحتوي على ما أُنشئ أو عُدّل فقط (updated_at)، والسجلات
+    المحذوفة تُعرف من هنا وتُحذف عند استعادة السلسلة.
+    """
+    
+    model_label = models.CharField(
+        _('النموذج'),
+        max_length=100,
+        help_text=_('app_label.model_name')
+    )
+    
+    object_pk = models.CharField(
+        _('المعرّف'),
+        max_length=64
+    )
+    
+    deleted_at = models.DateTimeField(
+        _('تاريخ الحذف'),
+        default=timezone.now,
+        db_index=True
+    )
+    
+    class Meta:
+        db_table = 'backup_tombstones'
+        verbose_name = _('سجل حذف')
+        verbose_name_plural = _('سجلات الحذف')
+        ordering = ['deleted_at']
+    
+    def __str__(self):
+        return f"{self.model_label}#{self.object_pk}"
+
+    @classmethod
+    def prune(cls):
+        """
+        حذف سجلات الحذف الأقدم من علامة أقدم نسخة محتفظ بها يمكن البناء عليها
+
+        كل نسخة تزايدية تقرأ سجلات الحذف منذ علامة نسختها الأساسية (بدايتها
+        ناقص الهامش)، فما قبل علامة أقدم نسخة أساسية (كاملة أو تزايدية
+        مكتملة) لا تحتاجه أي نسخة قادمة.
+
+        Returns:
+            int: عدد السجلات المحذوفة
+        """
+        from rent.services.backup_service import get_watermark_cutoff
+
+        oldest = Backup.objects.filter(
+            status=BackupStatus.COMPLETED,
+            is_successful=True,
+            watermarks__isnull=False,
+            started_at__isnull=False,
+        ).exclude(
+            backup_type=BackupType.PARTIAL,
+        ).order_by('started_at').first()
+        if oldest is None:
+            return 0
+
+        deleted, _ = cls.objects.filter(deleted_at__lt=get_watermark_cutoff(oldest)).delete()
+        return deleted
+
+
 # ========================================
 # BackupSchedule Model
 # ========================================
@@ -387,6 +511,32 @@ class BackupSchedule(TimeStampedModel, UserTrackingModel):
         help_text=_('الحد الأقصى لعدد النسخ المحفوظة')
     )
     
+    retention_policy = models.CharField(
+        _('سياسة الاحتفاظ'),
+        max_length=20,
+        choices=RetentionPolicy.choices,
+        default=RetentionPolicy.KEEP_LAST,
+        help_text=_('آخر عدد من النسخ (مع مدة الاحتفاظ) أو نسخة لكل يوم/أسبوع/شهر')
+    )
+    
+    keep_daily = models.PositiveIntegerField(
+        _('نسخ يومية'),
+        default=7,
+        help_text=_('عدد الأيام الأخيرة التي يُحتفظ بآخر نسخة من كل منها')
+    )
+    
+    keep_weekly = models.PositiveIntegerField(
+        _('نسخ أسبوعية'),
+        default=4,
+        help_text=_('عدد الأسابيع الأخيرة التي يُحتفظ بآخر نسخة من كل منها')
+    )
+    
+    keep_monthly = models.PositiveIntegerField(
+        _('نسخ شهرية'),
+        default=12,
+        help_text=_('عدد الأشهر الأخيرة التي يُحتفظ بآخر نسخة من كل منها')
+    )
+    
     compress_backup = models.BooleanField(
         _('ضغط النسخة'),
         default=True,
@@ -560,4 +710,21 @@ def backup_post_save(sender, instance, created, **kwargs):
         )
         for schedule in schedules:
             schedule.last_run = instance.created_at
-            schedule.calculate_next_run()
\ No newline at end of file
+            schedule.calculate_next_run()
+
+
+@receiver(post_delete)
+def record_backup_tombstone(sender, instance, **kwargs):
+    """تسجيل حذف السجلات التي تُنسخ تزايدياً (نماذج TimeStampedModel)"""
+    from audit_log.tracker import is_audit_suspended
+    from rent.services.backup_service import JSON_BACKUP_EXCLUDE
+
+    if not issubclass(sender, TimeStampedModel) or is_audit_suspended():
+        return
+    if sender._meta.label_lower in JSON_BACKUP_EXCLUDE:
+        # سجل النسخ نفسه لا يُنسخ - حذف نسخة لا يحتاج سجل حذف
+        return
+    BackupTombstone.objects.create(
+        model_label=sender._meta.label_lower,
+        object_pk=str(instance.pk),
+    )
@@ -223,6 +223,22 @@ class Building(TimeStampedModel, UserTrackingModel, SoftDeleteModel):
         rented_units = self.get_rented_units().count()
         return Decimal((rented_units / total_units) * 100).quantize(Decimal('0.01'))
     
+    def get_occupancy_history(self, months=12):
+        """
+        Monthly occupancy history from contract intervals
+        سجل الإشغال الشهري من فترات العقود (وليس حالة الوحدات الحالية)
+        
+        Args:
+            months: Number of months ending with the current month
+            
+        Returns:
+            list: Monthly rows (month, units, days, occupied_days, vacant_days, lost_rent, rate)
+        """
+        from rent.services.occupancy_service import monthly_series
+        
+        end_month = date.today().replace(day=1) + relativedelta(months=1)
+        return monthly_series(end_month - relativedelta(months=months), end_month, building_id=self.pk)
+    
     def get_total_monthly_revenue(self):
         """
         Calculate total monthly revenue from all rented units
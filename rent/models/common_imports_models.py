@@ -475,6 +475,12 @@ class TimeStampedModel(models.Model):
     class Meta:
         abstract = True
         ordering = ['-created_at']
+    
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        """تحديث القيم الأصلية المتتبعة (audit_log.tracker) بعد إعادة التحميل"""
+        super().refresh_from_db(using=using, fields=fields, **kwargs)
+        from audit_log.tracker import refresh_original_values
+        refresh_original_values(self, fields)
 
 
 class UserTrackingModel(models.Model):
@@ -1,10 +1,115 @@
 # models/contract_models.py
 
 from django.db.models import Q  # استيراد صريح
+from django.db.models.signals import m2m_changed
 from .common_imports_models import *
 from .unit_models import Unit
 from .tenant_models import Tenant
 from rent.services.contract_financial_service import ContractFinancialService
+from audit_log.tracker import get_original_values
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+# ========================================
+# Contract QuerySet
+# ========================================
+
+class ContractQuerySet(models.QuerySet):
+
+    def with_outstanding(self, as_of_date=None, build_missing=True):
+        """
+        المستحقات لكل عقد باستعلام واحد (من جدول الأقساط المحفوظ ContractPeriod)
+
+        توزيع FIFO: الأقساط المسددة بداية الجدول ثم قسط مسدد جزئياً ثم أقساط
+        بدون أي سداد. فالمستحق = max(مجموع الأقساط حتى التاريخ - المدفوع، 0)،
+        وأول قسط بدون سداد يُحدد بالمجموع التراكمي
+        (ContractPeriodQuerySet.with_fifo_status)، والمتأخر هو الأقساط المنتهية
+        من هذا القسط فصاعداً (الجزئي له حالة partial كما في PaymentDistributor).
+
+        النتائج مطابقة لـ ContractFinancialService بشرط أن تكون جداول الأقساط
+        مولّدة. العقود التي ليس لها جدول (قبل rebuild_contract_periods أو بعد
+        فشل إعادة التوليد) يُولّد جدولها أولاً (build_missing)، وما يبقى بدون
+        جدول يظهر بـ has_schedule=False بدلاً من مستحقات صفرية صامتة.
+
+        Args:
+            build_missing: توليد جداول العقود الناقصة قبل الاستعلام
+
+        Annotations:
+            total_due_to_date, total_paid_amount, outstanding_amount,
+            first_unpaid_period, overdue_amount, overdue_periods_count,
+            has_schedule
+
+        Usage:
+            Contract.objects.with_outstanding().filter(overdue_amount__gt=0).order_by('-outstanding_amount')
+        """
+        from django.db.models import Count, Exists, F, OuterRef, Subquery, Sum, Value
+        from django.db.models.functions import Coalesce, Greatest
+
+        from .contract_period_models import (
+            AMOUNT_FIELD,
+            ContractPeriod,
+            posted_receipts_total,
+        )
+
+        as_of_date = as_of_date or timezone.now().date()
+        zero = Value(Decimal('0'), output_field=AMOUNT_FIELD)
+
+        if build_missing:
+            self._build_missing_schedules()
+
+        periods = ContractPeriod.objects.applicable(as_of_date).filter(
+            contract=OuterRef('pk')
+        ).order_by()
+
+        first_unpaid = periods.with_fifo_status(as_of_date).filter(
+            fifo_paid=0,
+            due_amount__gt=0,
+        ).order_by('period_number').values('period_number')[:1]
+
+        overdue_periods = periods.filter(
+            end_date__lt=as_of_date,
+            due_amount__gt=0,
+            period_number__gte=OuterRef('first_unpaid_period'),
+        ).values('contract')
+
+        total_due = periods.values('contract').annotate(total=Sum('due_amount')).values('total')
+        overdue_due = overdue_periods.annotate(total=Sum('due_amount')).values('total')
+        overdue_count = overdue_periods.annotate(count=Count('pk')).values('count')
+
+        return self.annotate(
+            total_due_to_date=Coalesce(Subquery(total_due), zero, output_field=AMOUNT_FIELD),
+            total_paid_amount=posted_receipts_total(),
+            first_unpaid_period=Subquery(first_unpaid),
+        ).annotate(
+            outstanding_amount=Greatest(
+                F('total_due_to_date') - F('total_paid_amount'), zero, output_field=AMOUNT_FIELD
+            ),
+            overdue_amount=Coalesce(Subquery(overdue_due), zero, output_field=AMOUNT_FIELD),
+            overdue_periods_count=Coalesce(Subquery(overdue_count), Value(0)),
+            has_schedule=Exists(ContractPeriod.objects.filter(contract=OuterRef('pk'))),
+        )
+
+    def without_schedule(self):
+        """العقود التي ليس لها جدول أقساط محفوظ"""
+        from .contract_period_models import ContractPeriod
+
+        return self.exclude(pk__in=ContractPeriod.objects.values('contract_id'))
+
+    def _build_missing_schedules(self):
+        """توليد جداول العقود الناقصة (نفس rebuild_contract_periods --missing-only)"""
+        from .contract_period_models import ContractPeriod
+
+        if self.query.is_sliced:
+            return
+        missing = self.order_by().filter(is_deleted=False).without_schedule()
+        if not missing.exists():
+            return
+        try:
+            ContractPeriod.regenerate_for_contracts(missing)
+        except Exception as e:
+            logger.error(f'Error building missing contract schedules: {e}', exc_info=True)
 
 
 # ========================================
@@ -171,6 +276,8 @@ class Contract(TimeStampedModel, UserTrackingModel, SoftDeleteModel):
         help_text=_('أي ملاحظات إضافية عن العقد')
     )
     
+    objects = ContractQuerySet.as_manager()
+    
     # ========================================
     # Metadata
     # ========================================
@@ -240,14 +347,22 @@ class Contract(TimeStampedModel, UserTrackingModel, SoftDeleteModel):
         
         is_new = self.pk is None
         old_status = None
+        old_financial_values = None
         
         # حفظ الحالة القديمة إذا كان العقد موجوداً
         if not is_new:
-            try:
-                old_contract = Contract.objects.get(pk=self.pk)
-                old_status = old_contract.status
-            except Contract.DoesNotExist:
-                pass
+            original = get_original_values(self, *self.FINANCIAL_FIELDS)
+            if original is not None:
+                # القيم كما حُمّلت من قاعدة البيانات (بدون استعلام إضافي)
+                old_status = original['status']
+                old_financial_values = tuple(original[f] for f in self.FINANCIAL_FIELDS)
+            else:
+                try:
+                    old_contract = Contract.objects.get(pk=self.pk)
+                    old_status = old_contract.status
+                    old_financial_values = old_contract._get_financial_values()
+                except Contract.DoesNotExist:
+                    pass
         
         # 1. حساب تاريخ النهاية تلقائياً
         if self.start_date and not self.end_date:
@@ -260,6 +375,11 @@ class Contract(TimeStampedModel, UserTrackingModel, SoftDeleteModel):
             self.payment_day = self.start_date.day
             if self.payment_day > 28:
                 self.payment_day = 28
+        
+        # تُستخدم في contract_post_save لتحديد الحاجة لإعادة توليد جدول الأقساط
+        self._financial_values_changed = (
+            is_new or old_financial_values != self._get_financial_values()
+        )
                         
         # حفظ العقد
         super().save(*args, **kwargs)
@@ -280,6 +400,19 @@ class Contract(TimeStampedModel, UserTrackingModel, SoftDeleteModel):
         
       
     
+    # الحقول المؤثرة على الحسابات المالية (الفترات والمستحقات)
+    FINANCIAL_FIELDS = (
+        'start_date',
+        'end_date',
+        'actual_end_date',
+        'annual_rent',
+        'payment_frequency',
+        'status',
+    )
+    
+    def _get_financial_values(self):
+        return tuple(getattr(self, field) for field in self.FINANCIAL_FIELDS)
+    
     # ========================================
     # ✅ UPDATED: Unit Management Methods
     # ========================================
@@ -377,8 +510,8 @@ class Contract(TimeStampedModel, UserTrackingModel, SoftDeleteModel):
         if not self.pk:
             return
         
-        # تحديث جميع الوحدات
-        self.units.update(status=status)
+        # تحديث جميع الوحدات (update لا يُحدّث updated_at - مطلوب للنسخ التزايدية)
+        self.units.update(status=status, updated_at=timezone.now())
     
        # ========================================
     # ✅ UPDATED: Class Methods للوحدات المتاحة
@@ -589,6 +722,14 @@ def contract_post_save(sender, instance, created, **kwargs):
     if instance.is_expiring_soon(days=30):
         # يمكن إنشاء إشعار تلقائي
         pass
+    
+    from rent.services.financial_cache import bump_contract_version
+    bump_contract_version(instance.pk)
+
+    # إعادة توليد جدول الأقساط عند تغيير التواريخ أو الإيجار أو الحالة
+    if getattr(instance, '_financial_values_changed', True):
+        from .contract_period_models import schedule_period_rebuild
+        schedule_period_rebuild(instance.pk)
 
 
 @receiver(pre_save, sender=Contract)
@@ -596,4 +737,32 @@ def contract_pre_save(sender, instance, **kwargs):
     """Signal handler before contract is saved"""
     # تحديث حالة العقد تلقائياً
     if instance.is_expired() and instance.status == ContractStatus.ACTIVE:
-        instance.status = ContractStatus.EXPIRED
\ No newline at end of file
+        instance.status = ContractStatus.EXPIRED
+
+
+@receiver(post_delete, sender=Contract)
+def contract_post_delete(sender, instance, **kwargs):
+    """Signal handler after contract is deleted"""
+    from rent.services.financial_cache import bump_contract_version
+    bump_contract_version(instance.pk)
+
+
+@receiver(m2m_changed, sender=Contract.units.through)
+def contract_units_touch(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    تحديث updated_at للعقود عند تغيير وحداتها - جدول الربط يُنسخ مع العقد
+    فبدونه لا تظهر الوحدات المضافة أو المزالة في النسخة التزايدية
+    """
+    if not reverse:
+        contract_ids = [instance.pk]
+    elif action == 'pre_clear':
+        # الوحدة نفسها: عقودها تُقرأ قبل حذف الربط
+        instance._touch_contract_ids = list(instance.contracts.values_list('pk', flat=True))
+        return
+    elif action == 'post_clear':
+        contract_ids = instance.__dict__.pop('_touch_contract_ids', [])
+    else:
+        contract_ids = pk_set or []
+
+    if action in ('post_add', 'post_remove', 'post_clear') and contract_ids:
+        Contract.objects.filter(pk__in=contract_ids).update(updated_at=timezone.now())
@@ -0,0 +1,476 @@
+# models/contract_period_models.py
+
+"""
+Contract Period Models
+جدول أقساط العقد المحفوظ (صف لكل قسط)
+
+بدلاً من توليد تواريخ الاستحقاق بحلقة relativedelta في كل طلب، تُحفظ
+فترات العقد مع الإيجار الأساسي وتعديلات الضريبة والخصم والمبلغ المستحق.
+يُعاد توليد الجدول فقط عند:
+- تغيير تواريخ العقد أو الإيجار أو دورية السداد
+- تطبيق تعديل على العقد
+وعند ترحيل أو إلغاء سند قبض تُحدّث حالة السداد ودفتر توزيع السندات
+(ReceiptAllocation) فقط.
+
+"كل المستحق هذا الشهر في المحفظة" يصبح استعلاماً واحداً على فهرس:
+    ContractPeriod.objects.due_between(first_day, last_day).unpaid()
+"""
+
+import logging
+
+from django.db import transaction
+from django.db.models import (
+    Case, ExpressionWrapper, F, OuterRef, Subquery, Sum, Value, When, Window,
+)
+from django.db.models.functions import Coalesce, Greatest, Least
+
+from .common_imports_models import *
+from .contract_models import Contract
+
+logger = logging.getLogger(__name__)
+
+
+# ========================================
+# Choices
+# ========================================
+
+class ContractPeriodStatus(models.TextChoices):
+    """حالة سداد القسط (التأخير يُحسب من end_date وقت الاستعلام)"""
+    PENDING = 'pending', _('غير مسدد')
+    PARTIAL = 'partial', _('مسدد جزئياً')
+    PAID = 'paid', _('مسدد')
+
+
+# ========================================
+# QuerySet
+# ========================================
+
+AMOUNT_FIELD = models.DecimalField(max_digits=14, decimal_places=2)
+
+
+def posted_receipts_total(contract_ref='pk'):
+    """
+    إجمالي السندات المرحلة للعقد كاستعلام فرعي (نفس PaymentDistributor._get_total_paid)
+
+    Args:
+        contract_ref: اسم حقل العقد في الاستعلام الخارجي
+    """
+    from .receipt_models import Receipt, ReceiptStatus
+
+    total = Receipt.objects.filter(
+        contract=OuterRef(contract_ref),
+        status=ReceiptStatus.POSTED,
+        is_deleted=False,
+    ).order_by().values('contract').annotate(total=Sum('amount')).values('total')
+
+    return Coalesce(Subquery(total), Value(Decimal('0')), output_field=AMOUNT_FIELD)
+
+
+class ContractPeriodQuerySet(models.QuerySet):
+
+    def applicable(self, as_of_date):
+        """
+        الأقساط المحسوبة حتى التاريخ (نفس نطاق PeriodCalculator):
+        التي بدأت حتى as_of_date، وللعقد الملغي حتى تاريخ إنهائه الفعلي
+        """
+        return self.filter(start_date__lte=as_of_date).exclude(
+            contract__status=ContractStatus.TERMINATED,
+            contract__actual_end_date__lt=F('start_date'),
+        )
+
+    def with_fifo_status(self, as_of_date=None):
+        """
+        توزيع FIFO في SQL لكل أقساط كل العقود باستعلام واحد
+
+        المجموع التراكمي للمستحق لكل عقد:
+            SUM(due_amount) OVER (PARTITION BY contract_id ORDER BY period_number)
+        يُقارن بإجمالي السندات المرحلة للعقد، فيُحسب المسدد والمتبقي والحالة
+        (paid / partial / overdue / current / future) بنفس قواعد PaymentDistributor.
+
+        الأقساط قبل التوزيع تُحدد بـ filter قبل هذه الدالة (مثل applicable)
+        لأن النافذة تُحسب على الصفوف بعد WHERE.
+
+        Annotations:
+            contract_paid, cumulative_due, fifo_paid, fifo_remaining, fifo_status
+        """
+        as_of_date = as_of_date or timezone.now().date()
+        zero = Value(Decimal('0'), output_field=AMOUNT_FIELD)
+
+        queryset = self.annotate(
+            contract_paid=posted_receipts_total('contract_id'),
+            cumulative_due=Window(
+                Sum('due_amount'),
+                partition_by=[F('contract_id')],
+                order_by=[F('period_number').asc()],
+                output_field=AMOUNT_FIELD,
+            ),
+        )
+        # المسدد قبل هذا القسط = الإجمالي - المستحق في الأقساط السابقة
+        paid_for_period = F('contract_paid') - (F('cumulative_due') - F('due_amount'))
+
+        return queryset.annotate(
+            fifo_paid=Greatest(
+                Least(paid_for_period, F('due_amount'), output_field=AMOUNT_FIELD),
+                zero,
+                output_field=AMOUNT_FIELD,
+            ),
+        ).annotate(
+            fifo_remaining=ExpressionWrapper(
+                F('due_amount') - F('fifo_paid'), output_field=AMOUNT_FIELD
+            ),
+            fifo_status=Case(
+                When(cumulative_due__lte=F('contract_paid'), then=Value('paid')),
+                When(fifo_paid__gt=0, then=Value('partial')),
+                When(end_date__lt=as_of_date, then=Value('overdue')),
+                When(start_date__lte=as_of_date, then=Value('current')),
+                default=Value('future'),
+                output_field=models.CharField(),
+            ),
+        )
+
+    def due_between(self, start_date, end_date):
+        """الأقساط التي يستحق أولها بين التاريخين (شاملة)"""
+        return self.filter(start_date__gte=start_date, start_date__lte=end_date)
+
+    def unpaid(self):
+        return self.exclude(status=ContractPeriodStatus.PAID)
+
+    def overdue(self, as_of_date=None):
+        as_of_date = as_of_date or timezone.now().date()
+        return self.unpaid().filter(end_date__lt=as_of_date)
+
+    def active_contracts(self):
+        return self.filter(contract__is_deleted=False)
+
+
+# ========================================
+# ContractPeriod Model
+# ========================================
+
+class ContractPeriod(models.Model):
+    """
+    Contract Period
+    قسط من جدول أقساط العقد
+    """
+
+    # حقول حالة السداد (تُحدّث بدون إعادة توليد الجدول)
+    PAYMENT_FIELDS = ['paid_amount', 'remaining_amount', 'status']
+
+    # ========================================
+    # Relationships
+    # ========================================
+    contract = models.ForeignKey(
+        Contract,
+        on_delete=models.CASCADE,
+        related_name='schedule_periods',
+        verbose_name=_('العقد')
+    )
+
+    # ========================================
+    # Schedule
+    # ========================================
+    period_number = models.PositiveIntegerField(_('رقم القسط'))
+
+    start_date = models.DateField(_('تاريخ الاستحقاق'))
+
+    end_date = models.DateField(_('نهاية الفترة'))
+
+    # ========================================
+    # Amounts
+    # ========================================
+    annual_rent = models.DecimalField(
+        _('الإيجار السنوي'),
+        max_digits=14,
+        decimal_places=2
+    )
+
+    base_rent = models.DecimalField(
+        _('إيجار الفترة'),
+        max_digits=14,
+        decimal_places=2
+    )
+
+    vat_amount = models.DecimalField(
+        _('ضريبة القيمة المضافة'),
+        max_digits=14,
+        decimal_places=2,
+        default=Decimal('0.00')
+    )
+
+    discount_amount = models.DecimalField(
+        _('الخصم'),
+        max_digits=14,
+        decimal_places=2,
+        default=Decimal('0.00')
+    )
+
+    adjustment_amount = models.DecimalField(
+        _('صافي التعديلات'),
+        max_digits=14,
+        decimal_places=2,
+        default=Decimal('0.00'),
+        help_text=_('الضريبة ناقص الخصم')
+    )
+
+    due_amount = models.DecimalField(
+        _('المبلغ المستحق'),
+        max_digits=14,
+        decimal_places=2
+    )
+
+    rent_source = models.CharField(
+        _('مصدر الإيجار'),
+        max_length=30,
+        default='base',
+        help_text=_('base أو mod_<id> لتعديل الإيجار المطبق')
+    )
+
+    # ========================================
+    # Payment Status
+    # ========================================
+    paid_amount = models.DecimalField(
+        _('المبلغ المسدد'),
+        max_digits=14,
+        decimal_places=2,
+        default=Decimal('0.00')
+    )
+
+    remaining_amount = models.DecimalField(
+        _('المبلغ المتبقي'),
+        max_digits=14,
+        decimal_places=2,
+        default=Decimal('0.00')
+    )
+
+    status = models.CharField(
+        _('حالة السداد'),
+        max_length=10,
+        choices=ContractPeriodStatus.choices,
+        default=ContractPeriodStatus.PENDING
+    )
+
+    generated_at = models.DateTimeField(
+        _('تاريخ التوليد'),
+        default=timezone.now
+    )
+
+    objects = ContractPeriodQuerySet.as_manager()
+
+    # ========================================
+    # Metadata
+    # ========================================
+    class Meta:
+        db_table = 'contract_periods'
+        verbose_name = _('قسط العقد')
+        verbose_name_plural = _('أقساط العقود')
+        ordering = ['contract', 'period_number']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['contract', 'period_number'],
+                name='unique_contract_period_number'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['contract', 'start_date']),
+            models.Index(fields=['start_date', 'status']),
+        ]
+
+    def __str__(self):
+        return f"قسط {self.period_number} - العقد {self.contract_id} ({self.start_date})"
+
+    def is_overdue(self, as_of_date=None):
+        as_of_date = as_of_date or timezone.now().date()
+        return self.status != ContractPeriodStatus.PAID and self.end_date < as_of_date
+
+    # ========================================
+    # Building
+    # ========================================
+    @classmethod
+    def build_for_contract(cls, contract, data=None):
+        """
+        توليد أقساط العقد (غير محفوظة) من نفس محرك ContractFinancialService
+
+        Args:
+            data: ContractFinancialData اختياري (تعديلات محمّلة مسبقاً)
+
+        Returns:
+            list[ContractPeriod]
+        """
+        from rent.services.contract_financial_service import (
+            ModificationManager,
+            PeriodCalculator,
+        )
+
+        calculator = PeriodCalculator(contract, data=data)
+        modifications = ModificationManager(contract, data=data)
+        now = timezone.now()
+
+        periods = []
+        for period in calculator.calculate_periods_with_modifications(include_future=True):
+            mods = modifications.get_total_modifications_for_period(period['start_date'])
+            periods.append(cls(
+                contract=contract,
+                period_number=period['period_number'],
+                start_date=period['start_date'],
+                end_date=period['end_date'],
+                annual_rent=period['annual_rent'],
+                base_rent=period['due_amount'],
+                vat_amount=mods['vat_amount'],
+                discount_amount=mods['discount_amount'],
+                adjustment_amount=mods['total'],
+                due_amount=period['due_amount'] + mods['total'],
+                rent_source=period['source'],
+                generated_at=now,
+            ))
+        return periods
+
+    @staticmethod
+    def apply_payments(periods, total_paid):
+        """
+        توزيع إجمالي المدفوع على الأقساط بالترتيب (FIFO)
+
+        نفس توزيع PaymentDistributor، ويمتد الفائض للأقساط المستقبلية.
+        """
+        remaining_paid = total_paid or Decimal('0')
+        for period in periods:
+            if remaining_paid >= period.due_amount:
+                period.paid_amount = period.due_amount
+                period.status = ContractPeriodStatus.PAID
+            elif remaining_paid > 0:
+                period.paid_amount = remaining_paid
+                period.status = ContractPeriodStatus.PARTIAL
+            else:
+                period.paid_amount = Decimal('0')
+                period.status = ContractPeriodStatus.PENDING
+            period.remaining_amount = period.due_amount - period.paid_amount
+            remaining_paid -= period.paid_amount
+        return periods
+
+    @classmethod
+    def _save_schedules(cls, periods_by_contract):
+        """
+        حفظ جداول أقساط (بدلاً من الموجودة) مع حالة السداد ودفتر توزيع السندات
+
+        Args:
+            periods_by_contract: {contract_id: [ContractPeriod غير محفوظة]}
+        """
+        from .receipt_allocation_models import ReceiptAllocation
+
+        receipts = ReceiptAllocation.get_posted_receipts(periods_by_contract.keys())
+        for contract_id, periods in periods_by_contract.items():
+            cls.apply_payments(
+                periods, sum((r.amount for r in receipts[contract_id]), Decimal('0'))
+            )
+
+        with transaction.atomic():
+            # الحذف يحذف توزيعات السندات المرتبطة أيضاً (CASCADE)
+            cls.objects.filter(contract_id__in=periods_by_contract.keys()).delete()
+            cls.objects.bulk_create(
+                [period for periods in periods_by_contract.values() for period in periods],
+                batch_size=1000,
+            )
+            ReceiptAllocation.rebuild_for_contracts(periods_by_contract, receipts)
+
+    @classmethod
+    def regenerate_for_contract(cls, contract):
+        """
+        إعادة توليد جدول أقساط العقد (بعد تغيير العقد أو تطبيق تعديل)
+
+        Returns:
+            list[ContractPeriod]
+        """
+        periods = cls.build_for_contract(contract)
+        cls._save_schedules({contract.pk: periods})
+        return periods
+
+    @classmethod
+    def regenerate_for_contracts(cls, contracts):
+        """
+        إعادة توليد جداول مجموعة عقود (تعديلات وسندات محمّلة دفعة واحدة)
+
+        Returns:
+            int: عدد الأقساط
+        """
+        from rent.services.portfolio_financial_service import PortfolioFinancialService
+
+        periods_by_contract = {
+            contract.pk: cls.build_for_contract(contract, data=service.data)
+            for contract, service in PortfolioFinancialService(contracts)
+        }
+        cls._save_schedules(periods_by_contract)
+        return sum(len(periods) for periods in periods_by_contract.values())
+
+    @classmethod
+    def regenerate_all(cls, chunk_size=500):
+        """
+        إعادة توليد جداول كل العقود على دفعات (مثلاً بعد استعادة نسخة احتياطية:
+        الجداول ودفتر التوزيع لا تُنسخ والإشارات لا تعمل مع bulk_create)
+
+        Returns:
+            int: عدد الأقساط
+        """
+        contracts = Contract.objects.filter(is_deleted=False)
+        contract_ids = list(contracts.order_by('pk').values_list('pk', flat=True))
+
+        periods = 0
+        for start in range(0, len(contract_ids), chunk_size):
+            periods += cls.regenerate_for_contracts(
+                contracts.filter(pk__in=contract_ids[start:start + chunk_size])
+            )
+        return periods
+
+    @classmethod
+    def refresh_payments_for_contract(cls, contract):
+        """
+        تحديث حالة السداد ودفتر التوزيع فقط (بعد ترحيل أو إلغاء سند)
+
+        يُولّد الجدول إذا لم يكن موجوداً بعد.
+
+        Returns:
+            int: عدد الأقساط
+        """
+        from .receipt_allocation_models import ReceiptAllocation
+
+        periods = list(cls.objects.filter(contract=contract).order_by('period_number'))
+        if not periods:
+            return len(cls.regenerate_for_contract(contract))
+
+        receipts = ReceiptAllocation.get_posted_receipts([contract.pk])
+        cls.apply_payments(periods, sum((r.amount for r in receipts[contract.pk]), Decimal('0')))
+
+        with transaction.atomic():
+            cls.objects.bulk_update(periods, cls.PAYMENT_FIELDS)
+            ReceiptAllocation.rebuild_for_contracts({contract.pk: periods}, receipts)
+        return len(periods)
+
+
+# ========================================
+# Invalidation
+# ========================================
+
+def schedule_period_rebuild(contract_id, payments_only=False):
+    """
+    جدولة إعادة توليد جدول أقساط العقد بعد نجاح المعاملة الحالية
+
+    Args:
+        payments_only: تحديث حالة السداد فقط (الجدول نفسه لم يتغير)
+    """
+    if not contract_id:
+        return
+
+    def rebuild():
+        from rent.services.cashflow_forecast_service import invalidate_cashflow_forecasts
+
+        invalidate_cashflow_forecasts()
+        try:
+            contract = Contract.objects.get(pk=contract_id)
+            if payments_only:
+                ContractPeriod.refresh_payments_for_contract(contract)
+            else:
+                ContractPeriod.regenerate_for_contract(contract)
+        except Contract.DoesNotExist:
+            pass
+        except Exception as e:
+            logger.error(f'Error rebuilding periods for contract {contract_id}: {e}', exc_info=True)
+
+    transaction.on_commit(rebuild)
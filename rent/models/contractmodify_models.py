@@ -19,6 +19,7 @@ from django.utils import timezone
 
 from .common_imports_models import *
 from .contract_models import Contract
+from audit_log.tracker import get_original_values
 
 # استيراد الدوال المساعدة
 from rent.utils.contract_utils import (
@@ -675,6 +676,19 @@ class ContractModification(TimeStampedModel, UserTrackingModel):
     
     def save(self, *args, **kwargs):
         """Override save to auto-calculate values"""
+        # حالة التطبيق قبل الحفظ: إلغاء التطبيق يعيد توليد الجدول أيضاً
+        # (contract_modification_post_save)
+        was_applied = False
+        if self.pk:
+            original = get_original_values(self, 'is_applied')
+            if original is not None:
+                was_applied = original['is_applied']
+            else:
+                was_applied = ContractModification.objects.filter(
+                    pk=self.pk, is_applied=True
+                ).exists()
+        self._was_applied = was_applied
+        
         # استدعاء clean للحسابات التلقائية
         try:
             self.full_clean()
@@ -778,4 +792,33 @@ class ContractModification(TimeStampedModel, UserTrackingModel):
                 'label': 'متوازن',
                 'class': 'success',
                 'icon': 'check-circle'
-            }
\ No newline at end of file
+            }
+
+
+# ========================================
+# Signals
+# ========================================
+
+@receiver(post_save, sender=ContractModification)
+def contract_modification_post_save(sender, instance, created, **kwargs):
+    """Signal handler after modification is saved"""
+    from rent.services.financial_cache import bump_contract_version
+    bump_contract_version(instance.contract_id)
+
+    # إعادة توليد جدول الأقساط عند تطبيق التعديل
+    # أو إلغاء تطبيقه
+    if instance.is_applied or getattr(instance, '_was_applied', False):
+        from .contract_period_models import schedule_period_rebuild
+        schedule_period_rebuild(instance.contract_id)
+
+
+@receiver(post_delete, sender=ContractModification)
+def contract_modification_post_delete(sender, instance, **kwargs):
+    """Signal handler after modification is deleted"""
+    from rent.services.financial_cache import bump_contract_version
+    bump_contract_version(instance.contract_id)
+
+    # حذف تعديل مطبق: الجدول يعود لقيم العقد بدونه
+    if instance.is_applied:
+        from .contract_period_models import schedule_period_rebuild
+        schedule_period_rebuild(instance.contract_id)
@@ -0,0 +1,277 @@
+# models/financial_snapshot_models.py
+
+"""
+Contract Financial Snapshot Models
+لقطة مالية محفوظة لكل عقد
+
+بدلاً من تشغيل محرك FIFO لكل عقد في كل طلب، تُحفظ النتيجة في صف واحد
+لكل عقد. أعداد المتأخرات والاستحقاق القادم تتغير يومياً حتى بدون أي حفظ،
+لذلك تُبنى اللقطات دفعة واحدة يومياً كمهمة مجدولة:
+    rent.models.financial_snapshot_models.rebuild_financial_snapshots
+أو عبر الأمر rebuild_financial_snapshots.
+
+الأرصدة الحية تُقرأ من ContractPeriod (يُحدّث عند كل حفظ).
+"""
+
+from .common_imports_models import *
+from .contract_models import Contract
+
+
+# ========================================
+# ContractFinancialSnapshot Model
+# ========================================
+
+class ContractFinancialSnapshot(models.Model):
+    """
+    Contract Financial Snapshot
+    اللقطة المالية للعقد (صف واحد لكل عقد)
+    """
+
+    # الحقول المحسوبة التي يتم تحديثها عند إعادة البناء
+    SNAPSHOT_FIELDS = [
+        'as_of_date',
+        'periods_count',
+        'total_due',
+        'total_paid',
+        'outstanding_amount',
+        'overdue_amount',
+        'overdue_periods_count',
+        'next_due_date',
+        'next_due_amount',
+        'computed_at',
+    ]
+
+    # ========================================
+    # Relationships
+    # ========================================
+    contract = models.OneToOneField(
+        Contract,
+        on_delete=models.CASCADE,
+        related_name='financial_snapshot',
+        verbose_name=_('العقد')
+    )
+
+    # ========================================
+    # Snapshot Values
+    # ========================================
+    as_of_date = models.DateField(
+        _('محسوب حتى تاريخ'),
+        db_index=True,
+        help_text=_('التاريخ الذي حُسبت عليه اللقطة')
+    )
+
+    periods_count = models.PositiveIntegerField(
+        _('عدد الفترات المستحقة'),
+        default=0
+    )
+
+    total_due = models.DecimalField(
+        _('إجمالي المستحق'),
+        max_digits=14,
+        decimal_places=2,
+        default=Decimal('0.00')
+    )
+
+    total_paid = models.DecimalField(
+        _('إجمالي المدفوع'),
+        max_digits=14,
+        decimal_places=2,
+        default=Decimal('0.00')
+    )
+
+    outstanding_amount = models.DecimalField(
+        _('المبلغ المستحق'),
+        max_digits=14,
+        decimal_places=2,
+        default=Decimal('0.00'),
+        db_index=True
+    )
+
+    overdue_amount = models.DecimalField(
+        _('المبلغ المتأخر'),
+        max_digits=14,
+        decimal_places=2,
+        default=Decimal('0.00')
+    )
+
+    overdue_periods_count = models.PositiveIntegerField(
+        _('عدد الفترات المتأخرة'),
+        default=0
+    )
+
+    next_due_date = models.DateField(
+        _('تاريخ الاستحقاق القادم'),
+        null=True,
+        blank=True,
+        db_index=True
+    )
+
+    next_due_amount = models.DecimalField(
+        _('مبلغ الاستحقاق القادم'),
+        max_digits=14,
+        decimal_places=2,
+        null=True,
+        blank=True
+    )
+
+    computed_at = models.DateTimeField(
+        _('تاريخ الحساب'),
+        default=timezone.now
+    )
+
+    # ========================================
+    # Metadata
+    # ========================================
+    class Meta:
+        db_table = 'contract_financial_snapshots'
+        verbose_name = _('لقطة مالية للعقد')
+        verbose_name_plural = _('اللقطات المالية للعقود')
+        indexes = [
+            models.Index(fields=['outstanding_amount', 'as_of_date']),
+            models.Index(fields=['overdue_periods_count']),
+        ]
+
+    def __str__(self):
+        return f"لقطة العقد {self.contract_id} - {self.as_of_date}"
+
+    @property
+    def is_stale(self):
+        """اللقطة قديمة إذا حُسبت قبل اليوم (قد تكون فترات جديدة استحقت)"""
+        return self.as_of_date < timezone.now().date()
+
+    # ========================================
+    # Building
+    # ========================================
+    @classmethod
+    def build_from_service(cls, service):
+        """
+        إنشاء لقطة (غير محفوظة) من ContractFinancialService
+
+        Args:
+            service: ContractFinancialService
+
+        Returns:
+            ContractFinancialSnapshot
+        """
+        data = service.calculate_periods_with_payments()
+        periods = data.get('periods', [])
+        totals = data.get('totals', {})
+
+        overdue_periods = [p for p in periods if p.get('status') == 'overdue']
+        unpaid_periods = [p for p in periods if p.get('remaining_amount', 0) > 0]
+
+        # الاستحقاق القادم: أول فترة غير مسددة، وإلا أول فترة مستقبلية
+        next_period = unpaid_periods[0] if unpaid_periods else None
+        if next_period is None:
+            future_periods = [
+                p for p in service.calculate_periods_with_modifications(include_future=True)
+                if p['is_future']
+            ]
+            next_period = future_periods[0] if future_periods else None
+
+        if next_period is None:
+            next_due_amount = None
+        elif 'remaining_amount' in next_period:
+            next_due_amount = next_period['remaining_amount']
+        else:
+            next_due_amount = (
+                next_period['due_amount'] +
+                service.get_total_modifications_for_period(next_period['start_date'])['total']
+            )
+
+        return cls(
+            contract=service.contract,
+            as_of_date=service.as_of_date,
+            periods_count=len(periods),
+            total_due=totals.get('total_due', Decimal('0')),
+            total_paid=totals.get('total_paid', Decimal('0')),
+            outstanding_amount=service.get_outstanding_amount(),
+            overdue_amount=sum((p['remaining_amount'] for p in overdue_periods), Decimal('0')),
+            overdue_periods_count=len(overdue_periods),
+            next_due_date=next_period['start_date'] if next_period else None,
+            next_due_amount=next_due_amount,
+            computed_at=timezone.now(),
+        )
+
+    @classmethod
+    def rebuild_for_contract(cls, contract, as_of_date=None):
+        """
+        إعادة بناء لقطة عقد واحد
+
+        Returns:
+            ContractFinancialSnapshot
+        """
+        from rent.services.contract_financial_service import ContractFinancialService
+
+        snapshot = cls.build_from_service(ContractFinancialService(contract, as_of_date))
+        values = {field: getattr(snapshot, field) for field in cls.SNAPSHOT_FIELDS}
+        snapshot, created = cls.objects.update_or_create(contract=contract, defaults=values)
+        return snapshot
+
+    @classmethod
+    def rebuild_for_contracts(cls, contracts, as_of_date=None):
+        """
+        إعادة بناء لقطات مجموعة عقود دفعة واحدة (حساب مجمّع + upsert واحد)
+
+        Returns:
+            int: عدد اللقطات
+        """
+        from rent.services.portfolio_financial_service import PortfolioFinancialService
+
+        portfolio = PortfolioFinancialService(contracts, as_of_date)
+        snapshots = [cls.build_from_service(service) for contract, service in portfolio]
+
+        if snapshots:
+            cls.objects.bulk_create(
+                snapshots,
+                update_conflicts=True,
+                unique_fields=['contract'],
+                update_fields=cls.SNAPSHOT_FIELDS,
+            )
+        return len(snapshots)
+
+    @classmethod
+    def rebuild_all(cls, contract_ids=None, stale_only=False, chunk_size=500):
+        """
+        إعادة بناء لقطات كل العقود غير المحذوفة على دفعات بتاريخ اليوم
+
+        Args:
+            contract_ids: تقييد إعادة البناء بعقود محددة
+            stale_only: تخطي العقود التي لها لقطة محسوبة اليوم
+
+        Returns:
+            int: عدد اللقطات
+        """
+        today = timezone.now().date()
+        chunk_size = max(chunk_size, 1)
+
+        contracts = Contract.objects.filter(is_deleted=False).select_related('tenant')
+        if contract_ids:
+            contracts = contracts.filter(pk__in=contract_ids)
+        if stale_only:
+            contracts = contracts.exclude(
+                pk__in=cls.objects.filter(as_of_date__gte=today).values('contract_id')
+            )
+
+        ids = list(contracts.order_by('pk').values_list('pk', flat=True))
+        rebuilt = 0
+        for start in range(0, len(ids), chunk_size):
+            chunk = contracts.filter(pk__in=ids[start:start + chunk_size])
+            rebuilt += cls.rebuild_for_contracts(chunk, as_of_date=today)
+        return rebuilt
+
+
+# ========================================
+# Scheduled Task Entry Point
+# ========================================
+
+def rebuild_financial_snapshots(stale_only=True, chunk_size=500):
+    """
+    نقطة الدخول للمهام المجدولة (ScheduledTask.task_function)
+    rent.models.financial_snapshot_models.rebuild_financial_snapshots
+    """
+    return {
+        'snapshots': ContractFinancialSnapshot.rebuild_all(
+            stale_only=stale_only, chunk_size=chunk_size
+        ),
+    }
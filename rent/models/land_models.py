@@ -239,6 +239,22 @@ class Land(TimeStampedModel, UserTrackingModel, SoftDeleteModel):
         rented_units = self.get_rented_units()
         return Decimal((rented_units / total_units) * 100).quantize(Decimal('0.01'))
     
+    def get_occupancy_history(self, months=12):
+        """
+        Monthly occupancy history for all buildings
+        سجل الإشغال الشهري لجميع المباني من فترات العقود
+        
+        Args:
+            months: Number of months ending with the current month
+            
+        Returns:
+            list: Monthly rows (month, units, days, occupied_days, vacant_days, lost_rent, rate)
+        """
+        from rent.services.occupancy_service import monthly_series
+        
+        end_month = date.today().replace(day=1) + relativedelta(months=1)
+        return monthly_series(end_month - relativedelta(months=months), end_month, land_id=self.pk)
+    
     def is_rent_expiring_soon(self, days=90):
         """
         Check if land rent is expiring soon
@@ -8,6 +8,7 @@ Notification and Alert Models
 from .common_imports_models import *
 from .contract_models import Contract
 from .tenant_models import Tenant
+from rent.services.portfolio_financial_service import PortfolioFinancialService
 
 
 # ========================================
@@ -264,6 +265,39 @@ class Notification(TimeStampedModel):
     # Class Methods - Auto Notification Generators
     # ========================================
     
+    @classmethod
+    def _bulk_create_new(cls, notification_type, candidates, since_date):
+        """
+        إدراج الإشعارات الجديدة فقط دفعة واحدة
+        
+        يتم استبعاد العقود التي لها إشعار من نفس النوع منذ since_date
+        باستعلام واحد ثم الإدراج بـ bulk_create.
+        
+        Args:
+            notification_type: نوع الإشعار
+            candidates: قائمة إشعارات غير محفوظة (مرتبطة بعقود)
+            since_date: بداية فترة منع التكرار
+            
+        Returns:
+            int: عدد الإشعارات المُنشأة
+        """
+        if not candidates:
+            return 0
+        
+        existing_contract_ids = set(
+            cls.objects.filter(
+                notification_type=notification_type,
+                contract_id__in=[n.contract_id for n in candidates],
+                created_at__date__gte=since_date
+            ).values_list('contract_id', flat=True)
+        )
+        
+        new_notifications = [
+            n for n in candidates if n.contract_id not in existing_contract_ids
+        ]
+        cls.objects.bulk_create(new_notifications, batch_size=500)
+        return len(new_notifications)
+    
     @classmethod
     def check_contract_expiry(cls, days_before=30):
         """
@@ -272,6 +306,9 @@ class Notification(TimeStampedModel):
         
         Args:
             days_before: Number of days before expiry to notify
+            
+        Returns:
+            int: Number of created notifications
         """
         today = timezone.now().date()
         expiry_date = today + timedelta(days=days_before)
@@ -281,47 +318,46 @@ class Notification(TimeStampedModel):
             end_date__lte=expiry_date,
             end_date__gt=today,
             is_deleted=False
-        )
+        ).select_related('tenant')
         
+        candidates = []
         for contract in expiring_contracts:
             days_left = calculate_days_between(today, contract.end_date)
             
-            # التحقق من عدم وجود إشعار مسبق لنفس اليوم
-            existing = cls.objects.filter(
-                contract=contract,
-                notification_type=NotificationType.CONTRACT_EXPIRY,
-                created_at__date=today
-            ).exists()
+            # تحديد الأولوية بناءً على الأيام المتبقية
+            if days_left <= 7:
+                priority = PriorityLevel.URGENT
+            elif days_left <= 15:
+                priority = PriorityLevel.HIGH
+            else:
+                priority = PriorityLevel.MEDIUM
             
-            if not existing:
-                # تحديد الأولوية بناءً على الأيام المتبقية
-                if days_left <= 7:
-                    priority = PriorityLevel.URGENT
-                elif days_left <= 15:
-                    priority = PriorityLevel.HIGH
-                else:
-                    priority = PriorityLevel.MEDIUM
-                
-                cls.objects.create(
-                    notification_type=NotificationType.CONTRACT_EXPIRY,
-                    title=_('عقد على وشك الانتهاء'),
-                    message=_(
-                        f'العقد {contract.contract_number} للمستأجر {contract.tenant.name} '
-                        f'ينتهي في {contract.end_date.strftime("%Y-%m-%d")} '
-                        f'(باقي {days_left} يوم)'
-                    ),
-                    contract=contract,
-                    tenant=contract.tenant,
-                    priority=priority,
-                    due_date=contract.end_date,
-                    action_url=f'/contracts/{contract.pk}/'
-                )
+            candidates.append(cls(
+                notification_type=NotificationType.CONTRACT_EXPIRY,
+                title=_('عقد على وشك الانتهاء'),
+                message=_(
+                    f'العقد {contract.contract_number} للمستأجر {contract.tenant.name} '
+                    f'ينتهي في {contract.end_date.strftime("%Y-%m-%d")} '
+                    f'(باقي {days_left} يوم)'
+                ),
+                contract=contract,
+                tenant=contract.tenant,
+                priority=priority,
+                due_date=contract.end_date,
+                action_url=f'/contracts/{contract.pk}/'
+            ))
+        
+        # عدم تكرار الإشعار في نفس اليوم
+        return cls._bulk_create_new(NotificationType.CONTRACT_EXPIRY, candidates, today)
     
     @classmethod
     def check_payment_due(cls):
         """
         Check and create notifications for due payments
         التحقق وإنشاء إشعارات للدفعات المستحقة
+        
+        Returns:
+            int: Number of created notifications
         """
         today = timezone.now().date()
         
@@ -331,38 +367,41 @@ class Notification(TimeStampedModel):
             is_deleted=False
         )
         
-        for contract in active_contracts:
-            # حساب المبلغ المستحق
-            outstanding = contract.get_outstanding_amount(include_future=False)
+        # حساب المستحقات لكل العقود دفعة واحدة
+        portfolio = PortfolioFinancialService(active_contracts)
+        outstanding_amounts = portfolio.get_outstanding_amounts(include_future=False)
+        
+        candidates = []
+        for contract in portfolio.contracts:
+            outstanding = outstanding_amounts[contract.id]
+            if outstanding <= 0:
+                continue
             
-            if outstanding > 0:
-                # التحقق من عدم وجود إشعار مسبق لنفس اليوم
-                existing = cls.objects.filter(
-                    contract=contract,
-                    notification_type=NotificationType.PAYMENT_DUE,
-                    created_at__date=today
-                ).exists()
-                
-                if not existing:
-                    cls.objects.create(
-                        notification_type=NotificationType.PAYMENT_DUE,
-                        title=_('دفعة مستحقة'),
-                        message=_(
-                            f'يوجد مبلغ مستحق للعقد {contract.contract_number}: '
-                            f'{format_currency(outstanding)}'
-                        ),
-                        contract=contract,
-                        tenant=contract.tenant,
-                        priority=PriorityLevel.HIGH,
-                        due_date=today,
-                        action_url=f'/contracts/{contract.pk}/payments/'
-                    )
+            candidates.append(cls(
+                notification_type=NotificationType.PAYMENT_DUE,
+                title=_('دفعة مستحقة'),
+                message=_(
+                    f'يوجد مبلغ مستحق للعقد {contract.contract_number}: '
+                    f'{format_currency(outstanding)}'
+                ),
+                contract=contract,
+                tenant=contract.tenant,
+                priority=PriorityLevel.HIGH,
+                due_date=today,
+                action_url=f'/contracts/{contract.pk}/payments/'
+            ))
+        
+        # عدم تكرار الإشعار في نفس اليوم
+        return cls._bulk_create_new(NotificationType.PAYMENT_DUE, candidates, today)
     
     @classmethod
     def check_payment_overdue(cls):
         """
         Check and create notifications for overdue payments
         التحقق وإنشاء إشعارات للدفعات المتأخرة
+        
+        Returns:
+            int: Number of created notifications
         """
         today = timezone.now().date()
         
@@ -372,36 +411,66 @@ class Notification(TimeStampedModel):
             is_deleted=False
         )
         
-        for contract in contracts:
-            outstanding = contract.get_outstanding_amount(include_future=False)
+        portfolio = PortfolioFinancialService(contracts)
+        outstanding_amounts = portfolio.get_outstanding_amounts(include_future=False)
+        
+        candidates = []
+        for contract in portfolio.contracts:
+            outstanding = outstanding_amounts[contract.id]
+            if outstanding <= 0:
+                continue
+            
+            # التحقق من التأخير (افتراضياً بعد فترة السماح)
+            grace_days = getattr(contract, 'grace_period_days', 0) or 0
+            threshold_date = today - timedelta(days=grace_days)
+            if contract.start_date > threshold_date:
+                continue
             
-            if outstanding > 0:
-                # التحقق من التأخير (افتراضياً بعد فترة السماح)
-                grace_days = contract.grace_period_days
-                threshold_date = today - timedelta(days=grace_days)
-                
-                if contract.start_date <= threshold_date:
-                    # التحقق من عدم وجود إشعار تأخير حديث
-                    recent_overdue = cls.objects.filter(
-                        contract=contract,
-                        notification_type=NotificationType.PAYMENT_OVERDUE,
-                        created_at__gte=today - timedelta(days=7)
-                    ).exists()
-                    
-                    if not recent_overdue:
-                        cls.objects.create(
-                            notification_type=NotificationType.PAYMENT_OVERDUE,
-                            title=_('دفعة متأخرة'),
-                            message=_(
-                                f'يوجد مبلغ متأخر للعقد {contract.contract_number}: '
-                                f'{format_currency(outstanding)}'
-                            ),
-                            contract=contract,
-                            tenant=contract.tenant,
-                            priority=PriorityLevel.URGENT,
-                            due_date=today,
-                            action_url=f'/contracts/{contract.pk}/payments/'
-                        )
+            candidates.append(cls(
+                notification_type=NotificationType.PAYMENT_OVERDUE,
+                title=_('دفعة متأخرة'),
+                message=_(
+                    f'يوجد مبلغ متأخر للعقد {contract.contract_number}: '
+                    f'{format_currency(outstanding)}'
+                ),
+                contract=contract,
+                tenant=contract.tenant,
+                priority=PriorityLevel.URGENT,
+                due_date=today,
+                action_url=f'/contracts/{contract.pk}/payments/'
+            ))
+        
+        # عدم تكرار إشعار التأخير خلال 7 أيام
+        return cls._bulk_create_new(
+            NotificationType.PAYMENT_OVERDUE, candidates, today - timedelta(days=7)
+        )
+    
+    @classmethod
+    def generate_all_notifications(cls, days_before=30):
+        """
+        Run all automatic notification checks
+        تشغيل كل فحوصات الإشعارات التلقائية
+        
+        Returns:
+            dict: {notification_type: {'created': int, 'duration': float}}
+        """
+        import time
+        
+        checks = [
+            (NotificationType.PAYMENT_DUE, cls.check_payment_due, {}),
+            (NotificationType.PAYMENT_OVERDUE, cls.check_payment_overdue, {}),
+            (NotificationType.CONTRACT_EXPIRY, cls.check_contract_expiry, {'days_before': days_before}),
+        ]
+        
+        stats = {}
+        for notification_type, check, kwargs in checks:
+            started = time.monotonic()
+            created = check(**kwargs)
+            stats[str(notification_type)] = {
+                'created': created,
+                'duration': round(time.monotonic() - started, 3),
+            }
+        return stats
     
     @classmethod
     def create_system_notification(cls, title, message, priority=PriorityLevel.MEDIUM, user=None):
@@ -467,4 +536,16 @@ def notification_post_save(sender, instance, created, **kwargs):
     """Signal handler after notification is saved"""
     if created:
         # يمكن إضافة منطق لإرسال الإشعار عبر البريد الإلكتروني أو SMS
-        pass
\ No newline at end of file
+        pass
+
+
+# ========================================
+# Scheduled Task Entry Point
+# ========================================
+
+def generate_all_notifications(days_before=30):
+    """
+    نقطة الدخول للمهام المجدولة (ScheduledTask.task_function)
+    rent.models.notification_models.generate_all_notifications
+    """
+    return Notification.generate_all_notifications(days_before=days_before)
@@ -0,0 +1,270 @@
+# models/occupancy_models.py
+
+"""
+Unit Occupancy History Models
+سجل الإشغال الشهري للوحدات (صف لكل وحدة × شهر)
+
+أيام الإشغال والشغور والإيجار الفائت لكل وحدة في كل شهر، محسوبة من فترات
+العقود (rent.services.occupancy_service). المبنى والأرض مكرران في الصف
+فتُجمع سلسلة أي مبنى أو أرض باستعلام واحد على فهرس (building, month).
+
+يُعاد حساب صفوف الوحدة فقط بعد نجاح المعاملة عند:
+- تغيير تواريخ العقد أو حالته أو حذفه
+- إضافة وحدات للعقد أو إزالتها
+- إضافة وحدة أو تغيير مبناها أو إيجارها أو تعطيلها
+
+الأشهر تُحفظ حتى FUTURE_MONTHS بعد الشهر الحالي، وتُمد تلقائياً عند القراءة
+(ensure_history_through). إعادة البناء الكاملة: rebuild_occupancy_history.
+"""
+
+import logging
+
+from django.db import transaction
+from django.db.models import Max
+from django.db.models.signals import m2m_changed, pre_delete
+
+from .common_imports_models import *
+from .building_models import Building
+from .contract_models import Contract
+from .land_models import Land
+from .unit_models import Unit
+
+logger = logging.getLogger(__name__)
+
+# حقول الوحدة التي تغير صفوفها
+UNIT_OCCUPANCY_FIELDS = ('building_id', 'monthly_rent', 'is_active', 'is_deleted')
+
+
+# ========================================
+# UnitOccupancyMonth Model
+# ========================================
+
+class UnitOccupancyMonth(models.Model):
+    """
+    Unit Occupancy Month
+    إشغال وحدة خلال شهر
+    """
+
+    unit = models.ForeignKey(
+        Unit,
+        on_delete=models.CASCADE,
+        related_name='occupancy_months',
+        verbose_name=_('الوحدة')
+    )
+
+    building = models.ForeignKey(
+        Building,
+        on_delete=models.CASCADE,
+        related_name='occupancy_months',
+        verbose_name=_('المبنى')
+    )
+
+    land = models.ForeignKey(
+        Land,
+        on_delete=models.CASCADE,
+        related_name='occupancy_months',
+        verbose_name=_('الأرض')
+    )
+
+    month = models.DateField(_('الشهر'), help_text=_('أول يوم في الشهر'))
+
+    days = models.PositiveSmallIntegerField(
+        _('أيام الإتاحة'),
+        help_text=_('أيام الشهر بعد إضافة الوحدة')
+    )
+
+    occupied_days = models.PositiveSmallIntegerField(_('أيام الإشغال'))
+
+    vacant_days = models.PositiveSmallIntegerField(_('أيام الشغور'))
+
+    lost_rent = models.DecimalField(
+        _('الإيجار الفائت'),
+        max_digits=12,
+        decimal_places=2,
+        default=Decimal('0.00'),
+        help_text=_('أيام الشغور × الإيجار الشهري للوحدة')
+    )
+
+    # ========================================
+    # Metadata
+    # ========================================
+    class Meta:
+        db_table = 'unit_occupancy_months'
+        verbose_name = _('إشغال وحدة شهري')
+        verbose_name_plural = _('سجل الإشغال الشهري')
+        ordering = ['unit', 'month']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['unit', 'month'],
+                name='unique_unit_occupancy_month'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['month']),
+            models.Index(fields=['building', 'month']),
+            models.Index(fields=['land', 'month']),
+        ]
+
+    def __str__(self):
+        return f"{self.unit_id} / {self.month:%Y-%m}: {self.occupied_days}/{self.days}"
+
+    @property
+    def occupancy_rate(self):
+        if not self.days:
+            return Decimal('0.00')
+        return (Decimal(self.occupied_days) * 100 / self.days).quantize(Decimal('0.01'))
+
+    # ========================================
+    # Rebuild
+    # ========================================
+    @classmethod
+    def rebuild_for_units(cls, unit_ids=None, start_month=None, end_month=None):
+        """
+        إعادة حساب صفوف الوحدات (كلها افتراضياً) لنطاق أشهر
+
+        الوحدات المعطلة أو المحذوفة تُزال صفوفها. النطاق لا يتجاوز
+        default_horizon (نهاية واحدة لكل الوحدات)، وأي صفوف محفوظة بعده
+        للوحدات المعاد حسابها تُحذف.
+
+        Returns:
+            int: عدد الصفوف
+        """
+        from rent.services.occupancy_service import default_horizon, load_timelines, monthly_rows
+
+        horizon = default_horizon()
+        end_month = min(end_month, horizon) if end_month else horizon
+
+        timelines = load_timelines(unit_ids)
+        rows = [
+            cls(
+                unit_id=timeline.unit_id,
+                building_id=timeline.building_id,
+                land_id=timeline.land_id,
+                **values
+            )
+            for timeline in timelines.values()
+            for values in monthly_rows(timeline, start_month, end_month)
+        ]
+
+        existing = cls.objects.all()
+        if unit_ids is not None:
+            existing = existing.filter(unit_id__in=unit_ids)
+        if start_month:
+            existing = existing.filter(month__gte=start_month)
+        if end_month < horizon:
+            existing = existing.filter(month__lt=end_month)
+
+        with transaction.atomic():
+            existing.delete()
+            cls.objects.bulk_create(rows, batch_size=1000)
+        return len(rows)
+
+    @classmethod
+    def ensure_history_through(cls, month):
+        """
+        حساب الوحدات التي ليس لها صفوف حتى الشهر المطلوب (وحدات قديمة قبل
+        إنشاء الجدول، أو مرور الوقت بعد آخر شهر محفوظ)
+
+        الشهر المطلوب لا يتجاوز آخر شهر قبل default_horizon - الأشهر البعيدة
+        لا تُحفظ (تُقرأ فارغة).
+
+        Returns:
+            int: عدد الوحدات التي أُعيد حسابها
+        """
+        from rent.services.occupancy_service import default_horizon
+
+        horizon = default_horizon()
+        month = min(month.replace(day=1), horizon - relativedelta(months=1))
+        lagging = set(
+            cls.objects.values('unit').annotate(last=Max('month')).filter(
+                last__lt=month
+            ).values_list('unit', flat=True)
+        )
+        lagging.update(
+            Unit.objects.filter(is_active=True, is_deleted=False).exclude(
+                pk__in=cls.objects.values('unit')
+            ).values_list('pk', flat=True)
+        )
+        if not lagging:
+            return 0
+
+        cls.rebuild_for_units(lagging)
+        return len(lagging)
+
+
+# ========================================
+# Invalidation
+# ========================================
+
+def schedule_occupancy_rebuild(unit_ids):
+    """جدولة إعادة حساب إشغال الوحدات بعد نجاح المعاملة الحالية"""
+    unit_ids = {pk for pk in unit_ids if pk}
+    if not unit_ids:
+        return
+
+    def rebuild():
+        try:
+            UnitOccupancyMonth.rebuild_for_units(unit_ids)
+        except Exception as e:
+            logger.error(f'Error rebuilding occupancy for units {sorted(unit_ids)}: {e}', exc_info=True)
+
+    transaction.on_commit(rebuild)
+
+
+# ========================================
+# Signals
+# ========================================
+
+@receiver(post_save, sender=Contract)
+def contract_occupancy_post_save(sender, instance, created, update_fields=None, **kwargs):
+    """التواريخ أو الحالة (FINANCIAL_FIELDS) أو الحذف الناعم"""
+    if created:
+        # الوحدات تُضاف بعد الحفظ (m2m_changed)
+        return
+    changed = getattr(instance, '_financial_values_changed', True)
+    if update_fields is not None:
+        changed = changed or 'is_deleted' in update_fields
+    if changed:
+        schedule_occupancy_rebuild(instance.units.values_list('pk', flat=True))
+
+
+@receiver(pre_delete, sender=Contract)
+def contract_occupancy_pre_delete(sender, instance, **kwargs):
+    # جدول الربط يُحذف مع العقد - الوحدات تُقرأ قبل الحذف
+    schedule_occupancy_rebuild(list(instance.units.values_list('pk', flat=True)))
+
+
+@receiver(m2m_changed, sender=Contract.units.through)
+def contract_units_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action in ('post_add', 'post_remove'):
+        unit_ids = [instance.pk] if reverse else pk_set or []
+    elif action == 'pre_clear':
+        unit_ids = (
+            [instance.pk] if reverse
+            else list(instance.units.values_list('pk', flat=True))
+        )
+    else:
+        return
+    schedule_occupancy_rebuild(unit_ids)
+
+
+@receiver(pre_save, sender=Unit)
+def unit_occupancy_pre_save(sender, instance, **kwargs):
+    if instance.pk is None:
+        instance._occupancy_values_changed = True
+        return
+
+    from audit_log.tracker import get_original_values
+
+    original = get_original_values(instance, *UNIT_OCCUPANCY_FIELDS)
+    if original is None:
+        original = Unit.objects.filter(pk=instance.pk).values(*UNIT_OCCUPANCY_FIELDS).first()
+    instance._occupancy_values_changed = original is None or any(
+        original[field] != getattr(instance, field) for field in UNIT_OCCUPANCY_FIELDS
+    )
+
+
+@receiver(post_save, sender=Unit)
+def unit_occupancy_post_save(sender, instance, created, **kwargs):
+    if created or getattr(instance, '_occupancy_values_changed', True):
+        schedule_occupancy_rebuild([instance.pk])
@@ -0,0 +1,237 @@
+# models/receipt_allocation_models.py
+
+"""
+Receipt Allocation Models
+دفتر توزيع سندات القبض على أقساط العقد
+
+توزيع FIFO (نفس PaymentDistributor): السندات المرحلة بترتيب
+(تاريخ السند، المعرف) تسدد الأقساط بالترتيب. يُحفظ صف لكل
+(سند، قسط) بالمبلغ المخصص والمسدد قبله والمتبقي بعده.
+
+يُعاد بناء دفتر العقد مع جدول الأقساط (ContractPeriod):
+- عند ترحيل أو إلغاء أو حذف سند مرحل
+- عند إعادة توليد الجدول (تعديل مطبق أو تغيير العقد)
+
+فتصبح طباعة السند وسجل سداد القسط والمطابقة قراءات مباشرة على فهرس.
+"""
+
+from .common_imports_models import *
+from .contract_models import Contract
+from .contract_period_models import ContractPeriod
+from .receipt_models import Receipt, ReceiptStatus
+
+
+# ========================================
+# ReceiptAllocation Model
+# ========================================
+
+class ReceiptAllocation(models.Model):
+    """
+    Receipt Allocation
+    المبلغ المخصص من سند قبض لقسط من أقساط العقد
+    """
+
+    # ========================================
+    # Relationships
+    # ========================================
+    receipt = models.ForeignKey(
+        Receipt,
+        on_delete=models.CASCADE,
+        related_name='allocations',
+        verbose_name=_('السند')
+    )
+
+    contract = models.ForeignKey(
+        Contract,
+        on_delete=models.CASCADE,
+        related_name='receipt_allocations',
+        verbose_name=_('العقد')
+    )
+
+    period = models.ForeignKey(
+        ContractPeriod,
+        on_delete=models.CASCADE,
+        related_name='allocations',
+        verbose_name=_('القسط')
+    )
+
+    period_number = models.PositiveIntegerField(_('رقم القسط'))
+
+    # ========================================
+    # Amounts
+    # ========================================
+    amount = models.DecimalField(
+        _('المبلغ المخصص'),
+        max_digits=14,
+        decimal_places=2
+    )
+
+    paid_before = models.DecimalField(
+        _('المسدد من القسط قبل السند'),
+        max_digits=14,
+        decimal_places=2,
+        default=Decimal('0.00')
+    )
+
+    remaining_after = models.DecimalField(
+        _('المتبقي من القسط بعد السند'),
+        max_digits=14,
+        decimal_places=2,
+        default=Decimal('0.00')
+    )
+
+    created_at = models.DateTimeField(
+        _('تاريخ التوزيع'),
+        default=timezone.now
+    )
+
+    # ========================================
+    # Metadata
+    # ========================================
+    class Meta:
+        db_table = 'receipt_allocations'
+        verbose_name = _('توزيع سند')
+        verbose_name_plural = _('توزيعات السندات')
+        ordering = ['receipt', 'period_number']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['receipt', 'period_number'],
+                name='unique_receipt_allocation_period'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['contract', 'period_number']),
+        ]
+
+    def __str__(self):
+        return f"سند {self.receipt_id} ← قسط {self.period_number}: {self.amount}"
+
+    @property
+    def is_full(self):
+        """هل اكتمل سداد القسط بهذا السند"""
+        return self.remaining_after <= 0
+
+    # ========================================
+    # Allocation (FIFO)
+    # ========================================
+    @classmethod
+    def allocate(cls, periods, receipts):
+        """
+        توزيع السندات على الأقساط بالترتيب (غير محفوظة)
+
+        Args:
+            periods: أقساط العقد مرتبة حسب period_number
+            receipts: السندات مرتبة حسب (receipt_date, id)
+
+        Returns:
+            list[ReceiptAllocation] - الفائض بعد آخر قسط لا يُخصص
+        """
+        allocations = []
+        index = 0
+        paid_in_period = Decimal('0')
+        now = timezone.now()
+
+        for receipt in receipts:
+            left = receipt.amount or Decimal('0')
+            while left > 0 and index < len(periods):
+                period = periods[index]
+                room = period.due_amount - paid_in_period
+                if room <= 0:
+                    index += 1
+                    paid_in_period = Decimal('0')
+                    continue
+
+                amount = min(left, room)
+                allocations.append(cls(
+                    receipt=receipt,
+                    contract_id=period.contract_id,
+                    period=period,
+                    period_number=period.period_number,
+                    amount=amount,
+                    paid_before=paid_in_period,
+                    remaining_after=room - amount,
+                    created_at=now,
+                ))
+                left -= amount
+                paid_in_period += amount
+                if paid_in_period >= period.due_amount:
+                    index += 1
+                    paid_in_period = Decimal('0')
+
+        return allocations
+
+    @staticmethod
+    def get_posted_receipts(contracts):
+        """السندات المرحلة لمجموعة عقود بترتيب FIFO {contract_id: [Receipt]}"""
+        contract_ids = [getattr(c, 'pk', c) for c in contracts]
+        receipts = {contract_id: [] for contract_id in contract_ids}
+        for receipt in Receipt.objects.filter(
+            contract_id__in=contract_ids,
+            status=ReceiptStatus.POSTED,
+            is_deleted=False,
+        ).order_by('contract_id', 'receipt_date', 'id').only(
+            'id', 'contract_id', 'receipt_date', 'amount'
+        ):
+            receipts[receipt.contract_id].append(receipt)
+        return receipts
+
+    @classmethod
+    def rebuild_for_contracts(cls, periods_by_contract, receipts=None):
+        """
+        إعادة بناء دفتر التوزيع لعدة عقود (بعد حفظ أقساطها)
+
+        Args:
+            periods_by_contract: {contract_id: [ContractPeriod محفوظة]}
+            receipts: نتيجة get_posted_receipts إذا كانت محمّلة
+
+        Returns:
+            int: عدد صفوف التوزيع
+        """
+        if receipts is None:
+            receipts = cls.get_posted_receipts(periods_by_contract.keys())
+        allocations = []
+        for contract_id, periods in periods_by_contract.items():
+            allocations.extend(cls.allocate(periods, receipts[contract_id]))
+
+        cls.objects.filter(contract_id__in=periods_by_contract.keys()).delete()
+        cls.objects.bulk_create(allocations, batch_size=1000)
+        return len(allocations)
+
+    # ========================================
+    # Reading
+    # ========================================
+    @classmethod
+    def for_receipt(cls, receipt):
+        """
+        توزيع السند على الأقساط
+
+        السند المرحل: من الدفتر المحفوظ (يُولّد جدول العقد إذا لم يكن موجوداً).
+        غير المرحل (مسودة): معاينة غير محفوظة كأنه رُحّل بعد السندات المرحلة قبله.
+
+        Returns:
+            list[ReceiptAllocation] مع period محمّل
+        """
+        if not receipt.contract_id:
+            return []
+
+        if receipt.status == ReceiptStatus.POSTED and not receipt.is_deleted:
+            if not ContractPeriod.objects.filter(contract_id=receipt.contract_id).exists():
+                ContractPeriod.regenerate_for_contract(receipt.contract)
+            return list(
+                receipt.allocations.select_related('period').order_by('period_number')
+            )
+
+        periods = list(
+            ContractPeriod.objects.filter(contract_id=receipt.contract_id).order_by('period_number')
+        )
+        if not periods:
+            periods = ContractPeriod.regenerate_for_contract(receipt.contract)
+
+        earlier = [
+            r for r in cls.get_posted_receipts([receipt.contract_id])[receipt.contract_id]
+            if (r.receipt_date, r.pk) < (receipt.receipt_date, receipt.pk or 0)
+        ]
+        return [
+            allocation for allocation in cls.allocate(periods, earlier + [receipt])
+            if allocation.receipt is receipt
+        ]
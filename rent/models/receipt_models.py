@@ -7,6 +7,7 @@ Receipt/Payment Models
 
 from .common_imports_models import *
 from .contract_models import Contract
+from audit_log.tracker import get_original_values
 
 
 # ========================================
@@ -297,15 +298,28 @@ class Receipt(TimeStampedModel, UserTrackingModel, SoftDeleteModel):
     
     def save(self, *args, **kwargs):
         """Override save"""
+        from .revenue_rollup_models import RECEIPT_ROLLUP_FIELDS
+        
         is_new = self.pk is None
         old_status = None
+        old_values = None
         
         if not is_new:
-            try:
-                old_receipt = Receipt.objects.get(pk=self.pk)
-                old_status = old_receipt.status
-            except Receipt.DoesNotExist:
-                pass
+            original = get_original_values(self, *RECEIPT_ROLLUP_FIELDS)
+            if original is not None:
+                # القيم كما حُمّلت من قاعدة البيانات (بدون استعلام إضافي)
+                old_values = {field: original[field] for field in RECEIPT_ROLLUP_FIELDS}
+            else:
+                old_values = Receipt.objects.filter(pk=self.pk).values(
+                    *RECEIPT_ROLLUP_FIELDS
+                ).first()
+            if old_values:
+                old_status = old_values['status']
+        
+        # تُستخدم في receipt_post_save لتحديد الحاجة لتحديث حالة سداد الأقساط
+        self._old_status = old_status
+        # وتحديث إجماليات الإيرادات الشهرية
+        self._old_rollup_values = old_values
         
         super().save(*args, **kwargs)
         
@@ -489,6 +503,37 @@ def receipt_post_save(sender, instance, created, **kwargs):
     if instance.status == ReceiptStatus.POSTED:
         # يمكن إنشاء إشعار للمستخدم
         pass
+    
+    # النتائج المالية المحفوظة بين الطلبات (الكشف يشمل السندات المحصلة أيضاً)
+    from rent.services.financial_cache import bump_contract_version
+    bump_contract_version(instance.contract_id)
+
+    # إجماليات الإيرادات الشهرية (طرح المساهمة القديمة وإضافة الجديدة)
+    from .revenue_rollup_models import track_receipt_change
+    track_receipt_change(instance, getattr(instance, '_old_rollup_values', None))
+    instance._old_rollup_values = None
+
+    # تحديث حالة سداد الأقساط عند الترحيل أو الإلغاء أو تعديل سند مرحل
+    old_status = getattr(instance, '_old_status', None)
+    if ReceiptStatus.POSTED in (instance.status, old_status):
+        from .contract_period_models import schedule_period_rebuild
+        # الجدول نفسه لم يتغير - تحديث حالة السداد فقط
+        schedule_period_rebuild(instance.contract_id, payments_only=True)
+
+
+@receiver(post_delete, sender=Receipt)
+def receipt_post_delete(sender, instance, **kwargs):
+    """Signal handler after receipt is deleted"""
+    from rent.services.financial_cache import bump_contract_version
+    bump_contract_version(instance.contract_id)
+
+    from .revenue_rollup_models import track_receipt_delete
+    track_receipt_delete(instance)
+
+    # حذف سند مرحل: إعادة توزيع السندات الباقية على الأقساط
+    if instance.status == ReceiptStatus.POSTED:
+        from .contract_period_models import schedule_period_rebuild
+        schedule_period_rebuild(instance.contract_id, payments_only=True)
 
 
 @receiver(pre_save, sender=Receipt)
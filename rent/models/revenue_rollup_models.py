@@ -0,0 +1,335 @@
+# models/revenue_rollup_models.py
+
+"""
+Revenue Monthly Rollup Models
+إجماليات السندات الشهرية (صف لكل شهر × مبنى × طريقة دفع × حالة)
+
+تقرير الإيرادات ورسومه تقرأ هذا الجدول بدلاً من تجميع كل السندات بـ
+TruncMonth في كل طلب، فيبقى زمن التقرير ثابتاً مهما طالت الفترة ويمكن
+تفصيله حسب المبنى.
+
+يُحدَّث تزايدياً (F + delta) عند حفظ أو حذف أي سند: تُطرح مساهمته القديمة
+من صفها وتُضاف الجديدة (ترحيل، إلغاء، حذف ناعم، تغيير المبلغ أو التاريخ).
+السندات المحذوفة (is_deleted) لا تُحسب. المبنى هو مبنى أول وحدة في العقد
+(نفس PropertyContextManager)، وتُنقل سندات العقد بين المباني عند تغيير
+وحداته (m2m_changed).
+
+العمليات التي لا ترسل الإشارات (QuerySet.update، bulk_create، الاستعادة)
+تُصحح بأمر backfill_revenue_rollup.
+"""
+
+import logging
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import TruncMonth
+
+from .common_imports_models import *
+from django.db.models.signals import m2m_changed
+
+from .building_models import Building
+from .contract_models import Contract
+from .unit_models import Unit
+
+logger = logging.getLogger(__name__)
+
+# الحقول التي تحدد صف السند ومساهمته
+RECEIPT_ROLLUP_FIELDS = (
+    'receipt_date', 'contract_id', 'payment_method', 'status', 'is_deleted', 'amount',
+)
+
+
+def contract_building_id(contract_id):
+    """مبنى أول وحدة في العقد (بترتيب Unit الافتراضي)"""
+    if not contract_id:
+        return None
+    return Unit.objects.filter(contracts=contract_id).order_by(
+        *Unit._meta.ordering
+    ).values_list('building_id', flat=True).first()
+
+
+def receipt_building(contract_field='contract_id'):
+    """نفس contract_building_id كتعبير Subquery لاستعلامات السندات"""
+    return Subquery(
+        Unit.objects.filter(
+            contracts=OuterRef(contract_field)
+        ).order_by(*Unit._meta.ordering).values('building_id')[:1]
+    )
+
+
+# ========================================
+# RevenueMonthlyRollup Model
+# ========================================
+
+class RevenueMonthlyRollup(models.Model):
+    """
+    Revenue Monthly Rollup
+    مجموع ومبلغ السندات لكل (شهر، مبنى، طريقة دفع، حالة)
+    """
+
+    month = models.DateField(_('الشهر'), help_text=_('أول يوم في الشهر'))
+
+    building = models.ForeignKey(
+        Building,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='revenue_rollups',
+        verbose_name=_('المبنى')
+    )
+
+    payment_method = models.CharField(_('طريقة الدفع'), max_length=20)
+
+    status = models.CharField(_('الحالة'), max_length=20)
+
+    amount = models.DecimalField(
+        _('المبلغ'),
+        max_digits=16,
+        decimal_places=2,
+        default=Decimal('0.00')
+    )
+
+    receipts_count = models.IntegerField(_('عدد السندات'), default=0)
+
+    updated_at = models.DateTimeField(_('آخر تحديث'), auto_now=True)
+
+    # ========================================
+    # Metadata
+    # ========================================
+    class Meta:
+        db_table = 'revenue_monthly_rollups'
+        verbose_name = _('إجمالي إيرادات شهري')
+        verbose_name_plural = _('إجماليات الإيرادات الشهرية')
+        ordering = ['month']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['month', 'building', 'payment_method', 'status'],
+                condition=Q(building__isnull=False),
+                name='unique_revenue_rollup_bucket'
+            ),
+            # NULL لا يتكرر في UniqueConstraint - قيد منفصل للسندات بدون مبنى
+            models.UniqueConstraint(
+                fields=['month', 'payment_method', 'status'],
+                condition=Q(building__isnull=True),
+                name='unique_revenue_rollup_bucket_no_building'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['status', 'month']),
+        ]
+
+    def __str__(self):
+        return f"{self.month:%Y-%m} / {self.building_id or '-'} / {self.payment_method} / {self.status}: {self.amount}"
+
+    # ========================================
+    # Incremental Updates
+    # ========================================
+    @classmethod
+    def _bucket(cls, values):
+        """مفتاح صف السند من قيمه أو None إذا لا يُحسب"""
+        if not values or values.get('is_deleted') or not values.get('receipt_date'):
+            return None
+        return (
+            values['receipt_date'].replace(day=1),
+            contract_building_id(values.get('contract_id')),
+            values.get('payment_method') or '',
+            values.get('status') or '',
+        )
+
+    @classmethod
+    def _apply(cls, bucket, amount, count):
+        month, building_id, payment_method, status = bucket
+        lookup = {
+            'month': month,
+            'building_id': building_id,
+            'payment_method': payment_method,
+            'status': status,
+        }
+        updated = cls.objects.filter(**lookup).update(
+            amount=F('amount') + amount,
+            receipts_count=F('receipts_count') + count,
+            updated_at=timezone.now(),
+        )
+        if updated:
+            return
+
+        try:
+            with transaction.atomic():
+                cls.objects.create(amount=amount, receipts_count=count, **lookup)
+        except IntegrityError:
+            # أُنشئ الصف من طلب آخر في نفس اللحظة
+            cls.objects.filter(**lookup).update(
+                amount=F('amount') + amount,
+                receipts_count=F('receipts_count') + count,
+                updated_at=timezone.now(),
+            )
+
+    @classmethod
+    def record_receipt_change(cls, old_values, new_values):
+        """
+        تحديث الإجماليات لتغيير سند
+
+        Args:
+            old_values: قيم RECEIPT_ROLLUP_FIELDS قبل الحفظ (None للسند الجديد)
+            new_values: القيم بعد الحفظ (None للسند المحذوف)
+        """
+        old_bucket = cls._bucket(old_values)
+        new_bucket = cls._bucket(new_values)
+        old_amount = (old_values or {}).get('amount') or Decimal('0')
+        new_amount = (new_values or {}).get('amount') or Decimal('0')
+
+        if old_bucket == new_bucket:
+            if old_bucket is not None and old_amount != new_amount:
+                cls._apply(old_bucket, Decimal(new_amount) - Decimal(old_amount), 0)
+            return
+
+        if old_bucket is not None:
+            cls._apply(old_bucket, -Decimal(old_amount), -1)
+        if new_bucket is not None:
+            cls._apply(new_bucket, Decimal(new_amount), 1)
+
+    @classmethod
+    def move_contract_receipts(cls, contract_id, old_building_id, new_building_id):
+        """
+        نقل مساهمة سندات العقد بين المباني (تغيير أول وحدة في العقد)
+        """
+        from .receipt_models import Receipt
+
+        if old_building_id == new_building_id:
+            return
+
+        for row in Receipt.objects.filter(contract_id=contract_id, is_deleted=False).annotate(
+            month=TruncMonth('receipt_date'),
+        ).values('month', 'payment_method', 'status').annotate(
+            total=Sum('amount'),
+            count=Count('id'),
+        ).order_by():
+            amount = row['total'] or Decimal('0')
+            key = (row['payment_method'] or '', row['status'] or '')
+            cls._apply((row['month'], old_building_id) + key, -amount, -row['count'])
+            cls._apply((row['month'], new_building_id) + key, amount, row['count'])
+
+    # ========================================
+    # Backfill
+    # ========================================
+    @classmethod
+    def aggregate_receipts(cls, start_month=None, end_month=None):
+        """
+        تجميع السندات مباشرة (نفس صفوف الجدول) - للبناء والتحقق
+
+        Returns:
+            QuerySet من dicts: month, building_id, payment_method, status, amount, receipts_count
+        """
+        from .receipt_models import Receipt
+
+        receipts = Receipt.objects.filter(is_deleted=False)
+        if start_month:
+            receipts = receipts.filter(receipt_date__gte=start_month)
+        if end_month:
+            receipts = receipts.filter(receipt_date__lt=end_month)
+
+        return receipts.annotate(
+            month=TruncMonth('receipt_date'),
+            building_id=receipt_building(),
+        ).values('month', 'building_id', 'payment_method', 'status').annotate(
+            total=Sum('amount'),
+            count=Count('id'),
+        ).order_by('month')
+
+    @classmethod
+    def rebuild(cls, start_month=None, end_month=None):
+        """
+        إعادة بناء الإجماليات من السندات (كلها أو نطاق أشهر)
+
+        Returns:
+            int: عدد الصفوف
+        """
+        rows = [
+            cls(
+                month=row['month'],
+                building_id=row['building_id'],
+                payment_method=row['payment_method'] or '',
+                status=row['status'] or '',
+                amount=row['total'] or Decimal('0'),
+                receipts_count=row['count'],
+            )
+            for row in cls.aggregate_receipts(start_month, end_month)
+        ]
+
+        existing = cls.objects.all()
+        if start_month:
+            existing = existing.filter(month__gte=start_month)
+        if end_month:
+            existing = existing.filter(month__lt=end_month)
+
+        with transaction.atomic():
+            existing.delete()
+            cls.objects.bulk_create(rows, batch_size=1000)
+        return len(rows)
+
+    # ========================================
+    # Reading
+    # ========================================
+    @classmethod
+    def for_period(cls, start_month, end_month=None, status='posted', building=None):
+        """صفوف نطاق أشهر [start_month, end_month) لحالة ومبنى اختياري"""
+        rows = cls.objects.filter(month__gte=start_month, status=status)
+        if end_month:
+            rows = rows.filter(month__lt=end_month)
+        if building is not None:
+            rows = rows.filter(building=building)
+        return rows
+
+
+# ========================================
+# Signals
+# ========================================
+
+def _receipt_values(instance):
+    return {field: getattr(instance, field) for field in RECEIPT_ROLLUP_FIELDS}
+
+
+def track_receipt_change(instance, old_values):
+    """استدعاء من Receipt.save بعد الحفظ"""
+    try:
+        RevenueMonthlyRollup.record_receipt_change(old_values, _receipt_values(instance))
+    except Exception as e:
+        logger.error(f'Error updating revenue rollup for receipt {instance.pk}: {e}', exc_info=True)
+
+
+def track_receipt_delete(instance):
+    try:
+        RevenueMonthlyRollup.record_receipt_change(_receipt_values(instance), None)
+    except Exception as e:
+        logger.error(f'Error updating revenue rollup for deleted receipt {instance.pk}: {e}', exc_info=True)
+
+
+@receiver(m2m_changed, sender=Contract.units.through)
+def contract_units_rollup_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """المبنى المنسوب لسندات العقد قبل تغيير الوحدات وبعده"""
+    if action not in ('pre_add', 'pre_remove', 'pre_clear', 'post_add', 'post_remove', 'post_clear'):
+        return
+
+    if not reverse:
+        contract_ids = [instance.pk]
+    elif action.endswith('clear'):
+        contract_ids = (
+            instance._rollup_contract_ids if action == 'post_clear'
+            else list(instance.contracts.values_list('pk', flat=True))
+        )
+    else:
+        contract_ids = list(pk_set or [])
+
+    if action.startswith('pre_'):
+        instance._rollup_contract_ids = contract_ids
+        instance._rollup_buildings = {pk: contract_building_id(pk) for pk in contract_ids}
+        return
+
+    old_buildings = getattr(instance, '_rollup_buildings', {})
+    for contract_id in contract_ids:
+        try:
+            RevenueMonthlyRollup.move_contract_receipts(
+                contract_id, old_buildings.get(contract_id), contract_building_id(contract_id)
+            )
+        except Exception as e:
+            logger.error(f'Error moving revenue rollup for contract {contract_id}: {e}', exc_info=True)
@@ -332,6 +332,10 @@ class ScheduledTask(TimeStampedModel):
                 self.average_run_time = self.total_run_time / total_executions
         
         self.calculate_next_run()
+        self.save(update_fields=[
+            'last_run', 'last_status', 'success_count',
+            'total_run_time', 'average_run_time', 'updated_at',
+        ])
     
     def mark_execution_failed(self):
         """
@@ -342,6 +346,7 @@ class ScheduledTask(TimeStampedModel):
         self.last_status = TaskStatus.FAILED
         self.failure_count += 1
         self.calculate_next_run()
+        self.save(update_fields=['last_run', 'last_status', 'failure_count', 'updated_at'])
 
 
 # ========================================
@@ -323,16 +323,11 @@ class Tenant(TimeStampedModel, UserTrackingModel, SoftDeleteModel):
         total = Decimal('0')
 
         try:
-            from rent.services.contract_financial_service import ContractFinancialService
-            for contract in self.get_active_contracts():
-                try:
-                    service = ContractFinancialService(contract)
-                    outstanding = service.get_outstanding_amount()
-                    if outstanding:
-                        total += outstanding
-                except Exception:
-                    # في حالة فشل حساب عقد معين، نستمر مع البقية
-                    pass
+            from rent.services.portfolio_financial_service import PortfolioFinancialService
+            portfolio = PortfolioFinancialService(self.get_active_contracts())
+            for outstanding in portfolio.get_outstanding_amounts().values():
+                if outstanding:
+                    total += outstanding
         except ImportError:
             # fallback: حساب مباشر من المدفوعات والمستحقات
             try:
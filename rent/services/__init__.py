@@ -7,6 +7,7 @@ from .contract_financial_service import (
     validate_contract_modification,
     generate_tenants_report,
 )
+from .portfolio_financial_service import PortfolioFinancialService
 
 __all__ = [
     'ContractFinancialService',
@@ -14,6 +15,7 @@ __all__ = [
     'calculate_periods_with_payments',
     'validate_contract_modification',
     'generate_tenants_report',
+    'PortfolioFinancialService',
 ]
 
 from .unit_availability_service import(
@@ -0,0 +1,357 @@
+# services/backup_restore_service.py
+
+"""
+استعادة نسخ JSON بسرعة (بديل loaddata للنسخ الكبيرة)
+
+loaddata يحفظ كل كائن بـ save() فتعمل إشارات التدقيق (SELECT + INSERT لكل
+سجل) وإشارات العقود والوحدات والسندات. هنا:
+- قراءة الملف (json أو json.gz) بشكل متدفق، سجلاً بعد سجل
+- إدراج كل نموذج بـ bulk_create على دفعات - بنفس ترتيب الاعتماديات في الملف
+- bulk_create لا يرسل pre_save/post_save فلا تعمل إشارات العقود والسندات،
+  والتدقيق وتتبع القيم الأصلية موقوفان (audit_suspended)
+- الإدراج خام (raw مثل loaddata): القيم المحفوظة تُكتب كما هي، فلا تُستبدل
+  created_at/updated_at (auto_now/auto_now_add) بوقت الاستعادة
+- كل الاستعادة في معاملة واحدة ثم إعادة ضبط التسلسلات (sequences)
+
+السجلات الموجودة بنفس المفتاح تُحدّث (نفس سلوك loaddata).
+النسخ التزايدية تُستعاد كسلسلة (الكاملة ثم التزايدية بالترتيب) وسجلات الحذف
+فيها (rent.backuptombstone) تحذف السجلات المقابلة بدلاً من إدراجها.
+"""
+
+import gzip
+import json
+import logging
+import os
+
+from django.apps import apps
+from django.core import serializers
+from django.core.management.color import no_style
+from django.core.serializers.base import DeserializationError
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models.query import QuerySet
+from django.utils import timezone
+
+from audit_log.tracker import audit_suspended
+from rent.services.backup_service import TOMBSTONE_LABEL
+from rent.services.financial_cache import clear_financial_cache
+
+logger = logging.getLogger(__name__)
+
+RESTORE_BATCH_SIZE = 1000
+
+READ_CHUNK_SIZE = 64 * 1024
+
+
+class RawInsertQuerySet(QuerySet):
+    """
+    bulk_create بإدراج خام: قيم الحقول تُكتب كما هي دون pre_save
+    (auto_now و auto_now_add لا يستبدلان التواريخ المستعادة)
+    """
+
+    def _insert(self, *args, **kwargs):
+        kwargs['raw'] = True
+        return super()._insert(*args, **kwargs)
+
+
+def open_backup_file(file_path):
+    """فتح ملف النسخة كنص (مع فك ضغط gzip حسب الامتداد)"""
+    if file_path.endswith('.gz'):
+        return gzip.open(file_path, 'rt', encoding='utf-8')
+    return open(file_path, 'r', encoding='utf-8')
+
+
+def iter_json_array(stream, chunk_size=READ_CHUNK_SIZE):
+    """
+    قراءة مصفوفة JSON عنصراً بعد عنصر دون تحميل الملف كاملاً
+
+    يُقرأ الملف على أجزاء ويُفك كل عنصر بـ JSONDecoder.raw_decode
+    (المكتبة القياسية فقط).
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    pos = 0
+    eof = False
+
+    def fill():
+        nonlocal buffer, pos, eof
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            eof = True
+            return
+        buffer = buffer[pos:] + chunk
+        pos = 0
+
+    def skip(chars):
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos] in chars:
+                pos += 1
+            if pos < len(buffer) or eof:
+                return
+            fill()
+
+    skip(' \t\r\n')
+    if pos >= len(buffer) or buffer[pos] != '[':
+        raise DeserializationError('ملف النسخة ليس مصفوفة JSON.')
+    pos += 1
+
+    while True:
+        skip(' \t\r\n,')
+        if pos >= len(buffer):
+            raise DeserializationError('نهاية غير متوقعة لملف النسخة.')
+        if buffer[pos] == ']':
+            return
+
+        try:
+            item, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            # العنصر لم يكتمل بعد في المخزن
+            fill()
+            continue
+
+        # العنصر قد ينتهي عند حد الجزء (قيمة غير مكتملة لكنها صالحة)
+        if end >= len(buffer) and not eof:
+            fill()
+            continue
+
+        pos = end
+        yield item
+
+
+class JsonRestoreEngine:
+    """
+    استعادة نسخة JSON بـ bulk_create
+
+    Usage:
+        stats = JsonRestoreEngine().restore('backups/backup_x.json.gz')
+        # {'rent.tenant': 1200, 'rent.contract': 950, ...}
+    """
+
+    def __init__(self, batch_size=RESTORE_BATCH_SIZE, using=DEFAULT_DB_ALIAS):
+        self.batch_size = batch_size
+        self.using = using
+        self.stats = {}
+        self.deleted = {}
+        self._natural_keys = {}
+        self._models = []
+
+    # ========================================
+    # Natural Keys
+    # ========================================
+    def _resolve_natural_key(self, model, value, to_field=None):
+        """
+        تحويل مفتاح طبيعي (مثل ["admin"] للمستخدم) إلى قيمة المفتاح
+        مع cache حتى لا يتكرر الاستعلام لكل سجل
+        """
+        key = (model, tuple(value), to_field)
+        if key not in self._natural_keys:
+            obj = model._default_manager.db_manager(self.using).get_by_natural_key(*value)
+            self._natural_keys[key] = getattr(obj, to_field) if to_field else obj.pk
+        return self._natural_keys[key]
+
+    def _resolve_relations(self, model, fields):
+        """استبدال المفاتيح الطبيعية في الحقول المرتبطة بقيم المفاتيح قبل فك السجل"""
+        for field in model._meta.get_fields():
+            if not field.concrete or not field.is_relation or field.name not in fields:
+                continue
+            related = field.remote_field.model
+            if not hasattr(related._default_manager, 'get_by_natural_key'):
+                continue
+
+            value = fields[field.name]
+            if field.many_to_many:
+                if value and isinstance(value[0], (list, tuple)):
+                    fields[field.name] = [self._resolve_natural_key(related, v) for v in value]
+            elif isinstance(value, (list, tuple)):
+                fields[field.name] = self._resolve_natural_key(
+                    related, value, field.remote_field.field_name
+                )
+
+    # ========================================
+    # Loading
+    # ========================================
+    def _apply_tombstones(self, records):
+        """حذف السجلات المحذوفة في المصدر (من نسخة تزايدية)"""
+        pks_by_label = {}
+        for record in records:
+            fields = record['fields']
+            pks_by_label.setdefault(fields['model_label'], []).append(fields['object_pk'])
+
+        for label, pks in pks_by_label.items():
+            try:
+                model = apps.get_model(label)
+            except LookupError:
+                continue
+            pk_field = model._meta.pk
+            pks = [pk_field.to_python(pk) for pk in pks]
+            deleted, _ = model._base_manager.db_manager(self.using).filter(pk__in=pks).delete()
+            self.deleted[label] = self.deleted.get(label, 0) + deleted
+
+    def _flush(self, model, records):
+        if not records:
+            return
+
+        if model._meta.label_lower == TOMBSTONE_LABEL:
+            self._apply_tombstones(records)
+            return
+
+        for record in records:
+            self._resolve_relations(model, record['fields'])
+
+        deserialized = list(serializers.deserialize(
+            'python', records, using=self.using, ignorenonexistent=True
+        ))
+        objects = [item.object for item in deserialized]
+
+        self._fill_missing_timestamps(model, objects)
+
+        pk_name = model._meta.pk.name
+        existing = [obj for obj in objects if obj.pk is not None]
+        new = [obj for obj in objects if obj.pk is None]
+        manager = RawInsertQuerySet(model=model, using=self.using)
+
+        if existing:
+            update_fields = [
+                f.name for f in model._meta.concrete_fields if not f.primary_key
+            ]
+            if update_fields:
+                manager.bulk_create(
+                    existing,
+                    batch_size=self.batch_size,
+                    update_conflicts=True,
+                    unique_fields=[pk_name],
+                    update_fields=update_fields,
+                )
+            else:
+                manager.bulk_create(existing, batch_size=self.batch_size, ignore_conflicts=True)
+        if new:
+            manager.bulk_create(new, batch_size=self.batch_size)
+
+        self._restore_m2m(model, deserialized)
+
+        label = model._meta.label_lower
+        self.stats[label] = self.stats.get(label, 0) + len(objects)
+        if model not in self._models:
+            self._models.append(model)
+
+    def _fill_missing_timestamps(self, model, objects):
+        """
+        الإدراج خام فلا يملأ pre_save حقول auto_now/auto_now_add - الحقول
+        الغائبة عن النسخة (نسخ أقدم من الحقل) تأخذ وقت الاستعادة
+        """
+        fields = [
+            f for f in model._meta.concrete_fields
+            if getattr(f, 'auto_now', False) or getattr(f, 'auto_now_add', False)
+        ]
+        if not fields:
+            return
+        now = timezone.now()
+        for obj in objects:
+            for field in fields:
+                if getattr(obj, field.attname) is None:
+                    value = now.date() if field.get_internal_type() == 'DateField' else now
+                    setattr(obj, field.attname, value)
+
+    def _restore_m2m(self, model, deserialized):
+        """استبدال علاقات many-to-many للكائنات المستعادة بإدراج جماعي في جداول الربط"""
+        for field in model._meta.many_to_many:
+            items = [item for item in deserialized if field.name in (item.m2m_data or {})]
+            if not items:
+                continue
+
+            through = field.remote_field.through
+            source = field.m2m_field_name()
+            target = field.m2m_reverse_field_name()
+            through_manager = through._base_manager.db_manager(self.using)
+
+            through_manager.filter(
+                **{f'{source}__in': [item.object.pk for item in items]}
+            ).delete()
+            through_manager.bulk_create([
+                through(**{f'{source}_id': item.object.pk, f'{target}_id': value})
+                for item in items
+                for value in item.m2m_data[field.name]
+            ], batch_size=self.batch_size)
+
+    def _reset_sequences(self):
+        connection = connections[self.using]
+        statements = connection.ops.sequence_reset_sql(no_style(), self._models)
+        if statements:
+            with connection.cursor() as cursor:
+                for sql in statements:
+                    cursor.execute(sql)
+
+    def restore_stream(self, stream):
+        """استعادة من ملف نصي مفتوح - Returns: {model_label: count}"""
+        with transaction.atomic(using=self.using), audit_suspended():
+            model = None
+            records = []
+
+            for record in iter_json_array(stream):
+                try:
+                    record_model = apps.get_model(record['model'])
+                except (LookupError, KeyError, TypeError):
+                    raise DeserializationError(f"نموذج غير معروف: {record.get('model')}")
+
+                if record_model is not model or len(records) >= self.batch_size:
+                    self._flush(model, records)
+                    model, records = record_model, []
+                records.append(record)
+
+            self._flush(model, records)
+            self._reset_sequences()
+
+            # الإشارات لا تعمل مع bulk_create - إهمال النتائج المالية المحفوظة
+            # وإعادة بناء جداول الأقساط والإجماليات وسجل الإشغال من البيانات المستعادة
+            transaction.on_commit(clear_financial_cache, using=self.using)
+            transaction.on_commit(_rebuild_rollups, using=self.using)
+
+        logger.info(f'Restored {sum(self.stats.values())} records from backup')
+        return self.stats
+
+    def restore(self, file_path):
+        with open_backup_file(file_path) as stream:
+            return self.restore_stream(stream)
+
+
+def _rebuild_rollups():
+    """
+    إعادة بناء البيانات المشتقة غير المنسوخة (JSON_BACKUP_EXCLUDE) من
+    البيانات المستعادة: جداول الأقساط ودفتر توزيع السندات، إجماليات
+    الإيرادات، سجل الإشغال - ثم إهمال توقعات التدفق النقدي
+    """
+    from rent.models import ContractPeriod, RevenueMonthlyRollup, UnitOccupancyMonth
+    from rent.services.cashflow_forecast_service import invalidate_cashflow_forecasts
+
+    for model, rebuild in (
+        (ContractPeriod, ContractPeriod.regenerate_all),
+        (RevenueMonthlyRollup, RevenueMonthlyRollup.rebuild),
+        (UnitOccupancyMonth, UnitOccupancyMonth.rebuild_for_units),
+    ):
+        try:
+            rebuild()
+        except Exception as e:
+            logger.error(f'{model.__name__} rebuild after restore failed: {e}', exc_info=True)
+
+    invalidate_cashflow_forecasts()
+
+
+def restore_backup_chain(backup, **options):
+    """
+    استعادة نسخة من سجل Backup - التزايدية مع سلسلتها كاملة في معاملة واحدة
+
+    Returns:
+        {model_label: count}
+    """
+    chain = backup.get_restore_chain()
+    missing = [b.file_name for b in chain if not os.path.exists(b.file_path)]
+    if missing:
+        raise FileNotFoundError(f'ملفات النسخ غير موجودة: {", ".join(missing)}')
+
+    engine = JsonRestoreEngine(**options)
+    with transaction.atomic(using=engine.using):
+        for item in chain:
+            engine.restore(item.file_path)
+    return engine.stats
@@ -0,0 +1,275 @@
+# services/backup_schedule_service.py
+
+"""
+تنفيذ جداول النسخ الاحتياطي (BackupSchedule) وتطبيق سياسة الاحتفاظ
+
+- حجز الجداول المستحقة بنفس حلقة TaskScheduler (claim_due_rows) فلا
+  تُنفذ مرتين
+- نوع النسخة حسب الجدول: كاملة، جزئية (الجداول المحددة)، تزايدية (منذ آخر
+  نسخة للجدول)، تفاضلية (منذ آخر نسخة كاملة للجدول)
+- بعد كل نسخة ناجحة تُحذف النسخ الزائدة حسب سياسة الجدول مع الإبقاء على
+  سلاسل النسخ التزايدية المطلوبة للنسخ المحتفظ بها، ثم سجلات الحذف الأقدم
+  من أقدم نسخة باقية
+
+يمكن تشغيله عبر الأمر run_backup_schedules أو كمهمة مجدولة:
+    rent.services.backup_schedule_service.run_due_backup_schedules
+"""
+
+import logging
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from rent.services.backup_service import (
+    BACKUP_DIR,
+    JSON_BACKUP_EXCLUDE,
+    IncrementalJsonBackupWriter,
+    JsonBackupWriter,
+    recover_stale_backups,
+    release_backup_file,
+)
+from rent.services.scheduler_service import TaskScheduler, claim_due_rows
+
+logger = logging.getLogger(__name__)
+
+
+# ========================================
+# Retention
+# ========================================
+
+def select_backups_to_keep(schedule, backups):
+    """
+    النسخ التي يجب الاحتفاظ بها حسب سياسة الجدول
+
+    Args:
+        backups: النسخ الناجحة للجدول مرتبة من الأحدث للأقدم
+
+    Returns:
+        set من معرفات النسخ (تشمل النسخ الأساسية للسلاسل المحتفظ بها)
+    """
+    from rent.models.backup_models import RetentionPolicy
+
+    if not backups:
+        return set()
+
+    keep = {backups[0].pk}
+
+    if schedule.retention_policy == RetentionPolicy.CALENDAR:
+        buckets = (
+            (schedule.keep_daily, lambda d: d.date()),
+            (schedule.keep_weekly, lambda d: d.isocalendar()[:2]),
+            (schedule.keep_monthly, lambda d: (d.year, d.month)),
+        )
+        for limit, bucket_of in buckets:
+            seen = set()
+            for backup in backups:
+                if len(seen) >= limit:
+                    break
+                bucket = bucket_of(timezone.localtime(backup.started_at or backup.created_at))
+                if bucket not in seen:
+                    # أحدث نسخة في كل يوم/أسبوع/شهر
+                    seen.add(bucket)
+                    keep.add(backup.pk)
+    else:
+        cutoff = None
+        if schedule.retention_days:
+            cutoff = timezone.now() - timedelta(days=schedule.retention_days)
+        for backup in backups[:max(schedule.max_backups_to_keep, 1)]:
+            if cutoff is None or (backup.started_at or backup.created_at) >= cutoff:
+                keep.add(backup.pk)
+
+    # النسخة التزايدية لا تُستعاد بدون سلسلتها
+    by_pk = {backup.pk: backup for backup in backups}
+    for pk in list(keep):
+        backup = by_pk[pk]
+        while backup.base_backup_id:
+            keep.add(backup.base_backup_id)
+            backup = by_pk.get(backup.base_backup_id)
+            if backup is None:
+                break
+
+    return keep
+
+
+def delete_backup(backup):
+    """حذف نسخة وملفها (إذا لم تشر إليه نسخة أخرى)"""
+    release_backup_file(backup)
+    backup.delete()
+
+
+def apply_retention(schedule):
+    """
+    حذف نسخ الجدول الزائدة عن سياسة الاحتفاظ
+
+    Returns:
+        عدد النسخ المحذوفة
+    """
+    from rent.models import Backup, BackupTombstone
+    from rent.models.backup_models import BackupStatus
+
+    backups = list(
+        Backup.objects.filter(
+            schedule=schedule,
+            status=BackupStatus.COMPLETED,
+            is_successful=True,
+        ).order_by('-started_at', '-pk')
+    )
+    keep = select_backups_to_keep(schedule, backups)
+
+    to_delete = {backup.pk for backup in backups if backup.pk not in keep}
+    deleted = 0
+    # من الأحدث للأقدم: النسخ التزايدية تُحذف قبل نسخها الأساسية
+    for backup in backups:
+        if backup.pk not in to_delete:
+            continue
+        if backup.incremental_backups.exclude(pk__in=to_delete).exists():
+            # نسخة أساسية لنسخة أخرى باقية (مثلاً نسخة يدوية) - لا تُحذف
+            to_delete.discard(backup.pk)
+            continue
+        delete_backup(backup)
+        deleted += 1
+
+    if deleted:
+        logger.info(f'Backup schedule {schedule.pk}: pruned {deleted} backups')
+
+    # سجلات الحذف التي لم تعد أي نسخة أساسية باقية تحتاجها
+    tombstones = BackupTombstone.prune()
+    if tombstones:
+        logger.info(f'Pruned {tombstones} backup tombstones')
+    return deleted
+
+
+# ========================================
+# Execution
+# ========================================
+
+def get_schedule_directory(schedule):
+    """مجلد نسخ الجدول (المسار النسبي يُحسب من BASE_DIR)"""
+    if not schedule.storage_path:
+        return BACKUP_DIR
+    if os.path.isabs(schedule.storage_path):
+        return schedule.storage_path
+    return os.path.join(settings.BASE_DIR, schedule.storage_path)
+
+
+class BackupScheduleRunner(TaskScheduler):
+    """
+    تنفيذ جداول النسخ المستحقة
+
+    نفس حلقة TaskScheduler (الحجز + الانتظار + الإيقاف) بعامل واحد:
+    نسخة واحدة في كل مرة، والعنصر المحجوز هو (الجدول، سجل Backup).
+
+    Usage:
+        runner = BackupScheduleRunner()
+        runner.run_pending()     # دورة واحدة
+        runner.run_forever()     # عامل دائم
+    """
+
+    def __init__(self, poll_interval=60):
+        super().__init__(max_workers=1, poll_interval=poll_interval)
+
+    def claim_due_tasks(self, limit):
+        """
+        حجز الجداول المستحقة وإنشاء سجل Backup لكل منها
+
+        Returns:
+            list[(BackupSchedule, Backup)]
+        """
+        from rent.models import BackupSchedule
+
+        with transaction.atomic():
+            claimed = [
+                (schedule, self._create_backup_record(schedule))
+                for schedule in claim_due_rows(BackupSchedule.objects, limit, timezone.now())
+            ]
+
+        if claimed:
+            # نسخ سابقة مات عاملها أثناء التنفيذ
+            recover_stale_backups()
+        return claimed
+
+    def _get_writer_options(self, schedule):
+        from rent.models.backup_models import BackupType
+
+        options = {}
+        exclude = list(schedule.excluded_tables or [])
+        if exclude:
+            options['exclude'] = JSON_BACKUP_EXCLUDE + exclude
+        if schedule.backup_type == BackupType.PARTIAL or not schedule.include_all_tables:
+            options['include'] = list(schedule.included_tables or [])
+        return options
+
+    def _create_backup_record(self, schedule):
+        from rent.models.backup_models import BackupType
+
+        directory = get_schedule_directory(schedule)
+        compress = schedule.compress_backup
+        extra = {'schedule': schedule, 'notes': f'نسخة مجدولة: {schedule.name}'}
+
+        base_backup = None
+        if schedule.backup_type == BackupType.INCREMENTAL:
+            base_backup = IncrementalJsonBackupWriter.get_latest_base(schedule=schedule)
+        elif schedule.backup_type == BackupType.DIFFERENTIAL:
+            base_backup = IncrementalJsonBackupWriter.get_latest_base(
+                schedule=schedule, backup_type=BackupType.FULL
+            )
+
+        if base_backup is not None:
+            return IncrementalJsonBackupWriter.create_backup_record(
+                compress=compress,
+                directory=directory,
+                base_backup=base_backup,
+                backup_type=schedule.backup_type,
+                **extra,
+            )
+
+        # لا توجد نسخة أساسية للجدول بعد: أول نسخة تزايدية/تفاضلية تكون كاملة
+        backup_type = BackupType.PARTIAL if schedule.backup_type == BackupType.PARTIAL else BackupType.FULL
+        return JsonBackupWriter.create_backup_record(
+            compress=compress,
+            directory=directory,
+            backup_type=backup_type,
+            **extra,
+        )
+
+    def execute(self, claimed):
+        """تنفيذ نسخة الجدول ثم تطبيق سياسة الاحتفاظ"""
+        from rent.models import BackupSchedule
+        from rent.models.backup_models import BackupStatus, BackupType
+
+        schedule, backup = claimed
+        writer_class = (
+            IncrementalJsonBackupWriter
+            if backup.backup_type in BackupType.chained()
+            else JsonBackupWriter
+        )
+        writer_class(
+            backup, compress=schedule.compress_backup, **self._get_writer_options(schedule)
+        ).run()
+
+        if backup.status != BackupStatus.COMPLETED:
+            logger.error(f'Scheduled backup {schedule.pk} ({schedule.name}) failed: {backup.error_message}')
+            return backup
+
+        # update بدون save حتى لا يُعاد حساب next_run (تم تقديمه عند الحجز)
+        BackupSchedule.objects.filter(pk=schedule.pk).update(
+            last_run=backup.completed_at,
+            last_backup=backup,
+        )
+        try:
+            apply_retention(schedule)
+        except Exception as e:
+            logger.error(f'Retention for backup schedule {schedule.pk} failed: {e}', exc_info=True)
+        return backup
+
+
+def run_due_backup_schedules():
+    """مدخل للمهام المجدولة (ScheduledTask.task_function)"""
+    backups = BackupScheduleRunner().run_pending()
+    return {
+        'backups': len(backups),
+        'failed': sum(1 for b in backups if not b.is_successful),
+    }
@@ -0,0 +1,836 @@
+# services/backup_service.py
+
+"""
+خدمة إنشاء النسخ الاحتياطية
+
+- نسخة JSON تُكتب مباشرة إلى ملف مضغوط (gzip) نموذجاً بعد نموذج عبر
+  queryset.iterator() - الذاكرة ثابتة مهما كان حجم قاعدة البيانات
+- checksum (SHA-256) يُحسب أثناء الكتابة دون قراءة الملف مرة أخرى
+- نسخة JSON تزايدية: ما أُنشئ أو عُدّل منذ النسخة السابقة (علامات updated_at
+  لكل نموذج في Backup.watermarks) + سجلات الحذف (BackupTombstone)
+- نسخة PostgreSQL بصيغة directory عبر pg_dump/pg_restore --jobs N
+  (التوازي حسب عدد الأنوية) مع checksum محسوب على أجزاء ثابتة الحجم
+- التنفيذ خارج دورة الطلب (مهمة ينفذها عامل run_scheduler أو أمر
+  create_backup) وسجل Backup يتتبع التقدم (عدد السجلات والجداول والنموذج
+  الحالي)؛ النسخ المتوقفة (مات العامل) تُحدد كفاشلة في المهمة التالية
+- الملفات تُخزن حسب الـ checksum (objects/ab/abcd....json.gz) فالنسخة
+  المطابقة لنسخة موجودة لا تُكتب مرة ثانية
+"""
+
+import gzip
+import hashlib
+import io
+import logging
+import os
+import shutil
+import subprocess
+import tarfile
+from datetime import timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.core import serializers
+from django.db import DEFAULT_DB_ALIAS, connection, router
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+logger = logging.getLogger(__name__)
+
+BACKUP_DIR = os.path.join(settings.BASE_DIR, 'backups')
+
+# نفس الاستثناءات المستخدمة سابقاً مع dumpdata + سجل النسخ نفسه
+# (استعادته تستبدل سجل النسخ الحالي وحالة السلسلة الجارية استعادتها)
+# سجلات الحذف تُضمّن في النسخ التزايدية فقط
+JSON_BACKUP_EXCLUDE = [
+    'contenttypes', 'admin.logentry', 'sessions',
+    'rent.backup', 'rent.backupschedule', 'rent.backuptombstone',
+    # مشتقة من العقود والتعديلات والسندات - يُعاد توليدها بالأمر rebuild_contract_periods
+    'rent.contractperiod', 'rent.receiptallocation',
+    # إجماليات السندات الشهرية - يُعاد بناؤها بعد الاستعادة (backfill_revenue_rollup)
+    'rent.revenuemonthlyrollup',
+    # سجل الإشغال الشهري - يُعاد حسابه من العقود (rebuild_occupancy_history)
+    'rent.unitoccupancymonth',
+]
+
+# حقل علامة آخر تحديث لكل نموذج - أول حقل موجود (النماذج بدونها تُنسخ كاملة)
+WATERMARK_FIELDS = ('updated_at', 'computed_at', 'created_at')
+
+TOMBSTONE_LABEL = 'rent.backuptombstone'
+
+ITERATOR_CHUNK_SIZE = 2000
+
+# تحديث سجل Backup كل عدد من السجلات (بدون إشارات)
+PROGRESS_EVERY = 10000
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# امتداد مجلد نسخ pg_dump --format directory
+PG_DIRECTORY_EXTENSION = 'pgdump'
+
+# مجلد التخزين حسب المحتوى داخل مجلد النسخ
+OBJECTS_DIR_NAME = 'objects'
+
+
+class HashingWriter(io.RawIOBase):
+    """
+    ملف ثنائي يحسب SHA-256 وحجم ما يُكتب إليه أثناء الكتابة
+
+    يُمرر لـ GzipFile فيكون الـ checksum هو checksum الملف المضغوط على القرص.
+    """
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.hash = hashlib.sha256()
+        self.size = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.hash.update(data)
+        self.size += len(data)
+        return self.raw.write(data)
+
+    def flush(self):
+        self.raw.flush()
+
+    def hexdigest(self):
+        return self.hash.hexdigest()
+
+
+def _update_hash_from_file(digest, file_path, chunk_size):
+    size = 0
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+            size += len(chunk)
+    return size
+
+
+def file_checksum(file_path, chunk_size=HASH_CHUNK_SIZE):
+    """SHA-256 لملف بقراءته على أجزاء ثابتة الحجم"""
+    digest = hashlib.sha256()
+    _update_hash_from_file(digest, file_path, chunk_size)
+    return digest.hexdigest()
+
+
+def iter_backup_files(path):
+    """ملفات مجلد النسخة (مسار نسبي، مسار كامل) بترتيب ثابت"""
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for name in sorted(files):
+            full_path = os.path.join(root, name)
+            yield os.path.relpath(full_path, path).replace(os.sep, '/'), full_path
+
+
+def backup_checksum(path, chunk_size=HASH_CHUNK_SIZE):
+    """
+    SHA-256 وحجم نسخة (ملف أو مجلد) بذاكرة ثابتة
+
+    للمجلد: يدخل في الـ hash اسم كل ملف (نسبي) ثم محتواه بترتيب ثابت.
+
+    Returns:
+        (checksum, size)
+    """
+    if not os.path.isdir(path):
+        return file_checksum(path, chunk_size), os.path.getsize(path)
+
+    digest = hashlib.sha256()
+    size = 0
+    for relative_path, full_path in iter_backup_files(path):
+        digest.update(relative_path.encode('utf-8') + b'\0')
+        size += _update_hash_from_file(digest, full_path, chunk_size)
+    return digest.hexdigest(), size
+
+
+def remove_backup_path(path):
+    """حذف ملف أو مجلد النسخة إن وُجد"""
+    if os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=True)
+    elif os.path.exists(path):
+        os.remove(path)
+
+
+def store_backup_file(backup, temp_path, checksum):
+    """
+    نقل ملف (أو مجلد) النسخة إلى مسار يحدده الـ checksum
+
+    إذا وُجد ملف بنفس المحتوى يُحذف الملف المؤقت ويشير السجل للموجود.
+    يحدّث backup.file_path و metadata['deduplicated'].
+    """
+    directory = os.path.dirname(backup.file_path)
+    extension = backup.file_name.split('.', 1)[1] if '.' in backup.file_name else 'bak'
+    target_dir = os.path.join(directory, OBJECTS_DIR_NAME, checksum[:2])
+    os.makedirs(target_dir, exist_ok=True)
+    target = os.path.join(target_dir, f'{checksum}.{extension}')
+
+    deduplicated = os.path.exists(target)
+    if deduplicated:
+        remove_backup_path(temp_path)
+    else:
+        os.replace(temp_path, target)
+
+    backup.file_path = target
+    backup.metadata = {**(backup.metadata or {}), 'deduplicated': deduplicated}
+    return target
+
+
+def release_backup_file(backup):
+    """حذف ملف النسخة إذا لم تعد أي نسخة أخرى تشير إليه (تخزين حسب المحتوى)"""
+    from rent.models import Backup
+
+    if not backup.file_path:
+        return False
+    if Backup.objects.filter(file_path=backup.file_path).exclude(pk=backup.pk).exists():
+        return False
+    remove_backup_path(backup.file_path)
+    return True
+
+
+def iter_directory_tar(path, chunk_size=HASH_CHUNK_SIZE):
+    """
+    بث مجلد النسخة كملف tar (بدون ضغط - ملفات pg_dump مضغوطة أصلاً)
+    دون إنشاء ملف tar على القرص ودون تحميل أي ملف كامل في الذاكرة
+    """
+    base_name = os.path.basename(os.path.normpath(path))
+    for relative_path, full_path in iter_backup_files(path):
+        stat = os.stat(full_path)
+        info = tarfile.TarInfo(f'{base_name}/{relative_path}')
+        info.size = stat.st_size
+        info.mtime = int(stat.st_mtime)
+        info.mode = 0o644
+        yield info.tobuf(format=tarfile.PAX_FORMAT)
+
+        with open(full_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                yield chunk
+
+        remainder = info.size % tarfile.BLOCKSIZE
+        if remainder:
+            yield tarfile.NUL * (tarfile.BLOCKSIZE - remainder)
+
+    # نهاية الأرشيف: كتلتان فارغتان
+    yield tarfile.NUL * (tarfile.BLOCKSIZE * 2)
+
+
+def get_backup_models(exclude=None, include=None, using=DEFAULT_DB_ALIAS):
+    """
+    النماذج المشمولة في نسخة JSON مرتبة حسب الاعتماديات
+    (نفس منطق dumpdata --natural-foreign)
+
+    include/exclude: app_label أو app_label.model_name
+    """
+    exclude = JSON_BACKUP_EXCLUDE if exclude is None else exclude
+    excluded_apps = {label for label in exclude if '.' not in label}
+    excluded_models = {label.lower() for label in exclude if '.' in label}
+    included = {label.lower() for label in include} if include else None
+
+    app_list = []
+    for app_config in apps.get_app_configs():
+        if app_config.models_module is None or app_config.label in excluded_apps:
+            continue
+        models = [
+            model for model in app_config.get_models()
+            if model._meta.label_lower not in excluded_models
+            and not model._meta.proxy
+            and model._meta.can_migrate(connection)
+            and router.allow_migrate_model(using, model)
+            and (
+                included is None
+                or model._meta.label_lower in included
+                or app_config.label in included
+            )
+        ]
+        if models:
+            app_list.append((app_config, models))
+
+    return serializers.sort_dependencies(app_list, allow_cycles=True)
+
+
+def get_watermark_cutoff(backup):
+    """
+    أحدث علامة آمنة لنسخة: بدايتها ناقص BACKUP_WATERMARK_MARGIN
+
+    updated_at (و deleted_at لسجلات الحذف) وقت save() وليس وقت الالتزام: سجل
+    حُفظ في معاملة لم تلتزم أثناء النسخ لا يظهر فيها، فالعلامة لا تتجاوز
+    بداية النسخة ناقص الهامش حتى تعيده النسخة التالية.
+    """
+    margin = getattr(settings, 'BACKUP_WATERMARK_MARGIN', 600)
+    return (backup.started_at or timezone.now()) - timedelta(seconds=margin)
+
+
+def get_watermark_field(model):
+    """اسم حقل علامة آخر تحديث للنموذج أو None"""
+    names = {field.name for field in model._meta.concrete_fields}
+    for name in WATERMARK_FIELDS:
+        if name in names:
+            return name
+    return None
+
+
+def new_backup_file_path(extension, directory=None, prefix='backup'):
+    """(اسم الملف، المسار الكامل) لنسخة جديدة - بدون تعارض مع نسخة بنفس الثانية"""
+    from rent.models import Backup
+
+    directory = directory or BACKUP_DIR
+    os.makedirs(directory, exist_ok=True)
+    timestamp = timezone.now().strftime('%Y%m%d_%H%M%S')
+
+    counter = 0
+    while True:
+        suffix = f'_{counter}' if counter else ''
+        file_name = f'{prefix}_{timestamp}{suffix}.{extension}'
+        file_path = os.path.join(directory, file_name)
+        if not (
+            os.path.exists(file_path)
+            or os.path.exists(f'{file_path}.part')
+            or Backup.objects.filter(file_path=file_path).exists()
+        ):
+            return file_name, file_path
+        counter += 1
+
+
+# ========================================
+# JSON Backup
+# ========================================
+
+class JsonBackupWriter:
+    """
+    كتابة نسخة JSON (متوافقة مع loaddata) بشكل متدفق
+
+    Usage:
+        backup = JsonBackupWriter.create_backup_record(user=request.user)
+        JsonBackupWriter(backup).run()
+    """
+
+    def __init__(self, backup, compress=True, chunk_size=ITERATOR_CHUNK_SIZE, exclude=None, include=None):
+        self.backup = backup
+        self.compress = compress
+        self.chunk_size = chunk_size
+        self.exclude = exclude
+        self.include = include
+        self.records_count = 0
+        self.tables = []
+        self.watermarks = {}
+
+    @classmethod
+    def create_backup_record(cls, user=None, compress=True, directory=None, **extra):
+        """إنشاء سجل Backup بحالة "قيد التنفيذ" قبل بدء الكتابة"""
+        from rent.models import Backup
+        from rent.models.backup_models import BackupStatus, BackupType
+
+        extra.setdefault('backup_type', BackupType.FULL)
+        file_name, file_path = new_backup_file_path(
+            'json.gz' if compress else 'json',
+            directory,
+            prefix='incremental' if extra['backup_type'] in BackupType.chained() else 'backup',
+        )
+        return Backup.objects.create(
+            file_name=file_name,
+            file_path=file_path,
+            status=BackupStatus.IN_PROGRESS,
+            started_at=timezone.now(),
+            created_by=user,
+            metadata={'format': 'json', 'compressed': compress},
+            **extra,
+        )
+
+    # ========================================
+    # Progress
+    # ========================================
+    def _update_progress(self, current_model=None):
+        """تحديث التقدم مباشرة في قاعدة البيانات (update بدون إشارات التدقيق)"""
+        from rent.models import Backup
+
+        metadata = dict(self.backup.metadata or {})
+        metadata['progress'] = {
+            'current_model': current_model,
+            'records': self.records_count,
+            'tables': len(self.tables),
+            'updated_at': timezone.now().isoformat(),
+        }
+        self.backup.metadata = metadata
+        self.backup.records_count = self.records_count
+        self.backup.tables_count = len(self.tables)
+        Backup.objects.filter(pk=self.backup.pk).update(
+            metadata=metadata,
+            records_count=self.records_count,
+            tables_count=len(self.tables),
+        )
+
+    def get_querysets(self):
+        """(النموذج، queryset) لكل نموذج بالترتيب - يمكن تخصيصها (نسخ جزئي/تزايدي)"""
+        for model in get_backup_models(self.exclude, self.include):
+            yield model, model._base_manager.order_by(model._meta.pk.name)
+
+    def _iter_objects(self):
+        for model, queryset in self.get_querysets():
+            label = model._meta.label
+            watermark_field = get_watermark_field(model)
+            watermark = None
+            self._update_progress(current_model=label)
+            model_count = 0
+            for obj in queryset.iterator(chunk_size=self.chunk_size):
+                yield obj
+                if watermark_field:
+                    value = getattr(obj, watermark_field)
+                    if value is not None and (watermark is None or value > watermark):
+                        watermark = value
+                model_count += 1
+                self.records_count += 1
+                if self.records_count % PROGRESS_EVERY == 0:
+                    self._update_progress(current_model=label)
+            if model_count:
+                self.tables.append(label.lower())
+            if watermark is not None:
+                self.watermarks[label.lower()] = watermark
+
+    def get_watermarks(self):
+        """
+        علامات هذه النسخة: أحدث قيمة لكل نموذج بحد أقصى get_watermark_cutoff
+        (لا أكبر قيمة مقروءة: سجلات المعاملات الجارية أثناء النسخ لها قيم أقدم)،
+        ولسجلات الحذف نفس الحد
+        """
+        cutoff = get_watermark_cutoff(self.backup)
+        watermarks = {
+            label: min(value, cutoff).isoformat()
+            for label, value in self.watermarks.items()
+        }
+        watermarks[TOMBSTONE_LABEL] = cutoff.isoformat()
+        return watermarks
+
+    def write(self, raw):
+        """كتابة النسخة إلى ملف ثنائي مفتوح - Returns: HashingWriter"""
+        hashing = HashingWriter(raw)
+        if self.compress:
+            # mtime=0 حتى تنتج البيانات نفسها ملفاً مطابقاً
+            binary = gzip.GzipFile(filename='', mode='wb', fileobj=hashing, mtime=0)
+        else:
+            binary = hashing
+        stream = io.TextIOWrapper(binary, encoding='utf-8', write_through=False)
+        try:
+            serializers.serialize(
+                'json',
+                self._iter_objects(),
+                stream=stream,
+                use_natural_foreign_keys=True,
+                use_natural_primary_keys=True,
+            )
+            stream.flush()
+        finally:
+            # إغلاق GzipFile يكتب الذيل إلى hashing ولا يغلق الملف الأصلي
+            stream.detach()
+            if binary is not hashing:
+                binary.close()
+        return hashing
+
+    def run(self):
+        """
+        تنفيذ النسخ وتحديث سجل Backup بالنتيجة
+
+        الكتابة تتم إلى ملف مؤقت (.part) ثم يُنقل للتخزين حسب المحتوى عند النجاح.
+        """
+        backup = self.backup
+        temp_path = f'{backup.file_path}.part'
+
+        try:
+            with open(temp_path, 'wb') as raw:
+                hashing = self.write(raw)
+            store_backup_file(backup, temp_path, hashing.hexdigest())
+
+            self._update_progress()
+            backup.file_size = hashing.size
+            backup.included_tables = sorted(self.tables)
+            backup.watermarks = self.get_watermarks()
+            backup.checksum = hashing.hexdigest()
+            backup.mark_as_completed()
+            backup.mark_as_verified(backup.checksum)
+        except Exception as e:
+            logger.error(f'JSON backup {backup.pk} failed: {e}', exc_info=True)
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            backup.mark_as_failed(str(e))
+        return backup
+
+
+class IncrementalJsonBackupWriter(JsonBackupWriter):
+    """
+    نسخة JSON تزايدية: السجلات التي أُنشئت أو عُدّلت منذ النسخة الأساسية
+    (updated_at >= علامة النموذج في base_backup.watermarks) + سجلات الحذف
+
+    ملاحظة: QuerySet.update() لا يُحدّث updated_at - التعديلات الجماعية بدونه
+    تظهر في النسخة الكاملة التالية فقط.
+
+    Usage:
+        backup = IncrementalJsonBackupWriter.create_backup_record()
+        IncrementalJsonBackupWriter(backup).run()
+    """
+
+    @staticmethod
+    def get_latest_base(**filters):
+        """
+        آخر نسخة JSON مكتملة لها علامات (كاملة أو تزايدية - ليست جزئية)
+        filters: تضييق إضافي (مثلاً schedule=... أو backup_type=FULL للتفاضلية)
+        """
+        from rent.models import Backup
+        from rent.models.backup_models import BackupStatus, BackupType
+
+        return Backup.objects.filter(
+            status=BackupStatus.COMPLETED,
+            is_successful=True,
+            watermarks__isnull=False,
+            **filters,
+        ).exclude(
+            backup_type=BackupType.PARTIAL,
+        ).order_by('-started_at', '-pk').first()
+
+    @classmethod
+    def create_backup_record(cls, user=None, compress=True, directory=None, base_backup=None, **extra):
+        """
+        base_backup الافتراضي: آخر نسخة مكتملة (تزايدية)
+        backup_type=DIFFERENTIAL مع base_backup = آخر نسخة كاملة (تفاضلية)
+        """
+        from rent.models.backup_models import BackupType
+
+        base_backup = base_backup or cls.get_latest_base()
+        if base_backup is None:
+            raise ValueError('لا توجد نسخة كاملة سابقة لبناء نسخة تزايدية عليها.')
+        extra.setdefault('backup_type', BackupType.INCREMENTAL)
+        return super().create_backup_record(
+            user=user,
+            compress=compress,
+            directory=directory,
+            base_backup=base_backup,
+            **extra,
+        )
+
+    def _since(self, label):
+        value = (self.backup.base_backup.watermarks or {}).get(label)
+        return parse_datetime(value) if value else None
+
+    def get_querysets(self):
+        from rent.models import BackupTombstone
+
+        for model, queryset in super().get_querysets():
+            field = get_watermark_field(model)
+            since = self._since(model._meta.label_lower)
+            if field and since:
+                queryset = queryset.filter(**{f'{field}__gte': since})
+            yield model, queryset
+
+        tombstones = BackupTombstone.objects.order_by('pk')
+        since = self._since(TOMBSTONE_LABEL)
+        if since:
+            tombstones = tombstones.filter(deleted_at__gte=since)
+        yield BackupTombstone, tombstones
+
+    def get_watermarks(self):
+        """النماذج التي لم يتغير فيها شيء تحتفظ بعلامة النسخة الأساسية"""
+        watermarks = dict(self.backup.base_backup.watermarks or {})
+        watermarks.update(super().get_watermarks())
+        return watermarks
+
+
+# ========================================
+# PostgreSQL Directory Backup
+# ========================================
+
+def get_pg_jobs(jobs=None):
+    """عدد العمليات المتوازية لـ pg_dump/pg_restore"""
+    if jobs:
+        return max(1, int(jobs))
+    configured = getattr(settings, 'BACKUP_PG_JOBS', None)
+    if configured:
+        return max(1, int(configured))
+    return max(1, min(os.cpu_count() or 1, 8))
+
+
+def get_pg_connection(using=DEFAULT_DB_ALIAS):
+    """
+    معاملات الاتصال المشتركة لأدوات PostgreSQL وبيئة التشغيل (PGPASSWORD)
+
+    Returns:
+        (args, env, db_name)
+    """
+    db = settings.DATABASES[using]
+    env = os.environ.copy()
+    if db.get('PASSWORD'):
+        env['PGPASSWORD'] = db['PASSWORD']
+    args = [
+        '--host', db.get('HOST') or 'localhost',
+        '--port', str(db.get('PORT') or '5432'),
+        '--username', db.get('USER', ''),
+    ]
+    return args, env, db.get('NAME', '')
+
+
+def run_pg_tool(cmd, env):
+    """تشغيل أداة PostgreSQL - الأخطاء من stderr (stdout لا يُجمع في الذاكرة)"""
+    result = subprocess.run(
+        cmd,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+        timeout=getattr(settings, 'BACKUP_PG_TIMEOUT', None),
+    )
+    if result.returncode != 0:
+        raise Exception(result.stderr.strip() or f'{cmd[0]} exited with {result.returncode}')
+
+
+def pg_tools_available():
+    return shutil.which('pg_dump') is not None and shutil.which('pg_restore') is not None
+
+
+class PgDirectoryBackup:
+    """
+    نسخة PostgreSQL بصيغة directory (ملف لكل جدول، مضغوط)
+
+    تسمح بالنسخ والاستعادة المتوازية (--jobs) على عكس --format plain.
+
+    Usage:
+        backup = PgDirectoryBackup.create_backup_record(user=request.user)
+        PgDirectoryBackup(backup, jobs=4).run()
+    """
+
+    def __init__(self, backup, jobs=None):
+        self.backup = backup
+        self.jobs = get_pg_jobs(jobs)
+
+    @classmethod
+    def create_backup_record(cls, user=None, directory=None, **extra):
+        from rent.models import Backup
+        from rent.models.backup_models import BackupStatus, BackupType
+
+        file_name, file_path = new_backup_file_path(PG_DIRECTORY_EXTENSION, directory)
+        extra.setdefault('backup_type', BackupType.FULL)
+        return Backup.objects.create(
+            file_name=file_name,
+            file_path=file_path,
+            status=BackupStatus.IN_PROGRESS,
+            started_at=timezone.now(),
+            created_by=user,
+            notes='نسخة PostgreSQL (pg_dump --format directory)',
+            metadata={'format': 'directory'},
+            **extra,
+        )
+
+    @staticmethod
+    def _database_stats():
+        """عدد الجداول والسجلات التقريبي من إحصائيات PostgreSQL"""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT COUNT(*) FROM information_schema.tables "
+                "WHERE table_schema = 'public'"
+            )
+            tables_count = cursor.fetchone()[0]
+            cursor.execute("SELECT SUM(n_live_tup) FROM pg_stat_user_tables")
+            records_count = cursor.fetchone()[0] or 0
+        return tables_count, records_count
+
+    def run(self):
+        backup = self.backup
+        temp_path = f'{backup.file_path}.part'
+
+        try:
+            args, env, db_name = get_pg_connection()
+            remove_backup_path(temp_path)
+            run_pg_tool([
+                'pg_dump', *args,
+                '--format', 'directory',
+                '--jobs', str(self.jobs),
+                '--no-owner',
+                '--no-privileges',
+                '--file', temp_path,
+                db_name,
+            ], env)
+            checksum, size = backup_checksum(temp_path)
+            store_backup_file(backup, temp_path, checksum)
+            backup.tables_count, backup.records_count = self._database_stats()
+            backup.file_size = size
+            backup.checksum = checksum
+            backup.metadata = {**(backup.metadata or {}), 'jobs': self.jobs}
+            backup.mark_as_completed()
+            backup.mark_as_verified(checksum)
+        except Exception as e:
+            logger.error(f'pg_dump backup {backup.pk} failed: {e}', exc_info=True)
+            remove_backup_path(temp_path)
+            backup.mark_as_failed(str(e))
+        return backup
+
+
+def restore_pg_directory(path, jobs=None):
+    """استعادة نسخة directory عبر pg_restore --jobs N (يستبدل الكائنات الموجودة)"""
+    if not pg_tools_available():
+        raise Exception('أداة pg_restore غير متوفرة على السيرفر.')
+
+    args, env, db_name = get_pg_connection()
+    run_pg_tool([
+        'pg_restore', *args,
+        '--dbname', db_name,
+        '--jobs', str(get_pg_jobs(jobs)),
+        '--clean',
+        '--if-exists',
+        '--no-owner',
+        '--no-privileges',
+        path,
+    ], env)
+
+
+# ========================================
+# Background Jobs
+# ========================================
+
+def get_stale_cutoff():
+    """النسخ قيد التنفيذ بدون تقدم منذ هذا الوقت تُعتبر متوقفة (مات العامل)"""
+    return timezone.now() - timedelta(seconds=getattr(settings, 'BACKUP_STALE_AFTER', 6 * 3600))
+
+
+def _last_heartbeat(backup):
+    """آخر تحديث للتقدم (metadata['progress']) وإلا وقت البدء"""
+    progress = (backup.metadata or {}).get('progress') or {}
+    heartbeat = parse_datetime(progress.get('updated_at') or '')
+    if heartbeat is None or (backup.started_at and heartbeat < backup.started_at):
+        return backup.started_at
+    return heartbeat
+
+
+def recover_stale_backups(exclude_pk=None):
+    """
+    تحديد النسخ المتوقفة كفاشلة وحذف ملفات .part اليتيمة
+
+    تبقى النسخة "قيد التنفيذ" للأبد إذا مات العامل أثناءها، ويبقى ملفها
+    المؤقت. تُستدعى قبل كل مهمة نسخ.
+
+    Returns:
+        int: عدد النسخ المحددة كفاشلة
+    """
+    from rent.models import Backup
+    from rent.models.backup_models import BackupStatus
+
+    cutoff = get_stale_cutoff()
+    in_progress = Backup.objects.filter(status=BackupStatus.IN_PROGRESS).exclude(pk=exclude_pk)
+
+    failed = 0
+    directories = {BACKUP_DIR}
+    for backup in in_progress.filter(started_at__lt=cutoff):
+        heartbeat = _last_heartbeat(backup)
+        if heartbeat and heartbeat >= cutoff:
+            continue
+        directories.add(os.path.dirname(backup.file_path))
+        remove_backup_path(f'{backup.file_path}.part')
+        backup.mark_as_failed('توقفت النسخة دون اكتمال (انتهى العامل أثناء التنفيذ)')
+        failed += 1
+
+    active_paths = {
+        f'{path}.part'
+        for path in Backup.objects.filter(status=BackupStatus.IN_PROGRESS).values_list('file_path', flat=True)
+    }
+    for directory in directories:
+        if not os.path.isdir(directory):
+            continue
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+            if not name.endswith('.part') or path in active_paths:
+                continue
+            if os.path.getmtime(path) < cutoff.timestamp():
+                logger.warning(f'Removing orphaned backup file {path}')
+                remove_backup_path(path)
+
+    if failed:
+        logger.warning(f'Marked {failed} stale backup(s) as failed')
+    return failed
+
+
+def enqueue_backup_job(job, backup, **options):
+    """
+    جدولة job لسجل Backup كمهمة لمرة واحدة ينفذها عامل run_scheduler
+
+    تُنشأ المهمة في نفس معاملة سجل Backup - الطلب لا ينتظر، وسجل Backup
+    (الحالة + التقدم) هو وسيلة المتابعة.
+
+    Args:
+        job: مفتاح في BACKUP_JOBS
+    """
+    from rent.models import ScheduledTask
+    from rent.models.scheduledtask_models import TaskFrequency, TaskType
+
+    if job not in BACKUP_JOBS:
+        raise ValueError(f'Unknown backup job: {job}')
+
+    return ScheduledTask.objects.create(
+        name=f'{BACKUP_JOBS[job][1]}: {backup.file_name}',
+        task_type=TaskType.BACKUP,
+        frequency=TaskFrequency.CUSTOM,
+        task_function='rent.services.backup_service.run_backup_job',
+        task_parameters={'job': job, 'backup_id': backup.pk, **options},
+        next_run=timezone.now(),
+    )
+
+
+def run_backup_job(job, backup_id, **options):
+    """
+    نقطة الدخول للمهام المجدولة (ScheduledTask.task_function) - انظر enqueue_backup_job
+
+    فشل النسخة يُرفع كاستثناء حتى يُسجل تنفيذ المهمة كفاشل.
+    """
+    from rent.models import Backup
+    from rent.models.backup_models import BackupStatus
+
+    recover_stale_backups(exclude_pk=backup_id)
+    result = BACKUP_JOBS[job][0](Backup.objects.get(pk=backup_id), **options)
+
+    if isinstance(result, Backup):
+        if result.status != BackupStatus.COMPLETED:
+            raise Exception(result.error_message)
+        return {'backup': result.pk, 'status': result.status}
+    if result.get('status') == 'failed':
+        raise Exception(result.get('error'))
+    return result
+
+
+def run_json_backup(backup, **options):
+    """مدخل مهمة النسخ JSON (مهمة مجدولة أو أمر create_backup)"""
+    from rent.models.backup_models import BackupType
+
+    if backup.backup_type in BackupType.chained():
+        return IncrementalJsonBackupWriter(backup, **options).run()
+    return JsonBackupWriter(backup, **options).run()
+
+
+def run_pg_directory_backup(backup, **options):
+    """مدخل مهمة نسخ pg_dump --format directory"""
+    return PgDirectoryBackup(backup, **options).run()
+
+
+def run_pg_directory_restore(backup, jobs=None):
+    """
+    مهمة استعادة نسخة directory - النتيجة تُسجل في metadata['restore']
+    (update بدون إشارات حتى لا يكتب سجل التدقيق أثناء الاستعادة)
+    """
+    from rent.models import Backup
+
+    metadata = dict(backup.metadata or {})
+    restore = {'status': 'in_progress', 'started_at': timezone.now().isoformat()}
+    metadata['restore'] = restore
+    Backup.objects.filter(pk=backup.pk).update(metadata=metadata)
+
+    try:
+        restore_pg_directory(backup.file_path, jobs)
+        restore['status'] = 'completed'
+    except Exception as e:
+        logger.error(f'pg_restore of backup {backup.pk} failed: {e}', exc_info=True)
+        restore['status'] = 'failed'
+        restore['error'] = str(e)
+    restore['finished_at'] = timezone.now().isoformat()
+    # قد تكون الاستعادة استبدلت جدول النسخ - الكتابة على أحدث نسخة من السجل
+    Backup.objects.filter(pk=backup.pk).update(metadata=metadata)
+    return restore
+
+
+# (الدالة، وصف المهمة) لكل نوع مهمة في enqueue_backup_job
+BACKUP_JOBS = {
+    'json': (run_json_backup, 'نسخة احتياطية JSON'),
+    'pg_directory': (run_pg_directory_backup, 'نسخة احتياطية PostgreSQL'),
+    'pg_restore': (run_pg_directory_restore, 'استعادة نسخة PostgreSQL'),
+}
@@ -0,0 +1,230 @@
+# services/cashflow_forecast_service.py
+
+"""
+توقعات التدفق النقدي لمحفظة العقود النشطة
+
+التحصيل المتوقع لكل شهر خلال 12-36 شهراً قادمة:
+- جداول الأقساط لكل العقود دفعة واحدة (PortfolioFinancialService + schedule_builder)
+  فتشمل زيادات وتخفيضات الإيجار المطبقة وتنتهي عند نهاية العقد
+- VAT والخصومات المجدولة من ModificationManager لكل قسط
+- المدفوعات المرحلة تُوزع FIFO (نفس ContractPeriod.apply_payments) فالمسدد
+  مقدماً من الأقساط القادمة لا يُحسب ضمن المتوقع
+
+النتيجة CashFlowForecast: مصفوفة (عقود × أشهر) مع تجميع حسب المبنى والأرض
+ودورية السداد، محفوظة في الـ cache المشترك (financial_cache.get_shared_cache)
+لكل (تاريخ الحساب، عدد الأشهر). أي تغيير على عقد أو تعديل أو سند يرفع رقم
+الجيل فتُهمل النسخ المحفوظة في كل العمليات؛ بدون cache مشترك يُحسب التوقع
+في كل طلب.
+"""
+
+from collections import OrderedDict
+from datetime import date
+from decimal import Decimal
+import logging
+
+from dateutil.relativedelta import relativedelta
+
+from rent.services.financial_cache import get_shared_cache
+
+logger = logging.getLogger(__name__)
+
+MIN_MONTHS = 12
+MAX_MONTHS = 36
+DEFAULT_MONTHS = 12
+
+CACHE_PREFIX = 'cashflow_forecast'
+CACHE_TIMEOUT = 60 * 60
+GENERATION_KEY = f'{CACHE_PREFIX}:generation'
+
+
+# ========================================
+# Cache Generation
+# ========================================
+
+def _get_generation(cache):
+    generation = cache.get(GENERATION_KEY)
+    if generation is None:
+        generation = 1
+        cache.add(GENERATION_KEY, generation, None)
+    return generation
+
+
+def invalidate_cashflow_forecasts():
+    """إهمال كل التوقعات المحفوظة (بعد تغيير عقد أو تعديل أو سند)"""
+    cache = get_shared_cache()
+    if cache is None:
+        return
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.set(GENERATION_KEY, 2, None)
+
+
+# ========================================
+# CashFlowForecast
+# ========================================
+
+class CashFlowForecast:
+    """
+    نتيجة التوقع
+
+    Attributes:
+        months: أول يوم من كل شهر في نافذة التوقع
+        rows: صف لكل عقد {'contract_id', 'contract_number', 'tenant_name',
+            'building_id', 'building_name', 'land_id', 'land_name',
+            'payment_frequency', 'values': [Decimal لكل شهر], 'total'}
+        monthly_totals: إجمالي كل شهر لكل العقود
+        by_building / by_land / by_frequency: {مفتاح: {'label', 'values', 'total'}}
+    """
+
+    def __init__(self, as_of_date, months, rows):
+        self.as_of_date = as_of_date
+        self.months = months
+        self.rows = rows
+
+        self.monthly_totals = self._sum_columns(rows)
+        self.total = sum(self.monthly_totals, Decimal('0'))
+        self.by_building = self._group(rows, 'building_id', 'building_name')
+        self.by_land = self._group(rows, 'land_id', 'land_name')
+        self.by_frequency = self._group(rows, 'payment_frequency', 'payment_frequency_display')
+
+    def _sum_columns(self, rows):
+        totals = [Decimal('0')] * len(self.months)
+        for row in rows:
+            for index, value in enumerate(row['values']):
+                totals[index] += value
+        return totals
+
+    def _group(self, rows, key_field, label_field):
+        groups = OrderedDict()
+        for row in sorted(rows, key=lambda r: str(r[label_field])):
+            group = groups.setdefault(row[key_field], {
+                'label': row[label_field],
+                'values': [Decimal('0')] * len(self.months),
+                'total': Decimal('0'),
+                'contracts_count': 0,
+            })
+            for index, value in enumerate(row['values']):
+                group['values'][index] += value
+            group['total'] += row['total']
+            group['contracts_count'] += 1
+        return groups
+
+    @property
+    def month_labels(self):
+        return [month.strftime('%Y-%m') for month in self.months]
+
+    def to_chart_data(self):
+        return {
+            'labels': self.month_labels,
+            'values': [float(value) for value in self.monthly_totals],
+        }
+
+
+# ========================================
+# CashFlowForecastService
+# ========================================
+
+class CashFlowForecastService:
+    """حساب توقعات التحصيل الشهرية للعقود النشطة"""
+
+    def __init__(self, as_of_date=None, months=DEFAULT_MONTHS):
+        self.as_of_date = as_of_date or date.today()
+        self.months = min(max(int(months), MIN_MONTHS), MAX_MONTHS)
+
+        self.window_start = self.as_of_date.replace(day=1)
+
+    def cache_key(self, cache):
+        return f'{CACHE_PREFIX}:{_get_generation(cache)}:{self.as_of_date.isoformat()}:{self.months}'
+
+    def get_forecast(self, use_cache=True):
+        """التوقع من الـ cache أو حسابه وحفظه"""
+        cache = get_shared_cache()
+        if cache is None:
+            return self.build()
+
+        key = self.cache_key(cache)
+        if use_cache:
+            forecast = cache.get(key)
+            if forecast is not None:
+                return forecast
+
+        forecast = self.build()
+        cache.set(key, forecast, CACHE_TIMEOUT)
+        return forecast
+
+    # ========================================
+    # Building
+    # ========================================
+    def get_contracts(self):
+        from rent.models import Contract, ContractStatus
+
+        return Contract.objects.filter(
+            status=ContractStatus.ACTIVE,
+            is_deleted=False,
+            end_date__gte=self.window_start,
+        ).select_related('tenant').order_by('pk')
+
+    def build(self):
+        from rent.services.portfolio_financial_service import PortfolioFinancialService
+
+        portfolio = PortfolioFinancialService(self.get_contracts(), self.as_of_date)
+        month_index = {
+            (month.year, month.month): index
+            for index, month in enumerate(self._month_starts())
+        }
+
+        rows = []
+        for contract, service in portfolio:
+            values = self._contract_values(contract, service, month_index)
+            rows.append(self._make_row(contract, service, values))
+
+        logger.info(f'Cash-flow forecast: {len(rows)} contracts, {self.months} months from {self.window_start}')
+        return CashFlowForecast(self.as_of_date, self._month_starts(), rows)
+
+    def _month_starts(self):
+        return [self.window_start + relativedelta(months=offset) for offset in range(self.months)]
+
+    def _contract_values(self, contract, service, month_index):
+        """المتبقي المتوقع من كل قسط يقع استحقاقه في نافذة التوقع، موزعاً على الأشهر"""
+        values = [Decimal('0')] * self.months
+        remaining_paid = service.data.total_paid or Decimal('0')
+        last_date = self._last_collectable_date(contract)
+
+        for period in service.calculate_periods_with_modifications(include_future=True):
+            mods = service.get_total_modifications_for_period(period['start_date'])
+            due = period['due_amount'] + mods['total']
+
+            # FIFO: المدفوعات تسدد الأقساط الأقدم أولاً
+            paid = min(max(remaining_paid, Decimal('0')), due)
+            remaining_paid -= paid
+
+            if last_date and period['start_date'] > last_date:
+                continue
+            index = month_index.get((period['start_date'].year, period['start_date'].month))
+            if index is not None and due > paid:
+                values[index] += due - paid
+
+        return values
+
+    def _last_collectable_date(self, contract):
+        if contract.actual_end_date and contract.actual_end_date < contract.end_date:
+            return contract.actual_end_date
+        return contract.end_date
+
+    def _make_row(self, contract, service, values):
+        building = service.building
+        land = getattr(building, 'land', None) if building else None
+        return {
+            'contract_id': contract.id,
+            'contract_number': contract.contract_number,
+            'tenant_name': service.tenant_name,
+            'building_id': getattr(building, 'id', None),
+            'building_name': service.building_name,
+            'land_id': getattr(land, 'id', None),
+            'land_name': getattr(land, 'name', None) or 'غير محدد',
+            'payment_frequency': contract.payment_frequency,
+            'payment_frequency_display': contract.get_payment_frequency_display(),
+            'values': values,
+            'total': sum(values, Decimal('0')),
+        }
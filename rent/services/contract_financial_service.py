@@ -94,6 +94,66 @@ class ContractStatementLine:
         }
 
 
+# ========================================
+# ContractFinancialData
+# ========================================
+class ContractFinancialData:
+    """
+    بيانات العقد المحمّلة مسبقاً (التعديلات المطبقة + المدفوعات)
+
+    تُستخدم عند حساب عدة عقود دفعة واحدة لتجنب استعلامات كل عقد على حدة.
+    عند تمريرها للمكونات يتم الفلترة والترتيب والجمع في Python.
+    """
+    __slots__ = ('applied_modifications', 'total_paid', 'receipts', 'schedule')
+
+    def __init__(self, applied_modifications=None, total_paid=None, receipts=None, schedule=None):
+        # التعديلات المطبقة مرتبة حسب (effective_date, id)
+        self.applied_modifications = sorted(
+            applied_modifications or [],
+            key=lambda m: (m.effective_date, m.id or 0)
+        )
+        self.total_paid = total_paid
+        self.receipts = receipts
+        # جدول الأقساط المبني مسبقاً (list[SchedulePeriod] من schedule_builder)
+        self.schedule = schedule
+
+    @classmethod
+    def from_prefetched(cls, contract):
+        """
+        بناء البيانات من العلاقات المحمّلة مسبقاً بـ prefetch_related
+
+        Returns:
+            ContractFinancialData أو None إذا لم تكن modifications و receipts محمّلة
+        """
+        prefetched = getattr(contract, '_prefetched_objects_cache', {})
+        if 'modifications' not in prefetched or 'receipts' not in prefetched:
+            return None
+
+        applied_modifications = []
+        for mod in contract.modifications.all():
+            if mod.is_applied:
+                # ربط التعديل بنفس كائن العقد لتجنب استعلام إضافي عند الوصول إليه
+                mod.contract = contract
+                applied_modifications.append(mod)
+
+        receipts = list(contract.receipts.all())
+        total_paid = sum(
+            (r.amount for r in receipts if r.status == 'posted' and not r.is_deleted),
+            Decimal('0')
+        )
+
+        return cls(
+            applied_modifications=applied_modifications,
+            total_paid=total_paid,
+            receipts=receipts,
+        )
+
+    def get_applied_modifications(self, *modification_types):
+        if not modification_types:
+            return list(self.applied_modifications)
+        return [m for m in self.applied_modifications if m.modification_type in modification_types]
+
+
 # ========================================
 # PropertyContextManager
 # ========================================
@@ -249,9 +309,10 @@ class PropertyContextManager:
 class PeriodCalculator:
     """حساب فترات العقد مع التعديلات"""
 
-    def __init__(self, contract, as_of_date=None):
+    def __init__(self, contract, as_of_date=None, data=None):
         self.contract = contract
         self.as_of_date = as_of_date or date.today()
+        self.data = data
         # ✅ إضافة Cache
         self._periods_cache = {}
         self._rent_timeline_cache = None
@@ -269,6 +330,13 @@ class PeriodCalculator:
             return self._periods_cache[cache_key]
 
         end_date = self._get_effective_end_date(end_date)
+
+        if self.data is not None and self.data.schedule is not None:
+            # جدول مبني مسبقاً لعدة عقود (schedule_builder)
+            periods = self._create_periods_from_schedule(self.data.schedule, end_date, include_future)
+            self._periods_cache[cache_key] = periods
+            return periods
+
         due_dates = calculate_contract_due_dates(self.contract)
 
         if not due_dates:
@@ -301,10 +369,21 @@ class PeriodCalculator:
         if self._rent_timeline_cache is not None:
             return self._rent_timeline_cache
 
-        rent_mods = list(self.contract.modifications.filter(
-            modification_type__in=['rent_increase', 'rent_decrease'],
-            is_applied=True
-        ).order_by('effective_date').values('id', 'effective_date', 'old_rent_amount', 'new_rent_amount'))
+        if self.data is not None:
+            rent_mods = [
+                {
+                    'id': m.id,
+                    'effective_date': m.effective_date,
+                    'old_rent_amount': m.old_rent_amount,
+                    'new_rent_amount': m.new_rent_amount,
+                }
+                for m in self.data.get_applied_modifications('rent_increase', 'rent_decrease')
+            ]
+        else:
+            rent_mods = list(self.contract.modifications.filter(
+                modification_type__in=['rent_increase', 'rent_decrease'],
+                is_applied=True
+            ).order_by('effective_date').values('id', 'effective_date', 'old_rent_amount', 'new_rent_amount'))
 
         # الإيجار الأساسي
         base_annual_rent = rent_mods[0]['old_rent_amount'] if rent_mods else self.contract.annual_rent
@@ -358,6 +437,24 @@ class PeriodCalculator:
         logger.info(f'Generated {len(periods)} periods for contract {self.contract.id}')
         return periods
 
+    def _create_periods_from_schedule(self, schedule, end_date, include_future):
+        """إنشاء الفترات من جدول مبني مسبقاً (نفس نتيجة _create_periods)"""
+        frequency_display = self.contract.get_payment_frequency_display()
+        return [
+            {
+                'period_number': row.period_number,
+                'start_date': row.start_date,
+                'end_date': row.end_date,
+                'due_amount': row.period_rent,
+                'annual_rent': row.annual_rent,
+                'source': row.source,
+                'description': f'قسط رقم {row.period_number} - {frequency_display}',
+                'is_future': row.start_date > end_date
+            }
+            for row in schedule
+            if include_future or row.start_date <= end_date
+        ]
+
     def _find_applicable_rent(self, due_date, timeline_dates):
         """البحث عن الإيجار المناسب للفترة"""
         applicable = timeline_dates[0][2]  # default
@@ -380,8 +477,9 @@ class PeriodCalculator:
 class ModificationManager:
     """إدارة تعديلات VAT والخصم"""
 
-    def __init__(self, contract):
+    def __init__(self, contract, data=None):
         self.contract = contract
+        self.data = data
         self._cache = None
 
     def get_modifications_map(self):
@@ -398,7 +496,10 @@ class ModificationManager:
         - VAT و Discount لهما period_number يحدد الفترة المستهدفة
         - نطبق التعديل على الفترة المحددة فقط
         """
-        due_dates = calculate_contract_due_dates(self.contract)
+        if self.data is not None and self.data.schedule is not None:
+            due_dates = [row.start_date for row in self.data.schedule]
+        else:
+            due_dates = calculate_contract_due_dates(self.contract)
         if not due_dates:
             return {}
 
@@ -414,10 +515,7 @@ class ModificationManager:
             }
 
         # ✅ إصلاح: معالجة VAT
-        for vat in self.contract.modifications.filter(
-            modification_type='vat',
-            is_applied=True
-        ).order_by('effective_date'):
+        for vat in self._get_applied_modifications('vat'):
 
             # استخدام vat_period_number لتحديد الفترة
             period_number = getattr(vat, 'vat_period_number', None)
@@ -433,10 +531,7 @@ class ModificationManager:
                         modifications_map[due_date]['vat_amount'] = vat.vat_amount or Decimal('0')
 
         # ✅ إصلاح: معالجة الخصومات
-        for discount in self.contract.modifications.filter(
-            modification_type='discount',
-            is_applied=True
-        ).order_by('effective_date'):
+        for discount in self._get_applied_modifications('discount'):
 
             # استخدام discount_period_number لتحديد الفترة
             period_number = getattr(discount, 'discount_period_number', None)
@@ -459,6 +554,14 @@ class ModificationManager:
 
         return modifications_map
 
+    def _get_applied_modifications(self, modification_type):
+        if self.data is not None:
+            return self.data.get_applied_modifications(modification_type)
+        return self.contract.modifications.filter(
+            modification_type=modification_type,
+            is_applied=True
+        ).order_by('effective_date')
+
     def get_total_modifications_for_period(self, period_start_date):
         mods_map = self.get_modifications_map()
         return mods_map.get(period_start_date, {
@@ -478,11 +581,12 @@ class ModificationManager:
 class PaymentDistributor:
     """توزيع المدفوعات على الفترات (FIFO - المستحق أولاً يُسدد أولاً)"""
 
-    def __init__(self, contract, period_calculator, modification_manager, as_of_date=None):
+    def __init__(self, contract, period_calculator, modification_manager, as_of_date=None, data=None):
         self.contract = contract
         self.period_calculator = period_calculator
         self.modification_manager = modification_manager
         self.as_of_date = as_of_date or date.today()
+        self.data = data
 
     @handle_errors(default_return=lambda: {'periods': [], 'totals': {}}, log_message="Error distributing payments")
     def calculate_periods_with_payments(self):
@@ -544,6 +648,9 @@ class PaymentDistributor:
 
     @handle_errors(default_return=lambda: Decimal('0'), log_message="Error getting total paid")
     def _get_total_paid(self):
+        if self.data is not None and self.data.total_paid is not None:
+            return self.data.total_paid
+
         receipt_filter = {'status': 'posted'}
         if hasattr(self.contract.receipts.model, 'is_deleted'):
             receipt_filter['is_deleted'] = False
@@ -568,10 +675,11 @@ class StatementGenerator:
         'termination': ('🔴', False, None),
     }
 
-    def __init__(self, contract, period_calculator, as_of_date=None):
+    def __init__(self, contract, period_calculator, as_of_date=None, data=None):
         self.contract = contract
         self.period_calculator = period_calculator
         self.as_of_date = as_of_date or date.today()
+        self.data = data
 
     @handle_errors(default_return=lambda: {'success': False, 'error': 'Unknown error'}, log_message="Error generating statement")
     def generate_statement(self, end_date=None, include_future=False):
@@ -594,21 +702,47 @@ class StatementGenerator:
         }
 
     def _get_applied_modifications(self, end_date):
+        if self.data is not None:
+            modifications = [
+                m for m in self.data.get_applied_modifications()
+                if m.effective_date <= end_date
+            ]
+        else:
+            modifications = self.contract.modifications.filter(
+                is_applied=True,
+                effective_date__lte=end_date
+            ).order_by('effective_date')
+
         return [
             {
                 'date': m.effective_date,
                 'modification': m,
                 'description': m.get_summary()
             }
-            for m in self.contract.modifications.filter(
-                is_applied=True,
-                effective_date__lte=end_date
-            ).order_by('effective_date')
+            for m in modifications
         ]
 
     def _get_contract_receipts(self, end_date):
-        # استيراد هنا لتجنب Circular Import
-        from rent.models.receipt_models import Receipt
+        if self.data is not None and self.data.receipts is not None:
+            receipts = sorted(
+                (
+                    r for r in self.data.receipts
+                    if r.status in ('posted', 'cleared')
+                    and r.receipt_date <= end_date
+                    and not r.is_deleted
+                ),
+                key=lambda r: (r.receipt_date, r.id)
+            )
+        else:
+            # استيراد هنا لتجنب Circular Import
+            from rent.models.receipt_models import Receipt
+            receipts = Receipt.objects.filter(
+                contract=self.contract,
+                status__in=['posted', 'cleared'],
+                receipt_date__lte=end_date,
+                is_deleted=False
+            ).order_by('receipt_date')
+
         return [
             {
                 'date': r.receipt_date,
@@ -616,12 +750,7 @@ class StatementGenerator:
                 'description': f'دفعة - {r.get_payment_method_display()}',
                 'reference': r.receipt_number
             }
-            for r in Receipt.objects.filter(
-                contract=self.contract,
-                status__in=['posted', 'cleared'],
-                receipt_date__lte=end_date,
-                is_deleted=False
-            ).order_by('receipt_date')
+            for r in receipts
         ]
 
     def _build_timeline(self, periods, modifications, receipts):
@@ -781,9 +910,10 @@ class StatementGenerator:
 class ModificationValidator:
     """التحقق من صحة التعديلات"""
 
-    def __init__(self, contract, period_calculator):
+    def __init__(self, contract, period_calculator, data=None):
         self.contract = contract
         self.period_calculator = period_calculator
+        self.data = data
 
     def validate_modification(self, modification_type: str, effective_date: date, **kwargs) -> Tuple[bool, str]:
         validators = [
@@ -819,11 +949,17 @@ class ModificationValidator:
         if modification_type not in ['rent_increase', 'rent_decrease']:
             return True, ''
 
-        overlap = self.contract.modifications.filter(
-            modification_type__in=['rent_increase', 'rent_decrease'],
-            is_applied=True,
-            effective_date=effective_date
-        ).first()
+        if self.data is not None:
+            overlap = next((
+                m for m in self.data.get_applied_modifications('rent_increase', 'rent_decrease')
+                if m.effective_date == effective_date
+            ), None)
+        else:
+            overlap = self.contract.modifications.filter(
+                modification_type__in=['rent_increase', 'rent_decrease'],
+                is_applied=True,
+                effective_date=effective_date
+            ).first()
 
         if overlap:
             return False, _(
@@ -852,14 +988,21 @@ class ModificationValidator:
 class ContractFinancialService:
     """الخدمة الموحدة للحسابات المالية"""
 
-    def __init__(self, contract, as_of_date=None):
+    def __init__(self, contract, as_of_date=None, data=None, use_shared_cache=True):
         self.contract = contract
         self.as_of_date = as_of_date or date.today()
+        # النتائج المحفوظة بين الطلبات (financial_cache) - تُعطل للحساب على بيانات غير محفوظة
+        self.use_shared_cache = use_shared_cache
+        # بيانات محمّلة مسبقاً (ContractFinancialData) - اختياري
+        # إذا لم تُمرَّر تُستخدم العلاقات المحمّلة بـ prefetch_related إن وجدت
+        if data is None:
+            data = ContractFinancialData.from_prefetched(contract)
+        self.data = data
 
         # المكونات الرئيسية
         self._property_context = PropertyContextManager(contract)
-        self._period_calculator = PeriodCalculator(contract, as_of_date)
-        self._modification_manager = ModificationManager(contract)
+        self._period_calculator = PeriodCalculator(contract, as_of_date, data)
+        self._modification_manager = ModificationManager(contract, data)
 
         # Lazy loaded components
         self._payment_distributor = None
@@ -870,6 +1013,17 @@ class ContractFinancialService:
         self._cached_periods_with_payments = None
         self._cached_summary = None
 
+    @classmethod
+    def for_contracts(cls, contracts, as_of_date=None):
+        """
+        حساب مجموعة عقود دفعة واحدة بعدد ثابت من الاستعلامات
+
+        Returns:
+            PortfolioFinancialService
+        """
+        from rent.services.portfolio_financial_service import PortfolioFinancialService
+        return PortfolioFinancialService(contracts, as_of_date)
+
     # ========================================
     # Property Accessors
     # ========================================
@@ -941,12 +1095,21 @@ class ContractFinancialService:
     def calculate_periods_with_payments(self, force_refresh=False):
         if force_refresh or self._cached_periods_with_payments is None:
             distributor = self._get_payment_distributor()
-            self._cached_periods_with_payments = distributor.calculate_periods_with_payments()
+            if force_refresh:
+                self._cached_periods_with_payments = distributor.calculate_periods_with_payments()
+            else:
+                self._cached_periods_with_payments = self._get_shared(
+                    'periods_with_payments', (), distributor.calculate_periods_with_payments
+                )
         return self._cached_periods_with_payments
 
     def generate_statement(self, end_date=None, include_future=False):
         generator = self._get_statement_generator()
-        return generator.generate_statement(end_date, include_future)
+        return self._get_shared(
+            'statement', (end_date, include_future),
+            lambda: generator.generate_statement(end_date, include_future),
+            cacheable=lambda result: result.get('success', False),
+        )
 
     def validate_modification(self, modification_type: str, effective_date: date, **kwargs) -> Tuple[bool, str]:
         validator = self._get_validator()
@@ -1059,6 +1222,10 @@ class ContractFinancialService:
         if self._cached_summary is not None:
             return self._cached_summary
 
+        self._cached_summary = self._get_shared('summary', (), self._build_contract_summary)
+        return self._cached_summary
+
+    def _build_contract_summary(self):
         data = self.calculate_periods_with_payments()
         periods = data.get('periods', [])
         totals = data.get('totals', {})
@@ -1091,7 +1258,6 @@ class ContractFinancialService:
             elif status in status_mapping:
                 summary[status_mapping[status]].append(period)
 
-        self._cached_summary = summary
         return summary
 
     def calculate_payment_distribution(self, payment_amount):
@@ -1139,6 +1305,8 @@ class ContractFinancialService:
     def refresh_data(self):
         """تحديث كامل للبيانات"""
         self.invalidate_cache()
+        # البيانات المحمّلة مسبقاً قد تكون قديمة - العودة لقاعدة البيانات
+        self.data = None
         self._period_calculator = PeriodCalculator(self.contract, self.as_of_date)
         self._modification_manager = ModificationManager(self.contract)
         self._payment_distributor = None
@@ -1148,24 +1316,41 @@ class ContractFinancialService:
     # ========================================
     # Private Methods
     # ========================================
+    def _get_shared(self, method, params, compute, cacheable=None):
+        """النتيجة من الـ cache المشترك بين الطلبات (financial_cache) للعقود المحفوظة"""
+        if not self.use_shared_cache or self.contract.pk is None or self.contract._state.adding:
+            return compute()
+
+        from rent.services.financial_cache import get_or_compute
+
+        # قيم العقد نفسها جزء من المفتاح: كائن عُدّل في الذاكرة ولم يُحفظ لا يقرأ نتيجة المحفوظ
+        contract = self.contract
+        fingerprint = (
+            contract.start_date, contract.end_date, contract.annual_rent,
+            contract.payment_frequency, contract.status, contract.actual_end_date,
+        )
+        return get_or_compute(
+            contract.pk, method, (self.as_of_date,) + tuple(params) + fingerprint, compute, cacheable
+        )
+
     def _get_payment_distributor(self):
         if self._payment_distributor is None:
             self._payment_distributor = PaymentDistributor(
                 self.contract, self._period_calculator,
-                self._modification_manager, self.as_of_date
+                self._modification_manager, self.as_of_date, self.data
             )
         return self._payment_distributor
 
     def _get_statement_generator(self):
         if self._statement_generator is None:
             self._statement_generator = StatementGenerator(
-                self.contract, self._period_calculator, self.as_of_date
+                self.contract, self._period_calculator, self.as_of_date, self.data
             )
         return self._statement_generator
 
     def _get_validator(self):
         if self._validator is None:
-            self._validator = ModificationValidator(self.contract, self._period_calculator)
+            self._validator = ModificationValidator(self.contract, self._period_calculator, self.data)
         return self._validator
 
     # ✅ Backward compatibility methods
@@ -1206,7 +1391,7 @@ def get_contract_periods_with_modifications(contract):
 
 def generate_tenants_report(contracts):
     """إنشاء تقرير المستأجرين"""
-    return [ContractFinancialService(c).get_tenant_report_data() for c in contracts]
+    return ContractFinancialService.for_contracts(contracts).get_tenant_report_data()
 
 
 def format_statement_report(statement):
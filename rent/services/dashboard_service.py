@@ -0,0 +1,372 @@
+# services/dashboard_service.py
+
+"""
+بيانات لوحة التحكم كعناصر (widgets) محفوظة في الـ cache المشترك بين العمليات
+(financial_cache.get_shared_cache) - بدونه تُحسب العناصر في كل طلب، فلا
+تعرض عملية نتيجة لم يصلها إهمالها من عملية أخرى
+
+كل عنصر يُحسب باستعلامات مجمّعة (Count/Sum مع filter=Q) بدلاً من count()
+و aggregate() منفصلة، ويُحفظ بمدة خاصة به (TTL). المفتاح يحوي رقم جيل
+للعنصر يُرفع عند حفظ أو حذف أي نموذج يعتمد عليه (بعد نجاح المعاملة أيضاً)،
+فيُعاد حساب العنصر المتأثر فقط.
+
+المستحقات والعقود المتأخرة من Contract.objects.with_outstanding() (جدول
+الأقساط المحفوظ - استعلام واحد لكل العقود)، والعقود التي لم يُولّد جدولها
+بعد تُحسب بـ PortfolioFinancialService دفعة واحدة.
+"""
+
+from datetime import date, timedelta
+from decimal import Decimal
+import hashlib
+import json
+import logging
+
+from django.db import transaction
+from django.db.models import Count, OuterRef, Q, Subquery, Sum
+
+from rent.services.financial_cache import get_shared_cache
+
+logger = logging.getLogger(__name__)
+
+CACHE_PREFIX = 'dashboard'
+
+OVERDUE_STATUSES = ['active', 'expired', 'suspended']
+OVERDUE_LIST_SIZE = 10
+EXPIRING_DAYS = 30
+EXPIRING_LIST_SIZE = 5
+
+
+# ========================================
+# Widgets
+# ========================================
+
+def _contracts_widget(today, user=None):
+    """العقود النشطة والمنتهية قريباً (استعلام مجمّع + أول 5)"""
+    from rent.models import Contract
+
+    expiring = Q(end_date__gte=today, end_date__lte=today + timedelta(days=EXPIRING_DAYS))
+    active = Contract.objects.filter(status='active', is_deleted=False)
+
+    stats = active.aggregate(
+        total=Count('id'),
+        expiring=Count('id', filter=expiring),
+    )
+
+    return {
+        'total_contracts': stats['total'] or 0,
+        'expiring_contracts': stats['expiring'] or 0,
+        'expiring_contracts_list': list(
+            active.filter(expiring).select_related('tenant').prefetch_related(
+                'units__building__land'
+            ).order_by('end_date')[:EXPIRING_LIST_SIZE]
+        ),
+    }
+
+
+def _properties_widget(today, user=None):
+    """الوحدات والمستأجرين والأراضي والمباني"""
+    from rent.models import Building, Contract, Land, Tenant, Unit
+    from rent.services.unit_availability_service import UnitAvailabilityService
+
+    # مزامنة حالة الوحدات مع العقود السارية قبل العد (مرة لكل إعادة حساب)
+    UnitAvailabilityService(
+        contract_model=Contract,
+        unit_model=Unit,
+        active_status_value='active',
+        available_status_value='available',
+        rented_status_value='rented',
+    ).update_all_units_availability()
+
+    units = Unit.objects.filter(is_active=True).aggregate(
+        total=Count('id'),
+        rented=Count('id', filter=Q(status='rented')),
+    )
+    total_units = units['total'] or 0
+    rented_units = units['rented'] or 0
+
+    return {
+        'total_units': total_units,
+        'rented_units': rented_units,
+        'available_units': total_units - rented_units,
+        'occupancy_rate': round(rented_units / total_units * 100, 2) if total_units else 0,
+        'total_tenants': Tenant.objects.filter(is_active=True).count(),
+        'total_lands': Land.objects.filter(is_active=True).count(),
+        'total_buildings': Building.objects.filter(is_active=True).count(),
+    }
+
+
+def _receipts_widget(today, user=None):
+    """تحصيل اليوم والشهر الحالي (استعلام واحد)"""
+    from rent.models import Receipt
+
+    totals = Receipt.objects.filter(
+        status='posted',
+        is_deleted=False,
+        receipt_date__gte=today.replace(day=1),
+        receipt_date__lte=today,
+    ).aggregate(
+        month=Sum('amount'),
+        today=Sum('amount', filter=Q(receipt_date=today)),
+        today_count=Count('id', filter=Q(receipt_date=today)),
+    )
+
+    return {
+        'total_receipts_today': totals['today'] or Decimal('0'),
+        'total_receipts_today_count': totals['today_count'] or 0,
+        'total_receipts_month': totals['month'] or Decimal('0'),
+    }
+
+
+def _outstanding_widget(today, user=None):
+    """إجمالي المستحقات وأعلى العقود المتأخرة (بدون حد لعدد العقود)"""
+    from rent.models import Contract, ContractPeriod
+
+    contracts = Contract.objects.filter(
+        status__in=OVERDUE_STATUSES,
+        is_deleted=False,
+    )
+    # العقود بدون جدول تُحسب أدناه دون توليد جداولها أثناء عرض اللوحة
+    with_schedule = contracts.filter(
+        pk__in=ContractPeriod.objects.values('contract_id')
+    ).with_outstanding(today, build_missing=False)
+
+    # العقود النشطة فقط في الإجمالي والعدد (مثل API الإحصائيات)
+    totals = with_schedule.filter(status='active').aggregate(
+        total=Sum('outstanding_amount'),
+        overdue=Count('id', filter=Q(outstanding_amount__gt=0)),
+    )
+    total_outstanding = totals['total'] or Decimal('0')
+    overdue_count = totals['overdue'] or 0
+
+    first_unpaid_start = ContractPeriod.objects.filter(
+        contract=OuterRef('pk'),
+        period_number=OuterRef('first_unpaid_period'),
+    ).values('start_date')[:1]
+
+    overdue = []
+    for contract in with_schedule.filter(outstanding_amount__gt=0).annotate(
+        first_unpaid_start=Subquery(first_unpaid_start)
+    ).select_related('tenant').order_by('-outstanding_amount')[:OVERDUE_LIST_SIZE]:
+        # أقدم قسط متأخر هو أول قسط غير مسدد (الأقساط بالترتيب)
+        started = contract.first_unpaid_start
+        overdue.append({
+            'contract': contract,
+            'outstanding': contract.outstanding_amount,
+            'status': contract.status,
+            'overdue_periods_count': contract.overdue_periods_count,
+            'days_overdue': (
+                (today - started).days
+                if contract.overdue_periods_count and started and started < today else 0
+            ),
+        })
+
+    # عقود لم يُولّد جدول أقساطها بعد (rebuild_contract_periods)
+    missing = contracts.without_schedule().select_related('tenant')
+    if missing.exists():
+        total, items = _outstanding_without_schedule(missing, today)
+        total_outstanding += total
+        overdue_count += sum(1 for item in items if item['status'] == 'active')
+        overdue.extend(items)
+        overdue.sort(key=lambda item: item['outstanding'], reverse=True)
+
+    return {
+        'total_outstanding': total_outstanding,
+        'overdue_contracts_count': overdue_count,
+        'overdue_contracts': overdue[:OVERDUE_LIST_SIZE],
+    }
+
+
+def _outstanding_without_schedule(contracts, today):
+    from rent.services.portfolio_financial_service import PortfolioFinancialService
+
+    total = Decimal('0')
+    items = []
+    for contract, service in PortfolioFinancialService(contracts, today):
+        outstanding = service.get_outstanding_amount()
+        if contract.status == 'active':
+            total += outstanding
+        if outstanding <= 0:
+            continue
+
+        overdue_periods = [p for p in service.get_unpaid_periods() if p['status'] == 'overdue']
+        oldest = min((p['start_date'] for p in overdue_periods), default=None)
+        items.append({
+            'contract': contract,
+            'outstanding': outstanding,
+            'status': contract.status,
+            'overdue_periods_count': len(overdue_periods),
+            'days_overdue': (today - oldest).days if oldest and oldest < today else 0,
+        })
+    return total, items
+
+
+def _notifications_widget(today, user=None):
+    from rent.models import Notification
+
+    return {
+        'unread_notifications': Notification.objects.filter(is_read=False, user=user).count(),
+    }
+
+
+class DashboardWidget:
+    """
+    عنصر في لوحة التحكم
+
+    Attributes:
+        compute: دالة (today, user) تُرجع dict يُضاف لسياق القالب
+        timeout: مدة الحفظ بالثواني
+        depends_on: النماذج (app_label.model) التي يُعاد الحساب عند تغييرها
+        per_user: نسخة لكل مستخدم
+    """
+
+    def __init__(self, name, compute, timeout, depends_on, per_user=False):
+        self.name = name
+        self.compute = compute
+        self.timeout = timeout
+        self.depends_on = frozenset(depends_on)
+        self.per_user = per_user
+
+    @property
+    def generation_key(self):
+        return f'{CACHE_PREFIX}:{self.name}:generation'
+
+    def cache_key(self, cache, today, user=None):
+        generation = cache.get(self.generation_key)
+        if generation is None:
+            generation = 1
+            cache.add(self.generation_key, generation, None)
+        key = f'{CACHE_PREFIX}:{self.name}:{generation}:{today.isoformat()}'
+        if self.per_user:
+            key += f':{getattr(user, "pk", None)}'
+        return key
+
+    def get(self, today, user=None):
+        cache = get_shared_cache()
+        if cache is None:
+            return self.compute(today, user)
+
+        key = self.cache_key(cache, today, user)
+        data = cache.get(key)
+        if data is None:
+            data = self.compute(today, user)
+            cache.set(key, data, self.timeout)
+        return data
+
+    def invalidate(self):
+        cache = get_shared_cache()
+        if cache is None:
+            return
+        try:
+            cache.incr(self.generation_key)
+        except ValueError:
+            cache.set(self.generation_key, 2, None)
+
+
+WIDGETS = [
+    DashboardWidget(
+        'contracts', _contracts_widget, timeout=10 * 60,
+        depends_on=['rent.contract', 'rent.tenant'],
+    ),
+    DashboardWidget(
+        'properties', _properties_widget, timeout=30 * 60,
+        depends_on=['rent.unit', 'rent.building', 'rent.land', 'rent.tenant', 'rent.contract'],
+    ),
+    DashboardWidget(
+        'receipts', _receipts_widget, timeout=2 * 60,
+        depends_on=['rent.receipt'],
+    ),
+    DashboardWidget(
+        'outstanding', _outstanding_widget, timeout=5 * 60,
+        depends_on=['rent.contract', 'rent.receipt', 'rent.contractmodification', 'rent.tenant'],
+    ),
+    DashboardWidget(
+        'notifications', _notifications_widget, timeout=60,
+        depends_on=['rent.notification'], per_user=True,
+    ),
+]
+
+_WIDGETS_BY_MODEL = {}
+for _widget in WIDGETS:
+    for _label in _widget.depends_on:
+        _WIDGETS_BY_MODEL.setdefault(_label, []).append(_widget)
+
+
+# ========================================
+# Public API
+# ========================================
+
+def get_dashboard_data(user=None, today=None, widgets=None):
+    """
+    سياق لوحة التحكم من العناصر المحفوظة
+
+    Args:
+        widgets: أسماء العناصر المطلوبة (الكل افتراضياً)
+    """
+    today = today or date.today()
+    data = {}
+    for widget in WIDGETS:
+        if widgets is not None and widget.name not in widgets:
+            continue
+        try:
+            data.update(widget.get(today, user))
+        except Exception as e:
+            # عنصر فاشل لا يمنع عرض البقية
+            logger.error(f'Dashboard widget {widget.name} failed: {e}', exc_info=True)
+            data.setdefault('dashboard_errors', []).append(widget.name)
+    return data
+
+
+def get_dashboard_stats(today=None):
+    """
+    إحصائيات المحفظة (API التحديث الدوري) مع ETag محسوب من نفس البيانات
+
+    الـ ETag بصمة الإحصائيات نفسها (من العناصر في الـ cache المشترك) وليس من
+    قاعدة البيانات مباشرة: لا تُثبّت استجابات 304 نتيجة قديمة بـ ETag جديد،
+    وكل العمليات تُرجع نفس البصمة لنفس البيانات، والطلب الدوري بلا تغيير لا
+    يستعلم عن الجداول.
+
+    Returns:
+        (stats dict, etag)
+
+    Raises:
+        RuntimeError: إذا فشل حساب أحد العناصر
+    """
+    data = get_dashboard_data(today=today, widgets=['receipts', 'outstanding'])
+    if data.get('dashboard_errors'):
+        raise RuntimeError('تعذر حساب بعض الإحصائيات')
+
+    stats = {
+        'overdue_contracts': data['overdue_contracts_count'],
+        'total_outstanding': float(data['total_outstanding']),
+        'receipts_today': {
+            'count': data['total_receipts_today_count'],
+            'total': float(data['total_receipts_today']),
+        },
+    }
+    etag = hashlib.md5(json.dumps(stats, sort_keys=True).encode()).hexdigest()
+    return stats, etag
+
+
+def invalidate_dashboard(model_label=None):
+    """إعادة حساب العناصر المعتمدة على النموذج (أو كلها)"""
+    widgets = WIDGETS if model_label is None else _WIDGETS_BY_MODEL.get(model_label, [])
+    for widget in widgets:
+        widget.invalidate()
+
+
+def _handle_model_change(sender, **kwargs):
+    """فوراً وبعد نجاح المعاملة (بعد إعادة بناء جداول الأقساط في on_commit)"""
+    label = sender._meta.label_lower
+    invalidate_dashboard(label)
+    transaction.on_commit(lambda: invalidate_dashboard(label))
+
+
+def connect_signals():
+    """ربط post_save / post_delete للنماذج التي تعتمد عليها العناصر (RentConfig.ready)"""
+    from django.apps import apps
+    from django.db.models.signals import post_delete, post_save
+
+    for label in _WIDGETS_BY_MODEL:
+        model = apps.get_model(label)
+        post_save.connect(_handle_model_change, sender=model, dispatch_uid=f'dashboard_{label}_save')
+        post_delete.connect(_handle_model_change, sender=model, dispatch_uid=f'dashboard_{label}_delete')
@@ -0,0 +1,187 @@
+# services/financial_cache.py
+
+"""
+تخزين نتائج الحسابات المالية للعقد بين الطلبات
+
+PeriodCalculator و ModificationManager يحفظان النتائج على الكائن فقط، فكل طلب
+يبدأ من الصفر (صفحة العقد، الكشف، طباعة الكشف، API الملخص كلها تعيد الحساب).
+هنا تُحفظ نتائج calculate_periods_with_payments و generate_statement و
+get_contract_summary في Django cache مشترك بين العمليات (Redis أو file) بمفتاح:
+
+    contract_financial:<epoch>:<contract_id>:<version>:<method>:<params>
+
+- version: عداد لكل عقد يُرفع عند حفظ أو حذف سند أو تعديل أو العقد نفسه
+  (فوراً وبعد نجاح المعاملة) فتُهمل النتائج القديمة دون حذفها
+- epoch: يُرفع بعد استعادة نسخة احتياطية (bulk_create لا يرسل الإشارات)
+- قيمة البداية لأي عداد مفقود (أول استخدام أو أُزيل من الـ cache) رقم زمني
+  فلا يعود لقيمة سابقة تشير لنتائج قديمة
+
+العدادات في نفس الـ cache، فيجب أن يكون مشتركاً حتى يصل رفعها لكل العمليات.
+locmem (لكل عملية) لا يُستخدم إلا مع FINANCIAL_CACHE_ALLOW_LOCMEM (عملية
+واحدة)، وإلا تُحسب النتائج في كل طلب.
+
+الحجم محدود بإعدادات الـ cache المستخدم (FINANCIAL_CACHE_ALIAS):
+locmem بـ MAX_ENTRIES يحذف الأقدم استخداماً (LRU)، و Redis بـ
+maxmemory-policy allkeys-lru. عدادات الإصابة/الإخفاق لكل عملية (process).
+"""
+
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+CACHE_PREFIX = 'contract_financial'
+EPOCH_KEY = f'{CACHE_PREFIX}:epoch'
+
+
+def get_shared_cache():
+    """
+    الـ cache المشترك بين العمليات (FINANCIAL_CACHE_ALIAS)، أو None إذا كان
+    locmem غير مسموح به - لكل ما يُهمل بإشارات الحفظ (النتائج المالية،
+    توقعات التدفق النقدي، عناصر لوحة التحكم)
+    """
+    alias = getattr(settings, 'FINANCIAL_CACHE_ALIAS', 'financial')
+    if alias not in settings.CACHES:
+        alias = 'default'
+    cache = caches[alias]
+    if isinstance(cache, LocMemCache) and not getattr(settings, 'FINANCIAL_CACHE_ALLOW_LOCMEM', False):
+        return None
+    return cache
+
+
+def _new_counter():
+    return time.time_ns()
+
+
+# ========================================
+# Statistics
+# ========================================
+
+_stats_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0, 'sets': 0}
+
+
+def _count(name):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def get_cache_stats():
+    """عدادات الإصابة/الإخفاق في هذه العملية"""
+    with _stats_lock:
+        stats = dict(_stats)
+    lookups = stats['hits'] + stats['misses']
+    stats['hit_rate'] = round(stats['hits'] / lookups, 4) if lookups else 0.0
+    return stats
+
+
+def reset_cache_stats():
+    with _stats_lock:
+        for name in _stats:
+            _stats[name] = 0
+
+
+# ========================================
+# Versions
+# ========================================
+
+def _version_key(contract_id):
+    return f'{CACHE_PREFIX}:version:{contract_id}'
+
+
+def _get_counters(contract_id):
+    """(epoch, version) - تهيئة المفقود منهما"""
+    cache = get_shared_cache()
+    version_key = _version_key(contract_id)
+    values = cache.get_many([EPOCH_KEY, version_key])
+
+    for key in (EPOCH_KEY, version_key):
+        if key not in values:
+            cache.add(key, _new_counter(), None)
+            values[key] = cache.get(key)
+
+    return values[EPOCH_KEY], values[version_key]
+
+
+def _incr(key):
+    cache = get_shared_cache()
+    if cache is None:
+        return
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, _new_counter(), None)
+
+
+def bump_contract_version(contract_id):
+    """
+    إهمال النتائج المحفوظة للعقد
+
+    يُرفع العداد فوراً (للطلب الحالي) وبعد نجاح المعاملة حتى لا تبقى نتيجة
+    حُسبت من طلب آخر قبل ظهور التغيير.
+    """
+    if not contract_id:
+        return
+
+    key = _version_key(contract_id)
+    _incr(key)
+    transaction.on_commit(lambda: _incr(key))
+
+
+def clear_financial_cache():
+    """إهمال كل النتائج المحفوظة (مثلاً بعد استعادة نسخة احتياطية)"""
+    _incr(EPOCH_KEY)
+
+
+# ========================================
+# Lookup
+# ========================================
+
+def get_or_compute(contract_id, method, params, compute, cacheable=None):
+    """
+    النتيجة من الـ cache أو حسابها وحفظها
+
+    Args:
+        contract_id: معرف العقد (بدون معرف لا يُستخدم الـ cache)
+        method: اسم العملية (جزء من المفتاح)
+        params: قيم تؤثر في النتيجة (تاريخ الحساب، الخيارات)
+        compute: دالة بدون معاملات تحسب النتيجة
+        cacheable: دالة اختيارية - False للنتائج التي لا تُحفظ (الأخطاء)
+    """
+    if not contract_id:
+        return compute()
+
+    cache = get_shared_cache()
+    if cache is None:
+        return compute()
+    try:
+        epoch, version = _get_counters(contract_id)
+        key = ':'.join(
+            [CACHE_PREFIX, str(epoch), str(contract_id), str(version), method]
+            + [str(value) for value in params]
+        )
+        result = cache.get(key)
+    except Exception as e:
+        # تعطل الـ cache (Redis مثلاً) لا يوقف الحساب
+        logger.warning(f'Financial cache unavailable: {e}')
+        return compute()
+
+    if result is not None:
+        _count('hits')
+        return result
+
+    _count('misses')
+    result = compute()
+    if cacheable is None or cacheable(result):
+        try:
+            cache.set(key, result)
+            _count('sets')
+        except Exception as e:
+            logger.warning(f'Financial cache unavailable: {e}')
+    return result
@@ -0,0 +1,285 @@
+# services/occupancy_service.py
+
+"""
+محرك الإشغال التاريخي للوحدات
+
+Unit.status يجيب فقط "هل الوحدة مؤجرة الآن". هنا تُعاد فترات العقود
+(start_date إلى actual_end_date أو end_date، عبر Contract.units) لكل وحدة:
+
+- load_timelines: فترات كل الوحدات في استعلامين (الوحدات + جدول الربط مع العقود)
+  مدمجة (التجديد المتصل والعقود المتداخلة فترة واحدة)
+- monthly_rows: أيام الإشغال والشغور والإيجار الفائت لكل شهر - تُحفظ في
+  UnitOccupancyMonth (صف لكل وحدة × شهر) للرسوم والتقارير
+- daily_series: سلسلة يومية (عدد الوحدات المؤجرة والمتاحة) بمسح أحداث
+  البداية والنهاية (+1 / -1) دون تكرار على الوحدات لكل يوم
+- monthly_series: السلسلة الشهرية من الجدول المحفوظ لكل المحفظة أو حسب
+  الوحدة أو المبنى أو الأرض
+
+الوحدة تُحسب من تاريخ إضافتها (أو أول عقد عليها إن كان أقدم). العقود
+المسودة والمحذوفة لا تُحسب إشغالاً.
+"""
+
+from collections import namedtuple
+from datetime import date, timedelta
+from decimal import Decimal, ROUND_HALF_UP
+from itertools import accumulate
+import calendar
+import logging
+
+from dateutil.relativedelta import relativedelta
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# أشهر بعد الشهر الحالي تُحفظ مسبقاً (العقود الموقعة للفترة القادمة)
+FUTURE_MONTHS = 12
+
+# أقصى طول للسلسلة اليومية
+MAX_DAILY_DAYS = 731
+
+GROUP_FIELDS = {
+    'unit': 'unit_id',
+    'building': 'building_id',
+    'land': 'land_id',
+}
+
+UnitTimeline = namedtuple(
+    'UnitTimeline',
+    ['unit_id', 'building_id', 'land_id', 'monthly_rent', 'available_from', 'intervals'],
+)
+
+
+def occupying_statuses():
+    from rent.models import ContractStatus
+
+    return [
+        ContractStatus.ACTIVE,
+        ContractStatus.EXPIRED,
+        ContractStatus.TERMINATED,
+        ContractStatus.RENEWED,
+    ]
+
+
+def default_horizon(today=None):
+    """نهاية الأشهر المحفوظة (أول يوم بعد آخر شهر)"""
+    today = today or date.today()
+    return today.replace(day=1) + relativedelta(months=FUTURE_MONTHS + 1)
+
+
+# ========================================
+# Intervals
+# ========================================
+
+def contract_interval(start_date, end_date, actual_end_date=None):
+    """فترة إشغال العقد (شاملة الطرفين) - الإنهاء المبكر يقصرها"""
+    if actual_end_date and actual_end_date < end_date:
+        end_date = actual_end_date
+    if not start_date or not end_date or end_date < start_date:
+        return None
+    return (start_date, end_date)
+
+
+def merge_intervals(intervals):
+    """دمج الفترات المتداخلة أو المتصلة (يوم النهاية + 1 = بداية التالية)"""
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1] + timedelta(days=1):
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def overlap_days(intervals, first_day, last_day):
+    """عدد أيام الفترات المدمجة داخل [first_day, last_day]"""
+    days = 0
+    for start, end in intervals:
+        if end < first_day:
+            continue
+        if start > last_day:
+            break
+        days += (min(end, last_day) - max(start, first_day)).days + 1
+    return days
+
+
+def load_timelines(unit_ids=None):
+    """
+    فترات إشغال الوحدات النشطة
+
+    Args:
+        unit_ids: وحدات محددة (الكل افتراضياً)
+
+    Returns:
+        dict {unit_id: UnitTimeline}
+    """
+    from rent.models import Contract, Unit
+
+    units = Unit.objects.filter(is_active=True, is_deleted=False)
+    links = Contract.units.through.objects.filter(
+        contract__is_deleted=False,
+        contract__status__in=occupying_statuses(),
+    )
+    if unit_ids is not None:
+        units = units.filter(pk__in=unit_ids)
+        links = links.filter(unit_id__in=unit_ids)
+
+    intervals = {}
+    for unit_id, start, end, actual_end in links.values_list(
+        'unit_id', 'contract__start_date', 'contract__end_date', 'contract__actual_end_date'
+    ):
+        interval = contract_interval(start, end, actual_end)
+        if interval:
+            intervals.setdefault(unit_id, []).append(interval)
+
+    timelines = {}
+    for unit_id, building_id, land_id, monthly_rent, created_at in units.values_list(
+        'pk', 'building_id', 'building__land_id', 'monthly_rent', 'created_at'
+    ):
+        merged = merge_intervals(intervals.get(unit_id, []))
+        available_from = timezone.localtime(created_at).date() if created_at else date.today()
+        if merged and merged[0][0] < available_from:
+            available_from = merged[0][0]
+        timelines[unit_id] = UnitTimeline(
+            unit_id, building_id, land_id, monthly_rent or Decimal('0'), available_from, merged
+        )
+    return timelines
+
+
+# ========================================
+# Monthly Rows
+# ========================================
+
+def monthly_rows(timeline, start_month=None, end_month=None):
+    """
+    صفوف الأشهر [start_month, end_month) للوحدة
+
+    Returns:
+        list من dicts: month, days, occupied_days, vacant_days, lost_rent
+    """
+    month = max(start_month or date.min, timeline.available_from.replace(day=1))
+    end_month = end_month or default_horizon()
+
+    rows = []
+    while month < end_month:
+        month_days = calendar.monthrange(month.year, month.month)[1]
+        first_day = max(month, timeline.available_from)
+        last_day = month.replace(day=month_days)
+
+        days = (last_day - first_day).days + 1
+        occupied = overlap_days(timeline.intervals, first_day, last_day)
+        vacant = days - occupied
+        lost_rent = (timeline.monthly_rent * vacant / month_days).quantize(
+            Decimal('0.01'), rounding=ROUND_HALF_UP
+        )
+        rows.append({
+            'month': month,
+            'days': days,
+            'occupied_days': occupied,
+            'vacant_days': vacant,
+            'lost_rent': lost_rent,
+        })
+        month += relativedelta(months=1)
+    return rows
+
+
+# ========================================
+# Series
+# ========================================
+
+def _filter_timelines(timelines, building_id=None, land_id=None):
+    return [
+        timeline for timeline in timelines.values()
+        if (building_id is None or timeline.building_id == building_id)
+        and (land_id is None or timeline.land_id == land_id)
+    ]
+
+
+def daily_series(start_date, end_date, unit_ids=None, building_id=None, land_id=None):
+    """
+    سلسلة الإشغال اليومية [start_date, end_date] من العقود مباشرة
+
+    Returns:
+        list من dicts: date, units, occupied, vacant, rate
+    """
+    if end_date < start_date:
+        return []
+    end_date = min(end_date, start_date + timedelta(days=MAX_DAILY_DAYS - 1))
+    length = (end_date - start_date).days + 1
+
+    # أحداث +1 عند بداية الفترة و -1 بعد نهايتها، ثم مجموع تراكمي
+    units_delta = [0] * (length + 1)
+    occupied_delta = [0] * (length + 1)
+
+    def add(delta, start, end):
+        start, end = max(start, start_date), min(end, end_date)
+        if start <= end:
+            delta[(start - start_date).days] += 1
+            delta[(end - start_date).days + 1] -= 1
+
+    for timeline in _filter_timelines(load_timelines(unit_ids), building_id, land_id):
+        add(units_delta, timeline.available_from, end_date)
+        for start, end in timeline.intervals:
+            add(occupied_delta, start, end)
+
+    series = []
+    for offset, (units, occupied) in enumerate(zip(
+        accumulate(units_delta[:length]), accumulate(occupied_delta[:length])
+    )):
+        series.append({
+            'date': start_date + timedelta(days=offset),
+            'units': units,
+            'occupied': occupied,
+            'vacant': units - occupied,
+            'rate': round(occupied / units * 100, 2) if units else 0,
+        })
+    return series
+
+
+def monthly_series(start_month, end_month, group_by=None, unit_id=None, building_id=None, land_id=None):
+    """
+    سلسلة الإشغال الشهرية [start_month, end_month) من UnitOccupancyMonth
+
+    Args:
+        group_by: None (المحفظة) أو 'unit' أو 'building' أو 'land'
+
+    Returns:
+        list من dicts: month, [unit_id|building_id|land_id], units, days,
+        occupied_days, vacant_days, lost_rent, rate
+    """
+    from rent.models import UnitOccupancyMonth
+
+    UnitOccupancyMonth.ensure_history_through(end_month - relativedelta(months=1))
+
+    rows = UnitOccupancyMonth.objects.filter(month__gte=start_month, month__lt=end_month)
+    if unit_id:
+        rows = rows.filter(unit_id=unit_id)
+    if building_id:
+        rows = rows.filter(building_id=building_id)
+    if land_id:
+        rows = rows.filter(land_id=land_id)
+
+    fields = ['month']
+    if group_by:
+        fields.append(GROUP_FIELDS[group_by])
+
+    series = []
+    for row in rows.values(*fields).annotate(
+        units=Count('unit', filter=Q(days__gt=0)),
+        total_days=Sum('days'),
+        occupied=Sum('occupied_days'),
+        vacant=Sum('vacant_days'),
+        lost=Sum('lost_rent'),
+    ).order_by(*fields):
+        days = row.pop('total_days') or 0
+        occupied = row.pop('occupied') or 0
+        row.update({
+            'days': days,
+            'occupied_days': occupied,
+            'vacant_days': row.pop('vacant') or 0,
+            'lost_rent': row.pop('lost') or Decimal('0'),
+            'rate': round(occupied / days * 100, 2) if days else 0,
+        })
+        series.append(row)
+    return series
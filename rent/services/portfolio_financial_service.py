@@ -0,0 +1,154 @@
+"""
+خدمة الحسابات المالية لمحفظة العقود
+
+تحسب الفترات وتوزيع المدفوعات (FIFO) والمستحقات لعدة عقود دفعة واحدة:
+- استعلام واحد للعقود (+ المستأجر والوحدات عبر prefetch)
+- استعلام واحد لكل التعديلات المطبقة
+- استعلام واحد لإجمالي المدفوعات المرحلة لكل عقد
+
+إذا كانت modifications و receipts محمّلة مسبقاً (prefetch_related) تُستخدم
+مباشرة دون استعلامات إضافية.
+
+جداول الأقساط لكل العقود تُبنى دفعة واحدة بـ schedule_builder (إذا كان
+NumPy مثبتاً).
+
+ثم تُمرَّر البيانات لـ ContractFinancialService لكل عقد، فتطابق النتائج
+الحساب الفردي تماماً.
+"""
+
+from decimal import Decimal
+from datetime import date
+import logging
+
+from django.db.models import Sum, prefetch_related_objects
+
+from rent.services.contract_financial_service import (
+    ContractFinancialService,
+    ContractFinancialData,
+)
+from rent.services.schedule_builder import HAS_NUMPY, build_schedules
+
+logger = logging.getLogger(__name__)
+
+
+class PortfolioFinancialService:
+    """الحسابات المالية لمجموعة عقود بعدد ثابت من الاستعلامات"""
+
+    def __init__(self, contracts, as_of_date=None):
+        self.as_of_date = as_of_date or date.today()
+        self.contracts = self._load_contracts(contracts)
+        self._contracts_by_id = {c.id: c for c in self.contracts}
+        self._data = self._load_financial_data()
+        self._attach_schedules()
+        self._services = {}
+
+    # ========================================
+    # Loading
+    # ========================================
+    def _load_contracts(self, contracts):
+        contracts = list(contracts)
+        # لا يعيد Django تحميل العلاقات المحمّلة مسبقاً
+        prefetch_related_objects(contracts, 'tenant', 'units__building__land')
+        return contracts
+
+    def _load_financial_data(self):
+        from rent.models.contractmodify_models import ContractModification
+        from rent.models.receipt_models import Receipt
+
+        data = {}
+        contracts_by_id = {}
+        for contract_id, contract in self._contracts_by_id.items():
+            prefetched = ContractFinancialData.from_prefetched(contract)
+            if prefetched is not None:
+                data[contract_id] = prefetched
+            else:
+                contracts_by_id[contract_id] = contract
+
+        if not contracts_by_id:
+            return data
+
+        modifications = {contract_id: [] for contract_id in contracts_by_id}
+        for mod in ContractModification.objects.filter(
+            contract_id__in=contracts_by_id.keys(),
+            is_applied=True
+        ).order_by('contract_id', 'effective_date', 'id'):
+            # ربط التعديل بالعقد المحمّل لتجنب استعلام إضافي عند الوصول إليه
+            mod.contract = contracts_by_id[mod.contract_id]
+            modifications[mod.contract_id].append(mod)
+
+        receipt_filter = {'status': 'posted'}
+        if hasattr(Receipt, 'is_deleted'):
+            receipt_filter['is_deleted'] = False
+
+        totals = dict(
+            Receipt.objects.filter(
+                contract_id__in=contracts_by_id.keys(),
+                **receipt_filter
+            ).values('contract_id').annotate(
+                total=Sum('amount')
+            ).order_by().values_list('contract_id', 'total')
+        )
+
+        for contract_id in contracts_by_id:
+            data[contract_id] = ContractFinancialData(
+                applied_modifications=modifications[contract_id],
+                total_paid=totals.get(contract_id) or Decimal('0'),
+            )
+        return data
+
+    def _attach_schedules(self):
+        """
+        بناء جداول أقساط كل العقود دفعة واحدة (NumPy) وتمريرها للبيانات
+
+        بدون NumPy يولّد PeriodCalculator جدول كل عقد على حدة كما هو.
+        """
+        if not HAS_NUMPY or not self.contracts:
+            return
+
+        rent_modifications = {
+            contract_id: data.get_applied_modifications('rent_increase', 'rent_decrease')
+            for contract_id, data in self._data.items()
+        }
+        table = build_schedules(self.contracts, rent_modifications)
+        for contract_id, data in self._data.items():
+            data.schedule = table.periods_for(contract_id)
+
+    # ========================================
+    # Services
+    # ========================================
+    def get_service(self, contract):
+        """الحصول على ContractFinancialService للعقد باستخدام البيانات المحمّلة"""
+        contract_id = getattr(contract, 'id', contract)
+        if contract_id not in self._services:
+            self._services[contract_id] = ContractFinancialService(
+                self._contracts_by_id[contract_id], self.as_of_date, self._data.get(contract_id)
+            )
+        return self._services[contract_id]
+
+    def __iter__(self):
+        for contract in self.contracts:
+            yield contract, self.get_service(contract)
+
+    def __len__(self):
+        return len(self.contracts)
+
+    # ========================================
+    # Portfolio Results
+    # ========================================
+    def get_outstanding_amounts(self, include_future=False):
+        """المستحقات لكل عقد {contract_id: Decimal}"""
+        return {
+            contract.id: service.get_outstanding_amount(include_future=include_future)
+            for contract, service in self
+        }
+
+    def get_total_outstanding(self, include_future=False):
+        """إجمالي المستحقات لكل العقود"""
+        return sum(
+            self.get_outstanding_amounts(include_future).values(),
+            Decimal('0')
+        )
+
+    def get_tenant_report_data(self):
+        """بيانات تقرير المستأجرين لكل العقود"""
+        return [service.get_tenant_report_data() for contract, service in self]
@@ -0,0 +1,241 @@
+# services/schedule_builder.py
+
+"""
+بناء جداول أقساط عدة عقود دفعة واحدة (NumPy)
+
+المسار الحالي يولّد تواريخ الاستحقاق لكل عقد بحلقة relativedelta ثم يبحث
+عن الإيجار المطبق لكل قسط بمسح خطي للجدول الزمني. هنا:
+- التواريخ كمصفوفات إزاحة أشهر (datetime64[M]) لكل العقود معاً
+  مع نفس قص اليوم التراكمي لـ relativedelta المتسلسل (31 يناير ← 28 فبراير ← 28 مارس)
+- الإيجار المطبق = عدد تعديلات الإيجار التي سرت حتى تاريخ القسط،
+  بـ searchsorted على مفتاح (العقد، التاريخ) لكل الأقساط مرة واحدة
+- المبالغ تبقى Decimal (لا أرقام عشرية تقريبية) وتُربط بفهرس الشريحة
+
+النتيجة ScheduleTable (مصفوفات) تُمرر لـ ContractFinancialData.schedule
+فيستخدمها PeriodCalculator بدلاً من التوليد لكل عقد.
+
+NumPy اختياري: إذا لم يكن مثبتاً (HAS_NUMPY = False) يستمر المسار الحالي.
+"""
+
+from collections import namedtuple
+from decimal import Decimal
+import logging
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from rent.services.contract_financial_service import DEFAULT_PERIOD_MONTHS, FREQUENCY_MAP
+
+logger = logging.getLogger(__name__)
+
+HAS_NUMPY = np is not None
+
+# نفس حد calculate_contract_due_dates
+MAX_PERIODS = 1000
+
+
+SchedulePeriod = namedtuple(
+    'SchedulePeriod',
+    ['period_number', 'start_date', 'end_date', 'annual_rent', 'period_rent', 'source']
+)
+
+
+# ========================================
+# ScheduleTable
+# ========================================
+
+class ScheduleTable:
+    """
+    جداول أقساط عدة عقود كمصفوفات متوازية (صف لكل قسط، مجمّعة حسب العقد)
+
+    Attributes:
+        contract_ids: معرف العقد لكل صف
+        period_numbers, start_dates, end_dates: datetime64[D] للتواريخ
+        segments: فهرس شريحة الإيجار (في annual_rents / period_rents / sources)
+    """
+
+    def __init__(self, contract_ids, period_numbers, start_dates, end_dates, segments,
+                 annual_rents, period_rents, sources):
+        self.contract_ids = contract_ids
+        self.period_numbers = period_numbers
+        self.start_dates = start_dates
+        self.end_dates = end_dates
+        self.segments = segments
+        self.annual_rents = annual_rents
+        self.period_rents = period_rents
+        self.sources = sources
+
+        # حدود صفوف كل عقد (الصفوف مرتبة حسب ترتيب العقود المدخلة)
+        self._ranges = {}
+        if len(contract_ids):
+            boundaries = np.flatnonzero(np.diff(contract_ids)) + 1
+            starts = np.concatenate(([0], boundaries))
+            stops = np.concatenate((boundaries, [len(contract_ids)]))
+            for start, stop in zip(starts.tolist(), stops.tolist()):
+                self._ranges[int(contract_ids[start])] = (start, stop)
+
+    def __len__(self):
+        return len(self.contract_ids)
+
+    def periods_for(self, contract_id):
+        """أقساط عقد واحد كـ list[SchedulePeriod] (تواريخ Python)"""
+        start, stop = self._ranges.get(contract_id, (0, 0))
+        if start == stop:
+            return []
+
+        segments = self.segments[start:stop].tolist()
+        return [
+            SchedulePeriod(
+                period_number,
+                start_date,
+                end_date,
+                self.annual_rents[segment],
+                self.period_rents[segment],
+                self.sources[segment],
+            )
+            for period_number, start_date, end_date, segment in zip(
+                self.period_numbers[start:stop].tolist(),
+                self.start_dates[start:stop].astype(object).tolist(),
+                self.end_dates[start:stop].astype(object).tolist(),
+                segments,
+            )
+        ]
+
+    def due_dates_for(self, contract_id):
+        start, stop = self._ranges.get(contract_id, (0, 0))
+        return self.start_dates[start:stop].astype(object).tolist()
+
+
+# ========================================
+# Builder
+# ========================================
+
+def _add_months(months, day, offset):
+    """
+    datetime64[D] لـ (الشهر + offset) مع قص اليوم لآخر الشهر (مثل relativedelta)
+    """
+    target = months + offset.astype('timedelta64[M]')
+    days_in_month = (
+        (target + 1).astype('datetime64[D]') - target.astype('datetime64[D]')
+    ).astype(np.int64)
+    return target.astype('datetime64[D]') + (np.minimum(day, days_in_month) - 1)
+
+
+def build_schedules(contracts, rent_modifications=None):
+    """
+    توليد أقساط مجموعة عقود بعمليات مصفوفات
+
+    يطابق PeriodCalculator (calculate_contract_due_dates + _build_rent_timeline
+    + _find_applicable_rent + _calc_period_end) لكل عقد.
+
+    Args:
+        contracts: عقود محفوظة (لها id)
+        rent_modifications: {contract_id: [تعديلات rent_increase/rent_decrease
+            المطبقة مرتبة حسب effective_date]}
+
+    Returns:
+        ScheduleTable
+    """
+    if not HAS_NUMPY:
+        raise RuntimeError('NumPy غير مثبت')
+
+    rent_modifications = rent_modifications or {}
+    contracts = [c for c in contracts if c.start_date and c.end_date]
+
+    if not contracts:
+        empty = np.array([], dtype=np.int64)
+        empty_dates = np.array([], dtype='datetime64[D]')
+        return ScheduleTable(empty, empty, empty_dates, empty_dates, empty, [], [], [])
+
+    contract_ids = np.array([c.id for c in contracts], dtype=np.int64)
+    starts = np.array([c.start_date for c in contracts], dtype='datetime64[D]')
+    ends = np.array([c.end_date for c in contracts], dtype='datetime64[D]')
+    period_months = [FREQUENCY_MAP.get(c.payment_frequency, DEFAULT_PERIOD_MONTHS) for c in contracts]
+    steps = np.array([int(m) for m in period_months], dtype=np.int64)
+
+    # ========================================
+    # تواريخ الاستحقاق (عقود × أقساط)
+    # ========================================
+    start_months = starts.astype('datetime64[M]')
+    start_days = (starts - start_months.astype('datetime64[D]')).astype(np.int64) + 1
+    span_months = (ends.astype('datetime64[M]') - start_months).astype(np.int64)
+    max_periods = int(min((span_months // steps).max() + 1, MAX_PERIODS))
+
+    offsets = np.arange(max_periods, dtype=np.int64)[None, :] * steps[:, None]
+    months = start_months[:, None] + offsets.astype('timedelta64[M]')
+    days_in_month = (
+        (months + 1).astype('datetime64[D]') - months.astype('datetime64[D]')
+    ).astype(np.int64)
+
+    # relativedelta المتسلسل: اليوم بعد القص لا يعود للارتفاع
+    days = np.minimum.accumulate(np.minimum(start_days[:, None], days_in_month), axis=1)
+    due_dates = months.astype('datetime64[D]') + (days - 1)
+
+    # التواريخ تصاعدية فالأقساط الصالحة بداية كل صف
+    valid = due_dates <= ends[:, None]
+
+    rows, columns = np.nonzero(valid)
+    due = due_dates[rows, columns]
+
+    # نهاية الفترة = الاستحقاق + دورية السداد - يوم، بحد أقصى نهاية العقد
+    period_ends = _add_months(months[rows, columns], days[rows, columns], steps[rows]) - 1
+    period_ends = np.minimum(period_ends, ends[rows])
+
+    # ========================================
+    # شرائح الإيجار (searchsorted)
+    # ========================================
+    annual_rents = []
+    period_rents = []
+    sources = []
+    segment_offsets = np.empty(len(contracts), dtype=np.int64)
+    mod_contracts = []
+    mod_dates = []
+
+    for index, contract in enumerate(contracts):
+        mods = rent_modifications.get(contract.id, [])
+        segment_offsets[index] = len(annual_rents)
+
+        base_annual = mods[0].old_rent_amount if mods else contract.annual_rent
+        annual_rents.append(base_annual)
+        period_rents.append(base_annual * period_months[index] / Decimal('12'))
+        sources.append('base')
+
+        for mod in mods:
+            annual_rents.append(mod.new_rent_amount)
+            period_rents.append(mod.new_rent_amount * period_months[index] / Decimal('12'))
+            sources.append(f'mod_{mod.id}')
+            mod_contracts.append(index)
+            mod_dates.append(mod.effective_date)
+
+    # مفتاح مركب (فهرس العقد، اليوم) مرتب: عدد التعديلات التي سرت حتى القسط
+    epoch_days = due.astype(np.int64)
+    if mod_dates:
+        mod_days = np.array(mod_dates, dtype='datetime64[D]').astype(np.int64)
+        low = min(int(epoch_days.min()), int(mod_days.min()))
+        width = max(int(epoch_days.max()), int(mod_days.max())) - low + 1
+
+        mod_keys = np.array(mod_contracts, dtype=np.int64) * width + (mod_days - low)
+        mod_keys.sort(kind='stable')
+        due_keys = rows.astype(np.int64) * width + (epoch_days - low)
+
+        applied = (
+            np.searchsorted(mod_keys, due_keys, side='right')
+            - np.searchsorted(mod_keys, rows.astype(np.int64) * width, side='left')
+        )
+    else:
+        applied = np.zeros(len(rows), dtype=np.int64)
+
+    logger.debug(f'Built {len(rows)} periods for {len(contracts)} contracts')
+
+    return ScheduleTable(
+        contract_ids=contract_ids[rows],
+        period_numbers=columns + 1,
+        start_dates=due,
+        end_dates=period_ends,
+        segments=segment_offsets[rows] + applied,
+        annual_rents=annual_rents,
+        period_rents=period_rents,
+        sources=sources,
+    )
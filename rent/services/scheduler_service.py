@@ -0,0 +1,216 @@
+# services/scheduler_service.py
+
+"""
+خدمة تشغيل المهام المجدولة (ScheduledTask)
+
+- حجز المهام المستحقة بـ select_for_update(skip_locked=True) بحيث يمكن
+  تشغيل أكثر من عامل (worker) في نفس الوقت دون تنفيذ المهمة مرتين
+- تنفيذ المهام في مجموعة خيوط محدودة الحجم (ThreadPoolExecutor)
+- تسجيل كل تنفيذ في TaskExecution (المدة + الحالة + النتيجة)
+
+لا يعتمد على أي خدمة خارجية غير قاعدة البيانات.
+"""
+
+import logging
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import close_old_connections, connection, transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+
+def claim_due_rows(manager, limit, now):
+    """
+    حجز الصفوف المستحقة (is_active و next_run <= now) وتقديم next_run لكل منها
+
+    تُستدعى داخل transaction.atomic(): select_for_update(skip_locked=True)
+    يمنع عاملاً آخر من حجز نفس الصف، وبعد تحرير القفل يكون next_run قد تقدم.
+    تُستخدم للمهام المجدولة وجداول النسخ الاحتياطي (calculate_next_run).
+
+    Returns:
+        list
+    """
+    if limit <= 0:
+        return []
+
+    rows = list(
+        manager.select_for_update(skip_locked=True).filter(
+            is_active=True,
+            next_run__lte=now,
+        ).order_by('next_run')[:limit]
+    )
+
+    for row in rows:
+        row.calculate_next_run()
+        if row.next_run and row.next_run <= now:
+            # التكرار لا يسمح بحساب موعد قادم (مثل: مخصص/يدوي) - تنفيذ مرة واحدة
+            logger.warning(f'{row._meta.object_name} {row.pk} has no next run, unscheduling it')
+            row.next_run = None
+            row.save(update_fields=['next_run'])
+
+    return rows
+
+
+class TaskScheduler:
+    """
+    تشغيل المهام المجدولة المستحقة
+
+    Usage:
+        scheduler = TaskScheduler(max_workers=4)
+        scheduler.run_pending()      # دورة واحدة
+        scheduler.run_forever()      # عامل دائم
+    """
+
+    def __init__(self, max_workers=4, poll_interval=30):
+        self.max_workers = max(1, max_workers)
+        self.poll_interval = poll_interval
+        self._stopped = threading.Event()
+
+    # ========================================
+    # Claiming
+    # ========================================
+    def claim_due_tasks(self, limit):
+        """
+        حجز المهام المستحقة وإنشاء سجل TaskExecution لكل منها
+
+        يتم تقديم next_run داخل نفس المعاملة، فلا يراها أي عامل آخر
+        بعد تحرير القفل.
+
+        Returns:
+            list[TaskExecution]
+        """
+        from rent.models.scheduledtask_models import ScheduledTask, TaskExecution, TaskStatus
+
+        now = timezone.now()
+        executions = []
+
+        with transaction.atomic():
+            for task in claim_due_rows(ScheduledTask.objects, limit, now):
+                executions.append(TaskExecution.objects.create(
+                    task=task,
+                    started_at=now,
+                    status=TaskStatus.RUNNING,
+                ))
+
+        return executions
+
+    # ========================================
+    # Execution
+    # ========================================
+    def execute(self, execution):
+        """
+        تنفيذ مهمة واحدة وتسجيل نتيجتها
+
+        عند حفظ التنفيذ بحالة نجاح/فشل يقوم task_execution_post_save
+        بتحديث إحصائيات المهمة.
+        """
+        from rent.models.scheduledtask_models import TaskLog, TaskStatus
+
+        task = execution.task
+        execution.started_at = timezone.now()
+
+        try:
+            func = import_string(task.task_function)
+            result = func(**(task.task_parameters or {}))
+
+            execution.status = TaskStatus.SUCCESS
+            execution.result = 'تم التنفيذ بنجاح'
+            execution.output = self._serialize_output(result)
+        except Exception as e:
+            logger.error(f'Scheduled task {task.pk} ({task.name}) failed: {e}', exc_info=True)
+            execution.status = TaskStatus.FAILED
+            execution.result = 'فشل التنفيذ'
+            execution.error_message = str(e)
+            execution.traceback = traceback.format_exc()
+
+            TaskLog.objects.create(
+                task=task,
+                execution=execution,
+                level=TaskLog.LogLevel.ERROR,
+                message=str(e),
+            )
+        finally:
+            # المدة تُحسب في TaskExecution.save
+            execution.finished_at = timezone.now()
+            execution.save()
+
+        return execution
+
+    def _execute_in_thread(self, execution):
+        """تنفيذ المهمة داخل خيط من المجموعة مع إغلاق اتصال قاعدة البيانات بعدها"""
+        try:
+            return self.execute(execution)
+        finally:
+            connection.close()
+
+    @staticmethod
+    def _serialize_output(result):
+        """تحويل نتيجة المهمة لقيمة قابلة للحفظ في JSONField"""
+        if result is None:
+            return None
+        import json
+        return json.loads(json.dumps(result, cls=DjangoJSONEncoder, default=str))
+
+    # ========================================
+    # Loops
+    # ========================================
+    def run_pending(self):
+        """
+        دورة واحدة: حجز كل المهام المستحقة وتنفيذها ثم الانتظار حتى تنتهي
+
+        Returns:
+            list[TaskExecution]
+        """
+        executions = self.claim_due_tasks(self.max_workers)
+        finished = []
+
+        while executions:
+            if self.max_workers == 1:
+                finished.extend(self.execute(e) for e in executions)
+            else:
+                with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                    finished.extend(pool.map(self._execute_in_thread, executions))
+            executions = self.claim_due_tasks(self.max_workers)
+
+        return finished
+
+    def run_forever(self):
+        """
+        عامل دائم: يحافظ على max_workers مهمة قيد التنفيذ كحد أقصى
+        ويبحث عن مهام جديدة كل poll_interval ثانية
+        """
+        running = set()
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            while not self._stopped.is_set():
+                close_old_connections()
+
+                try:
+                    executions = self.claim_due_tasks(self.max_workers - len(running))
+                except Exception as e:
+                    logger.error(f'Error claiming scheduled tasks: {e}', exc_info=True)
+                    executions = []
+
+                for execution in executions:
+                    running.add(pool.submit(self._execute_in_thread, execution))
+
+                if running:
+                    # الاستيقاظ عند انتهاء أي مهمة لحجز غيرها
+                    done, running = wait(
+                        running, timeout=self.poll_interval, return_when=FIRST_COMPLETED
+                    )
+                    running = set(running)
+                elif not executions:
+                    # الاستيقاظ فوراً عند الإيقاف
+                    self._stopped.wait(self.poll_interval)
+
+            wait(running)
+
+    def stop(self):
+        """إيقاف العامل بعد انتهاء المهام الجارية"""
+        self._stopped.set()
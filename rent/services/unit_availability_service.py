@@ -1,6 +1,7 @@
 # services/unit_availability_service.py
 
 from django.db.models import Q, Exists, OuterRef
+from django.utils import timezone
 from typing import List, Dict, Optional
 
 
@@ -42,31 +43,34 @@ class UnitAvailabilityService:
         """
         تحديث حالة جميع الوحدات بناءً على العقود الساريه
         
+        الوحدات التي حالتها صحيحة لا تُعدّل، فلا يتغير updated_at لها
+        ولا تُعاد في كل نسخة تزايدية
+        
         Returns:
         --------
-        dict: إحصائيات العملية
+        dict: إحصائيات العملية (عدد الوحدات التي تغيرت حالتها)
         """
-        # الحصول على الوحدات التي لها عقود ساريه
-        active_contracts = self.contract_model.objects.filter(
-            status=self.active_status_value
-        ).prefetch_related('units')
-        
-        # جمع IDs الوحدات من جميع العقود الساريه
-        units_with_active_contracts = set()
-        for contract in active_contracts:
-            units_with_active_contracts.update(
-                contract.units.values_list('id', flat=True)
-            )
+        # جمع IDs الوحدات من جميع العقود الساريه (استعلام واحد على جدول الربط)
+        units_with_active_contracts = set(
+            self.contract_model.objects.filter(
+                status=self.active_status_value,
+                units__isnull=False
+            ).values_list('units', flat=True)
+        )
         
         # تحديث الوحدات إلى حالة "مؤجرة" (لها عقود ساريه)
         rented_count = self.unit_model.objects.filter(
             id__in=units_with_active_contracts
-        ).update(status=self.rented_status_value)
+        ).exclude(
+            status=self.rented_status_value
+        ).update(status=self.rented_status_value, updated_at=timezone.now())
         
         # تحديث الوحدات إلى حالة "متاحة" (ليس لها عقود ساريه)
         available_count = self.unit_model.objects.exclude(
             id__in=units_with_active_contracts
-        ).update(status=self.available_status_value)
+        ).exclude(
+            status=self.available_status_value
+        ).update(status=self.available_status_value, updated_at=timezone.now())
         
         return {
             'rented_units': rented_count,
@@ -107,7 +111,7 @@ class UnitAvailabilityService:
         )
         
         # تحديث الوحدات
-        updated_count = units.update(status=new_status)
+        updated_count = units.update(status=new_status, updated_at=timezone.now())
         
         return {
             'success': True,
@@ -3,9 +3,9 @@ from django.test import TestCase
 # Create your tests here.
 # rent/tests/test_contract_financial_service.py
 
-from datetime import date
+from datetime import date, timedelta
 from decimal import Decimal
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from rent.services.contract_financial_service import ContractFinancialService
 from rent.models import Contract, Tenant
 
@@ -62,4 +62,1851 @@ class ContractFinancialServiceTest(TestCase):
         
         self.assertTrue(statement['success'])
         self.assertEqual(len(statement['lines']), 4)  # 4 فترات
-        self.assertEqual(statement['summary']['total_periods'], 4)
\ No newline at end of file
+        self.assertEqual(statement['summary']['total_periods'], 4)
+
+class PortfolioFinancialServiceTest(TestCase):
+    """اختبار الحساب المجمّع لعدة عقود"""
+
+    def setUp(self):
+        from rent.models import Land, Building, Unit, Receipt, ContractModification
+
+        land = Land.objects.create(
+            name='أرض 1', area=Decimal('1000'), deed_number='D-1', owner_name='مالك'
+        )
+        building = Building.objects.create(
+            land=land, name='مبنى 1', total_area=Decimal('500'), floors_count=1
+        )
+
+        self.contracts = []
+        for i in range(4):
+            tenant = Tenant.objects.create(
+                name=f'مستأجر {i}', phone=f'05000000{i:02d}', id_number=f'10000000{i:02d}'
+            )
+            unit = Unit.objects.create(
+                building=building, unit_number=f'U-{i}', floor=0, area=Decimal('50')
+            )
+            contract = Contract.objects.create(
+                tenant=tenant,
+                start_date=date(2024, 1, 1),
+                end_date=date(2025, 12, 31),
+                annual_rent=Decimal('120000.00'),
+                payment_frequency='quarterly',
+                status='active',
+            )
+            contract.units.add(unit)
+            self.contracts.append(contract)
+
+        # دفعات مختلفة لكل عقد
+        Receipt.objects.create(
+            contract=self.contracts[0], receipt_date=date(2024, 1, 5),
+            amount=Decimal('45000.00'), status='posted'
+        )
+        Receipt.objects.create(
+            contract=self.contracts[1], receipt_date=date(2024, 2, 1),
+            amount=Decimal('10000.00'), status='cancelled'
+        )
+
+        # تعديلات مطبقة: زيادة إيجار + قيمة مضافة + خصم
+        ContractModification.objects.create(
+            contract=self.contracts[2], modification_type='rent_increase',
+            effective_date=date(2024, 7, 1), old_rent_amount=Decimal('120000.00'),
+            new_rent_amount=Decimal('132000.00'), is_applied=True
+        )
+        ContractModification.objects.create(
+            contract=self.contracts[3], modification_type='vat',
+            effective_date=date(2024, 1, 1), vat_input_type='fixed',
+            vat_amount=Decimal('4500.00'), vat_period_number=1, is_applied=True
+        )
+        ContractModification.objects.create(
+            contract=self.contracts[3], modification_type='discount',
+            effective_date=date(2024, 4, 1), discount_amount=Decimal('1000.00'),
+            discount_period_number=2, is_applied=True
+        )
+
+        self.as_of = date(2025, 2, 15)
+
+    def test_matches_per_contract_service(self):
+        """نتائج الحساب المجمّع مطابقة للحساب الفردي"""
+        from rent.services.portfolio_financial_service import PortfolioFinancialService
+
+        portfolio = PortfolioFinancialService(
+            Contract.objects.filter(pk__in=[c.pk for c in self.contracts]), self.as_of
+        )
+
+        for contract in self.contracts:
+            expected = ContractFinancialService(
+                Contract.objects.get(pk=contract.pk), self.as_of
+            )
+            actual = portfolio.get_service(contract)
+
+            self.assertEqual(
+                actual.calculate_periods_with_payments(),
+                expected.calculate_periods_with_payments()
+            )
+            self.assertEqual(actual.get_outstanding_amount(), expected.get_outstanding_amount())
+            self.assertEqual(actual.get_tenant_report_data(), expected.get_tenant_report_data())
+
+        # التعديلات أُخذت في الاعتبار
+        periods = portfolio.get_service(self.contracts[2]).calculate_periods_with_payments()['periods']
+        self.assertEqual(periods[2]['due_amount'], Decimal('33000.00'))
+        periods = portfolio.get_service(self.contracts[3]).calculate_periods_with_payments()['periods']
+        self.assertEqual(periods[0]['due_amount'], Decimal('34500.00'))
+        self.assertEqual(periods[1]['due_amount'], Decimal('29000.00'))
+
+    def test_constant_number_of_queries(self):
+        """عدد الاستعلامات ثابت بغض النظر عن عدد العقود"""
+        from rent.services.portfolio_financial_service import PortfolioFinancialService
+
+        # العقود + المستأجرين + الوحدات + المباني + الأراضي + التعديلات + المدفوعات
+        with self.assertNumQueries(7):
+            portfolio = PortfolioFinancialService(Contract.objects.all(), self.as_of)
+            portfolio.get_tenant_report_data()
+            portfolio.get_total_outstanding()
+
+    def test_snapshots_rebuilt_by_daily_task_not_on_save(self):
+        """اللقطات تُبنى بالمهمة اليومية وليس عند كل حفظ، ولا تُدقق"""
+        from datetime import timedelta
+        from django.db import transaction
+        from django.utils import timezone
+        from audit_log.models import AuditLog
+        from rent.models import Receipt, ContractFinancialSnapshot, ScheduledTask
+        from rent.services.scheduler_service import TaskScheduler
+
+        contract = self.contracts[1]
+        with self.captureOnCommitCallbacks(execute=True), transaction.atomic():
+            Receipt.objects.create(
+                contract=contract, receipt_date=date(2024, 2, 1),
+                amount=Decimal('20000.00'), status='posted'
+            )
+        self.assertFalse(ContractFinancialSnapshot.objects.exists())
+
+        task = ScheduledTask.objects.create(
+            name='اللقطات المالية', task_type='calculation',
+            task_function='rent.models.financial_snapshot_models.rebuild_financial_snapshots',
+        )
+        ScheduledTask.objects.filter(pk=task.pk).update(
+            next_run=timezone.now() - timedelta(minutes=1)
+        )
+        with self.captureOnCommitCallbacks(execute=True), transaction.atomic():
+            executions = TaskScheduler(max_workers=1).run_pending()
+
+        self.assertEqual(executions[0].status, 'success')
+        self.assertEqual(executions[0].output, {'snapshots': len(self.contracts)})
+
+        snapshot = ContractFinancialSnapshot.objects.get(contract=contract)
+        expected = ContractFinancialService(Contract.objects.get(pk=contract.pk))
+        self.assertEqual(snapshot.as_of_date, timezone.now().date())
+        self.assertEqual(snapshot.total_paid, Decimal('20000.00'))
+        self.assertEqual(snapshot.outstanding_amount, expected.get_outstanding_amount())
+
+        # اللقطات المحسوبة اليوم لا يُعاد بناؤها
+        self.assertEqual(ContractFinancialSnapshot.rebuild_all(stale_only=True), 0)
+
+        # اللقطة مشتقة فلا تُسجل في سجل التدقيق
+        with self.captureOnCommitCallbacks(execute=True), transaction.atomic():
+            ContractFinancialSnapshot.rebuild_for_contract(contract)
+        self.assertTrue(AuditLog.objects.filter(model_name='Receipt').exists())
+        self.assertFalse(AuditLog.objects.filter(model_name='ContractFinancialSnapshot').exists())
+
+    def test_snapshot_bulk_rebuild_matches_single(self):
+        """إعادة البناء المجمّعة تطابق إعادة البناء الفردية"""
+        from rent.models import ContractFinancialSnapshot
+
+        count = ContractFinancialSnapshot.rebuild_for_contracts(Contract.objects.all(), self.as_of)
+        self.assertEqual(count, len(self.contracts))
+
+        for contract in self.contracts:
+            bulk = ContractFinancialSnapshot.objects.get(contract=contract)
+            single = ContractFinancialSnapshot.rebuild_for_contract(
+                Contract.objects.get(pk=contract.pk), self.as_of
+            )
+            for field in ContractFinancialSnapshot.SNAPSHOT_FIELDS:
+                if field != 'computed_at':
+                    self.assertEqual(getattr(bulk, field), getattr(single, field), field)
+
+    def test_contract_periods_match_service(self):
+        """جدول الأقساط المحفوظ يطابق فترات الخدمة ويُحدّث عند الترحيل"""
+        from rent.models import ContractPeriod, Receipt
+        from rent.models.contract_period_models import ContractPeriodStatus
+        from rent.utils.contract_utils import calculate_contract_due_dates
+
+        self.assertEqual(ContractPeriod.regenerate_for_contracts(Contract.objects.all()), 32)
+
+        contract = self.contracts[3]
+        stored = list(ContractPeriod.objects.filter(contract=contract).order_by('period_number'))
+        expected = ContractFinancialService(
+            Contract.objects.get(pk=contract.pk), date(2025, 12, 31)
+        ).calculate_periods_with_payments()['periods']
+        self.assertEqual(
+            [(p.start_date, p.due_amount) for p in stored],
+            [(p['start_date'], p['due_amount']) for p in expected]
+        )
+        self.assertEqual(stored[1].discount_amount, Decimal('1000.00'))
+
+        # تواريخ الاستحقاق من الجدول المحمّل مسبقاً
+        loaded = Contract.objects.prefetch_related('schedule_periods').get(pk=contract.pk)
+        with self.assertNumQueries(0):
+            due_dates = calculate_contract_due_dates(loaded)
+        self.assertEqual(due_dates, [p.start_date for p in stored])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Receipt.objects.create(
+                contract=contract, receipt_date=date(2024, 2, 1),
+                amount=Decimal('40000.00'), status='posted'
+            )
+
+        statuses = list(
+            ContractPeriod.objects.filter(contract=contract)
+            .order_by('period_number').values_list('status', flat=True)[:3]
+        )
+        self.assertEqual(statuses, [
+            ContractPeriodStatus.PAID, ContractPeriodStatus.PARTIAL, ContractPeriodStatus.PENDING,
+        ])
+        self.assertEqual(
+            ContractPeriod.objects.due_between(date(2024, 4, 1), date(2024, 4, 30)).unpaid().count(),
+            len(self.contracts)
+        )
+
+    def test_receipt_allocations(self):
+        """دفتر توزيع السندات يُكتب عند الترحيل ويُعاد بناؤه عند الإلغاء والحذف"""
+        from rent.models import ContractPeriod, Receipt, ReceiptAllocation
+        from rent.views.receipt_views import ReceiptPrintView
+
+        contract = Contract.objects.get(pk=self.contracts[0].pk)
+        first = Receipt.objects.get(contract=contract)
+
+        def split(receipt):
+            return [
+                (a.period_number, a.amount, a.remaining_after)
+                for a in ReceiptAllocation.for_receipt(receipt)
+            ]
+
+        # يُولّد الجدول عند أول قراءة
+        self.assertEqual(split(first), [
+            (1, Decimal('30000.00'), Decimal('0.00')),
+            (2, Decimal('15000.00'), Decimal('15000.00')),
+        ])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second = Receipt.objects.create(
+                contract=contract, receipt_date=date(2024, 5, 1),
+                amount=Decimal('20000.00'), status='posted'
+            )
+        self.assertEqual(split(second), [
+            (2, Decimal('15000.00'), Decimal('0.00')),
+            (3, Decimal('5000.00'), Decimal('25000.00')),
+        ])
+        covered = ReceiptPrintView()._get_covered_periods(second)
+        self.assertEqual([p['allocated_amount'] for p in covered], [Decimal('15000.00'), Decimal('5000.00')])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.status = 'cancelled'
+            first.save()
+        self.assertFalse(first.allocations.exists())
+        self.assertEqual(split(second), [(1, Decimal('20000.00'), Decimal('10000.00'))])
+
+        # حذف سند مرحل يعيد توزيع السندات الباقية
+        with self.captureOnCommitCallbacks(execute=True):
+            first.status = 'posted'
+            first.save()
+        self.assertEqual(split(second), [
+            (2, Decimal('15000.00'), Decimal('0.00')),
+            (3, Decimal('5000.00'), Decimal('25000.00')),
+        ])
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertEqual(split(second), [(1, Decimal('20000.00'), Decimal('10000.00'))])
+        self.assertEqual(
+            ContractPeriod.objects.get(contract=contract, period_number=1).paid_amount,
+            Decimal('20000.00')
+        )
+
+
+class ContractOutstandingQueryTest(TestCase):
+    """توزيع FIFO في SQL يطابق محرك Python على عقود عشوائية"""
+
+    def setUp(self):
+        import random
+        from dateutil.relativedelta import relativedelta
+        from rent.models import ContractModification, ContractPeriod, Receipt
+
+        rng = random.Random(2024)
+        frequencies = ['monthly', 'quarterly', 'semi_annual', 'annual']
+
+        for i in range(20):
+            tenant = Tenant.objects.create(
+                name=f'مستأجر {i}', phone=f'05100000{i:02d}', id_number=f'20000000{i:02d}'
+            )
+            start = date(rng.randint(2022, 2024), rng.randint(1, 12), rng.randint(1, 28))
+            end = start + relativedelta(months=rng.choice([12, 24, 36])) - relativedelta(days=1)
+            terminated = rng.random() < 0.2
+            contract = Contract.objects.create(
+                tenant=tenant,
+                start_date=start,
+                end_date=end,
+                annual_rent=Decimal(rng.randint(10, 200) * 1200),
+                payment_frequency=rng.choice(frequencies),
+                status='terminated' if terminated else 'active',
+                actual_end_date=start + relativedelta(months=rng.randint(3, 11)) if terminated else None,
+            )
+
+            for _ in range(rng.randint(0, 5)):
+                Receipt.objects.create(
+                    contract=contract,
+                    receipt_date=start + relativedelta(days=rng.randint(0, 700)),
+                    amount=Decimal(rng.randint(1, 80) * 500),
+                    status=rng.choice(['posted', 'posted', 'posted', 'cancelled', 'draft']),
+                )
+
+            if rng.random() < 0.3:
+                ContractModification.objects.create(
+                    contract=contract, modification_type='rent_increase',
+                    effective_date=start + relativedelta(months=rng.randint(1, 11)),
+                    old_rent_amount=contract.annual_rent,
+                    new_rent_amount=contract.annual_rent + Decimal(rng.randint(1, 20) * 1200),
+                    is_applied=True,
+                )
+            if rng.random() < 0.3:
+                ContractModification.objects.create(
+                    contract=contract, modification_type='vat',
+                    effective_date=start, vat_input_type='fixed',
+                    vat_amount=Decimal(rng.randint(1, 30) * 100),
+                    vat_period_number=rng.randint(1, 2), is_applied=True,
+                )
+            if rng.random() < 0.3:
+                ContractModification.objects.create(
+                    contract=contract, modification_type='discount',
+                    effective_date=start + relativedelta(months=rng.randint(0, 6)),
+                    discount_amount=Decimal(rng.randint(1, 10) * 100),
+                    discount_period_number=rng.randint(1, 3), is_applied=True,
+                )
+
+        ContractPeriod.regenerate_for_contracts(Contract.objects.all())
+
+    def test_matches_python_engine(self):
+        from rent.models import ContractPeriod
+
+        for as_of in (date(2023, 3, 10), date(2024, 8, 1), date(2025, 6, 30)):
+            contracts = Contract.objects.with_outstanding(as_of).order_by('pk')
+            periods = {
+                (p.contract_id, p.period_number): p
+                for p in ContractPeriod.objects.applicable(as_of).with_fifo_status(as_of)
+            }
+
+            for contract in contracts:
+                service = ContractFinancialService(Contract.objects.get(pk=contract.pk), as_of)
+                expected = service.calculate_periods_with_payments()['periods']
+                overdue = [p for p in expected if p['status'] == 'overdue']
+                message = f'contract {contract.pk} as of {as_of}'
+
+                self.assertEqual(contract.outstanding_amount, service.get_outstanding_amount(), message)
+                self.assertEqual(
+                    contract.overdue_amount,
+                    sum((p['remaining_amount'] for p in overdue), Decimal('0')),
+                    message
+                )
+                self.assertEqual(contract.overdue_periods_count, len(overdue), message)
+
+                self.assertEqual(
+                    [(p['period_number'], p['status'], p['remaining_amount']) for p in expected],
+                    [
+                        (p.period_number, p.fifo_status, p.fifo_remaining)
+                        for p in sorted(
+                            (p for key, p in periods.items() if key[0] == contract.pk),
+                            key=lambda p: p.period_number
+                        )
+                    ],
+                    message
+                )
+
+        # قابل للفلترة والترتيب
+        ordered = list(
+            Contract.objects.with_outstanding(date(2025, 6, 30))
+            .filter(outstanding_amount__gt=0).order_by('-outstanding_amount')
+            .values_list('outstanding_amount', flat=True)
+        )
+        self.assertTrue(ordered)
+        self.assertEqual(ordered, sorted(ordered, reverse=True))
+
+    def test_missing_schedule_is_built_or_flagged(self):
+        from rent.models import ContractPeriod
+
+        as_of = date(2025, 6, 30)
+        expected = {c.pk: c.outstanding_amount for c in Contract.objects.with_outstanding(as_of)}
+        contract = next(pk for pk, amount in expected.items() if amount > 0)
+        ContractPeriod.objects.filter(contract_id=contract).delete()
+
+        flagged = Contract.objects.with_outstanding(as_of, build_missing=False).get(pk=contract)
+        self.assertFalse(flagged.has_schedule)
+        self.assertEqual(list(Contract.objects.without_schedule().values_list('pk', flat=True)), [contract])
+
+        rebuilt = Contract.objects.with_outstanding(as_of).get(pk=contract)
+        self.assertTrue(rebuilt.has_schedule)
+        self.assertEqual(rebuilt.outstanding_amount, expected[contract])
+
+
+class ModificationScheduleRebuildTest(TestCase):
+    """إلغاء تطبيق تعديل أو حذفه يعيد توليد جدول الأقساط"""
+
+    def test_unapply_and_delete_rebuild_periods(self):
+        from django.db.models import Sum
+        from rent.models import ContractModification, ContractPeriod
+
+        tenant = Tenant.objects.create(name='مستأجر', phone='0570000000', id_number='7000000000')
+        with self.captureOnCommitCallbacks(execute=True):
+            contract = Contract.objects.create(
+                tenant=tenant, start_date=date(2024, 1, 1), end_date=date(2024, 12, 31),
+                annual_rent=Decimal('120000.00'), payment_frequency='quarterly', status='active',
+            )
+
+        def discount():
+            return ContractPeriod.objects.filter(contract=contract).aggregate(
+                total=Sum('discount_amount')
+            )['total']
+
+        self.assertEqual(discount(), Decimal('0'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            modification = ContractModification.objects.create(
+                contract=contract, modification_type='discount', effective_date=date(2024, 1, 1),
+                discount_amount=Decimal('500.00'), discount_period_number=1, is_applied=True,
+            )
+        self.assertEqual(discount(), Decimal('500.00'))
+
+        # إلغاء التطبيق
+        with self.captureOnCommitCallbacks(execute=True):
+            modification = ContractModification.objects.get(pk=modification.pk)
+            modification.is_applied = False
+            modification.save()
+        self.assertEqual(discount(), Decimal('0'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            modification.is_applied = True
+            modification.save()
+        self.assertEqual(discount(), Decimal('500.00'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            modification.delete()
+        self.assertEqual(discount(), Decimal('0'))
+
+
+class ScheduleBuilderTest(TestCase):
+    """الجداول المبنية بالمصفوفات تطابق PeriodCalculator لكل عقد"""
+
+    def test_matches_period_calculator(self):
+        import random
+        import unittest
+        from dateutil.relativedelta import relativedelta
+        from rent.models import ContractModification
+        from rent.services.contract_financial_service import ContractFinancialData, PeriodCalculator
+        from rent.services.schedule_builder import HAS_NUMPY, build_schedules
+
+        if not HAS_NUMPY:
+            raise unittest.SkipTest('NumPy غير مثبت')
+
+        rng = random.Random(7)
+        contracts = []
+        modifications = {}
+        for contract_id in range(1, 201):
+            # أيام نهاية الشهر لاختبار قص اليوم التراكمي (31 يناير ← 28 فبراير ← 28 مارس)
+            start = date(rng.randint(2020, 2024), rng.randint(1, 12), 1)
+            start += relativedelta(day=rng.choice([1, 15, 28, 29, 30, 31]))
+            contract = Contract(
+                id=contract_id,
+                start_date=start,
+                end_date=start + relativedelta(months=rng.randint(1, 60), days=rng.randint(-20, 20)),
+                annual_rent=Decimal(rng.randint(10, 300) * 1000),
+                payment_frequency=rng.choice(['monthly', 'quarterly', 'semi_annual', 'annual', 'other']),
+            )
+            mods = sorted(
+                (
+                    ContractModification(
+                        id=contract_id * 10 + index,
+                        modification_type='rent_increase',
+                        effective_date=start + relativedelta(days=rng.randint(-60, 900)),
+                        old_rent_amount=Decimal(rng.randint(10, 300) * 1000),
+                        new_rent_amount=Decimal(rng.randint(10, 300) * 1000),
+                        is_applied=True,
+                    )
+                    for index in range(rng.randint(0, 3))
+                ),
+                key=lambda m: (m.effective_date, m.id)
+            )
+            contracts.append(contract)
+            modifications[contract_id] = mods
+
+        table = build_schedules(contracts, modifications)
+
+        for contract in contracts:
+            data = ContractFinancialData(applied_modifications=modifications[contract.id])
+            expected = PeriodCalculator(contract, data=data).calculate_periods_with_modifications(
+                include_future=True
+            )
+            data.schedule = table.periods_for(contract.id)
+            actual = PeriodCalculator(contract, data=data).calculate_periods_with_modifications(
+                include_future=True
+            )
+            self.assertEqual(actual, expected, f'contract {contract.id} from {contract.start_date}')
+
+
+@override_settings(FINANCIAL_CACHE_ALLOW_LOCMEM=True)
+class CashFlowForecastServiceTest(TestCase):
+    """توقعات التحصيل الشهرية مع التعديلات والمدفوع مقدماً ونهاية العقد"""
+
+    def setUp(self):
+        from django.core.cache import caches
+        from rent.models import Land, Building, Unit, Receipt, ContractModification
+
+        caches['financial'].clear()
+        # سنة قادمة حتى لا تنتهي العقود تلقائياً (contract_pre_save)
+        self.year = date.today().year + 1
+        year = self.year
+        land = Land.objects.create(
+            name='أرض 1', area=Decimal('1000'), deed_number='D-1', owner_name='مالك'
+        )
+        buildings = [
+            Building.objects.create(land=land, name=f'مبنى {i}', total_area=Decimal('500'), floors_count=1)
+            for i in range(2)
+        ]
+
+        self.contracts = []
+        for i, (frequency, end, rent) in enumerate([
+            ('quarterly', date(year + 1, 12, 31), Decimal('120000.00')),
+            ('monthly', date(year, 12, 31), Decimal('60000.00')),
+        ]):
+            tenant = Tenant.objects.create(
+                name=f'مستأجر {i}', phone=f'05200000{i:02d}', id_number=f'30000000{i:02d}'
+            )
+            unit = Unit.objects.create(
+                building=buildings[i], unit_number=f'U-{i}', floor=0, area=Decimal('50')
+            )
+            contract = Contract.objects.create(
+                tenant=tenant, start_date=date(year, 1, 1), end_date=end,
+                annual_rent=rent, payment_frequency=frequency, status='active',
+            )
+            contract.units.add(unit)
+            self.contracts.append(contract)
+
+        quarterly = self.contracts[0]
+        # 100000 تغطي الأقساط الثلاثة الأولى و10000 من الرابع
+        Receipt.objects.create(
+            contract=quarterly, receipt_date=date(year, 1, 5),
+            amount=Decimal('100000.00'), status='posted'
+        )
+        ContractModification.objects.create(
+            contract=quarterly, modification_type='rent_increase',
+            effective_date=date(year + 1, 1, 1), old_rent_amount=Decimal('120000.00'),
+            new_rent_amount=Decimal('132000.00'), is_applied=True
+        )
+        ContractModification.objects.create(
+            contract=quarterly, modification_type='vat',
+            effective_date=date(year + 1, 1, 1), vat_input_type='fixed',
+            vat_amount=Decimal('4950.00'), vat_period_number=5, is_applied=True
+        )
+
+    def test_monthly_matrix_and_groups(self):
+        from unittest import mock
+        from rent.services.cashflow_forecast_service import (
+            CashFlowForecastService,
+            invalidate_cashflow_forecasts,
+        )
+
+        service = CashFlowForecastService(as_of_date=date(self.year, 9, 15), months=12)
+        forecast = service.get_forecast()
+
+        self.assertEqual(forecast.month_labels[0], f'{self.year}-09')
+        self.assertEqual(len(forecast.months), 12)
+
+        rows = {row['contract_id']: row for row in forecast.rows}
+        quarterly = rows[self.contracts[0].pk]['values']
+        self.assertEqual(quarterly[1], Decimal('20000.00'))  # أكتوبر: المتبقي بعد المدفوع مقدماً
+        self.assertEqual(quarterly[4], Decimal('37950.00'))  # يناير: الإيجار الجديد + VAT
+        self.assertEqual(quarterly[7], Decimal('33000.00'))
+        self.assertEqual(quarterly[10], Decimal('33000.00'))
+        self.assertEqual(rows[self.contracts[0].pk]['total'], Decimal('123950.00'))
+
+        # العقد الشهري ينتهي في ديسمبر
+        monthly = rows[self.contracts[1].pk]['values']
+        self.assertEqual(monthly[:4], [Decimal('5000.00')] * 4)
+        self.assertFalse(any(monthly[4:]))
+
+        self.assertEqual(forecast.total, Decimal('143950.00'))
+        self.assertEqual(len(forecast.by_building), 2)
+        self.assertEqual(len(forecast.by_land), 1)
+        self.assertEqual(
+            {key: group['total'] for key, group in forecast.by_frequency.items()},
+            {'quarterly': Decimal('123950.00'), 'monthly': Decimal('20000.00')}
+        )
+
+        # محفوظ حتى يُهمل بتغيير في البيانات
+        with mock.patch.object(service, 'build', wraps=service.build) as build:
+            self.assertEqual(service.get_forecast().total, forecast.total)
+            self.assertEqual(build.call_count, 0)
+            invalidate_cashflow_forecasts()
+            service.get_forecast()
+            self.assertEqual(build.call_count, 1)
+
+            # locmem لكل عملية لا يصله الإهمال من العمليات الأخرى - لا يُحفظ
+            with override_settings(FINANCIAL_CACHE_ALLOW_LOCMEM=False):
+                service.get_forecast()
+                service.get_forecast()
+            self.assertEqual(build.call_count, 3)
+
+
+@override_settings(FINANCIAL_CACHE_ALLOW_LOCMEM=True)
+class ContractFinancialCacheTest(TestCase):
+    """النتائج المالية محفوظة بين الطلبات حتى يتغير العقد أو سنداته أو تعديلاته"""
+
+    def setUp(self):
+        from rent.services.financial_cache import reset_cache_stats
+
+        reset_cache_stats()
+        tenant = Tenant.objects.create(name='مستأجر', phone='0530000000', id_number='4000000000')
+        self.contract = Contract.objects.create(
+            tenant=tenant,
+            start_date=date(2024, 1, 1),
+            end_date=date(2025, 12, 31),
+            annual_rent=Decimal('120000.00'),
+            payment_frequency='quarterly',
+            status='active',
+        )
+        self.as_of = date(2024, 8, 15)
+
+    def _summary(self):
+        contract = Contract.objects.get(pk=self.contract.pk)
+        return ContractFinancialService(contract, self.as_of).get_contract_summary()
+
+    def test_hits_until_receipt_changes_version(self):
+        from rent.models import Receipt
+        from rent.services.financial_cache import get_cache_stats
+
+        first = self._summary()
+        self.assertEqual(get_cache_stats()['hits'], 0)
+
+        # طلب جديد (كائن خدمة جديد) يقرأ النتيجة المحفوظة
+        self.assertEqual(self._summary(), first)
+        self.assertEqual(get_cache_stats()['hits'], 1)
+
+        Receipt.objects.create(
+            contract=self.contract, receipt_date=date(2024, 1, 5),
+            amount=Decimal('30000.00'), status='posted'
+        )
+        updated = self._summary()
+        self.assertEqual(updated['total_paid'], first['total_paid'] + Decimal('30000.00'))
+        self.assertEqual(get_cache_stats()['hits'], 1)
+
+        # كائن عُدّل في الذاكرة ولم يُحفظ لا يقرأ نتيجة المحفوظ
+        contract = Contract.objects.get(pk=self.contract.pk)
+        contract.annual_rent = Decimal('240000.00')
+        changed = ContractFinancialService(contract, self.as_of).get_contract_summary()
+        self.assertNotEqual(changed['total_contract_value'], updated['total_contract_value'])
+
+    def test_locmem_bypassed_unless_allowed(self):
+        from rent.services.financial_cache import get_cache_stats
+
+        # locmem لكل عملية لا يصله إهمال العمليات الأخرى - يُحسب في كل طلب
+        with override_settings(FINANCIAL_CACHE_ALLOW_LOCMEM=False):
+            first = self._summary()
+            self.assertEqual(self._summary(), first)
+        stats = get_cache_stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['sets']), (0, 0, 0))
+
+
+@override_settings(FINANCIAL_CACHE_ALLOW_LOCMEM=True)
+class DashboardServiceTest(TestCase):
+    """عناصر لوحة التحكم: عدد استعلامات ثابت ونتائج محفوظة حتى تتغير البيانات"""
+
+    def setUp(self):
+        from django.contrib.auth.models import User
+        from django.core.cache import caches
+        from rent.models import Land, Building
+
+        caches['financial'].clear()
+        self.user = User.objects.create_user('dashboard', password='x')
+        land = Land.objects.create(
+            name='أرض 1', area=Decimal('1000'), deed_number='D-1', owner_name='مالك'
+        )
+        self.building = Building.objects.create(
+            land=land, name='مبنى 1', total_area=Decimal('500'), floors_count=1
+        )
+        self.count = 0
+
+    def _add_contracts(self, count):
+        from dateutil.relativedelta import relativedelta
+        from rent.models import Unit, Receipt
+
+        start = date.today() - relativedelta(months=7)
+        with self.captureOnCommitCallbacks(execute=True):
+            for _ in range(count):
+                i = self.count
+                self.count += 1
+                tenant = Tenant.objects.create(
+                    name=f'مستأجر {i}', phone=f'05400000{i:02d}', id_number=f'50000000{i:02d}'
+                )
+                unit = Unit.objects.create(
+                    building=self.building, unit_number=f'U-{i}', floor=0, area=Decimal('50')
+                )
+                contract = Contract.objects.create(
+                    tenant=tenant, start_date=start, end_date=start + relativedelta(years=2, days=-1),
+                    annual_rent=Decimal('120000.00'), payment_frequency='quarterly', status='active',
+                )
+                contract.units.add(unit)
+                if i % 2:
+                    Receipt.objects.create(
+                        contract=contract, receipt_date=start,
+                        amount=Decimal('30000.00'), status='posted'
+                    )
+
+    def _count_queries(self):
+        from django.core.cache import caches
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from rent.services.dashboard_service import get_dashboard_data
+
+        caches['financial'].clear()
+        with CaptureQueriesContext(connection) as queries:
+            data = get_dashboard_data(user=self.user)
+        return len(queries), data
+
+    def test_query_count_flat_and_cached(self):
+        from rent.services.dashboard_service import get_dashboard_data
+        from rent.services.portfolio_financial_service import PortfolioFinancialService
+
+        self._add_contracts(2)
+        small, _ = self._count_queries()
+        self._add_contracts(6)
+        large, data = self._count_queries()
+        self.assertEqual(small, large)
+
+        self.assertEqual(data['total_contracts'], 8)
+        self.assertEqual(data['rented_units'], 8)
+        self.assertEqual(
+            data['total_outstanding'],
+            PortfolioFinancialService(Contract.objects.all()).get_total_outstanding()
+        )
+        self.assertEqual(len(data['overdue_contracts']), 8)
+
+        # المحفوظ لا يستعلم قاعدة البيانات
+        with self.assertNumQueries(0):
+            get_dashboard_data(user=self.user)
+
+        # تغيير سند يعيد حساب العناصر المعتمدة على السندات فقط
+        from rent.models import Receipt
+        with self.captureOnCommitCallbacks(execute=True):
+            Receipt.objects.create(
+                contract=Contract.objects.first(), receipt_date=date.today(),
+                amount=Decimal('1000.00'), status='posted'
+            )
+        refreshed = get_dashboard_data(user=self.user)
+        self.assertEqual(refreshed['total_receipts_today'], Decimal('1000.00'))
+        self.assertEqual(refreshed['total_outstanding'], data['total_outstanding'] - Decimal('1000.00'))
+
+
+    def test_stats_api_etag(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from django.urls import reverse
+        from rent.models import Receipt
+
+        self._add_contracts(3)
+        self.client.force_login(self.user)
+        url = reverse('rent:dashboard_stats_api')
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        stats = response.json()['stats']
+        self.assertEqual(stats['overdue_contracts'], 3)
+        etag = response['ETag']
+
+        # لا تغيير: 304 من العناصر المحفوظة بدون استعلام على العقود والسندات
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        tables = (Contract._meta.db_table, Receipt._meta.db_table)
+        self.assertFalse([
+            q['sql'] for q in ctx.captured_queries if any(f'"{t}"' in q['sql'] for t in tables)
+        ])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Receipt.objects.create(
+                contract=Contract.objects.first(), receipt_date=date.today(),
+                amount=Decimal('500.00'), status='posted'
+            )
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['stats']['receipts_today'], {'count': 1, 'total': 500.0})
+
+
+    def test_stats_etag_follows_invalidation_from_another_worker(self):
+        import threading
+        from django.core.cache import cache, caches
+        from django.urls import reverse
+        from rent.models import Receipt
+        from rent.services.dashboard_service import invalidate_dashboard
+
+        self._add_contracts(2)
+        self.client.force_login(self.user)
+        url = reverse('rent:dashboard_stats_api')
+        etag = self.client.get(url)['ETag']
+
+        # تغيير بدون إشارات في هذه العملية، والإهمال من حالة cache أخرى
+        # (خيط آخر له اتصالات cache خاصة به كعملية أخرى)
+        Receipt.objects.update(receipt_date=date.today())
+        worker = threading.Thread(target=invalidate_dashboard, args=('rent.receipt',))
+        worker.start()
+        worker.join()
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['stats']['receipts_today']['count'], 1)
+
+        # العناصر في الـ cache المشترك وليس في locmem الافتراضي لكل عملية
+        self.assertIsNone(cache.get('dashboard:receipts:generation'))
+        self.assertIsNotNone(caches['financial'].get('dashboard:receipts:generation'))
+
+    def test_widgets_not_cached_without_shared_cache(self):
+        from django.urls import reverse
+        from rent.models import Receipt
+
+        self._add_contracts(2)
+        self.client.force_login(self.user)
+        url = reverse('rent:dashboard_stats_api')
+
+        with override_settings(FINANCIAL_CACHE_ALLOW_LOCMEM=False):
+            etag = self.client.get(url)['ETag']
+            Receipt.objects.update(receipt_date=date.today())
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+
+class TenantsReportQueryCountTest(TestCase):
+    """عدد استعلامات تقرير المستأجرين ثابت بغض النظر عن عدد العقود"""
+
+    def setUp(self):
+        from django.contrib.auth.models import User
+        from django.test import RequestFactory
+        from rent.models import Land, Building
+
+        self.factory = RequestFactory()
+        self.user = User.objects.create_superuser('admin', 'admin@example.com', 'pass')
+
+        land = Land.objects.create(
+            name='أرض 1', area=Decimal('1000'), deed_number='D-1', owner_name='مالك'
+        )
+        self.building = Building.objects.create(
+            land=land, name='مبنى 1', total_area=Decimal('500'), floors_count=1
+        )
+        self.contracts_created = 0
+
+    def _add_contracts(self, count):
+        from rent.models import Unit, Receipt, ContractModification
+
+        for _ in range(count):
+            i = self.contracts_created
+            self.contracts_created += 1
+            tenant = Tenant.objects.create(
+                name=f'مستأجر {i}', phone=f'05000000{i:02d}', id_number=f'10000000{i:02d}'
+            )
+            unit = Unit.objects.create(
+                building=self.building, unit_number=f'U-{i}', floor=0, area=Decimal('50')
+            )
+            contract = Contract.objects.create(
+                tenant=tenant,
+                start_date=date(2024, 1, 1),
+                end_date=date(2025, 12, 31),
+                annual_rent=Decimal('120000.00'),
+                payment_frequency='quarterly',
+                status='active',
+            )
+            contract.units.add(unit)
+            Receipt.objects.create(
+                contract=contract, receipt_date=date(2024, 1, 5),
+                amount=Decimal('20000.00'), status='posted'
+            )
+            ContractModification.objects.create(
+                contract=contract, modification_type='discount',
+                effective_date=date(2024, 4, 1), discount_amount=Decimal('1000.00'),
+                discount_period_number=2, is_applied=True
+            )
+
+    def _count_queries(self, view):
+        from unittest import mock
+        from django.db import connection
+        from django.http import HttpResponse
+        from django.test.utils import CaptureQueriesContext
+
+        request = self.factory.get('/')
+        request.user = self.user
+        # قالب الطباعة غير موجود في المشروع - نقيس استعلامات البيانات فقط
+        with mock.patch(
+            'rent.views.report_t_views.render',
+            side_effect=lambda request, template, context: HttpResponse()
+        ), CaptureQueriesContext(connection) as ctx:
+            response = view(request)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_constant_number_of_queries(self):
+        from rent.views.report_t_views import (
+            tenants_report_view,
+            export_tenants_report_excel,
+            print_tenants_report,
+        )
+
+        for view in (tenants_report_view, export_tenants_report_excel, print_tenants_report):
+            with self.subTest(view=view.__name__):
+                self._add_contracts(2)
+                few = self._count_queries(view)
+                self._add_contracts(5)
+                many = self._count_queries(view)
+                self.assertEqual(few, many)
+
+
+    def test_excel_export_across_chunks(self):
+        """التصدير على أكثر من دفعة يكتب كل الصفوف المطابقة للفلتر بتنسيقها"""
+        import io
+        from unittest import mock
+        from openpyxl import load_workbook
+        from rent.models import Receipt
+        from rent.services.portfolio_financial_service import PortfolioFinancialService
+        from rent.views.report_t_views import export_tenants_report_excel
+
+        self._add_contracts(5)
+        # سداد كامل لعقد واحد - يُستبعد بفلتر "يوجد مستحقات"
+        paid = Contract.objects.order_by('pk').first()
+        Receipt.objects.create(
+            contract=paid, receipt_date=date(2024, 2, 1),
+            amount=Decimal('219000.00'), status='posted'
+        )
+
+        request = self.factory.get('/', {'has_outstanding': 'yes'})
+        request.user = self.user
+        with mock.patch('rent.views.report_t_views.EXPORT_CHUNK_SIZE', 2), mock.patch(
+            'rent.services.portfolio_financial_service.PortfolioFinancialService',
+            wraps=PortfolioFinancialService,
+        ) as portfolio:
+            response = export_tenants_report_excel(request)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(portfolio.call_count, 3)
+
+        ws = load_workbook(io.BytesIO(b''.join(response.streaming_content))).active
+        rows = list(ws.iter_rows(values_only=True))
+        # العناوين + 4 عقود بمستحقات (على 3 دفعات) + الإجماليات
+        self.assertEqual(len(rows), 6)
+        self.assertNotIn(paid.tenant.name, [row[1] for row in rows])
+        self.assertEqual(rows[-1][6], sum(row[6] for row in rows[1:-1]))
+
+        due = ws.cell(row=2, column=7)
+        self.assertGreater(due.value, 0)
+        self.assertEqual(due.style, 'tenants_money_due')
+        self.assertTrue(due.font.bold)
+        self.assertEqual(due.number_format, '#,##0.00')
+
+
+def sample_scheduled_task(value=None):
+    """مهمة تجريبية لاختبار المجدول"""
+    if value == 'fail':
+        raise ValueError('فشل متعمد')
+    return {'value': value}
+
+
+class RevenueMonthlyRollupTest(TestCase):
+    """إجماليات الإيرادات الشهرية تطابق السندات بعد الترحيل والإلغاء والحذف"""
+
+    def setUp(self):
+        from dateutil.relativedelta import relativedelta
+        from rent.models import Land, Building, Unit
+
+        land = Land.objects.create(
+            name='أرض 1', area=Decimal('1000'), deed_number='D-1', owner_name='مالك'
+        )
+        self.this_month = date.today().replace(day=1)
+        self.last_month = self.this_month - relativedelta(months=1)
+        start = self.this_month - relativedelta(months=6)
+
+        self.contracts = []
+        for i in range(2):
+            building = Building.objects.create(
+                land=land, name=f'مبنى {i}', total_area=Decimal('500'), floors_count=1
+            )
+            unit = Unit.objects.create(
+                building=building, unit_number=f'U-{i}', floor=0, area=Decimal('50')
+            )
+            tenant = Tenant.objects.create(
+                name=f'مستأجر {i}', phone=f'05500000{i:02d}', id_number=f'60000000{i:02d}'
+            )
+            contract = Contract.objects.create(
+                tenant=tenant, start_date=start, end_date=start + relativedelta(years=2, days=-1),
+                annual_rent=Decimal('120000.00'), payment_frequency='monthly', status='active',
+            )
+            contract.units.add(unit)
+            self.contracts.append(contract)
+
+    def _receipt(self, contract, receipt_date, amount, **kwargs):
+        from rent.models import Receipt
+
+        return Receipt.objects.create(
+            contract=contract, receipt_date=receipt_date, amount=Decimal(amount),
+            status=kwargs.pop('status', 'posted'), **kwargs
+        )
+
+    def _assert_matches_raw(self):
+        from dateutil.relativedelta import relativedelta
+        from rent.services.revenue_report_service import get_revenue_summary
+
+        start, end = self.last_month, self.this_month + relativedelta(months=1)
+        rollup = get_revenue_summary(start, end)
+        self.assertEqual(rollup, get_revenue_summary(start, end, source='raw'))
+        return rollup
+
+    def test_incremental_updates_match_raw_scan(self):
+        from io import StringIO
+        from django.core.management import CommandError, call_command
+        from rent.models import Receipt, RevenueMonthlyRollup
+
+        first, second = self.contracts
+        kept = self._receipt(first, self.last_month, '10000.00')
+        cancelled = self._receipt(first, self.this_month, '5000.00', payment_method='cash')
+        moved = self._receipt(second, self.last_month, '7000.00')
+        deleted = self._receipt(second, self.this_month, '3000.00')
+        soft_deleted = self._receipt(second, self.this_month, '2000.00')
+
+        summary = self._assert_matches_raw()
+        self.assertEqual(summary['total'], Decimal('27000.00'))
+        self.assertEqual(summary['receipts_count'], 5)
+
+        cancelled.status = 'cancelled'
+        cancelled.save()
+        # تغيير المبلغ والشهر ينقل المساهمة بين الصفوف
+        moved = Receipt.objects.get(pk=moved.pk)
+        moved.amount = Decimal('8000.00')
+        moved.receipt_date = self.this_month
+        moved.save()
+        deleted.delete()
+        soft_deleted.is_deleted = True
+        soft_deleted.save()
+
+        summary = self._assert_matches_raw()
+        self.assertEqual(summary['total'], Decimal('18000.00'))
+        self.assertEqual(summary['receipts_count'], 2)
+        self.assertEqual(
+            [item['total'] for item in summary['monthly']],
+            [Decimal('10000.00'), Decimal('8000.00')]
+        )
+        self.assertEqual(
+            {item['name']: item['total'] for item in summary['buildings']},
+            {'مبنى 0': Decimal('10000.00'), 'مبنى 1': Decimal('8000.00')}
+        )
+        self.assertEqual(
+            RevenueMonthlyRollup.objects.get(
+                month=self.this_month, status='cancelled', building__name='مبنى 0'
+            ).amount,
+            Decimal('5000.00')
+        )
+
+        # التحديثات بدون إشارات تُكتشف بالتحقق وتُصحح بإعادة البناء
+        call_command('backfill_revenue_rollup', '--verify', stdout=StringIO())
+        Receipt.objects.filter(pk=kept.pk).update(amount=Decimal('11000.00'))
+        with self.assertRaises(CommandError):
+            call_command('backfill_revenue_rollup', '--verify', stdout=StringIO())
+        call_command('backfill_revenue_rollup', stdout=StringIO())
+        self.assertEqual(self._assert_matches_raw()['total'], Decimal('19000.00'))
+
+    def test_contract_units_change_moves_receipts(self):
+        from io import StringIO
+        from django.core.management import call_command
+
+        first, second = self.contracts
+        self._receipt(first, self.this_month, '4000.00')
+        first_unit, second_unit = first.units.get(), second.units.get()
+
+        # نقل العقد لوحدة في المبنى الآخر
+        first.units.remove(first_unit)
+        summary = self._assert_matches_raw()
+        self.assertEqual(summary['buildings'][0]['name'], 'غير محدد')
+        first.units.add(second_unit)
+        summary = self._assert_matches_raw()
+        self.assertEqual(
+            {item['name']: item['total'] for item in summary['buildings']},
+            {'مبنى 1': Decimal('4000.00')}
+        )
+
+        # من جهة الوحدة (unit.contracts)
+        second_unit.contracts.remove(first)
+        first_unit.contracts.add(first)
+        self.assertEqual(self._assert_matches_raw()['buildings'][0]['name'], 'مبنى 0')
+        first_unit.contracts.clear()
+        self._assert_matches_raw()
+        call_command('backfill_revenue_rollup', '--verify', stdout=StringIO())
+
+    def test_report_view_reads_rollup(self):
+        from django.contrib.auth.models import User
+        from django.urls import reverse
+
+        self._receipt(self.contracts[0], self.this_month, '4000.00')
+        self._receipt(self.contracts[1], self.this_month, '6000.00')
+        self.client.force_login(User.objects.create_superuser('revenue', password='x'))
+        url = reverse('rent:report_revenue')
+
+        response = self.client.get(url, {'months': 3})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['total_revenue'], Decimal('10000.00'))
+        self.assertEqual(len(response.context['monthly_revenue']), 3)
+        self.assertEqual(response.context['month_revenue'], Decimal('10000.00'))
+
+        building = self.contracts[1].units.first().building
+        response = self.client.get(url, {'months': 3, 'building': building.pk, 'source': 'raw'})
+        self.assertEqual(response.context['total_revenue'], Decimal('6000.00'))
+        self.assertEqual(response.context['source'], 'raw')
+
+        # عقد بوحدتين في مبنيين: إيراد اليوم ينسب لمبنى أول وحدة فقط (مثل الإجماليات)
+        self.contracts[0].units.add(self.contracts[1].units.first())
+        self._receipt(self.contracts[0], date.today(), '1000.00')
+        response = self.client.get(url, {'months': 3, 'building': building.pk})
+        self.assertEqual(response.context['today_revenue'], Decimal('0'))
+        response = self.client.get(url, {'months': 3, 'building': self.contracts[0].units.first().building_id})
+        self.assertEqual(response.context['today_revenue'], Decimal('1000.00'))
+
+
+class OccupancyHistoryTest(TestCase):
+    """سجل الإشغال من فترات العقود ويُحدّث عند تغيير العقد أو وحداته"""
+
+    def setUp(self):
+        from dateutil.relativedelta import relativedelta
+        from rent.models import Land, Building, Unit
+
+        land = Land.objects.create(
+            name='أرض 1', area=Decimal('1000'), deed_number='D-1', owner_name='مالك'
+        )
+        self.building = Building.objects.create(
+            land=land, name='مبنى 1', total_area=Decimal('500'), floors_count=1
+        )
+        self.rented = Unit.objects.create(
+            building=self.building, unit_number='U-1', floor=0, area=Decimal('50'),
+            monthly_rent=Decimal('3000.00')
+        )
+        self.vacant = Unit.objects.create(
+            building=self.building, unit_number='U-2', floor=0, area=Decimal('50')
+        )
+        self.start = date.today().replace(day=1) - relativedelta(months=6)
+        tenant = Tenant.objects.create(name='مستأجر', phone='0560000000', id_number='7000000000')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.contract = Contract.objects.create(
+                tenant=tenant, start_date=self.start,
+                end_date=self.start + relativedelta(years=1, days=-1),
+                annual_rent=Decimal('36000.00'), payment_frequency='monthly', status='active',
+            )
+            self.contract.units.add(self.rented)
+
+    def _row(self, unit, month):
+        from rent.models import UnitOccupancyMonth
+        return UnitOccupancyMonth.objects.get(unit=unit, month=month)
+
+    def test_early_termination_updates_months(self):
+        import calendar
+        from dateutil.relativedelta import relativedelta
+        from rent.services.occupancy_service import daily_series, monthly_series
+
+        self.assertEqual(self._row(self.rented, self.start).vacant_days, 0)
+
+        third = self.start + relativedelta(months=2)
+        with self.captureOnCommitCallbacks(execute=True):
+            contract = Contract.objects.get(pk=self.contract.pk)
+            contract.actual_end_date = third + timedelta(days=9)
+            contract.save()
+
+        days = calendar.monthrange(third.year, third.month)[1]
+        row = self._row(self.rented, third)
+        self.assertEqual((row.occupied_days, row.vacant_days), (10, days - 10))
+        self.assertEqual(row.lost_rent, (Decimal('3000') * (days - 10) / days).quantize(Decimal('0.01')))
+        self.assertEqual(self._row(self.rented, third + relativedelta(months=1)).occupied_days, 0)
+
+        # الوحدة الثانية متاحة من إضافتها فقط (الشهر الحالي)
+        series = monthly_series(self.start, date.today().replace(day=1) + relativedelta(months=1),
+                                building_id=self.building.pk)
+        self.assertEqual(len(series), 7)
+        self.assertEqual(series[0]['units'], 1)
+        self.assertEqual(series[0]['rate'], 100)
+        self.assertEqual(series[-1]['units'], 2)
+        self.assertEqual(series[-1]['occupied_days'], 0)
+
+        daily = daily_series(third, third + timedelta(days=days - 1), building_id=self.building.pk)
+        self.assertEqual([day['occupied'] for day in daily], [1] * 10 + [0] * (days - 10))
+        self.assertEqual(sum(day['vacant'] for day in daily), row.vacant_days)
+
+    def test_unit_removed_from_contract(self):
+        from django.urls import reverse
+        from django.contrib.auth.models import User
+        from rent.models import UnitOccupancyMonth
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.contract.units.remove(self.rented)
+        self.assertFalse(
+            UnitOccupancyMonth.objects.filter(unit=self.rented, occupied_days__gt=0).exists()
+        )
+
+        # وحدات بدون صفوف (قبل إنشاء الجدول) تُحسب عند القراءة
+        with self.captureOnCommitCallbacks(execute=True):
+            self.contract.units.add(self.rented)
+        UnitOccupancyMonth.objects.all().delete()
+        self.client.force_login(User.objects.create_superuser('occupancy', password='x'))
+        response = self.client.get(reverse('rent:report_occupancy'), {'history_months': 6})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['occupancy_history'][0]['rate'], 100)
+        self.assertTrue(UnitOccupancyMonth.objects.filter(unit=self.vacant).exists())
+
+        response = self.client.get(reverse('rent:report_occupancy_history_api'), {
+            'granularity': 'daily', 'start': self.start.isoformat(),
+            'end': (self.start + timedelta(days=6)).isoformat(), 'unit': self.rented.pk,
+        })
+        self.assertEqual([day['occupied'] for day in response.json()['series']], [1] * 7)
+
+    def test_far_future_end_does_not_extend_history(self):
+        from django.urls import reverse
+        from django.contrib.auth.models import User
+        from rent.models import UnitOccupancyMonth
+        from rent.services.occupancy_service import default_horizon
+
+        self.client.force_login(User.objects.create_superuser('occupancy', password='x'))
+        response = self.client.get(reverse('rent:report_occupancy_history_api'), {
+            'start': self.start.isoformat(), 'end': '2300-01-01',
+        })
+        self.assertEqual(response.status_code, 200)
+        horizon = default_horizon()
+        self.assertFalse(UnitOccupancyMonth.objects.filter(month__gte=horizon).exists())
+
+        # صفوف بعد الأفق (من نسخة سابقة) تُحذف عند إعادة حساب الوحدة
+        UnitOccupancyMonth.objects.create(
+            unit=self.rented, building=self.building, land=self.building.land,
+            month=date(2299, 12, 1), days=31, occupied_days=0, vacant_days=31,
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            self.rented.monthly_rent = Decimal('3500.00')
+            self.rented.save()
+        self.assertFalse(UnitOccupancyMonth.objects.filter(month__gte=horizon).exists())
+
+
+class TaskSchedulerTest(TestCase):
+    """اختبار حجز وتنفيذ المهام المجدولة"""
+
+    def _create_task(self, **kwargs):
+        from django.utils import timezone
+        from datetime import timedelta
+        from rent.models import ScheduledTask
+
+        task = ScheduledTask.objects.create(
+            name=kwargs.pop('name', 'مهمة'),
+            task_type='calculation',
+            task_function='rent.tests.sample_scheduled_task',
+            **kwargs
+        )
+        ScheduledTask.objects.filter(pk=task.pk).update(
+            next_run=timezone.now() - timedelta(minutes=1)
+        )
+        return task
+
+    def test_runs_due_tasks_and_records_executions(self):
+        from rent.models import ScheduledTask, TaskExecution
+        from rent.services.scheduler_service import TaskScheduler
+
+        ok = self._create_task(name='ناجحة', task_parameters={'value': 5})
+        bad = self._create_task(name='فاشلة', task_parameters={'value': 'fail'})
+        self._create_task(name='معطلة', is_active=False)
+
+        executions = TaskScheduler(max_workers=1).run_pending()
+        self.assertEqual(len(executions), 2)
+
+        ok_execution = TaskExecution.objects.get(task=ok)
+        self.assertEqual(ok_execution.status, 'success')
+        self.assertEqual(ok_execution.output, {'value': 5})
+        self.assertIsNotNone(ok_execution.duration)
+
+        bad_execution = TaskExecution.objects.get(task=bad)
+        self.assertEqual(bad_execution.status, 'failed')
+        self.assertIn('فشل متعمد', bad_execution.error_message)
+
+        ok.refresh_from_db()
+        bad.refresh_from_db()
+        self.assertEqual((ok.success_count, ok.last_status), (1, 'success'))
+        self.assertEqual((bad.failure_count, bad.last_status), (1, 'failed'))
+        self.assertGreater(ok.next_run, ok_execution.finished_at)
+
+        # لا تُنفذ مرة أخرى قبل موعدها القادم
+        self.assertEqual(TaskScheduler(max_workers=1).run_pending(), [])
+
+
+class NotificationGenerationTest(TestCase):
+    """اختبار إنشاء الإشعارات التلقائية دفعة واحدة"""
+
+    def setUp(self):
+        from datetime import timedelta
+        from django.utils import timezone
+
+        today = timezone.now().date()
+        self.contracts = []
+        for i in range(3):
+            tenant = Tenant.objects.create(
+                name=f'مستأجر {i}', phone=f'05000000{i:02d}', id_number=f'10000000{i:02d}'
+            )
+            self.contracts.append(Contract.objects.create(
+                tenant=tenant,
+                start_date=today - timedelta(days=200),
+                end_date=today + timedelta(days=10 + i * 100),
+                annual_rent=Decimal('12000.00'),
+                payment_frequency='monthly',
+                status='active',
+            ))
+
+    def test_bulk_generation_is_deduplicated(self):
+        from rent.models import Notification
+
+        stats = Notification.generate_all_notifications()
+        self.assertEqual(stats['payment_due']['created'], 3)
+        self.assertEqual(stats['payment_overdue']['created'], 3)
+        # عقد واحد فقط ينتهي خلال 30 يوم
+        self.assertEqual(stats['contract_expiry']['created'], 1)
+
+        # التشغيل مرة أخرى لا يكرر الإشعارات
+        stats = Notification.generate_all_notifications()
+        self.assertEqual(sum(s['created'] for s in stats.values()), 0)
+        self.assertEqual(Notification.objects.count(), 7)
+
+    def test_constant_number_of_queries(self):
+        from rent.models import Notification
+
+        Notification.check_payment_due()
+        Notification.objects.all().delete()
+        # العقود + المستأجرين + الوحدات + التعديلات + المدفوعات + منع التكرار + الإدراج
+        with self.assertNumQueries(7):
+            self.assertEqual(Notification.check_payment_due(), 3)
+
+
+class JsonBackupWriterTest(TestCase):
+    """اختبار النسخ الاحتياطي JSON المتدفق والمضغوط"""
+
+    def setUp(self):
+        import tempfile
+        self.directory = tempfile.mkdtemp()
+        for i in range(5):
+            Tenant.objects.create(
+                name=f'مستأجر {i}', phone=f'05100000{i:02d}', id_number=f'20000000{i:02d}'
+            )
+
+    def tearDown(self):
+        import shutil
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_streamed_backup_matches_checksum_and_counts(self):
+        import gzip
+        import hashlib
+        import json
+        from rent.services.backup_service import JsonBackupWriter
+
+        backup = JsonBackupWriter.create_backup_record(directory=self.directory)
+        JsonBackupWriter(backup, chunk_size=2).run()
+
+        backup.refresh_from_db()
+        self.assertEqual(backup.status, 'completed')
+        self.assertTrue(backup.is_verified)
+        self.assertTrue(backup.file_name.endswith('.json.gz'))
+
+        with open(backup.file_path, 'rb') as f:
+            raw = f.read()
+        self.assertEqual(backup.checksum, hashlib.sha256(raw).hexdigest())
+        self.assertEqual(backup.file_size, len(raw))
+
+        records = json.loads(gzip.decompress(raw))
+        self.assertEqual(backup.records_count, len(records))
+        self.assertEqual(sum(1 for r in records if r['model'] == 'rent.tenant'), 5)
+        self.assertIn('rent.tenant', backup.included_tables)
+        self.assertFalse(any(r['model'].startswith('contenttypes.') for r in records))
+
+    def test_directory_backup_checksum_and_tar_stream(self):
+        import io
+        import os
+        import tarfile
+        from rent.services.backup_service import backup_checksum, iter_directory_tar
+
+        path = os.path.join(self.directory, 'backup_test.pgdump')
+        os.makedirs(path)
+        contents = {'toc.dat': b'toc' * 300, '3001.dat.gz': os.urandom(5000)}
+        for name, data in contents.items():
+            with open(os.path.join(path, name), 'wb') as f:
+                f.write(data)
+
+        checksum, size = backup_checksum(path, chunk_size=1024)
+        self.assertEqual(size, sum(len(d) for d in contents.values()))
+        self.assertEqual(checksum, backup_checksum(path, chunk_size=7)[0])
+
+        archive = tarfile.open(fileobj=io.BytesIO(b''.join(iter_directory_tar(path, chunk_size=1024))))
+        for name, data in contents.items():
+            self.assertEqual(archive.extractfile(f'backup_test.pgdump/{name}').read(), data)
+
+    def test_fast_restore_round_trip_without_audit(self):
+        from django.contrib.auth.models import User
+        from django.utils import timezone
+        from audit_log.models import AuditLog
+        from rent.services.backup_restore_service import JsonRestoreEngine
+        from rent.services.backup_service import JsonBackupWriter
+
+        user = User.objects.create_user('backup_admin', password='x')
+        Tenant.objects.filter(name='مستأجر 0').update(created_by=user)
+
+        # تواريخ قديمة لا تساوي وقت الاستعادة
+        past = (timezone.now() - timedelta(days=400)).replace(microsecond=0)
+        Tenant.objects.update(created_at=past, updated_at=past)
+        AuditLog.objects.update(created_at=past)
+
+        backup = JsonBackupWriter.create_backup_record(directory=self.directory)
+        JsonBackupWriter(backup).run()
+        expected = {
+            t.pk: (t.name, t.created_by_id, t.created_at, t.updated_at)
+            for t in Tenant.objects.all()
+        }
+        expected_audit = dict(AuditLog.objects.values_list('pk', 'created_at'))
+
+        Tenant.objects.all().delete()
+        audit_count = AuditLog.objects.count()
+
+        stats = JsonRestoreEngine(batch_size=2).restore(backup.file_path)
+
+        self.assertEqual(stats['rent.tenant'], 5)
+        self.assertEqual(
+            {
+                t.pk: (t.name, t.created_by_id, t.created_at, t.updated_at)
+                for t in Tenant.objects.all()
+            },
+            expected
+        )
+        # لا سجلات تدقيق جديدة أثناء الاستعادة، وتواريخ الموجودة لم تتغير
+        self.assertEqual(AuditLog.objects.count(), audit_count)
+        if expected_audit:
+            self.assertEqual(
+                dict(AuditLog.objects.values_list('pk', 'created_at')), expected_audit
+            )
+
+        # التسلسلات أُعيد ضبطها بعد الإدراج بمفاتيح محددة
+        tenant = Tenant.objects.create(name='جديد', phone='0599999999', id_number='2999999999')
+        self.assertGreater(tenant.pk, max(expected))
+
+    def test_restore_rebuilds_periods_from_restored_receipts(self):
+        from django.db.models import Sum
+        from rent.models import ContractPeriod, Receipt, ReceiptAllocation
+        from rent.services.backup_restore_service import JsonRestoreEngine
+        from rent.services.backup_service import JsonBackupWriter
+
+        with self.captureOnCommitCallbacks(execute=True):
+            contract = Contract.objects.create(
+                tenant=Tenant.objects.first(), start_date=date(2024, 1, 1),
+                end_date=date(2025, 12, 31), annual_rent=Decimal('120000.00'),
+                payment_frequency='quarterly', status='active',
+            )
+            Receipt.objects.create(
+                contract=contract, receipt_date=date(2024, 1, 5),
+                amount=Decimal('30000.00'), status='posted'
+            )
+
+        backup = JsonBackupWriter.create_backup_record(directory=self.directory)
+        JsonBackupWriter(backup).run()
+
+        # تغييرات بدون إشارات بعد النسخ: الجداول المشتقة لا تطابق المستعاد
+        Receipt.objects.update(amount=Decimal('1000.00'))
+        ContractPeriod.objects.update(paid_amount=Decimal('0'))
+        ReceiptAllocation.objects.all().delete()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            JsonRestoreEngine().restore(backup.file_path)
+
+        periods = ContractPeriod.objects.filter(contract=contract)
+        self.assertEqual(periods.aggregate(paid=Sum('paid_amount'))['paid'], Decimal('30000.00'))
+        self.assertEqual(
+            ReceiptAllocation.objects.filter(contract=contract).aggregate(total=Sum('amount'))['total'],
+            Decimal('30000.00')
+        )
+
+    def test_incremental_json_array_parser(self):
+        import io
+        import json
+        from rent.services.backup_restore_service import iter_json_array
+
+        items = [{'model': 'rent.tenant', 'pk': i, 'fields': {'name': 'س' * i}} for i in range(20)]
+        text = json.dumps(items, ensure_ascii=False, indent=2)
+        for chunk_size in (1, 7, 4096):
+            self.assertEqual(list(iter_json_array(io.StringIO(text), chunk_size)), items)
+        self.assertEqual(list(iter_json_array(io.StringIO('[]'))), [])
+
+    def test_incremental_includes_rows_committed_after_full_dump(self):
+        import gzip
+        import json
+        from datetime import timedelta
+        from rent.models import BackupTombstone
+        from rent.services.backup_service import IncrementalJsonBackupWriter, JsonBackupWriter
+
+        full = JsonBackupWriter.create_backup_record(directory=self.directory)
+        JsonBackupWriter(full).run()
+
+        # حُفظ قبل بداية النسخة الكاملة لكن التزم بعد قراءتها الجدول:
+        # updated_at أقدم من أحدث قيمة في النسخة ولم يظهر فيها
+        late = Tenant.objects.create(name='متأخر', phone='0512222222', id_number='2122222222')
+        saved_at = full.started_at - timedelta(seconds=60)
+        Tenant.objects.filter(pk=late.pk).update(updated_at=saved_at)
+        BackupTombstone.objects.create(model_label='rent.tenant', object_pk='999', deleted_at=saved_at)
+
+        delta = IncrementalJsonBackupWriter.create_backup_record(directory=self.directory)
+        IncrementalJsonBackupWriter(delta).run()
+        with gzip.open(delta.file_path, 'rt', encoding='utf-8') as f:
+            records = json.load(f)
+
+        self.assertIn(late.pk, {r['pk'] for r in records if r['model'] == 'rent.tenant'})
+        self.assertIn('999', {
+            r['fields']['object_pk'] for r in records if r['model'] == 'rent.backuptombstone'
+        })
+
+    def test_incremental_backup_chain_restore(self):
+        import gzip
+        import json
+        from django.utils import timezone
+        from rent.models import Backup
+        from rent.services.backup_restore_service import restore_backup_chain
+        from rent.services.backup_service import IncrementalJsonBackupWriter, JsonBackupWriter
+
+        # سجلات أقدم من هامش العلامة (BACKUP_WATERMARK_MARGIN) لا تُعاد
+        for i, pk in enumerate(Tenant.objects.order_by('pk').values_list('pk', flat=True)):
+            Tenant.objects.filter(pk=pk).update(
+                updated_at=timezone.now() - timedelta(days=1) + timedelta(seconds=i)
+            )
+
+        full = JsonBackupWriter.create_backup_record(directory=self.directory)
+        JsonBackupWriter(full).run()
+        self.assertIn('rent.tenant', full.watermarks)
+
+        changed = Tenant.objects.get(name='مستأجر 1')
+        changed.name = 'مستأجر معدل'
+        changed.save()
+        deleted_pk = Tenant.objects.get(name='مستأجر 2').pk
+        Tenant.objects.filter(pk=deleted_pk).delete()
+        added = Tenant.objects.create(name='مستأجر جديد', phone='0511111111', id_number='2111111111')
+
+        delta = IncrementalJsonBackupWriter.create_backup_record(directory=self.directory)
+        IncrementalJsonBackupWriter(delta).run()
+        delta.refresh_from_db()
+        self.assertEqual(delta.status, 'completed')
+        self.assertEqual(delta.base_backup, full)
+        # المعدل والجديد (+ آخر سجل عند حد العلامة) وسجل حذف واحد
+        with gzip.open(delta.file_path, 'rt', encoding='utf-8') as f:
+            records = json.load(f)
+        tenant_pks = {r['pk'] for r in records if r['model'] == 'rent.tenant'}
+        self.assertTrue({changed.pk, added.pk} <= tenant_pks)
+        self.assertNotIn(Tenant.objects.get(name='مستأجر 0').pk, tenant_pks)
+        self.assertEqual(sum(1 for r in records if r['model'] == 'rent.backuptombstone'), 1)
+        self.assertEqual([b.pk for b in delta.get_restore_chain()], [full.pk, delta.pk])
+
+        expected = dict(Tenant.objects.values_list('pk', 'name'))
+        Tenant.objects.all().delete()
+
+        restore_backup_chain(Backup.objects.get(pk=delta.pk))
+
+        self.assertEqual(dict(Tenant.objects.values_list('pk', 'name')), expected)
+        self.assertFalse(Tenant.objects.filter(pk=deleted_pk).exists())
+        self.assertTrue(Tenant.objects.filter(pk=added.pk).exists())
+
+
+    def test_create_view_enqueues_job_for_scheduler_worker(self):
+        """زر النسخ ينشئ مهمة لمرة واحدة ينفذها run_scheduler وليس خيطاً في الطلب"""
+        from django.contrib.auth.models import User
+        from unittest import mock
+        from django.urls import reverse
+        from rent.models import Backup, ScheduledTask
+        from rent.services.scheduler_service import TaskScheduler
+
+        self.client.force_login(User.objects.create_superuser('backup', password='x'))
+        with mock.patch('rent.services.backup_service.BACKUP_DIR', self.directory):
+            self.client.post(reverse('rent:backup_create'))
+
+            backup = Backup.objects.get()
+            task = ScheduledTask.objects.get(task_type='backup')
+            self.assertEqual(backup.status, 'in_progress')
+            self.assertEqual(task.task_parameters, {'job': 'json', 'backup_id': backup.pk})
+
+            executions = TaskScheduler(max_workers=1).run_pending()
+
+        self.assertEqual([e.status for e in executions], ['success'])
+        backup.refresh_from_db()
+        task.refresh_from_db()
+        self.assertEqual(backup.status, 'completed')
+        self.assertTrue(backup.file_path.startswith(self.directory))
+        self.assertIsNone(task.next_run)
+
+    def test_stale_backup_failed_and_orphaned_part_removed(self):
+        """نسخة مات عاملها تُحدد كفاشلة في المهمة التالية ويُحذف ملفها المؤقت"""
+        import os
+        from unittest import mock
+        from django.utils import timezone
+        from rent.models import Backup
+        from rent.services.backup_service import JsonBackupWriter, recover_stale_backups
+
+        old = timezone.now() - timedelta(days=1)
+        stale = JsonBackupWriter.create_backup_record(directory=self.directory)
+        running = JsonBackupWriter.create_backup_record(directory=self.directory)
+        Backup.objects.filter(pk__in=[stale.pk, running.pk]).update(started_at=old)
+        # النسخة الجارية حدّثت تقدمها للتو
+        Backup.objects.filter(pk=running.pk).update(
+            metadata={'progress': {'updated_at': timezone.now().isoformat()}}
+        )
+
+        orphan = os.path.join(self.directory, 'backup_orphan.json.gz.part')
+        for path in (f'{stale.file_path}.part', f'{running.file_path}.part', orphan):
+            with open(path, 'wb') as f:
+                f.write(b'partial')
+            os.utime(path, (old.timestamp(), old.timestamp()))
+
+        with mock.patch('rent.services.backup_service.BACKUP_DIR', self.directory):
+            self.assertEqual(recover_stale_backups(), 1)
+
+        stale.refresh_from_db()
+        running.refresh_from_db()
+        self.assertEqual(stale.status, 'failed')
+        self.assertEqual(running.status, 'in_progress')
+        self.assertFalse(os.path.exists(f'{stale.file_path}.part'))
+        self.assertFalse(os.path.exists(orphan))
+        self.assertTrue(os.path.exists(f'{running.file_path}.part'))
+
+
+class BackupScheduleRunnerTest(TestCase):
+    """اختبار تنفيذ جداول النسخ وسياسة الاحتفاظ والتخزين حسب المحتوى"""
+
+    def setUp(self):
+        import tempfile
+        self.directory = tempfile.mkdtemp()
+        Tenant.objects.create(name='مستأجر', phone='0520000000', id_number='3000000000')
+
+    def tearDown(self):
+        import shutil
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def _make_due(self, schedule):
+        from datetime import timedelta
+        from django.utils import timezone
+        from rent.models import BackupSchedule
+
+        BackupSchedule.objects.filter(pk=schedule.pk).update(
+            next_run=timezone.now() - timedelta(minutes=1)
+        )
+
+    def test_due_schedule_runs_and_prunes(self):
+        from datetime import time
+        from rent.models import Backup, BackupSchedule
+        from rent.services.backup_schedule_service import BackupScheduleRunner
+
+        schedule = BackupSchedule.objects.create(
+            name='يومي',
+            execution_time=time(2, 0),
+            storage_path=self.directory,
+            max_backups_to_keep=2,
+        )
+        runner = BackupScheduleRunner()
+        self.assertEqual(runner.run_pending(), [])
+
+        for _ in range(3):
+            self._make_due(schedule)
+            backups = runner.run_pending()
+            self.assertEqual(len(backups), 1)
+            self.assertTrue(backups[0].is_successful)
+
+        schedule.refresh_from_db()
+        self.assertGreater(schedule.next_run, backups[0].completed_at)
+        self.assertEqual(schedule.last_backup, backups[0])
+
+        kept = Backup.objects.filter(schedule=schedule)
+        self.assertEqual(kept.count(), 2)
+        self.assertIn(backups[0], kept)
+        for backup in kept:
+            self.assertTrue(backup.file_path.startswith(self.directory))
+
+    def test_identical_backups_share_one_file(self):
+        import os
+        from datetime import time
+        from django.db import transaction
+        from audit_log.models import AuditLog
+        from rent.models import BackupSchedule
+        from rent.services.backup_schedule_service import BackupScheduleRunner, delete_backup
+
+        # نسختان كاملتان بدون تحديد جداول، وسجلات التدقيق تُكتب بين النسختين
+        with self.captureOnCommitCallbacks(execute=True), transaction.atomic():
+            Tenant.objects.create(name='مستأجر 2', phone='0520000002', id_number='3000000002')
+            schedule = BackupSchedule.objects.create(
+                name='يومي', execution_time=time(2, 0), storage_path=self.directory,
+            )
+        runner = BackupScheduleRunner()
+        backups = []
+        for _ in range(2):
+            self._make_due(schedule)
+            with self.captureOnCommitCallbacks(execute=True), transaction.atomic():
+                backups.extend(runner.run_pending())
+
+        first, second = backups
+        self.assertIn('audit_log.auditlog', first.included_tables)
+        self.assertFalse(AuditLog.objects.filter(model_name__in=['Backup', 'BackupSchedule']).exists())
+        self.assertEqual(first.checksum, second.checksum)
+        self.assertEqual(first.file_path, second.file_path)
+        self.assertTrue(second.metadata['deduplicated'])
+
+        delete_backup(first)
+        self.assertTrue(os.path.exists(second.file_path))
+        delete_backup(second)
+        self.assertFalse(os.path.exists(second.file_path))
+
+
+class IncrementalTimestampsTest(TestCase):
+    """تعديلات الوحدات وروابط العقود تُحدّث updated_at فتظهر في النسخ التزايدية"""
+
+    def setUp(self):
+        from rent.models import Land, Building, Unit
+
+        land = Land.objects.create(
+            name='أرض', area=Decimal('1000'), deed_number='D-T', owner_name='مالك'
+        )
+        building = Building.objects.create(
+            land=land, name='مبنى', total_area=Decimal('500'), floors_count=1
+        )
+        self.units = [
+            Unit.objects.create(building=building, unit_number=f'T-{i}', floor=0, area=Decimal('50'))
+            for i in range(2)
+        ]
+        tenant = Tenant.objects.create(name='مستأجر', phone='0560000000', id_number='6000000000')
+        self.contract = Contract.objects.create(
+            tenant=tenant, start_date=date.today(), end_date=date.today() + timedelta(days=364),
+            annual_rent=Decimal('12000.00'), payment_frequency='monthly', status='active',
+        )
+
+    def _age(self, queryset):
+        from django.utils import timezone
+
+        past = timezone.now() - timedelta(days=30)
+        queryset.update(updated_at=past)
+        return past
+
+    def test_unit_status_and_contract_units_touch_updated_at(self):
+        from rent.models import Unit
+        from rent.services.unit_availability_service import UnitAvailabilityService
+
+        contracts = Contract.objects.filter(pk=self.contract.pk)
+        past = self._age(contracts)
+        self.contract.units.add(self.units[0])
+        self.assertGreater(contracts.get().updated_at, past)
+
+        # من جهة الوحدة (reverse) بما فيها clear
+        past = self._age(contracts)
+        self.units[0].contracts.clear()
+        self.assertGreater(contracts.get().updated_at, past)
+
+        # update() الجماعي لحالة الوحدات
+        self.contract.units.add(*self.units)
+        past = self._age(Unit.objects.all())
+        self.contract._update_units_status('maintenance')
+        self.assertTrue(all(unit.updated_at > past for unit in Unit.objects.all()))
+
+        # الوحدات التي حالتها صحيحة لا تُعدّل
+        service = UnitAvailabilityService(
+            contract_model=Contract, unit_model=Unit, active_status_value='active',
+            available_status_value='available', rented_status_value='rented',
+        )
+        self.assertEqual(service.update_all_units_availability()['rented_units'], 2)
+        past = self._age(Unit.objects.all())
+        self.assertEqual(service.update_all_units_availability()['total_processed'], 0)
+        self.assertTrue(all(unit.updated_at == past for unit in Unit.objects.all()))
+
+    def test_retention_prunes_tombstones_before_oldest_base(self):
+        import shutil
+        import tempfile
+        from datetime import time
+        from django.utils import timezone
+        from rent.models import BackupSchedule, BackupTombstone
+        from rent.services.backup_schedule_service import apply_retention
+        from rent.services.backup_service import JsonBackupWriter
+
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        schedule = BackupSchedule.objects.create(
+            name='يومي', execution_time=time(2, 0), storage_path=directory,
+        )
+
+        old = BackupTombstone.objects.create(
+            model_label='rent.tenant', object_pk='1', deleted_at=timezone.now() - timedelta(days=5)
+        )
+        # بدون نسخة أساسية لا يُحذف شيء
+        apply_retention(schedule)
+        self.assertTrue(BackupTombstone.objects.filter(pk=old.pk).exists())
+
+        backup = JsonBackupWriter.create_backup_record(directory=directory, schedule=schedule)
+        JsonBackupWriter(backup).run()
+        recent = BackupTombstone.objects.create(model_label='rent.tenant', object_pk='2')
+
+        apply_retention(schedule)
+        self.assertEqual(list(BackupTombstone.objects.values_list('pk', flat=True)), [recent.pk])
+
+
+class BackupDownloadRangeTest(TestCase):
+    """اختبار تحميل النسخ مع دعم Range/If-Range"""
+
+    def setUp(self):
+        import os
+        import tempfile
+        from django.contrib.auth.models import User
+        from django.urls import reverse
+        from rent.models import Backup
+
+        self.directory = tempfile.mkdtemp()
+        self.content = bytes(range(256)) * 40
+        path = os.path.join(self.directory, 'backup_test.json.gz')
+        with open(path, 'wb') as f:
+            f.write(self.content)
+
+        self.backup = Backup.objects.create(
+            file_name='backup_test.json.gz', file_path=path, checksum='abc123',
+            status='completed', is_successful=True,
+        )
+        self.client.force_login(User.objects.create_superuser('root', password='x'))
+        self.url = reverse('rent:backup_download', args=[self.backup.pk])
+
+    def tearDown(self):
+        import shutil
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def _body(self, response):
+        return b''.join(response.streaming_content)
+
+    def test_full_and_partial_downloads(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(response['ETag'], '"abc123"')
+        self.assertEqual(self._body(response), self.content)
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=100-199')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 100-199/{len(self.content)}')
+        self.assertEqual(response['Content-Length'], '100')
+        self.assertEqual(self._body(response), self.content[100:200])
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=-10', HTTP_IF_RANGE='"abc123"')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(self._body(response), self.content[-10:])
+
+    def test_stale_if_range_and_unsatisfiable_range(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"other"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self._body(response), self.content)
+
+        response = self.client.get(self.url, HTTP_RANGE=f'bytes={len(self.content)}-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{len(self.content)}')
+
+    def test_nginx_accel_redirect(self):
+        with self.settings(BACKUP_DOWNLOAD_ACCEL='nginx', BACKUP_ACCEL_ROOT=self.directory,
+                           BACKUP_ACCEL_REDIRECT_PREFIX='/protected/'):
+            response = self.client.get(self.url)
+        self.assertEqual(response['X-Accel-Redirect'], '/protected/backup_test.json.gz')
+        self.assertEqual(response.content, b'')
@@ -43,6 +43,7 @@ urlpatterns = [
     # الصفحة الرئيسية والداشبورد
     # ========================================
     path('', views.DashboardView.as_view(), name='dashboard'),
+    path('api/dashboard-stats/', views.DashboardStatsAPIView.as_view(), name='dashboard_stats_api'),
     
     # ========================================
     # إدارة الأراضي
@@ -148,7 +149,9 @@ urlpatterns = [
     path('reports/tenants-due/', views.TenantsDueReportView.as_view(), name='report_tenants_due'),
     path('reports/contracts-expiring/', views.ContractsExpiringReportView.as_view(), name='report_contracts_expiring'),
     path('reports/occupancy/', views.OccupancyReportView.as_view(), name='report_occupancy'),
+    path('reports/occupancy/history/', views.OccupancyHistoryAPIView.as_view(), name='report_occupancy_history_api'),
     path('reports/revenue/', views.RevenueReportView.as_view(), name='report_revenue'),
+    path('reports/cashflow-forecast/', views.CashFlowForecastReportView.as_view(), name='report_cashflow_forecast'),
 
     path('reports/rep/', tenants_report_view, name='report_rep'),
     path('reports/rep/export-excel/', export_tenants_report_excel, name='export_tenants_excel'),
@@ -12,10 +12,26 @@ import logging
 logger = logging.getLogger(__name__)
 
 
+FREQUENCY_MONTHS = {
+    'monthly': 1,
+    'quarterly': 3,
+    'semi_annual': 6,
+    'annual': 12,
+}
+
+DEFAULT_FREQUENCY_MONTHS = 6
+
+
 def calculate_contract_due_dates(contract) -> List[date]:
     """
     حساب تواريخ الاستحقاق للعقد
     
+    المصادر بالترتيب (بدون استعلامات إضافية):
+    1. جدول الأقساط المحفوظ (ContractPeriod) إذا كان محمّلاً مسبقاً
+       بـ prefetch_related('schedule_periods') ومطابقاً للعقد
+    2. نتيجة محفوظة على كائن العقد لنفس (البداية، النهاية، الدورية)
+    3. الحساب بحلقة relativedelta
+    
     Args:
         contract: Contract object
     
@@ -30,14 +46,25 @@ def calculate_contract_due_dates(contract) -> List[date]:
     if not contract or not contract.start_date or not contract.end_date:
         return []
     
-    frequency_map = {
-        'monthly': 1,
-        'quarterly': 3,
-        'semi_annual': 6,
-        'annual': 12,
-    }
+    key = (contract.start_date, contract.end_date, contract.payment_frequency)
+    cached = getattr(contract, '_due_dates_cache', None)
+    if cached is not None and cached[0] == key:
+        return list(cached[1])
     
-    period_months = frequency_map.get(contract.payment_frequency, 6)
+    due_dates = _get_stored_due_dates(contract)
+    if due_dates is None:
+        due_dates = compute_contract_due_dates(contract)
+    
+    contract._due_dates_cache = (key, due_dates)
+    return list(due_dates)
+
+
+def compute_contract_due_dates(contract) -> List[date]:
+    """حساب تواريخ الاستحقاق بحلقة relativedelta (بدون أي cache)"""
+    if not contract or not contract.start_date or not contract.end_date:
+        return []
+    
+    period_months = FREQUENCY_MONTHS.get(contract.payment_frequency, DEFAULT_FREQUENCY_MONTHS)
     due_dates = []
     current_date = contract.start_date
     
@@ -59,6 +86,35 @@ def calculate_contract_due_dates(contract) -> List[date]:
     return due_dates
 
 
+def _get_stored_due_dates(contract) -> Optional[List[date]]:
+    """
+    تواريخ الاستحقاق من جدول الأقساط المحمّل مسبقاً
+    
+    Returns:
+        None إذا لم يكن الجدول محمّلاً أو لا يطابق تواريخ العقد ودوريته الحالية
+        (مثلاً في نموذج تعديل لم يُحفظ بعد)
+    """
+    prefetched = getattr(contract, '_prefetched_objects_cache', {})
+    if 'schedule_periods' not in prefetched:
+        return None
+    
+    periods = sorted(contract.schedule_periods.all(), key=lambda p: p.period_number)
+    if not periods or periods[0].start_date != contract.start_date:
+        return None
+    
+    period_months = FREQUENCY_MONTHS.get(contract.payment_frequency, DEFAULT_FREQUENCY_MONTHS)
+    if len(periods) > 1 and periods[1].start_date != periods[0].start_date + relativedelta(months=period_months):
+        return None
+    
+    # آخر قسط يجب أن يكون الأخير فعلاً حسب نهاية العقد الحالية
+    last = periods[-1]
+    next_date = last.start_date + relativedelta(months=period_months)
+    if last.start_date > contract.end_date or next_date <= contract.end_date:
+        return None
+    
+    return [p.start_date for p in periods]
+
+
 def format_due_dates_error_message(due_dates: List[date], max_display: int = 5) -> str:
     """
     تنسيق رسالة خطأ تواريخ الاستحقاق
@@ -0,0 +1,192 @@
+"""
+File Response Utilities
+إرسال الملفات الكبيرة مع دعم التحميل الجزئي (HTTP Range)
+
+- Range/If-Range: استكمال التحميل المنقطع بدلاً من البدء من الصفر
+- الملف يُمرر كـ file-like له fileno() فيستخدم gunicorn الـ os.sendfile
+  (بدون نسخ البيانات عبر Python) - ويحترم Content-Length للجزء المطلوب
+- اختيارياً: تسليم الإرسال للـ proxy الأمامي (X-Accel-Redirect لـ nginx
+  أو X-Sendfile لـ Apache) فلا ينشغل عامل التطبيق بالتحميل إطلاقاً
+"""
+import mimetypes
+import os
+import re
+from typing import Optional, Tuple
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse
+from django.utils.http import http_date, parse_http_date_safe
+
+RANGE_RE = re.compile(r'^\s*bytes\s*=\s*(\d*)\s*-\s*(\d*)\s*$', re.IGNORECASE)
+
+
+class RangeNotSatisfiable(Exception):
+    """نطاق خارج حجم الملف (416)"""
+
+
+def parse_range_header(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    تحليل ترويسة Range لنطاق واحد
+
+    Returns:
+        (start, end) شاملة، أو None إذا كانت الترويسة غير مدعومة
+        (عدة نطاقات أو صيغة خاطئة) فيُرسل الملف كاملاً
+
+    Raises:
+        RangeNotSatisfiable: إذا كان النطاق خارج الملف
+    """
+    match = RANGE_RE.match(header or '')
+    if not match:
+        return None
+
+    first, last = match.groups()
+    if not first and not last:
+        return None
+
+    if not first:
+        # bytes=-500 : آخر 500 بايت
+        length = int(last)
+        if length == 0:
+            raise RangeNotSatisfiable()
+        return max(size - length, 0), size - 1
+
+    start = int(first)
+    end = int(last) if last else size - 1
+    if start >= size or end < start:
+        raise RangeNotSatisfiable()
+    return start, min(end, size - 1)
+
+
+class RangeFileWrapper:
+    """
+    جزء من ملف مفتوح (من start بطول length)
+
+    read() لا يتجاوز الجزء المطلوب، و fileno() متاح حتى يستخدم خادم WSGI
+    os.sendfile من موضع الملف الحالي بطول Content-Length.
+    """
+
+    def __init__(self, file, start=0, length=None):
+        self.file = file
+        self.name = getattr(file, 'name', '')
+        self.file.seek(start)
+        self.remaining = length
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def read(self, size=-1):
+        if self.remaining is None:
+            return self.file.read(size)
+        if self.remaining <= 0:
+            return b''
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def _if_range_matches(if_range, etag, last_modified):
+    """هل ما زال الملف هو نفسه الذي بدأ تحميله؟ (If-Range)"""
+    if not if_range:
+        return True
+    if_range = if_range.strip()
+    if if_range.startswith(('"', 'W/')):
+        # المقارنة القوية فقط حسب RFC 9110
+        return etag is not None and not if_range.startswith('W/') and if_range == etag
+    timestamp = parse_http_date_safe(if_range)
+    return timestamp is not None and int(last_modified) == timestamp
+
+
+def _content_disposition(filename):
+    try:
+        filename.encode('ascii')
+        return f'attachment; filename="{filename}"'
+    except UnicodeEncodeError:
+        return f"attachment; filename*=utf-8''{quote(filename)}"
+
+
+def _accel_response(path, filename, content_type):
+    """
+    تسليم الإرسال للـ proxy (BACKUP_DOWNLOAD_ACCEL = 'nginx' أو 'apache')
+
+    nginx: المسار يجب أن يكون داخل BACKUP_ACCEL_ROOT ويُحوّل إلى
+    BACKUP_ACCEL_REDIRECT_PREFIX (location داخلي في إعدادات nginx).
+
+    Returns:
+        HttpResponse أو None إذا لم يكن التسليم ممكناً
+    """
+    backend = getattr(settings, 'BACKUP_DOWNLOAD_ACCEL', '')
+    if backend == 'apache':
+        header, value = 'X-Sendfile', path
+    elif backend == 'nginx':
+        root = os.path.realpath(getattr(settings, 'BACKUP_ACCEL_ROOT', ''))
+        real_path = os.path.realpath(path)
+        if not root or os.path.commonpath([root, real_path]) != root:
+            return None
+        prefix = getattr(settings, 'BACKUP_ACCEL_REDIRECT_PREFIX', '/protected-backups/')
+        relative = os.path.relpath(real_path, root).replace(os.sep, '/')
+        header, value = 'X-Accel-Redirect', prefix.rstrip('/') + '/' + quote(relative)
+    else:
+        return None
+
+    response = HttpResponse(content_type=content_type)
+    response[header] = value
+    response['Content-Disposition'] = _content_disposition(filename)
+    return response
+
+
+def ranged_file_response(request, path, filename, etag=None):
+    """
+    إرسال ملف مع دعم Range/If-Range (أو تسليمه للـ proxy)
+
+    Args:
+        path: مسار الملف على القرص
+        filename: اسم الملف للتحميل
+        etag: قيمة ETag قوية (مثل checksum الملف)
+    """
+    content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    if etag and not etag.startswith('"'):
+        etag = f'"{etag}"'
+
+    response = _accel_response(path, filename, content_type)
+    if response is not None:
+        # الـ proxy يتولى Range بنفسه
+        return response
+
+    stat = os.stat(path)
+    size = stat.st_size
+
+    byte_range = None
+    range_header = request.META.get('HTTP_RANGE')
+    if range_header and _if_range_matches(request.META.get('HTTP_IF_RANGE'), etag, stat.st_mtime):
+        try:
+            byte_range = parse_range_header(range_header, size)
+        except RangeNotSatisfiable:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            response['Accept-Ranges'] = 'bytes'
+            return response
+
+    file = open(path, 'rb')
+    if byte_range:
+        start, end = byte_range
+        length = end - start + 1
+        response = FileResponse(RangeFileWrapper(file, start, length), status=206,
+                                content_type=content_type)
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    else:
+        length = size
+        response = FileResponse(RangeFileWrapper(file), content_type=content_type)
+
+    response['Content-Length'] = str(length)
+    response['Content-Disposition'] = _content_disposition(filename)
+    response['Accept-Ranges'] = 'bytes'
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    if etag:
+        response['ETag'] = etag
+    return response
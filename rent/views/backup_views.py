@@ -6,41 +6,30 @@ Backup Views
 """
 
 import os
-import json
-import hashlib
-import subprocess
 import shutil
-from io import StringIO
 from django.views import View
 from django.views.generic import ListView, DeleteView
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.urls import reverse_lazy
 from django.shortcuts import redirect, render
 from django.contrib import messages
-from django.http import FileResponse
+from django.http import StreamingHttpResponse
+from django.db import transaction
 from django.utils import timezone
-from django.core.management import call_command
-from django.conf import settings
-from django.db import connection
 
 from rent.models import Backup
-from rent.models.backup_models import BackupType, BackupStatus
-
-
-BACKUP_DIR = os.path.join(settings.BASE_DIR, 'backups')
-
-
-def _get_db_config():
-    """استخراج إعدادات قاعدة البيانات"""
-    db = settings.DATABASES['default']
-    return {
-        'engine': db.get('ENGINE', ''),
-        'name': db.get('NAME', ''),
-        'user': db.get('USER', ''),
-        'password': db.get('PASSWORD', ''),
-        'host': db.get('HOST', 'localhost'),
-        'port': db.get('PORT', '5432'),
-    }
+from rent.services.backup_service import (
+    BACKUP_DIR,
+    JsonBackupWriter,
+    PgDirectoryBackup,
+    get_pg_connection,
+    iter_directory_tar,
+    release_backup_file,
+    enqueue_backup_job,
+    run_pg_tool,
+)
+from rent.services.backup_restore_service import JsonRestoreEngine, restore_backup_chain
+from rent.utils.file_response import ranged_file_response
 
 
 def _pg_dump_available():
@@ -72,155 +61,41 @@ class BackupListView(LoginRequiredMixin, SuperuserRequiredMixin, ListView):
 
 
 class BackupCreateView(LoginRequiredMixin, SuperuserRequiredMixin, View):
-    """إنشاء نسخة احتياطية جديدة (JSON عبر dumpdata)"""
+    """إنشاء نسخة احتياطية جديدة (JSON مضغوط - في الخلفية)"""
 
     def post(self, request):
-        os.makedirs(BACKUP_DIR, exist_ok=True)
-
-        timestamp = timezone.now().strftime('%Y%m%d_%H%M%S')
-        file_name = f'backup_{timestamp}.json'
-        file_path = os.path.join(BACKUP_DIR, file_name)
-
-        backup = Backup(
-            backup_type=BackupType.FULL,
-            file_name=file_name,
-            file_path=file_path,
-            status=BackupStatus.IN_PROGRESS,
-            started_at=timezone.now(),
-            created_by=request.user,
+        # السجل والمهمة معاً - لا سجل "قيد التنفيذ" بدون مهمة تنفذه
+        with transaction.atomic():
+            backup = JsonBackupWriter.create_backup_record(user=request.user)
+            enqueue_backup_job('json', backup)
+
+        messages.success(
+            request,
+            f'بدأ إنشاء النسخة الاحتياطية JSON في الخلفية ({backup.file_name}). '
+            'حدّث الصفحة لمتابعة الحالة.'
         )
-        backup.save()
-
-        try:
-            output = StringIO()
-            call_command(
-                'dumpdata',
-                '--indent', '2',
-                '--exclude', 'contenttypes',
-                '--exclude', 'admin.logentry',
-                '--exclude', 'sessions',
-                '--natural-foreign',
-                '--natural-primary',
-                stdout=output,
-            )
-
-            data = output.getvalue()
-            with open(file_path, 'w', encoding='utf-8') as f:
-                f.write(data)
-
-            file_size = os.path.getsize(file_path)
-            checksum = hashlib.sha256(data.encode('utf-8')).hexdigest()
-
-            parsed = json.loads(data)
-            records_count = len(parsed)
-            tables = set()
-            for record in parsed:
-                tables.add(record.get('model', ''))
-            tables_count = len(tables)
-
-            backup.file_size = file_size
-            backup.records_count = records_count
-            backup.tables_count = tables_count
-            backup.included_tables = sorted(list(tables))
-            backup.checksum = checksum
-            backup.mark_as_completed()
-
-            messages.success(request, f'تم إنشاء النسخة الاحتياطية JSON بنجاح ({backup.get_file_size_display()}, {records_count} سجل)')
-
-        except Exception as e:
-            backup.mark_as_failed(str(e))
-            messages.error(request, f'فشل إنشاء النسخة الاحتياطية: {e}')
-
         return redirect('rent:backup_list')
 
 
 class BackupCreateSQLView(LoginRequiredMixin, SuperuserRequiredMixin, View):
-    """إنشاء نسخة احتياطية SQL عبر pg_dump (مثل SQL Server backup)"""
+    """
+    إنشاء نسخة PostgreSQL عبر pg_dump --format directory --jobs N (في الخلفية)
+    """
 
     def post(self, request):
         if not _pg_dump_available():
             messages.error(request, 'أداة pg_dump غير متوفرة على السيرفر.')
             return redirect('rent:backup_list')
 
-        os.makedirs(BACKUP_DIR, exist_ok=True)
-
-        timestamp = timezone.now().strftime('%Y%m%d_%H%M%S')
-        file_name = f'backup_{timestamp}.sql'
-        file_path = os.path.join(BACKUP_DIR, file_name)
+        with transaction.atomic():
+            backup = PgDirectoryBackup.create_backup_record(user=request.user)
+            enqueue_backup_job('pg_directory', backup)
 
-        db = _get_db_config()
-
-        backup = Backup(
-            backup_type=BackupType.FULL,
-            file_name=file_name,
-            file_path=file_path,
-            status=BackupStatus.IN_PROGRESS,
-            started_at=timezone.now(),
-            created_by=request.user,
+        messages.success(
+            request,
+            f'بدأ إنشاء نسخة SQL في الخلفية ({backup.file_name}). '
+            'حدّث الصفحة لمتابعة الحالة.'
         )
-        backup.save()
-
-        try:
-            env = os.environ.copy()
-            if db['password']:
-                env['PGPASSWORD'] = db['password']
-
-            cmd = [
-                'pg_dump',
-                '--host', db['host'] or 'localhost',
-                '--port', str(db['port'] or '5432'),
-                '--username', db['user'],
-                '--format', 'plain',
-                '--no-owner',
-                '--no-privileges',
-                '--file', file_path,
-                db['name'],
-            ]
-
-            result = subprocess.run(
-                cmd,
-                env=env,
-                capture_output=True,
-                text=True,
-                timeout=300,
-            )
-
-            if result.returncode != 0:
-                raise Exception(result.stderr)
-
-            file_size = os.path.getsize(file_path)
-            checksum = hashlib.sha256(
-                open(file_path, 'rb').read()
-            ).hexdigest()
-
-            # حساب عدد الجداول من قاعدة البيانات
-            with connection.cursor() as cursor:
-                cursor.execute(
-                    "SELECT COUNT(*) FROM information_schema.tables "
-                    "WHERE table_schema = 'public'"
-                )
-                tables_count = cursor.fetchone()[0]
-
-                cursor.execute(
-                    "SELECT SUM(n_live_tup) FROM pg_stat_user_tables"
-                )
-                records_count = cursor.fetchone()[0] or 0
-
-            backup.file_size = file_size
-            backup.tables_count = tables_count
-            backup.records_count = records_count
-            backup.checksum = checksum
-            backup.notes = 'نسخة SQL (pg_dump)'
-            backup.mark_as_completed()
-
-            messages.success(request, f'تم إنشاء نسخة SQL بنجاح ({backup.get_file_size_display()})')
-
-        except Exception as e:
-            backup.mark_as_failed(str(e))
-            if os.path.exists(file_path):
-                os.remove(file_path)
-            messages.error(request, f'فشل إنشاء نسخة SQL: {e}')
-
         return redirect('rent:backup_list')
 
 
@@ -238,10 +113,21 @@ class BackupDownloadView(LoginRequiredMixin, SuperuserRequiredMixin, View):
             messages.error(request, 'ملف النسخة الاحتياطية غير موجود على السيرفر.')
             return redirect('rent:backup_list')
 
-        return FileResponse(
-            open(backup.file_path, 'rb'),
-            as_attachment=True,
-            filename=backup.file_name,
+        if os.path.isdir(backup.file_path):
+            # نسخة pg_dump بصيغة directory - تُبث كملف tar
+            response = StreamingHttpResponse(
+                iter_directory_tar(backup.file_path),
+                content_type='application/x-tar',
+            )
+            response['Content-Disposition'] = f'attachment; filename="{backup.file_name}.tar"'
+            return response
+
+        # دعم Range (استكمال التحميل) و sendfile أو X-Accel-Redirect حسب الإعدادات
+        return ranged_file_response(
+            request,
+            backup.file_path,
+            backup.file_name,
+            etag=backup.checksum or None,
         )
 
 
@@ -255,6 +141,7 @@ class BackupRestoreView(LoginRequiredMixin, SuperuserRequiredMixin, View):
         backup_id = request.POST.get('backup_id')
         uploaded_file = request.FILES.get('backup_file')
 
+        backup = None
         file_path = None
         temp_file = False
         is_sql = False
@@ -268,13 +155,18 @@ class BackupRestoreView(LoginRequiredMixin, SuperuserRequiredMixin, View):
                 messages.error(request, 'النسخة الاحتياطية غير موجودة.')
                 return redirect('rent:backup_list')
         elif uploaded_file:
-            if not (uploaded_file.name.endswith('.json') or uploaded_file.name.endswith('.sql')):
-                messages.error(request, 'يجب أن يكون الملف بصيغة JSON أو SQL.')
+            if not uploaded_file.name.endswith(('.json', '.json.gz', '.sql')):
+                messages.error(request, 'يجب أن يكون الملف بصيغة JSON أو JSON.GZ أو SQL.')
                 return redirect('rent:backup_restore')
 
             is_sql = uploaded_file.name.endswith('.sql')
             os.makedirs(BACKUP_DIR, exist_ok=True)
-            ext = 'sql' if is_sql else 'json'
+            if is_sql:
+                ext = 'sql'
+            elif uploaded_file.name.endswith('.gz'):
+                ext = 'json.gz'
+            else:
+                ext = 'json'
             file_path = os.path.join(BACKUP_DIR, f'restore_temp_{timezone.now().strftime("%Y%m%d_%H%M%S")}.{ext}')
             temp_file = True
             with open(file_path, 'wb') as f:
@@ -288,12 +180,26 @@ class BackupRestoreView(LoginRequiredMixin, SuperuserRequiredMixin, View):
             messages.error(request, 'ملف النسخة الاحتياطية غير موجود.')
             return redirect('rent:backup_list')
 
+        if os.path.isdir(file_path):
+            # pg_restore --jobs N في الخلفية - النتيجة في metadata['restore']
+            enqueue_backup_job('pg_restore', backup)
+            messages.success(request, 'بدأت استعادة البيانات في الخلفية عبر pg_restore.')
+            return redirect('rent:backup_list')
+
         try:
             if is_sql:
                 self._restore_sql(file_path)
+                messages.success(request, 'تم استعادة البيانات بنجاح!')
             else:
-                call_command('loaddata', file_path, verbosity=0)
-            messages.success(request, 'تم استعادة البيانات بنجاح!')
+                if backup is not None:
+                    # النسخ التزايدية تُستعاد مع سلسلتها (الكاملة ثم التزايدية)
+                    stats = restore_backup_chain(backup)
+                else:
+                    stats = JsonRestoreEngine().restore(file_path)
+                messages.success(
+                    request,
+                    f'تم استعادة البيانات بنجاح! ({sum(stats.values())} سجل في {len(stats)} جدول)'
+                )
         except Exception as e:
             messages.error(request, f'فشل استعادة البيانات: {e}')
         finally:
@@ -303,34 +209,12 @@ class BackupRestoreView(LoginRequiredMixin, SuperuserRequiredMixin, View):
         return redirect('rent:backup_list')
 
     def _restore_sql(self, file_path):
-        """استعادة من ملف SQL عبر psql"""
+        """استعادة من ملف SQL (صيغة plain القديمة) عبر psql"""
         if not shutil.which('psql'):
             raise Exception('أداة psql غير متوفرة على السيرفر.')
 
-        db = _get_db_config()
-        env = os.environ.copy()
-        if db['password']:
-            env['PGPASSWORD'] = db['password']
-
-        cmd = [
-            'psql',
-            '--host', db['host'] or 'localhost',
-            '--port', str(db['port'] or '5432'),
-            '--username', db['user'],
-            '--dbname', db['name'],
-            '--file', file_path,
-        ]
-
-        result = subprocess.run(
-            cmd,
-            env=env,
-            capture_output=True,
-            text=True,
-            timeout=300,
-        )
-
-        if result.returncode != 0:
-            raise Exception(result.stderr)
+        args, env, db_name = get_pg_connection()
+        run_pg_tool(['psql', *args, '--dbname', db_name, '--file', file_path], env)
 
 
 class BackupDeleteView(LoginRequiredMixin, SuperuserRequiredMixin, DeleteView):
@@ -338,9 +222,12 @@ class BackupDeleteView(LoginRequiredMixin, SuperuserRequiredMixin, DeleteView):
     model = Backup
     success_url = reverse_lazy('rent:backup_list')
 
-    def delete(self, request, *args, **kwargs):
-        backup = self.get_object()
-        if backup.file_path and os.path.exists(backup.file_path):
-            os.remove(backup.file_path)
-        messages.success(request, 'تم حذف النسخة الاحتياطية بنجاح.')
-        return super().delete(request, *args, **kwargs)
+    def form_valid(self, form):
+        backup = self.object
+        if backup.incremental_backups.exists():
+            messages.error(self.request, 'لا يمكن حذف نسخة تعتمد عليها نسخ تزايدية.')
+            return redirect('rent:backup_list')
+        # الملف قد يكون مشتركاً مع نسخة أخرى (تخزين حسب المحتوى)
+        release_backup_file(backup)
+        messages.success(self.request, 'تم حذف النسخة الاحتياطية بنجاح.')
+        return super().form_valid(form)
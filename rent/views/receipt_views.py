@@ -15,7 +15,7 @@ from django.core.exceptions import ValidationError
 from decimal import Decimal, InvalidOperation
 from django.db.models import Q, Sum, Count
 
-from rent.models import Receipt, Contract
+from rent.models import Receipt, Contract, ReceiptAllocation
 from rent.forms import ReceiptForm
 
 # ✅ NEW: استيراد الخدمة الموحدة
@@ -434,14 +434,10 @@ class ReceiptPrintView(LoginRequiredMixin, PermissionCheckMixin, DetailView):
         from django.utils import timezone
         context['now'] = timezone.now()
         
-        # ✅ NEW: استخدام الخدمة الموحدة للحصول على الفترات المغطاة
+        # الفترات المغطاة بهذا السند من دفتر التوزيع (ReceiptAllocation)
         receipt = self.object
         if receipt.contract:
-            service = ContractFinancialService(receipt.contract)
-            
-            # الحصول على الفترات المغطاة بهذا السند
-            # (هذه الدالة يجب إضافتها للـ Service إذا لم تكن موجودة)
-            context['covered_periods'] = self._get_covered_periods(service, receipt)
+            context['covered_periods'] = self._get_covered_periods(receipt)
         
         # Add unit and building info safely
         if receipt.contract:
@@ -451,56 +447,23 @@ class ReceiptPrintView(LoginRequiredMixin, PermissionCheckMixin, DetailView):
         
         return context
     
-    def _get_covered_periods(self, service, receipt):
+    def _get_covered_periods(self, receipt):
         """
-        حساب الفترات التي غطاها هذا السند
-        ✅ يستخدم منطق الخدمة الموحدة
+        الفترات التي غطاها هذا السند
+        ✅ قراءة مباشرة من دفتر التوزيع المحفوظ (نفس توزيع FIFO للخدمة)
         """
         try:
-            # الحصول على المدفوع قبل هذا السند
-            paid_before = receipt.contract.receipts.filter(
-                receipt_date__lt=receipt.receipt_date,
-                status='posted',
-                is_deleted=False
-            ).exclude(
-                pk=receipt.pk
-            ).aggregate(
-                total=Sum('amount')
-            )['total'] or Decimal('0')
-            
-            paid_with = paid_before + receipt.amount
-            
-            # الحصول على الفترات
-            periods = service.calculate_periods_with_modifications()
-            covered_periods = []
-            
-            cumulative = Decimal('0')
-            
-            for period in periods:
-                period_start = cumulative
-                period_end = cumulative + period['due_amount']
-                
-                if paid_with > period_start and paid_before < period_end:
-                    start_in_period = max(paid_before, period_start)
-                    end_in_period = min(paid_with, period_end)
-                    allocated = end_in_period - start_in_period
-                    
-                    if allocated > 0:
-                        covered_periods.append({
-                            'period_number': period['period_number'],
-                            'start_date': period['start_date'],
-                            'end_date': period.get('end_date'),
-                            'due_amount': period['due_amount'],
-                            'allocated_amount': allocated,
-                            'description': f'سداد دفعة من إيجار الفترة'
-                        })
-                
-                cumulative = period_end
-                
-                if paid_with <= cumulative:
-                    break
-            
-            return covered_periods
+            return [
+                {
+                    'period_number': allocation.period_number,
+                    'start_date': allocation.period.start_date,
+                    'end_date': allocation.period.end_date,
+                    'due_amount': allocation.period.due_amount,
+                    'allocated_amount': allocation.amount,
+                    'description': f'سداد دفعة من إيجار الفترة'
+                }
+                for allocation in ReceiptAllocation.for_receipt(receipt)
+            ]
             
         except Exception as e:
             # في حالة حدوث خطأ، نرجع قائمة فارغة
@@ -553,7 +516,7 @@ class ReceiptPDFView(LoginRequiredMixin, PermissionCheckMixin, DetailView):
 
         if receipt.contract:
             service = ContractFinancialService(receipt.contract)
-            covered_periods = self._get_covered_periods_with_status(service, receipt)
+            covered_periods = self._get_covered_periods_with_status(receipt)
 
             # جلب أرقام الوحدات والموقع
             unit_numbers = service.all_unit_numbers_str
@@ -667,59 +630,24 @@ class ReceiptPDFView(LoginRequiredMixin, PermissionCheckMixin, DetailView):
         # Fallback: عرض HTML
         return render(request, 'receipts/receipt_pdf.html', context)
 
-    def _get_covered_periods_with_status(self, service, receipt):
+    def _get_covered_periods_with_status(self, receipt):
         """
-        حساب الفترات التي غطاها هذا السند مع حالة كل فترة (كامل/جزئي)
+        الفترات التي غطاها هذا السند مع حالة كل فترة (كامل/جزئي)
+        من دفتر التوزيع المحفوظ
         """
         try:
-            # الحصول على المدفوع قبل هذا السند
-            paid_before = receipt.contract.receipts.filter(
-                receipt_date__lt=receipt.receipt_date,
-                status='posted',
-                is_deleted=False
-            ).exclude(
-                pk=receipt.pk
-            ).aggregate(
-                total=Sum('amount')
-            )['total'] or Decimal('0')
-
-            paid_with = paid_before + receipt.amount
-
-            # الحصول على الفترات
-            periods = service.calculate_periods_with_modifications()
-            covered_periods = []
-
-            cumulative = Decimal('0')
-
-            for period in periods:
-                period_start = cumulative
-                period_end = cumulative + period['due_amount']
-
-                if paid_with > period_start and paid_before < period_end:
-                    start_in_period = max(paid_before, period_start)
-                    end_in_period = min(paid_with, period_end)
-                    allocated = end_in_period - start_in_period
-
-                    if allocated > 0:
-                        # حساب المتبقي بعد هذه الدفعة
-                        remaining_after = period['due_amount'] - (end_in_period - period_start)
-
-                        covered_periods.append({
-                            'period_number': period['period_number'],
-                            'start_date': period['start_date'],
-                            'end_date': period.get('end_date'),
-                            'due_amount': period['due_amount'],
-                            'allocated_amount': allocated,
-                            'remaining_after': max(Decimal('0'), remaining_after),
-                            'description': f'إيجار الفترة {period["period_number"]}'
-                        })
-
-                cumulative = period_end
-
-                if paid_with <= cumulative:
-                    break
-
-            return covered_periods
+            return [
+                {
+                    'period_number': allocation.period_number,
+                    'start_date': allocation.period.start_date,
+                    'end_date': allocation.period.end_date,
+                    'due_amount': allocation.period.due_amount,
+                    'allocated_amount': allocation.amount,
+                    'remaining_after': max(Decimal('0'), allocation.remaining_after),
+                    'description': f'إيجار الفترة {allocation.period_number}'
+                }
+                for allocation in ReceiptAllocation.for_receipt(receipt)
+            ]
 
         except Exception as e:
             import logging
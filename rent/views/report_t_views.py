@@ -39,7 +39,8 @@ def get_contracts_queryset(filters=None):
     ).select_related(
         'tenant',
     ).prefetch_related(
-        'units',
+        'units__building__land',
+        # تستخدمها الخدمة المالية مباشرة دون استعلامات إضافية لكل عقد
         'modifications',
         'receipts'
     )
@@ -73,16 +74,16 @@ def safe_float(val):
 def apply_outstanding_filter(report_data, has_outstanding_filter):
     """
     فلترة حسب وجود مستحقات
+    القائمة تُرجع قائمة، والمولّد (التصدير على دفعات) يُرجع مولّداً دون تحميل البيانات
     """
-    if not has_outstanding_filter:
-        return report_data
-    
     if has_outstanding_filter == 'yes':
-        return [r for r in report_data if r['outstanding_amount'] > 0]
+        filtered = (r for r in report_data if r['outstanding_amount'] > 0)
     elif has_outstanding_filter == 'no':
-        return [r for r in report_data if r['outstanding_amount'] == 0]
-    
-    return report_data
+        filtered = (r for r in report_data if r['outstanding_amount'] == 0)
+    else:
+        return report_data
+
+    return list(filtered) if isinstance(report_data, list) else filtered
 
 
 # ========================================
@@ -97,15 +98,7 @@ def tenants_report_view(request):
     ✅ Updated - يستخدم ContractFinancialService
     """
     # جلب العقود (نشطة + منتهية + ملغاة) لظهور المستحقات المتبقية
-    contracts = Contract.objects.filter(
-        status__in=['active', 'expired', 'terminated']
-    ).select_related(
-        'tenant',
-    ).prefetch_related(
-        'units',
-        'modifications',
-        'receipts'
-    )
+    contracts = get_contracts_queryset()
     
     # استخدام الخدمة الموحدة
     report_data = generate_tenants_report(contracts)
@@ -196,233 +189,228 @@ def detailed_tenants_report(request):
 # View 3: تصدير إلى Excel
 # ========================================
 
-@login_required
-@permission_required('rent.export_reports', raise_exception=True)
-def export_tenants_report_excel(request):
+# عدد العقود التي تُحمّل وتُحسب في كل دفعة أثناء التصدير
+EXPORT_CHUNK_SIZE = 500
+
+EXCEL_HEADERS = [
+    'رقم المستأجر',
+    'اسم المستأجر',
+    'الموقع',
+    'الإيجار السنوي',
+    'رقم المعرض',
+    'الهاتف',
+    'المستحق',
+    'من تاريخ',
+    'إلى تاريخ',
+    'عدد الفترات المتأخرة'
+]
+
+EXCEL_COLUMN_WIDTHS = {
+    1: 15,  # رقم المستأجر
+    2: 30,  # اسم المستأجر
+    3: 25,  # الموقع
+    4: 18,  # الإيجار السنوي
+    5: 20,  # رقم المعرض
+    6: 18,  # الهاتف
+    7: 18,  # المستحق
+    8: 15,  # من تاريخ
+    9: 15,  # إلى تاريخ
+    10: 20, # عدد الفترات المتأخرة
+}
+
+
+def iter_tenants_report_data(contracts, chunk_size=None):
     """
-    تصدير التقرير إلى Excel مع تنسيق احترافي
-    ✅ Updated - يستخدم ContractFinancialService
+    توليد بيانات تقرير المستأجرين على دفعات
+    يُحمّل ويُحسب chunk_size عقد فقط في كل مرة (الذاكرة ثابتة مهما زاد عدد العقود)
     """
-    # جلب الفلاتر (إن وجدت)
-    filters = {
-        'tenant_name': request.GET.get('tenant_name', ''),
-        'location': request.GET.get('location', ''),
-        'has_outstanding': request.GET.get('has_outstanding', ''),
-    }
-    
-    # جلب العقود
-    contracts = get_contracts_queryset(filters)
-    
-    # ✅ NEW: استخدام الخدمة الموحدة
-    report_data = generate_tenants_report(contracts)
-    
-    # تطبيق فلتر المستحقات
-    report_data = apply_outstanding_filter(
-        report_data, 
-        filters.get('has_outstanding')
-    )
-    
-    # إنشاء Workbook
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "تقرير المستأجرين"
-    
-    # ========================================
-    # تنسيق العناوين
-    # ========================================
-    
-    headers = [
-        'رقم المستأجر',
-        'اسم المستأجر',
-        'الموقع',
-        'الإيجار السنوي',
-        'رقم المعرض',
-        'الهاتف',
-        'المستحق',
-        'من تاريخ',
-        'إلى تاريخ',
-        'عدد الفترات المتأخرة'
-    ]
-    
-    # تنسيق الحدود
+    from itertools import islice
+    from rent.services.portfolio_financial_service import PortfolioFinancialService
+
+    chunk_size = chunk_size or EXPORT_CHUNK_SIZE
+
+    contracts_iterator = contracts.iterator(chunk_size=chunk_size)
+    while True:
+        chunk = list(islice(contracts_iterator, chunk_size))
+        if not chunk:
+            break
+        yield from PortfolioFinancialService(chunk).get_tenant_report_data()
+
+
+def _build_excel_styles():
+    """الأنماط المشتركة (Named Styles) لكل خلايا الملف"""
+    from openpyxl.styles import NamedStyle
+
     thin_border = Border(
         left=Side(style='thin'),
         right=Side(style='thin'),
         top=Side(style='thin'),
         bottom=Side(style='thin')
     )
-    
-    # كتابة العناوين
-    for col_num, header in enumerate(headers, 1):
-        cell = ws.cell(row=1, column=col_num)
-        cell.value = header
-        cell.font = Font(bold=True, size=12, color="FFFFFF")
-        cell.fill = PatternFill(
-            start_color="366092",
-            end_color="366092",
-            fill_type="solid"
-        )
-        cell.alignment = Alignment(
-            horizontal='center',
-            vertical='center'
-        )
-        cell.border = thin_border
-    
-    # ========================================
-    # كتابة البيانات
-    # ========================================
-    
-    row_num = 2
+    total_fill = PatternFill(
+        start_color="E7E6E6",
+        end_color="E7E6E6",
+        fill_type="solid"
+    )
+
+    return {
+        'header': NamedStyle(
+            name='tenants_header',
+            font=Font(bold=True, size=12, color="FFFFFF"),
+            fill=PatternFill(start_color="366092", end_color="366092", fill_type="solid"),
+            alignment=Alignment(horizontal='center', vertical='center'),
+            border=thin_border,
+        ),
+        'text': NamedStyle(name='tenants_text', border=thin_border),
+        'center': NamedStyle(
+            name='tenants_center',
+            alignment=Alignment(horizontal='center'),
+            border=thin_border,
+        ),
+        'money': NamedStyle(
+            name='tenants_money', number_format='#,##0.00', border=thin_border
+        ),
+        'money_due': NamedStyle(
+            name='tenants_money_due',
+            number_format='#,##0.00',
+            font=Font(color="FF0000", bold=True),
+            border=thin_border,
+        ),
+        'total_label': NamedStyle(
+            name='tenants_total_label',
+            font=Font(bold=True, size=12),
+            alignment=Alignment(horizontal='right'),
+            fill=total_fill,
+        ),
+        'total_money': NamedStyle(
+            name='tenants_total_money',
+            number_format='#,##0.00',
+            font=Font(bold=True, size=12),
+            fill=total_fill,
+        ),
+        'total_due': NamedStyle(
+            name='tenants_total_due',
+            number_format='#,##0.00',
+            font=Font(bold=True, size=12, color="FF0000"),
+            fill=total_fill,
+        ),
+        'total_empty': NamedStyle(name='tenants_total_empty', fill=total_fill),
+    }
+
+
+def write_tenants_report_excel(report_data, output):
+    """
+    كتابة التقرير إلى ملف Excel في وضع الكتابة فقط (write-only)
+    الصفوف تُكتب مباشرة دون الاحتفاظ بها في الذاكرة
+    """
+    from openpyxl.cell import WriteOnlyCell
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("تقرير المستأجرين")
+
+    styles = _build_excel_styles()
+    for style in styles.values():
+        wb.add_named_style(style)
+
+    def cell(value, style):
+        c = WriteOnlyCell(ws, value=value)
+        c.style = styles[style].name
+        return c
+
+    # عرض الأعمدة وتجميد الصف الأول (يجب ضبطها قبل كتابة الصفوف)
+    for col, width in EXCEL_COLUMN_WIDTHS.items():
+        ws.column_dimensions[get_column_letter(col)].width = width
+    ws.freeze_panes = 'A2'
+
+    ws.append([cell(header, 'header') for header in EXCEL_HEADERS])
+
     total_outstanding = Decimal('0')
     total_annual_rent = Decimal('0')
-    
+
     for item in report_data:
-        # رقم المستأجر
-        ws.cell(row=row_num, column=1).value = item['tenant_id']
-        ws.cell(row=row_num, column=1).alignment = Alignment(horizontal='center')
-        ws.cell(row=row_num, column=1).border = thin_border
-
-        # اسم المستأجر
-        ws.cell(row=row_num, column=2).value = item['tenant_name']
-        ws.cell(row=row_num, column=2).border = thin_border
-
-        # الموقع
-        ws.cell(row=row_num, column=3).value = item['location']
-        ws.cell(row=row_num, column=3).border = thin_border
-
-        # الإيجار السنوي
-        ws.cell(row=row_num, column=4).value = safe_float(item['annual_rent'])
-        ws.cell(row=row_num, column=4).number_format = '#,##0.00'
-        ws.cell(row=row_num, column=4).border = thin_border
-
-        # رقم المعرض (كل الوحدات)
-        ws.cell(row=row_num, column=5).value = item.get('all_unit_numbers_str', item['unit_number'])
-        ws.cell(row=row_num, column=5).alignment = Alignment(horizontal='center')
-        ws.cell(row=row_num, column=5).border = thin_border
-
-        # الهاتف
-        ws.cell(row=row_num, column=6).value = item.get('tenant_phone', 'غير محدد')
-        ws.cell(row=row_num, column=6).alignment = Alignment(horizontal='center')
-        ws.cell(row=row_num, column=6).border = thin_border
-
-        # المستحق
-        ws.cell(row=row_num, column=7).value = safe_float(item['outstanding_amount'])
-        ws.cell(row=row_num, column=7).number_format = '#,##0.00'
-        ws.cell(row=row_num, column=7).border = thin_border
-
-        # تلوين المستحق إذا كان > 0
-        if item['outstanding_amount'] > 0:
-            ws.cell(row=row_num, column=7).font = Font(color="FF0000", bold=True)
-
-        # من تاريخ
         due_from = item.get('due_period_from')
-        ws.cell(row=row_num, column=8).value = due_from.strftime('%Y-%m-%d') if due_from else '-'
-        ws.cell(row=row_num, column=8).alignment = Alignment(horizontal='center')
-        ws.cell(row=row_num, column=8).border = thin_border
-
-        # إلى تاريخ
         due_to = item.get('due_period_to')
-        ws.cell(row=row_num, column=9).value = due_to.strftime('%Y-%m-%d') if due_to else '-'
-        ws.cell(row=row_num, column=9).alignment = Alignment(horizontal='center')
-        ws.cell(row=row_num, column=9).border = thin_border
 
-        # عدد الفترات المتأخرة
-        ws.cell(row=row_num, column=10).value = item['overdue_periods_count']
-        ws.cell(row=row_num, column=10).alignment = Alignment(horizontal='center')
-        ws.cell(row=row_num, column=10).border = thin_border
+        ws.append([
+            cell(item['tenant_id'], 'center'),
+            cell(item['tenant_name'], 'text'),
+            cell(item['location'], 'text'),
+            cell(safe_float(item['annual_rent']), 'money'),
+            cell(item.get('all_unit_numbers_str', item['unit_number']), 'center'),
+            cell(item.get('tenant_phone', 'غير محدد'), 'center'),
+            # تلوين المستحق إذا كان > 0
+            cell(
+                safe_float(item['outstanding_amount']),
+                'money_due' if item['outstanding_amount'] > 0 else 'money'
+            ),
+            cell(due_from.strftime('%Y-%m-%d') if due_from else '-', 'center'),
+            cell(due_to.strftime('%Y-%m-%d') if due_to else '-', 'center'),
+            cell(item['overdue_periods_count'], 'center'),
+        ])
 
         # الإجماليات
         total_outstanding += item['outstanding_amount']
         total_annual_rent += item['annual_rent']
 
-        row_num += 1
-    
-    # ========================================
-    # إضافة صف الإجماليات
-    # ========================================
-    
-    ws.cell(row=row_num, column=3).value = "الإجمالي:"
-    ws.cell(row=row_num, column=3).font = Font(bold=True, size=12)
-    ws.cell(row=row_num, column=3).alignment = Alignment(horizontal='right')
-    ws.cell(row=row_num, column=3).fill = PatternFill(
-        start_color="E7E6E6",
-        end_color="E7E6E6",
-        fill_type="solid"
-    )
+    # صف الإجماليات
+    ws.append([
+        None,
+        None,
+        cell("الإجمالي:", 'total_label'),
+        cell(safe_float(total_annual_rent), 'total_money'),
+        cell(None, 'total_empty'),
+        cell(None, 'total_empty'),
+        cell(safe_float(total_outstanding), 'total_due'),
+        cell(None, 'total_empty'),
+        cell(None, 'total_empty'),
+        cell(None, 'total_empty'),
+    ])
 
-    # إجمالي الإيجار السنوي
-    ws.cell(row=row_num, column=4).value = safe_float(total_annual_rent)
-    ws.cell(row=row_num, column=4).number_format = '#,##0.00'
-    ws.cell(row=row_num, column=4).font = Font(bold=True, size=12)
-    ws.cell(row=row_num, column=4).fill = PatternFill(
-        start_color="E7E6E6",
-        end_color="E7E6E6",
-        fill_type="solid"
-    )
+    wb.save(output)
 
-    # خلايا فارغة
-    for col in [5, 6]:
-        ws.cell(row=row_num, column=col).fill = PatternFill(
-            start_color="E7E6E6",
-            end_color="E7E6E6",
-            fill_type="solid"
-        )
 
-    # إجمالي المستحق
-    ws.cell(row=row_num, column=7).value = safe_float(total_outstanding)
-    ws.cell(row=row_num, column=7).number_format = '#,##0.00'
-    ws.cell(row=row_num, column=7).font = Font(bold=True, size=12, color="FF0000")
-    ws.cell(row=row_num, column=7).fill = PatternFill(
-        start_color="E7E6E6",
-        end_color="E7E6E6",
-        fill_type="solid"
-    )
+@login_required
+@permission_required('rent.export_reports', raise_exception=True)
+def export_tenants_report_excel(request):
+    """
+    تصدير التقرير إلى Excel مع تنسيق احترافي
+    ✅ Updated - حساب العقود على دفعات + كتابة write-only إلى ملف مؤقت
+    يُرسل الملف كـ FileResponse (StreamingHttpResponse) فتبقى الذاكرة ثابتة
+    """
+    import tempfile
+    from django.http import FileResponse
 
-    # خلايا فارغة
-    for col in [8, 9, 10]:
-        ws.cell(row=row_num, column=col).fill = PatternFill(
-            start_color="E7E6E6",
-            end_color="E7E6E6",
-            fill_type="solid"
-        )
-    
-    # ========================================
-    # ضبط عرض الأعمدة
-    # ========================================
-    
-    column_widths = {
-        1: 15,  # رقم المستأجر
-        2: 30,  # اسم المستأجر
-        3: 25,  # الموقع
-        4: 18,  # الإيجار السنوي
-        5: 20,  # رقم المعرض
-        6: 18,  # الهاتف
-        7: 18,  # المستحق
-        8: 15,  # من تاريخ
-        9: 15,  # إلى تاريخ
-        10: 20, # عدد الفترات المتأخرة
+    # جلب الفلاتر (إن وجدت)
+    filters = {
+        'tenant_name': request.GET.get('tenant_name', ''),
+        'location': request.GET.get('location', ''),
+        'has_outstanding': request.GET.get('has_outstanding', ''),
     }
     
-    for col, width in column_widths.items():
-        ws.column_dimensions[get_column_letter(col)].width = width
-    
-    # تجميد الصف الأول
-    ws.freeze_panes = 'A2'
-    
-    # ========================================
-    # حفظ الملف
-    # ========================================
+    # جلب العقود
+    contracts = get_contracts_queryset(filters)
     
-    response = HttpResponse(
-        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-    )
-    response['Content-Disposition'] = (
-        f'attachment; filename=tenants_report_{date.today().strftime("%Y%m%d")}.xlsx'
+    # توليد البيانات على دفعات + تطبيق فلتر المستحقات
+    report_data = apply_outstanding_filter(
+        iter_tenants_report_data(contracts),
+        filters.get('has_outstanding')
     )
     
-    wb.save(response)
-    
-    return response
+    # الكتابة إلى ملف مؤقت على القرص (يُحذف تلقائياً عند إغلاقه بعد الإرسال)
+    output = tempfile.TemporaryFile(suffix='.xlsx')
+    try:
+        write_tenants_report_excel(report_data, output)
+    except Exception:
+        output.close()
+        raise
+    output.seek(0)
+    
+    return FileResponse(
+        output,
+        as_attachment=True,
+        filename=f'tenants_report_{date.today().strftime("%Y%m%d")}.xlsx',
+        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    )
 
 
 # ========================================
@@ -1,4 +1,5 @@
 from .common_imports_view import *
+from django.views import View
 # ========================================
 # 8. التقارير
 # ========================================
@@ -166,6 +167,7 @@ class OccupancyReportView(LoginRequiredMixin, PermissionCheckMixin, TemplateView
             rented = stat['rented'] or 0
             rate = (rented / total * 100) if total > 0 else 0
             building_stats_list.append({
+                'building_id': stat['id'],
                 'building_name': stat['name'],
                 'total': total,
                 'rented': rented,
@@ -174,6 +176,7 @@ class OccupancyReportView(LoginRequiredMixin, PermissionCheckMixin, TemplateView
             })
 
         context['building_stats'] = building_stats_list
+        context.update(self.get_history_context(building_stats_list))
 
         # بيانات للرسم البياني
         context['chart_data'] = {
@@ -183,108 +186,232 @@ class OccupancyReportView(LoginRequiredMixin, PermissionCheckMixin, TemplateView
 
         return context
 
+    def get_history_context(self, building_stats_list):
+        """الإشغال التاريخي وأيام الشغور من سجل الإشغال الشهري (فترات العقود)"""
+        from dateutil.relativedelta import relativedelta
+        from rent.services.occupancy_service import monthly_series
 
-class RevenueReportView(LoginRequiredMixin, PermissionCheckMixin, TemplateView):
-    """تقرير الإيرادات - محسّن"""
-    template_name = 'reports/revenue.html'
-    required_permission = 'rent.view_reports'
-
-    def get_context_data(self, **kwargs):
-        from django.db.models.functions import TruncMonth
-        from django.db.models import Count
-
-        context = super().get_context_data(**kwargs)
-        today = date.today()
+        try:
+            history_months = int(self.request.GET.get('history_months', 12))
+        except (TypeError, ValueError):
+            history_months = 12
+        history_months = min(max(history_months, 3), 60)
 
-        # الفترة (افتراضياً آخر 12 شهر)
-        months = int(self.request.GET.get('months', 12))
-        start_date = today - timedelta(days=30 * months)
-        month_start_current = today.replace(day=1)
+        end_month = date.today().replace(day=1) + relativedelta(months=1)
+        start_month = end_month - relativedelta(months=history_months)
 
-        # ✅ OPTIMIZED: جلب كل الإحصائيات في query واحد
-        base_qs = Receipt.objects.filter(
-            status='posted',
-            receipt_date__gte=start_date
-        )
+        history = monthly_series(start_month, end_month)
 
-        # إجمالي الإيرادات + عدد السندات في query واحد
-        totals = base_qs.aggregate(
-            total_revenue=Sum('amount'),
-            total_receipts=Count('id')
-        )
-        total_revenue = totals['total_revenue'] or Decimal('0')
-        total_receipts = totals['total_receipts'] or 0
+        # أيام الإشغال والشغور لكل مبنى خلال الفترة
+        by_building = {}
+        for row in monthly_series(start_month, end_month, group_by='building'):
+            totals = by_building.setdefault(row['building_id'], {
+                'days': 0, 'occupied_days': 0, 'vacant_days': 0, 'lost_rent': Decimal('0'),
+            })
+            for field in totals:
+                totals[field] += row[field]
+
+        for stat in building_stats_list:
+            totals = by_building.get(stat['building_id'], {})
+            days = totals.get('days', 0)
+            stat['vacant_days'] = totals.get('vacant_days', 0)
+            stat['lost_rent'] = totals.get('lost_rent', Decimal('0'))
+            stat['history_rate'] = round(totals.get('occupied_days', 0) / days * 100, 1) if days else 0
+
+        return {
+            'history_months': history_months,
+            'occupancy_history': history,
+            'total_vacant_days': sum(row['vacant_days'] for row in history),
+            'total_lost_rent': sum((row['lost_rent'] for row in history), Decimal('0')),
+            'history_chart_data': {
+                'labels': [row['month'].strftime('%Y-%m') for row in history],
+                'values': [float(row['rate']) for row in history],
+            },
+        }
 
-        # ✅ OPTIMIZED: الإيرادات الشهرية في query واحد باستخدام TruncMonth
-        monthly_data = base_qs.annotate(
-            month=TruncMonth('receipt_date')
-        ).values('month').annotate(
-            total=Sum('amount')
-        ).order_by('month')
 
-        # تحويل النتائج لقوائم
-        monthly_dict = {item['month']: item['total'] for item in monthly_data}
+class OccupancyHistoryAPIView(LoginRequiredMixin, PermissionCheckMixin, View):
+    """
+    API سلسلة الإشغال للرسوم البيانية
 
-        monthly_revenue = []
-        monthly_labels = []
-        monthly_values = []
+    Query params:
+        granularity: monthly (من سجل الإشغال) أو daily (من العقود مباشرة)
+        start / end: YYYY-MM-DD (افتراضياً آخر 12 شهر)
+        unit / building / land: تصفية
+        group_by: unit أو building أو land (الشهري فقط)
+    """
+    required_permission = 'rent.view_reports'
 
-        # إنشاء قائمة بكل الشهور (حتى الفارغة)
+    def get(self, request, *args, **kwargs):
         from dateutil.relativedelta import relativedelta
-        current_month = start_date.replace(day=1)
-        while current_month <= today:
-            month_label = current_month.strftime('%Y-%m')
-            month_total = monthly_dict.get(current_month, Decimal('0'))
-
-            monthly_labels.append(month_label)
-            monthly_values.append(float(month_total or 0))
-            monthly_revenue.append({
-                'month': month_label,
-                'total': month_total or Decimal('0')
-            })
+        from rent.services.occupancy_service import (
+            GROUP_FIELDS, daily_series, default_horizon, monthly_series,
+        )
 
-            current_month = current_month + relativedelta(months=1)
+        try:
+            end = self._parse_date(request.GET.get('end')) or date.today()
+            start = self._parse_date(request.GET.get('start')) or (
+                end.replace(day=1) - relativedelta(months=11)
+            )
+            filters = {
+                f'{name}_id': int(request.GET[name])
+                for name in ('unit', 'building', 'land') if request.GET.get(name)
+            }
+        except ValueError:
+            return JsonResponse({'success': False, 'error': 'معاملات غير صحيحة'}, status=400)
+
+        # لا أشهر بعد نهاية السجل المحفوظ (FUTURE_MONTHS بعد الشهر الحالي)
+        end = min(end, default_horizon() - timedelta(days=1))
+        if start > end:
+            return JsonResponse({'success': False, 'error': 'تاريخ البداية بعد تاريخ النهاية'}, status=400)
+
+        if request.GET.get('granularity') == 'daily':
+            unit_id = filters.pop('unit_id', None)
+            series = daily_series(start, end, unit_ids=[unit_id] if unit_id else None, **filters)
+            data = [dict(row, date=row['date'].isoformat()) for row in series]
+        else:
+            group_by = request.GET.get('group_by') or None
+            if group_by not in GROUP_FIELDS and group_by is not None:
+                return JsonResponse({'success': False, 'error': 'تجميع غير معروف'}, status=400)
+            series = monthly_series(
+                start.replace(day=1), end.replace(day=1) + relativedelta(months=1),
+                group_by=group_by, **filters
+            )
+            data = [
+                dict(row, month=row['month'].isoformat(), lost_rent=float(row['lost_rent']))
+                for row in series
+            ]
+
+        return JsonResponse({'success': True, 'series': data})
+
+    def _parse_date(self, value):
+        from datetime import datetime
+
+        if not value:
+            return None
+        return datetime.strptime(value, '%Y-%m-%d').date()
 
-        # ✅ OPTIMIZED: الإيرادات حسب طريقة الدفع (query موجود بالفعل - جيد)
-        payment_methods = base_qs.values('payment_method').annotate(
-            total=Sum('amount')
-        ).order_by('-total')
 
-        payment_methods_data = []
-        for method in payment_methods:
-            payment_methods_data.append({
-                'method': method.get('payment_method', 'غير محدد'),
-                'method_code': method['payment_method'],
-                'total': method['total']
-            })
+class RevenueReportView(LoginRequiredMixin, PermissionCheckMixin, TemplateView):
+    """تقرير الإيرادات - محسّن"""
+    template_name = 'reports/revenue.html'
+    required_permission = 'rent.view_reports'
 
-        # ✅ OPTIMIZED: الإيرادات اليوم والشهر الحالي في query واحد
-        today_and_month = Receipt.objects.filter(
-            status='posted',
-            receipt_date__gte=month_start_current
-        ).aggregate(
-            month_revenue=Sum('amount'),
-            today_revenue=Sum('amount', filter=Q(receipt_date=today))
-        )
+    def get_context_data(self, **kwargs):
+        from dateutil.relativedelta import relativedelta
+        from rent.models import PaymentMethod
+        from rent.models.revenue_rollup_models import receipt_building
+        from rent.services.revenue_report_service import SOURCE_RAW, SOURCE_ROLLUP, get_revenue_summary
 
-        today_revenue = today_and_month['today_revenue'] or Decimal('0')
-        month_revenue = today_and_month['month_revenue'] or Decimal('0')
+        context = super().get_context_data(**kwargs)
+        today = date.today()
 
-        context['total_revenue'] = total_revenue
+        # الفترة بالأشهر الكاملة (افتراضياً آخر 12 شهر شاملة الشهر الحالي)
+        try:
+            months = int(self.request.GET.get('months', 12))
+        except (TypeError, ValueError):
+            months = 12
+        months = min(max(months, 1), 60)
+        month_start_current = today.replace(day=1)
+        start_date = month_start_current - relativedelta(months=months - 1)
+        end_date = month_start_current + relativedelta(months=1)
+
+        try:
+            building_id = int(self.request.GET.get('building') or 0) or None
+        except (TypeError, ValueError):
+            building_id = None
+
+        # من جدول الإجماليات الشهرية، أو من السندات مباشرة للتحقق (?source=raw)
+        source = SOURCE_RAW if self.request.GET.get('source') == SOURCE_RAW else SOURCE_ROLLUP
+        summary = get_revenue_summary(start_date, end_date, building_id=building_id, source=source)
+
+        monthly_revenue = [
+            {'month': item['month'].strftime('%Y-%m'), 'total': item['total']}
+            for item in summary['monthly']
+        ]
+
+        method_labels = dict(PaymentMethod.choices)
+        payment_methods_data = [
+            {
+                'method': method_labels.get(item['method_code'], item['method_code'] or 'غير محدد'),
+                'method_code': item['method_code'],
+                'total': item['total'],
+            }
+            for item in summary['payment_methods']
+        ]
+
+        # إيرادات الشهر الحالي من الإجماليات، واليوم فقط من السندات (استعلام صغير)
+        month_revenue = summary['monthly'][-1]['total'] if summary['monthly'] else Decimal('0')
+        today_qs = Receipt.objects.filter(status='posted', is_deleted=False, receipt_date=today)
+        if building_id:
+            # نفس نسبة الإجماليات: مبنى أول وحدة في العقد
+            today_qs = today_qs.annotate(
+                rollup_building_id=receipt_building()
+            ).filter(rollup_building_id=building_id)
+        today_revenue = today_qs.aggregate(total=Sum('amount'))['total'] or Decimal('0')
+
+        context['total_revenue'] = summary['total']
         context['today_revenue'] = today_revenue
         context['month_revenue'] = month_revenue
-        context['total_receipts'] = total_receipts
+        context['total_receipts'] = summary['receipts_count']
         context['monthly_revenue'] = monthly_revenue
         context['payment_methods'] = payment_methods_data
+        context['revenue_by_building'] = summary['buildings']
+        context['buildings'] = Building.objects.filter(is_active=True).order_by('name')
+        context['selected_building'] = building_id
+        context['source'] = source
         context['months'] = months
         context['start_date'] = start_date
 
         # بيانات للرسم البياني
         context['chart_data'] = {
-            'labels': monthly_labels,
-            'values': monthly_values
+            'labels': [item['month'] for item in monthly_revenue],
+            'values': [float(item['total']) for item in monthly_revenue]
         }
 
         return context
 
 
+class CashFlowForecastReportView(LoginRequiredMixin, PermissionCheckMixin, TemplateView):
+    """تقرير توقعات التحصيل الشهرية للعقود النشطة"""
+    template_name = 'reports/cashflow_forecast.html'
+    required_permission = 'rent.view_reports'
+
+    GROUP_CHOICES = {
+        'building': 'المبنى',
+        'land': 'الأرض',
+        'frequency': 'دورية السداد',
+    }
+
+    def get_context_data(self, **kwargs):
+        from rent.services.cashflow_forecast_service import (
+            CashFlowForecastService,
+            DEFAULT_MONTHS,
+        )
+
+        context = super().get_context_data(**kwargs)
+
+        try:
+            months = int(self.request.GET.get('months', DEFAULT_MONTHS))
+        except (TypeError, ValueError):
+            months = DEFAULT_MONTHS
+
+        group_by = self.request.GET.get('group_by', 'building')
+        if group_by not in self.GROUP_CHOICES:
+            group_by = 'building'
+
+        service = CashFlowForecastService(months=months)
+        forecast = service.get_forecast(use_cache=not self.request.GET.get('refresh'))
+
+        context['forecast'] = forecast
+        context['months'] = service.months
+        context['group_by'] = group_by
+        context['group_label'] = self.GROUP_CHOICES[group_by]
+        context['groups'] = {
+            'building': forecast.by_building,
+            'land': forecast.by_land,
+            'frequency': forecast.by_frequency,
+        }[group_by].values()
+        context['chart_data'] = forecast.to_chart_data()
+
+        return context
@@ -186,9 +186,78 @@ SESSION_COOKIE_HTTPONLY = True
 # ============================================
 # CACHE CONFIGURATION
 # ============================================
+FINANCIAL_CACHE_MAX_ENTRIES = int(os.environ.get('FINANCIAL_CACHE_MAX_ENTRIES', 5000))
+FINANCIAL_CACHE_TIMEOUT = int(os.environ.get('FINANCIAL_CACHE_TIMEOUT', 60 * 60))
+# cache مشترك بين العمليات (workers) لنتائج الحسابات المالية:
+# redis://host:6379/1 أو file:///var/cache/rental/financial (نفس الخادم فقط)
+FINANCIAL_CACHE_URL = os.environ.get('FINANCIAL_CACHE_URL', '')
+# locmem لكل عملية: إهمال النتائج لا يصل للعمليات الأخرى فلا يُستخدم إلا صراحة
+# (خادم التطوير أو عملية واحدة)
+FINANCIAL_CACHE_ALLOW_LOCMEM = os.environ.get(
+    'FINANCIAL_CACHE_ALLOW_LOCMEM', str(DEBUG)
+).lower() == 'true'
+
+# نتائج الحسابات المالية للعقود (rent.services.financial_cache)
+# CULL_FREQUENCY = MAX_ENTRIES: عند الامتلاء يُحذف الأقدم استخداماً فقط (LRU)
+# مع Redis: maxmemory + maxmemory-policy allkeys-lru
+if FINANCIAL_CACHE_URL.startswith(('redis://', 'rediss://')):
+    FINANCIAL_CACHE = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': FINANCIAL_CACHE_URL,
+        'TIMEOUT': FINANCIAL_CACHE_TIMEOUT,
+    }
+elif FINANCIAL_CACHE_URL.startswith('file://'):
+    FINANCIAL_CACHE = {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': FINANCIAL_CACHE_URL[len('file://'):],
+        'TIMEOUT': FINANCIAL_CACHE_TIMEOUT,
+        'OPTIONS': {
+            'MAX_ENTRIES': FINANCIAL_CACHE_MAX_ENTRIES,
+        },
+    }
+else:
+    FINANCIAL_CACHE = {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'contract-financial',
+        'TIMEOUT': FINANCIAL_CACHE_TIMEOUT,
+        'OPTIONS': {
+            'MAX_ENTRIES': FINANCIAL_CACHE_MAX_ENTRIES,
+            'CULL_FREQUENCY': FINANCIAL_CACHE_MAX_ENTRIES,
+        },
+    }
+
 CACHES = {
     'default': {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
         'LOCATION': 'unique-snowflake',
-    }
-}
\ No newline at end of file
+    },
+    'financial': FINANCIAL_CACHE,
+}
+FINANCIAL_CACHE_ALIAS = 'financial'
+
+# ============================================
+# AUDIT LOG CONFIGURATION
+# ============================================
+# كتابة سجلات التدقيق في خيط خلفي بدلاً من نهاية المعاملة/الطلب
+AUDIT_LOG_ASYNC = os.environ.get('AUDIT_LOG_ASYNC', 'False').lower() == 'true'
+AUDIT_LOG_BATCH_SIZE = int(os.environ.get('AUDIT_LOG_BATCH_SIZE', '500'))
+# الحد الأقصى لنسخ ما قبل الحفظ المحفوظة مؤقتاً لكل خيط
+AUDIT_LOG_SNAPSHOT_MAX_SIZE = int(os.environ.get('AUDIT_LOG_SNAPSHOT_MAX_SIZE', '1000'))
+
+# ============================================
+# BACKUP CONFIGURATION
+# ============================================
+# عدد العمليات المتوازية لـ pg_dump/pg_restore (افتراضي: عدد الأنوية بحد أقصى 8)
+BACKUP_PG_JOBS = int(os.environ.get('BACKUP_PG_JOBS', '0')) or None
+# مهلة أدوات PostgreSQL بالثواني (بدون مهلة افتراضياً)
+BACKUP_PG_TIMEOUT = int(os.environ.get('BACKUP_PG_TIMEOUT', '0')) or None
+# هامش علامات النسخ التزايدية بالثواني: updated_at وقت save() وليس وقت
+# الالتزام، فما حُفظ قبل بداية النسخة بأقل من الهامش يُعاد في النسخة التالية
+BACKUP_WATERMARK_MARGIN = int(os.environ.get('BACKUP_WATERMARK_MARGIN', '600'))
+# نسخة "قيد التنفيذ" بدون تقدم منذ هذه المدة بالثواني تُحدد كفاشلة ويُحذف ملفها المؤقت
+BACKUP_STALE_AFTER = int(os.environ.get('BACKUP_STALE_AFTER', str(6 * 3600)))
+# تحميل النسخ عبر الـ proxy الأمامي: '' (التطبيق نفسه مع sendfile) أو 'nginx' أو 'apache'
+BACKUP_DOWNLOAD_ACCEL = os.environ.get('BACKUP_DOWNLOAD_ACCEL', '').lower()
+# nginx: location داخلي (internal) يشير إلى BACKUP_ACCEL_ROOT
+BACKUP_ACCEL_ROOT = os.environ.get('BACKUP_ACCEL_ROOT', os.path.join(BASE_DIR, 'backups'))
+BACKUP_ACCEL_REDIRECT_PREFIX = os.environ.get('BACKUP_ACCEL_REDIRECT_PREFIX', '/protected-backups/')